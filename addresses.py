@@ -0,0 +1,150 @@
+"""
+Адреса кошельков: детерминированная выдача и обратный поиск без сканирования
+
+Адрес однозначно кодирует (валюта, пользователь): КОД_ + base32 от
+id валюты, id пользователя и 4 байт контрольной суммы (sha256 от кода и id).
+Поэтому:
+- адрес известен до создания кошелька (кошельки создаются при первом
+  зачислении) и не может совпасть с чужим - пулы и проверки не нужны;
+- обратный поиск - разбор адреса за O(1) и поиск кошелька по индексу
+  ix_wallets_user_currency; чужие и испорченные адреса отсеиваются
+  контрольной суммой без обращения к базе.
+
+Старые адреса вида КОД_address_<пользователь>_<валюта> тоже разбираются,
+но считаются нашими, только если такой адрес записан у кошелька (без
+контрольной суммы их легко подобрать).
+"""
+import struct
+import base64
+import hashlib
+from collections import namedtuple
+from sqlalchemy import tuple_
+from database import db
+from models import Wallet, Currency
+import logging
+
+logger = logging.getLogger(__name__)
+
+AddressInfo = namedtuple('AddressInfo', 'currency_code currency_id user_id legacy')
+
+_PAYLOAD = struct.Struct(">IQ")  # id валюты, id пользователя
+_CHECKSUM_SIZE = 4
+_LEGACY_MARKER = "_address_"
+
+
+def _checksum(currency_code, payload):
+    return hashlib.sha256(currency_code.encode('utf-8') + payload).digest()[:_CHECKSUM_SIZE]
+
+
+def wallet_address(currency_code, user_id, currency_id):
+    """Адрес кошелька пользователя в валюте"""
+    payload = _PAYLOAD.pack(currency_id, user_id)
+    encoded = base64.b32encode(payload + _checksum(currency_code, payload)).decode('ascii')
+    return f"{currency_code}_{encoded.rstrip('=').lower()}"
+
+
+def parse_address(address):
+    """
+    Валюта и пользователь по адресу (без обращения к базе)
+
+    Returns:
+        AddressInfo: или None, если адрес не выдан этим кошельком
+    """
+    if not address or '_' not in address:
+        return None
+
+    if _LEGACY_MARKER in address:
+        currency_code, _, ids = address.partition(_LEGACY_MARKER)
+        user_id, _, currency_id = ids.partition('_')
+        if not (user_id.isdigit() and currency_id.isdigit()):
+            return None
+        return AddressInfo(currency_code, int(currency_id), int(user_id), True)
+
+    currency_code, _, encoded = address.rpartition('_')
+    try:
+        raw = base64.b32decode(encoded.upper() + '=' * (-len(encoded) % 8))
+    except ValueError:
+        return None
+    if len(raw) != _PAYLOAD.size + _CHECKSUM_SIZE:
+        return None
+
+    payload, checksum = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    if checksum != _checksum(currency_code, payload):
+        return None
+    currency_id, user_id = _PAYLOAD.unpack(payload)
+    return AddressInfo(currency_code, currency_id, user_id, False)
+
+
+class AddressBook:
+    """Обратный поиск кошельков по адресам (общий экземпляр - address_book)"""
+
+    # Пар (пользователь, валюта) в одном запросе IN
+    LOOKUP_CHUNK = 400
+
+    def __init__(self, database=db):
+        self.db = database
+        self._currency_codes = {}
+
+    def _currency_code(self, session, currency_id):
+        code = self._currency_codes.get(currency_id)
+        if code is None:
+            # Новая валюта - перечитываем справочник
+            self._currency_codes = dict(session.query(Currency.id, Currency.code))
+            code = self._currency_codes.get(currency_id)
+        return code
+
+    def parse(self, session, address):
+        """AddressInfo адреса, если его валюта существует и совпадает с кодом в адресе"""
+        info = parse_address(address)
+        if info and self._currency_code(session, info.currency_id) == info.currency_code:
+            return info
+        return None
+
+    def resolve(self, session, address):
+        """
+        Кошелек по адресу
+
+        Returns:
+            tuple: (AddressInfo, Wallet или None - кошелек еще не создан)
+                или None - адрес не наш
+        """
+        info = self.parse(session, address)
+        if not info:
+            return None
+        wallet = session.query(Wallet).filter_by(user_id=info.user_id, currency_id=info.currency_id).first()
+        if info.legacy and (not wallet or wallet.address != address):
+            return None
+        return info, wallet
+
+    def resolve_many(self, session, addresses):
+        """
+        Кошельки по многим адресам: запрос на LOOKUP_CHUNK адресов
+
+        Returns:
+            dict: {адрес: (AddressInfo, Wallet или None)}, чужих адресов в нем нет
+        """
+        infos = {}
+        for address in set(addresses):
+            info = self.parse(session, address)
+            if info:
+                infos[address] = info
+
+        keys = list({(info.user_id, info.currency_id) for info in infos.values()})
+        wallets = {}
+        for start in range(0, len(keys), self.LOOKUP_CHUNK):
+            chunk = keys[start:start + self.LOOKUP_CHUNK]
+            for wallet in (session.query(Wallet)
+                           .filter(tuple_(Wallet.user_id, Wallet.currency_id).in_(chunk))):
+                wallets[(wallet.user_id, wallet.currency_id)] = wallet
+
+        result = {}
+        for address, info in infos.items():
+            wallet = wallets.get((info.user_id, info.currency_id))
+            if info.legacy and (not wallet or wallet.address != address):
+                continue
+            result[address] = (info, wallet)
+        return result
+
+
+# Общий обратный поиск адресов
+address_book = AddressBook()
@@ -1,25 +1,38 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QTableWidget, QTableWidgetItem,
                              QLineEdit, QComboBox, QMessageBox, QGroupBox,
-                             QFormLayout, QHeaderView, QTabWidget, QWidget)
-from PyQt5.QtCore import Qt
+                             QFormLayout, QHeaderView, QTabWidget, QWidget,
+                             QFileDialog, QInputDialog)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 from database import db
-from models import User, UserRole, UserStatus, Transaction, Exchange, Currency
+from models import User, UserRole, UserStatus, Transaction, Exchange, Currency, ROLE_DISPLAY_NAMES
 from transaction_utils import transaction_session
 from backup_manager import backup_manager  # Импортируем менеджер бэкапов
+from user_stats import user_stats
+from user_directory import user_directory
+from instrumentation import instrumentation
 from datetime import datetime
+import threading
 
 
 class AdminPanelDialog(QDialog):
+    # Результат фоновой выгрузки приходит в GUI-поток через сигналы
+    export_finished = pyqtSignal(dict)
+    export_failed = pyqtSignal(str)
+
     def __init__(self, admin_user_id, parent=None):
         super().__init__(parent)
         self.admin_user_id = admin_user_id
         self.selected_user_id = None
+        # Ключи страниц справочника: id, после которого начинается каждая открытая страница
+        self.users_page_cursors = [None]
+        self.users_has_next_page = False
         self.init_ui()
         self.load_users()
         self.load_transactions()
         self.load_currencies()
+        self.load_performance()
 
         # Загружаем информацию о последнем бэкапе
         self.load_latest_backup_info()
@@ -61,6 +74,10 @@ class AdminPanelDialog(QDialog):
         currencies_tab = self.create_currencies_tab()
         tabs.addTab(currencies_tab, "💰 Валюты")
 
+        # Вкладка производительности (метрики instrumentation)
+        performance_tab = self.create_performance_tab()
+        tabs.addTab(performance_tab, "⏱ Производительность")
+
         layout.addWidget(tabs)
 
         # Простые кнопки
@@ -147,7 +164,8 @@ class AdminPanelDialog(QDialog):
                 modified = latest_backup['modified']
 
                 if isinstance(modified, str):
-                    dt = datetime.fromisoformat(modified.replace('Z', '+00:00'))
+                    # Каталог хранит время в UTC - показываем местное
+                    dt = datetime.fromisoformat(modified.replace('Z', '+00:00')).astimezone()
                 else:
                     dt = modified
 
@@ -295,9 +313,15 @@ class AdminPanelDialog(QDialog):
 
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Телефон, ФИО или ID...")
-        self.search_input.textChanged.connect(self.filter_users)
+        self.search_input.textChanged.connect(self.on_search_text_changed)
         search_layout.addWidget(self.search_input)
 
+        # Поиск - после паузы в наборе, а не на каждую букву
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.filter_users)
+
         layout.addWidget(search_group)
 
         # Таблица пользователей
@@ -310,6 +334,23 @@ class AdminPanelDialog(QDialog):
         self.users_table.cellClicked.connect(self.on_user_cell_clicked)
         layout.addWidget(self.users_table)
 
+        # Страницы
+        pages_layout = QHBoxLayout()
+
+        self.users_prev_btn = QPushButton("◀ Назад")
+        self.users_prev_btn.clicked.connect(self.show_previous_users_page)
+        pages_layout.addWidget(self.users_prev_btn)
+
+        self.users_page_label = QLabel()
+        self.users_page_label.setAlignment(Qt.AlignCenter)
+        pages_layout.addWidget(self.users_page_label)
+
+        self.users_next_btn = QPushButton("Вперед ▶")
+        self.users_next_btn.clicked.connect(self.show_next_users_page)
+        pages_layout.addWidget(self.users_next_btn)
+
+        layout.addLayout(pages_layout)
+
         # Кнопки управления пользователем
         user_actions = QHBoxLayout()
 
@@ -441,6 +482,14 @@ class AdminPanelDialog(QDialog):
         refresh_transactions_btn.clicked.connect(self.load_transactions)
         layout.addWidget(refresh_transactions_btn)
 
+        # Полная выгрузка для сверки (все транзакции, обмены и комиссии)
+        self.export_btn = QPushButton("📤 Экспорт всех данных")
+        self.export_btn.clicked.connect(self.export_all_data)
+        layout.addWidget(self.export_btn)
+
+        self.export_finished.connect(self.on_export_finished)
+        self.export_failed.connect(self.on_export_failed)
+
         return widget
 
     def create_currencies_tab(self):
@@ -472,37 +521,115 @@ class AdminPanelDialog(QDialog):
 
         return widget
 
+    def create_performance_tab(self):
+        """Создание вкладки производительности: самые медленные операции и запросы"""
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+
+        controls_layout = QHBoxLayout()
+        controls_layout.addWidget(QLabel("Показать:"))
+
+        self.performance_limit_combo = QComboBox()
+        for limit in (10, 25, 50):
+            self.performance_limit_combo.addItem(f"Топ {limit}", limit)
+        controls_layout.addWidget(self.performance_limit_combo)
+
+        self.performance_sort_combo = QComboBox()
+        self.performance_sort_combo.addItem("По суммарному времени", 'total_ms')
+        self.performance_sort_combo.addItem("По p99", 'p99_ms')
+        self.performance_sort_combo.addItem("По максимуму", 'max_ms')
+        controls_layout.addWidget(self.performance_sort_combo)
+
+        refresh_performance_btn = QPushButton("🔄 Обновить метрики")
+        refresh_performance_btn.clicked.connect(self.load_performance)
+        controls_layout.addWidget(refresh_performance_btn)
+        controls_layout.addStretch()
+        layout.addLayout(controls_layout)
+
+        # Операции
+        self.operations_table = QTableWidget()
+        self.operations_table.setColumnCount(8)
+        self.operations_table.setHorizontalHeaderLabels([
+            "Операция", "Вызовов", "Среднее, мс", "p99, мс", "Макс, мс",
+            "Всего, мс", "SQL за вызов", "SQL мс за вызов"
+        ])
+        self.operations_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.operations_table)
+
+        # SQL-запросы
+        layout.addWidget(QLabel("Самые затратные SQL-запросы:"))
+        self.statements_table = QTableWidget()
+        self.statements_table.setColumnCount(5)
+        self.statements_table.setHorizontalHeaderLabels([
+            "Операция", "Запрос", "Выполнений", "Всего, мс", "Среднее, мс"
+        ])
+        self.statements_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.statements_table)
+
+        self.performance_limit_combo.currentIndexChanged.connect(self.load_performance)
+        self.performance_sort_combo.currentIndexChanged.connect(self.load_performance)
+
+        return widget
+
+    def load_performance(self):
+        """Загрузка топа медленных операций и запросов текущего процесса"""
+        limit = self.performance_limit_combo.currentData()
+        operations = instrumentation.top_operations(limit, by=self.performance_sort_combo.currentData())
+
+        self.operations_table.setRowCount(len(operations))
+        for row, stats in enumerate(operations):
+            values = [stats['operation'], str(stats['count']), f"{stats['avg_ms']:.1f}",
+                      f"{stats['p99_ms']:.1f}", f"{stats['max_ms']:.1f}", f"{stats['total_ms']:.0f}",
+                      f"{stats['sql_per_call']:.1f}", f"{stats['sql_ms_per_call']:.1f}"]
+            for column, value in enumerate(values):
+                self.operations_table.setItem(row, column, QTableWidgetItem(value))
+            if stats['errors']:
+                self.operations_table.item(row, 0).setForeground(QColor("#DC143C"))
+
+        statements = instrumentation.top_statements(limit)
+        self.statements_table.setRowCount(len(statements))
+        for row, stats in enumerate(statements):
+            values = [stats['operation'], stats['statement'], str(stats['count']),
+                      f"{stats['total_ms']:.0f}", f"{stats['avg_ms']:.2f}"]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setToolTip(value)
+                self.statements_table.setItem(row, column, item)
+
     # ===================== ОСНОВНЫЕ МЕТОДЫ =====================
 
+    @instrumentation.timed("admin.load_users")
     def load_users(self):
-        """Загрузка пользователей"""
+        """Загрузка текущей страницы пользователей (с учетом поиска)"""
         try:
-            session = db.get_session()
-            users = session.query(User).order_by(User.id).all()
+            search = self.search_input.text()
+            users, self.users_has_next_page = user_directory.page(
+                search, after_id=self.users_page_cursors[-1], limit=user_directory.PAGE_SIZE
+            )
 
             self.users_table.setRowCount(len(users))
 
-            for row, user in enumerate(users):
+            for row, (user_id, phone, full_name, role, status) in enumerate(users):
                 # ID
-                self.users_table.setItem(row, 0, QTableWidgetItem(str(user.id)))
+                self.users_table.setItem(row, 0, QTableWidgetItem(str(user_id)))
 
                 # Телефон
-                self.users_table.setItem(row, 1, QTableWidgetItem(user.phone))
+                self.users_table.setItem(row, 1, QTableWidgetItem(phone))
 
                 # ФИО
-                self.users_table.setItem(row, 2, QTableWidgetItem(user.full_name))
+                self.users_table.setItem(row, 2, QTableWidgetItem(full_name))
 
                 # Роль
-                role_item = QTableWidgetItem(user.get_role_display())
-                if user.role == UserRole.ADMIN:
+                role_item = QTableWidgetItem(ROLE_DISPLAY_NAMES.get(role, "Пользователь"))
+                if role == UserRole.ADMIN:
                     role_item.setForeground(QColor("#FF0000"))
-                elif user.role == UserRole.MODERATOR:
+                elif role == UserRole.MODERATOR:
                     role_item.setForeground(QColor("#FF8C00"))
                 self.users_table.setItem(row, 3, role_item)
 
                 # Статус
-                status_item = QTableWidgetItem(user.status.value)
-                if user.status == UserStatus.ACTIVE:
+                status_item = QTableWidgetItem(status.value)
+                if status == UserStatus.ACTIVE:
                     status_item.setForeground(QColor("#2E8B57"))
                 else:
                     status_item.setForeground(QColor("#DC143C"))
@@ -513,11 +640,37 @@ class AdminPanelDialog(QDialog):
                 actions_item.setForeground(QColor("#1E90FF"))
                 self.users_table.setItem(row, 5, actions_item)
 
+            self.update_users_page_controls(search)
+
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки пользователей: {str(e)}")
-        finally:
-            session.close()
 
+    def update_users_page_controls(self, search):
+        """Номер страницы и доступность кнопок листания"""
+        page = len(self.users_page_cursors)
+        if search.strip():
+            self.users_page_label.setText(f"Страница {page} · поиск: «{search.strip()}»")
+        else:
+            pages = max(1, -(-user_directory.total_count() // user_directory.PAGE_SIZE))
+            self.users_page_label.setText(f"Страница {page} из {pages}")
+
+        self.users_prev_btn.setEnabled(page > 1)
+        self.users_next_btn.setEnabled(self.users_has_next_page)
+
+    def show_next_users_page(self):
+        """Следующая страница: начинается после последнего id на текущей"""
+        if not self.users_has_next_page or not self.users_table.rowCount():
+            return
+        last_id = int(self.users_table.item(self.users_table.rowCount() - 1, 0).text())
+        self.users_page_cursors.append(last_id)
+        self.load_users()
+
+    def show_previous_users_page(self):
+        if len(self.users_page_cursors) > 1:
+            self.users_page_cursors.pop()
+            self.load_users()
+
+    @instrumentation.timed("admin.load_user_operations")
     def load_user_operations(self):
         """Загрузка операций пользователя по ID"""
         user_id_str = self.user_id_input.text().strip()
@@ -556,9 +709,6 @@ class AdminPanelDialog(QDialog):
 
             self.user_transactions_table.setRowCount(len(transactions))
 
-            total_sent = 0
-            total_received = 0
-
             for row, transaction in enumerate(transactions):
                 # ID
                 self.user_transactions_table.setItem(row, 0, QTableWidgetItem(str(transaction.id)))
@@ -574,10 +724,8 @@ class AdminPanelDialog(QDialog):
                 # Направление
                 if transaction.user_id_from == user_id:
                     direction = "📤 Отправка"
-                    total_sent += transaction.amount
                 else:
                     direction = "📥 Получение"
-                    total_received += transaction.amount
 
                 self.user_transactions_table.setItem(row, 3, QTableWidgetItem(direction))
 
@@ -659,17 +807,21 @@ class AdminPanelDialog(QDialog):
                 completed_date = exchange.completed_date.strftime("%d.%m %H:%M") if exchange.completed_date else "-"
                 self.user_exchanges_table.setItem(row, 7, QTableWidgetItem(completed_date))
 
+            # Суммы - из дневных агрегатов (только проведенные операции)
+            totals = user_stats.period_totals(user_id, session=session)
+
             # Обновляем статистику
             self.total_transactions_label.setText(f"Транзакций: {len(transactions)}")
             self.total_exchanges_label.setText(f"Обменов: {len(exchanges)}")
-            self.total_sent_label.setText(f"Отправлено: {total_sent:.2f}")
-            self.total_received_label.setText(f"Получено: {total_received:.2f}")
+            self.total_sent_label.setText(f"Отправлено: {user_stats.format_amounts(totals, 'sent_amount')}")
+            self.total_received_label.setText(f"Получено: {user_stats.format_amounts(totals, 'received_amount')}")
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки операций: {str(e)}")
         finally:
             session.close()
 
+    @instrumentation.timed("admin.load_transactions")
     def load_transactions(self):
         """Загрузка всех транзакций"""
         try:
@@ -721,6 +873,47 @@ class AdminPanelDialog(QDialog):
         finally:
             session.close()
 
+    def export_all_data(self):
+        """Массовая выгрузка транзакций, обменов и комиссий в файлы"""
+        from bulk_export import bulk_exporter, EXPORT_FORMATS
+
+        output_dir = QFileDialog.getExistingDirectory(self, "Папка для выгрузки")
+        if not output_dir:
+            return
+
+        fmt, ok = QInputDialog.getItem(self, "Формат выгрузки", "Формат:", list(EXPORT_FORMATS), 0, False)
+        if not ok:
+            return
+
+        self.export_btn.setEnabled(False)
+        self.export_btn.setText("⏳ Выгрузка...")
+
+        def run_export():
+            try:
+                manifest = bulk_exporter.export(output_dir, fmt=fmt, partition_by='month')
+                self.export_finished.emit(manifest)
+            except Exception as e:
+                self.export_failed.emit(str(e))
+
+        threading.Thread(target=run_export, daemon=True).start()
+
+    def on_export_finished(self, manifest):
+        self.export_btn.setEnabled(True)
+        self.export_btn.setText("📤 Экспорт всех данных")
+
+        rows = "\n".join(f"{name}: {count}" for name, count in manifest['rows'].items())
+        QMessageBox.information(
+            self, "Успех",
+            f"✅ Выгрузка завершена за {manifest['seconds']} с\n\n"
+            f"{rows}\n\nФайлов: {len(manifest['files'])}"
+        )
+
+    def on_export_failed(self, error):
+        self.export_btn.setEnabled(True)
+        self.export_btn.setText("📤 Экспорт всех данных")
+        QMessageBox.critical(self, "Ошибка", f"Ошибка выгрузки: {error}")
+
+    @instrumentation.timed("admin.load_currencies")
     def load_currencies(self):
         """Загрузка валют"""
         try:
@@ -758,20 +951,14 @@ class AdminPanelDialog(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки валют: {str(e)}")
 
-    def filter_users(self):
-        """Простая фильтрация"""
-        search_text = self.search_input.text().lower()
-
-        for row in range(self.users_table.rowCount()):
-            show_row = False
+    def on_search_text_changed(self):
+        """Перезапуск таймера поиска при каждом изменении текста"""
+        self.search_timer.start()
 
-            for col in [0, 1, 2]:  # ID, телефон, ФИО
-                item = self.users_table.item(row, col)
-                if item and search_text in item.text().lower():
-                    show_row = True
-                    break
-
-            self.users_table.setRowHidden(row, not show_row)
+    def filter_users(self):
+        """Поиск по справочнику: с первой страницы результатов"""
+        self.users_page_cursors = [None]
+        self.load_users()
 
     def on_user_cell_clicked(self, row, column):
         """Выбор пользователя"""
@@ -1057,4 +1244,5 @@ class AdminPanelDialog(QDialog):
         self.load_users()
         self.load_transactions()
         self.load_currencies()
+        self.load_performance()
         QMessageBox.information(self, "Успех", "Данные обновлены!")
\ No newline at end of file
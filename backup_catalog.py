@@ -0,0 +1,241 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """Контрольная сумма SHA-256 файла (читаем блоками, без загрузки целиком)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_database(src_path, dst_path):
+    """
+    Консистентная копия SQLite базы через sqlite backup API
+
+    В режиме WAL без автоматических checkpoint'ов закоммиченные данные
+    могут лежать только в журнале (-wal), поэтому копировать сам файл базы нельзя.
+    Копия переводится в обычный журнал и не зависит от файла -wal.
+    """
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst)
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+
+
+def parse_modified(value):
+    """
+    Время изменения бэкапа как datetime в UTC
+
+    Наивное время (локальные записи старых версий) считается местным,
+    строки Яндекс.Диска приходят с часовым поясом.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.astimezone(timezone.utc)
+
+
+def normalize_modified(value):
+    """Время изменения для каталога: ISO строка в UTC с часовым поясом"""
+    return parse_modified(value).isoformat()
+
+
+def _modified_sort_key(entry):
+    try:
+        return parse_modified(entry['modified'])
+    except (KeyError, TypeError, ValueError):
+        return datetime.min.replace(tzinfo=timezone.utc)
+
+
+def collect_row_counts(db_path):
+    """Количество строк в каждой таблице SQLite базы"""
+    counts = {}
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        for table in tables:
+            counts[table] = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    finally:
+        conn.close()
+    return counts
+
+
+class BackupCatalog:
+    """
+    Локальный каталог бэкапов.
+
+    Хранит по каждому архиву размер, контрольную сумму, количество строк
+    в таблицах и метаданные, чтобы не скачивать архив ради metadata.json.
+    Удаленный листинг нужен только для сверки (reconcile).
+    """
+
+    def __init__(self, index_path="backups/catalog.json"):
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        self._entries = None
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._entries = {entry['name']: entry for entry in data.get('backups', [])}
+                # Каталоги старых версий хранили локальные записи в наивном времени
+                for entry in self._entries.values():
+                    try:
+                        entry['modified'] = normalize_modified(entry['modified'])
+                    except (KeyError, TypeError, ValueError):
+                        pass
+            except Exception as e:
+                logger.error(f"❌ Ошибка чтения каталога бэкапов: {e}")
+        return self._entries
+
+    def _save(self):
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        data = {
+            'updated': datetime.now().isoformat(),
+            'backups': list(self._entries.values())
+        }
+
+        # Пишем во временный файл и атомарно подменяем индекс
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.index_path)
+
+    def exists(self):
+        """Был ли каталог уже сохранен на диск"""
+        return os.path.exists(self.index_path)
+
+    def add(self, name, size, modified, path=None, checksum=None, row_counts=None, metadata=None):
+        """Добавление или обновление записи о бэкапе"""
+        modified = normalize_modified(modified)
+
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(name, {})
+            entry.update({
+                'name': name,
+                'size': size,
+                'modified': modified,
+                'path': path
+            })
+            if checksum is not None:
+                entry['checksum'] = checksum
+            if row_counts is not None:
+                entry['row_counts'] = row_counts
+            if metadata is not None:
+                entry['metadata'] = metadata
+            entries[name] = entry
+            self._save()
+            return dict(entry)
+
+    def update(self, name, **fields):
+        """Обновление отдельных полей существующей записи"""
+        with self._lock:
+            entries = self._load()
+            if name not in entries:
+                return None
+            if 'modified' in fields:
+                fields['modified'] = normalize_modified(fields['modified'])
+            entries[name].update(fields)
+            self._save()
+            return dict(entries[name])
+
+    def remove(self, *names):
+        """Удаление записей из каталога"""
+        with self._lock:
+            entries = self._load()
+            removed = 0
+            for name in names:
+                if entries.pop(name, None) is not None:
+                    removed += 1
+            if removed:
+                self._save()
+            return removed
+
+    def get(self, name):
+        """Запись о бэкапе или None"""
+        with self._lock:
+            entry = self._load().get(name)
+            return dict(entry) if entry else None
+
+    def list_backups(self):
+        """Список бэкапов (новые сначала)"""
+        with self._lock:
+            backups = [dict(entry) for entry in self._load().values()]
+        # По времени, а не по строке: у записей могут быть разные часовые пояса
+        backups.sort(key=_modified_sort_key, reverse=True)
+        return backups
+
+    def total_size(self):
+        """Суммарный размер всех бэкапов в каталоге"""
+        with self._lock:
+            return sum(entry.get('size') or 0 for entry in self._load().values())
+
+    def reconcile(self, remote_items):
+        """
+        Сверка каталога с удаленным листингом
+
+        Args:
+            remote_items (list): Список dict с полями name, size, modified, path
+
+        Returns:
+            tuple: (добавлено, удалено)
+        """
+        with self._lock:
+            entries = self._load()
+            remote_names = set()
+            added = 0
+
+            for item in remote_items:
+                name = item['name']
+                remote_names.add(name)
+                modified = normalize_modified(item['modified'])
+
+                if name in entries:
+                    entries[name].update({'size': item['size'], 'modified': modified, 'path': item.get('path')})
+                else:
+                    entries[name] = {
+                        'name': name,
+                        'size': item['size'],
+                        'modified': modified,
+                        'path': item.get('path')
+                    }
+                    added += 1
+
+            stale = [name for name in entries if name not in remote_names]
+            for name in stale:
+                del entries[name]
+
+            self._save()
+
+        if added or stale:
+            logger.info(f"🔁 Каталог бэкапов сверен: +{added}, -{len(stale)}")
+        return added, len(stale)
+
+
+# Создаем экземпляр каталога
+backup_catalog = BackupCatalog()
@@ -2,7 +2,7 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QTableWidget, QTableWidgetItem,
                              QMessageBox, QHeaderView, QGroupBox,
                              QProgressBar, QComboBox, QLineEdit, QCheckBox,
-                             QFormLayout, QSplitter, QTextEdit, QWidget)
+                             QFormLayout, QSplitter, QTextEdit, QWidget, QSpinBox)
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 from backup_manager import backup_manager
@@ -67,7 +67,7 @@ class BackupDialog(QDialog):
         backup_buttons = QHBoxLayout()
 
         refresh_btn = QPushButton("🔄 Обновить")
-        refresh_btn.clicked.connect(self.load_backups)
+        refresh_btn.clicked.connect(lambda: self.load_backups(refresh=True))
         backup_buttons.addWidget(refresh_btn)
 
         create_btn = QPushButton("➕ Создать бэкап")
@@ -189,7 +189,32 @@ class BackupDialog(QDialog):
         if index >= 0:
             self.keep_backups_combo.setCurrentIndex(index)
 
-        layout.addRow("Хранить бэкапов:", self.keep_backups_combo)
+        layout.addRow("Всегда хранить последних:", self.keep_backups_combo)
+
+        # Политика хранения GFS: по одному бэкапу на час/день/неделю/месяц
+        self.retention_spins = {}
+        for key, label, maximum in [
+            ('keep_hourly', "Почасовых точек:", 168),
+            ('keep_daily', "Ежедневных точек:", 90),
+            ('keep_weekly', "Еженедельных точек:", 52),
+            ('keep_monthly', "Ежемесячных точек:", 120),
+        ]:
+            spin = QSpinBox()
+            spin.setRange(0, maximum)
+            spin.setValue(backup_manager.settings[key])
+            self.retention_spins[key] = spin
+            layout.addRow(label, spin)
+
+        self.max_size_combo = QComboBox()
+        self.max_size_combo.addItem("Без ограничения", None)
+        for size_mb in [100, 500, 1024, 5120]:
+            self.max_size_combo.addItem(f"{size_mb} МБ", size_mb)
+
+        index = self.max_size_combo.findData(backup_manager.settings['max_backups_size_mb'])
+        if index >= 0:
+            self.max_size_combo.setCurrentIndex(index)
+
+        layout.addRow("Максимальный объем:", self.max_size_combo)
 
         self.backup_on_start_check = QCheckBox("Бэкап при запуске")
         self.backup_on_start_check.setChecked(backup_manager.settings['backup_on_start'])
@@ -223,10 +248,10 @@ class BackupDialog(QDialog):
         except Exception as e:
             self.disk_info_label.setText(f"❌ Ошибка загрузки информации: {str(e)}")
 
-    def load_backups(self):
-        """Загрузка списка бэкапов"""
+    def load_backups(self, refresh=False):
+        """Загрузка списка бэкапов (из локального каталога, refresh - сверка с диском)"""
         try:
-            backups = backup_manager.get_backup_list()
+            backups = backup_manager.get_backup_list(refresh=refresh)
 
             self.backups_table.setRowCount(len(backups))
             self.selected_backup = None
@@ -244,7 +269,8 @@ class BackupDialog(QDialog):
                 # Дата и время
                 modified = backup['modified']
                 if isinstance(modified, str):
-                    dt = datetime.fromisoformat(modified.replace('Z', '+00:00'))
+                    # Каталог хранит время в UTC - показываем местное
+                    dt = datetime.fromisoformat(modified.replace('Z', '+00:00')).astimezone()
                 else:
                     dt = modified
 
@@ -303,6 +329,7 @@ class BackupDialog(QDialog):
 ├─ 📏 Размер: {info['size'] / (1024 * 1024):.1f} МБ
 ├─ 📅 Создан: {info['created']}
 ├─ ✏️ Изменен: {info['modified']}
+├─ 🔑 SHA-256: {info.get('checksum') or '—'}
 
 📊 **Метаданные:**
 """
@@ -398,9 +425,16 @@ class BackupDialog(QDialog):
                     if success:
                         self.backup_restored.emit(self.selected_backup)
 
+                        report = backup_manager.last_restore_report or {}
+                        timings = "\n".join(
+                            f"{stage}: {seconds:.2f} с"
+                            for stage, seconds in report.get('timings', {}).items()
+                        )
+
                         QMessageBox.information(
                             self, "Успех",
                             f"База данных восстановлена из бэкапа!\n{self.selected_backup}\n\n"
+                            f"{timings}\n\n"
                             "Приложение будет перезапущено для применения изменений."
                         )
 
@@ -444,15 +478,8 @@ class BackupDialog(QDialog):
 
         if reply == QMessageBox.Yes:
             try:
-                # Используем yadisk_backup напрямую
-                from yadisk_backup import yadisk_backup
-
-                # Удаляем файл с Яндекс.Диска
-                remote_path = f"{yadisk_backup.app_folder}/{self.selected_backup}"
-
-                if yadisk_backup.disk.exists(remote_path):
-                    yadisk_backup.disk.remove(remote_path, permanently=True)
-
+                # Удаляем файл с Яндекс.Диска и запись из каталога
+                if backup_manager.delete_backup(self.selected_backup):
                     QMessageBox.information(
                         self, "Успех",
                         f"Бэкап удален: {self.selected_backup}"
@@ -479,10 +506,14 @@ class BackupDialog(QDialog):
                 'auto_backup': self.auto_backup_check.isChecked(),
                 'backup_interval_hours': self.interval_combo.currentData(),
                 'keep_last_backups': self.keep_backups_combo.currentData(),
+                'max_backups_size_mb': self.max_size_combo.currentData(),
                 'backup_on_start': self.backup_on_start_check.isChecked(),
                 'backup_on_exit': self.backup_on_exit_check.isChecked()
             }
 
+            for key, spin in self.retention_spins.items():
+                settings[key] = spin.value()
+
             backup_manager.update_settings(**settings)
 
             QMessageBox.information(
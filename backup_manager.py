@@ -1,9 +1,11 @@
 import threading
-import schedule
-import time
 from datetime import datetime, timedelta
 from database import db
+from scheduler import scheduler
 from yadisk_backup import yadisk_backup
+from restore_pipeline import RestorePipeline, RestoreError
+from backup_retention import RetentionPolicy
+from wal_archiver import WalArchiver, YandexDiskArchiveStorage
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,15 +14,25 @@ logger = logging.getLogger(__name__)
 class BackupManager:
     def __init__(self):
         self.running = False
-        self.thread = None
+        self.scheduler = scheduler
+        self.last_restore_report = None
+        self.wal_archiver = None
 
         # Настройки бэкапов - КАЖДЫЙ ЧАС
         self.settings = {
             'auto_backup': True,
             'backup_interval_hours': 1,  # КАЖДЫЙ ЧАС
-            'keep_last_backups': 24,  # Хранить 24 последних бэкапа (сутки)
+            'keep_last_backups': 3,  # Последние бэкапы, которые храним всегда
+            # Политика хранения GFS: по одному бэкапу на час/день/неделю/месяц
+            'keep_hourly': 24,
+            'keep_daily': 7,
+            'keep_weekly': 4,
+            'keep_monthly': 12,
+            'max_backups_size_mb': None,  # Ограничение суммарного размера (None - без ограничения)
             'backup_on_start': True,  # Бэкап при запуске
-            'backup_on_exit': True  # Бэкап при выходе
+            'backup_on_exit': True,  # Бэкап при выходе
+            'wal_archiving': False,  # Непрерывная отправка WAL для восстановления на момент времени
+            'wal_ship_interval_seconds': 1
         }
 
     def start_auto_backup(self):
@@ -31,39 +43,48 @@ class BackupManager:
 
         self.running = True
 
+        if self.settings['wal_archiving']:
+            self.start_wal_archiving()
+
         # Бэкап при старте
         if self.settings['backup_on_start']:
             logger.info("🔄 Создание бэкапа при запуске...")
             self.create_backup("Автоматический бэкап при запуске приложения")
 
-        # Настройка расписания - КАЖДЫЙ ЧАС
+        self.schedule_jobs()
+
+        next_run = self.scheduler.next_run(prefix="backup_")
+        if next_run:
+            next_time = next_run.strftime("%H:%M:%S")
+            logger.info(f"✅ Автоматический бэкап запущен. Следующий бэкап в: {next_time}")
+        else:
+            logger.info(f"✅ Автоматический бэкап запущен (интервал: {self.settings['backup_interval_hours']} часов)")
+
+    def schedule_jobs(self):
+        """Регистрация задач бэкапа в общем планировщике"""
         logger.info(f"⏰ Настройка авто-бэкапов каждые {self.settings['backup_interval_hours']} часов")
 
-        schedule.every(self.settings['backup_interval_hours']).hours.do(
-            self.create_scheduled_backup
+        self.scheduler.add_job(
+            "backup_interval",
+            self.create_scheduled_backup,
+            interval=self.settings['backup_interval_hours'] * 3600,
+            jitter=60
         )
 
         # Также делаем бэкап каждое утро в 3:00
-        schedule.every().day.at("03:00").do(
+        self.scheduler.add_job(
+            "backup_daily",
             self.create_backup,
-            description="Ежедневный утренний бэкап"
+            at="03:00",
+            kwargs={'description': "Ежедневный утренний бэкап"}
         )
 
-        # Запуск в отдельном потоке
-        def scheduler_loop():
-            while self.running:
-                schedule.run_pending()
-                time.sleep(60)  # Проверяем каждую минуту
+        self.scheduler.start()
 
-        self.thread = threading.Thread(target=scheduler_loop, daemon=True)
-        self.thread.start()
-
-        next_run = schedule.next_run()
-        if next_run:
-            next_time = next_run.strftime("%H:%M:%S")
-            logger.info(f"✅ Автоматический бэкап запущен. Следующий бэкап в: {next_time}")
-        else:
-            logger.info(f"✅ Автоматический бэкап запущен (интервал: {self.settings['backup_interval_hours']} часов)")
+    def get_job_metrics(self):
+        """Метрики задач бэкапа (длительность, успехи, ошибки)"""
+        return {name: metrics for name, metrics in self.scheduler.metrics().items()
+                if name.startswith("backup_")}
 
     def create_scheduled_backup(self):
         """Создание запланированного бэкапа"""
@@ -76,10 +97,7 @@ class BackupManager:
             backup_name = self.create_backup(description)
 
             if backup_name:
-                # Очищаем старые бэкапы
-                self.cleanup_old_backups()
-
-                next_run = schedule.next_run()
+                next_run = self.scheduler.next_run(prefix="backup_")
                 if next_run:
                     next_time = next_run.strftime("%H:%M:%S")
                     logger.info(f"✅ Запланированный бэкап создан. Следующий в: {next_time}")
@@ -87,20 +105,33 @@ class BackupManager:
         except Exception as e:
             logger.error(f"❌ Ошибка запланированного бэкапа: {e}")
 
+    def retention_policy(self):
+        """Политика хранения бэкапов из текущих настроек"""
+        max_size_mb = self.settings['max_backups_size_mb']
+        return RetentionPolicy(
+            keep_last=self.settings['keep_last_backups'],
+            hourly=self.settings['keep_hourly'],
+            daily=self.settings['keep_daily'],
+            weekly=self.settings['keep_weekly'],
+            monthly=self.settings['keep_monthly'],
+            max_total_size=max_size_mb * 1024 * 1024 if max_size_mb else None
+        )
+
     def cleanup_old_backups(self):
         """Очистка старых бэкапов на Яндекс.Диске"""
         try:
-            yadisk_backup.cleanup_old_backups(keep_last=self.settings['keep_last_backups'])
+            return yadisk_backup.cleanup_old_backups(policy=self.retention_policy())
         except Exception as e:
             logger.error(f"❌ Ошибка очистки старых бэкапов: {e}")
+            return []
 
     def stop_auto_backup(self):
         """Остановка автоматического бэкапа"""
         self.running = False
-        schedule.clear()
 
-        if self.thread:
-            self.thread.join(timeout=5)
+        # Снимаем только свои задачи - остальные задачи планировщика продолжают работать
+        self.scheduler.cancel("backup_interval")
+        self.scheduler.cancel("backup_daily")
 
         logger.info("⏸️ Автоматический бэкап остановлен")
 
@@ -119,7 +150,7 @@ class BackupManager:
             logger.info(f"🔄 Создание бэкапа: {description}")
 
             # Создаем локальный бэкап базы данных
-            db.backup_database()
+            db.backup_database(retention_policy=self.retention_policy())
 
             # Подготавливаем метаданные
             metadata = {
@@ -141,6 +172,10 @@ class BackupManager:
 
             if backup_name:
                 logger.info(f"✅ Бэкап создан: {backup_name}")
+
+                # Очищаем старые бэкапы по политике хранения
+                self.cleanup_old_backups()
+
                 return backup_name
             else:
                 logger.error("❌ Не удалось создать бэкап на Яндекс.Диске")
@@ -167,18 +202,19 @@ class BackupManager:
             logger.error(f"❌ Ошибка получения последнего бэкапа: {e}")
             return None
 
-    def get_backup_list(self, limit=10):
+    def get_backup_list(self, limit=10, refresh=False):
         """
         Получение списка бэкапов
 
         Args:
             limit (int): Максимальное количество бэкапов
+            refresh (bool): Сверить локальный каталог с Яндекс.Диском
 
         Returns:
             list: Список бэкапов с информацией
         """
         try:
-            backups = yadisk_backup.list_backups()
+            backups = yadisk_backup.list_backups(refresh=refresh)
             return backups[:limit]
         except Exception as e:
             logger.error(f"❌ Ошибка получения списка бэкапов: {e}")
@@ -199,23 +235,8 @@ class BackupManager:
             backup_name = latest['name']
             logger.info(f"🔄 Восстановление из последнего бэкапа: {backup_name}")
 
-            success = yadisk_backup.restore_from_backup(backup_name)
-
-            if success:
-                logger.info(f"✅ Восстановление успешно: {backup_name}")
-
-                # Пересоздаем таблицы после восстановления
-                db.create_tables()
-
-                # Обновляем курсы валют
-                from crypto_manager import crypto_manager
-                crypto_manager.update_exchange_rates()
-
-                return True, backup_name, None
-            else:
-                error_msg = f"Не удалось восстановить из бэкапа: {backup_name}"
-                logger.error(f"❌ {error_msg}")
-                return False, backup_name, error_msg
+            success, error_msg = self.restore_backup(backup_name)
+            return success, backup_name, error_msg
 
         except Exception as e:
             error_msg = f"Ошибка восстановления: {str(e)}"
@@ -223,32 +244,51 @@ class BackupManager:
             return False, None, error_msg
 
     def restore_backup(self, backup_name):
+        """
+        Проверенное восстановление из бэкапа с атомарной подменой файла базы
+
+        Returns:
+            tuple: (success, error_message)
+        """
+        archive_storage = None
         try:
             logger.info(f"🔄 Восстановление из бэкапа: {backup_name}")
 
-            success = yadisk_backup.restore_from_backup(backup_name)
+            # Архиватор держит соединение с заменяемым файлом
+            if self.wal_archiver and self.wal_archiver.running:
+                archive_storage = self.wal_archiver.storage
+                self.stop_wal_archiving()
 
-            if success:
-                logger.info(f"✅ Восстановление успешно: {backup_name}")
+            pipeline = RestorePipeline(yadisk_backup, db)
+            self.last_restore_report = pipeline.run(backup_name)
 
-                # Пересоздаем таблицы после восстановления
-                db.create_tables()
+            logger.info(f"✅ Восстановление успешно: {backup_name}")
 
-                # Обновляем курсы валют
+            # Курсы валют обновляем в фоне, это не часть времени восстановления
+            def refresh_rates():
                 from crypto_manager import crypto_manager
                 crypto_manager.update_exchange_rates()
 
-                return True, None
-            else:
-                error_msg = f"Не удалось восстановить из бэкапа: {backup_name}"
-                logger.error(f"❌ {error_msg}")
-                return False, error_msg
+            threading.Thread(target=refresh_rates, daemon=True).start()
+
+            return True, None
+
+        except RestoreError as e:
+            error_msg = f"Не удалось восстановить из бэкапа {backup_name}: {e}"
+            logger.error(f"❌ {error_msg}")
+            return False, error_msg
 
         except Exception as e:
             error_msg = f"Ошибка восстановления: {str(e)}"
             logger.error(f"❌ {error_msg}")
             return False, error_msg
 
+        finally:
+            # Старые сегменты не применимы к новому файлу - архивация
+            # продолжается с нового базового снимка
+            if archive_storage is not None:
+                self.start_wal_archiving(archive_storage)
+
     def get_backup_info(self, backup_name):
         """Получение информации о бэкапе"""
         try:
@@ -258,6 +298,14 @@ class BackupManager:
             logger.error(f"❌ Ошибка получения информации о бэкапе: {e}")
             return None
 
+    def delete_backup(self, backup_name):
+        """Удаление бэкапа (с Яндекс.Диска и из каталога)"""
+        try:
+            return yadisk_backup.delete_backup(backup_name)
+        except Exception as e:
+            logger.error(f"❌ Ошибка удаления бэкапа: {e}")
+            return False
+
     def get_disk_info(self):
         """Получение информации о Яндекс.Диске"""
         try:
@@ -273,15 +321,60 @@ class BackupManager:
             if key in self.settings:
                 self.settings[key] = value
 
-        # Перезапускаем автоматический бэкап если он включен
+        # Пересоздаем задачи с новым интервалом (без повторного бэкапа при запуске)
         if self.running:
-            self.stop_auto_backup()
-            self.start_auto_backup()
+            if self.settings['auto_backup']:
+                self.schedule_jobs()
+            else:
+                self.stop_auto_backup()
 
         logger.info("⚙️ Настройки бэкапа обновлены")
 
+    def start_wal_archiving(self, storage=None):
+        """
+        Запуск непрерывной отправки WAL (восстановление на любой момент времени)
+
+        Args:
+            storage: Хранилище архива (по умолчанию - папка на Яндекс.Диске)
+        """
+        if self.wal_archiver and self.wal_archiver.running:
+            return self.wal_archiver
+
+        try:
+            db.enable_wal_mode(autocheckpoint=False)
+
+            self.wal_archiver = WalArchiver(
+                storage or YandexDiskArchiveStorage(yadisk_backup),
+                db_path="crypto_wallet.db",
+                interval=self.settings['wal_ship_interval_seconds']
+            )
+            self.wal_archiver.start()
+            return self.wal_archiver
+
+        except Exception as e:
+            logger.error(f"❌ Не удалось запустить архивацию WAL: {e}")
+            return None
+
+    def stop_wal_archiving(self):
+        """Остановка отправки WAL"""
+        if self.wal_archiver:
+            self.wal_archiver.stop()
+            # Без архиватора checkpoint'ы снова делает сам SQLite; накопленный
+            # журнал переносим сразу - открытые соединения (session_db GUI)
+            # не дают SQLite сделать это при закрытии
+            db.enable_wal_mode(autocheckpoint=True)
+            db.checkpoint_wal()
+
+    def get_wal_status(self):
+        """Состояние архивации WAL (отставание репликации, объем отправленного)"""
+        if not self.wal_archiver:
+            return None
+        return self.wal_archiver.status()
+
     def backup_on_exit(self):
         """Бэкап при выходе из приложения"""
+        self.stop_wal_archiving()
+
         if self.settings['backup_on_exit']:
             logger.info("🔄 Создание бэкапа перед выходом...")
             self.create_backup("Бэкап перед выходом из приложения")
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionPolicy:
+    """
+    Политика хранения бэкапов "дед-отец-сын" (GFS)
+
+    Args:
+        keep_last (int): Сколько последних бэкапов хранить всегда
+        hourly (int): Сколько последних часов хранить (по одному бэкапу на час)
+        daily (int): Сколько последних дней хранить (по одному на день)
+        weekly (int): Сколько последних недель хранить (по одному на неделю)
+        monthly (int): Сколько последних месяцев хранить (по одному на месяц)
+        max_total_size (int): Ограничение суммарного размера в байтах (None - без ограничения)
+    """
+
+    TIERS = (
+        ('hourly', lambda dt: dt.strftime("%Y%m%d%H")),
+        ('daily', lambda dt: dt.strftime("%Y%m%d")),
+        ('weekly', lambda dt: "%d-%02d" % dt.isocalendar()[:2]),
+        ('monthly', lambda dt: dt.strftime("%Y%m")),
+    )
+
+    def __init__(self, keep_last=3, hourly=24, daily=7, weekly=4, monthly=12, max_total_size=None):
+        self.keep_last = keep_last
+        self.hourly = hourly
+        self.daily = daily
+        self.weekly = weekly
+        self.monthly = monthly
+        self.max_total_size = max_total_size
+
+    @staticmethod
+    def backup_time(backup):
+        """Время создания бэкапа (из метаданных, иначе дата изменения файла)"""
+        value = (backup.get('metadata') or {}).get('backup_date') or backup.get('modified')
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value
+
+    def select(self, backups):
+        """
+        Разделение бэкапов на сохраняемые и удаляемые
+
+        Args:
+            backups (list): Записи каталога (name, size, modified, metadata)
+
+        Returns:
+            tuple: (keep, delete) - списки записей, новые сначала
+        """
+        ordered = sorted(backups, key=self.backup_time, reverse=True)
+        keep_names = {backup['name'] for backup in ordered[:self.keep_last]}
+
+        for tier, bucket_key in self.TIERS:
+            limit = getattr(self, tier)
+            buckets = set()
+            for backup in ordered:
+                if len(buckets) >= limit:
+                    break
+                key = bucket_key(self.backup_time(backup))
+                if key not in buckets:
+                    # Самый новый бэкап в корзине представляет ее
+                    buckets.add(key)
+                    keep_names.add(backup['name'])
+
+        keep = [backup for backup in ordered if backup['name'] in keep_names]
+
+        # Ограничение по размеру: отбрасываем самые старые точки, но последний бэкап храним всегда
+        if self.max_total_size is not None:
+            total = sum(backup.get('size') or 0 for backup in keep)
+            while len(keep) > 1 and total > self.max_total_size:
+                dropped = keep.pop()
+                total -= dropped.get('size') or 0
+
+        keep_names = {backup['name'] for backup in keep}
+        delete = [backup for backup in ordered if backup['name'] not in keep_names]
+        return keep, delete
+
+
+class RetentionEngine:
+    """Применение политики хранения: пакетное параллельное удаление"""
+
+    def __init__(self, policy, batch_size=10, max_workers=4):
+        self.policy = policy
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def apply(self, backups, delete_func):
+        """
+        Удаление бэкапов, не попавших под политику
+
+        Args:
+            backups (list): Записи каталога
+            delete_func (callable): Удаление одного бэкапа по имени, возвращает bool
+
+        Returns:
+            list: Имена удаленных бэкапов
+        """
+        _, to_delete = self.policy.select(backups)
+        names = [backup['name'] for backup in to_delete]
+        deleted = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for start in range(0, len(names), self.batch_size):
+                batch = names[start:start + self.batch_size]
+                for name, removed in zip(batch, executor.map(delete_func, batch)):
+                    if removed:
+                        deleted.append(name)
+                        logger.info(f"🗑️ Удален старый бэкап: {name}")
+
+        if names:
+            logger.info(f"🧹 Политика хранения: удалено {len(deleted)} из {len(names)} бэкапов")
+        return deleted
@@ -0,0 +1 @@
+"""Бенчмарки горячих путей приложения (запуск: python -m benchmarks.<имя>)"""
@@ -0,0 +1,95 @@
+"""
+Бенчмарк обратного поиска кошельков по адресам
+
+Поток адресов входящих платежей: доля --foreign - чужие адреса (не нашего
+кошелька), остальные - адреса пользователей в случайных валютах. Сравниваются:
+- by_address - запрос кошелька по колонке address, по одному адресу;
+- resolve - address_book.resolve (разбор адреса, индекс пользователь+валюта);
+- resolve_many - address_book.resolve_many пакетами по --batch адресов
+  (время - на один адрес).
+
+Запуск: python -m benchmarks.bench_addresses --users 20000 --ops 5000
+"""
+import os
+import json
+import time
+import random
+import argparse
+from benchmarks.synthetic_data import SyntheticDataGenerator, use_workdir
+from benchmarks.bench_settlement import measure
+
+
+def make_addresses(count, user_ids, currencies, foreign, seed=42):
+    from addresses import wallet_address
+
+    rnd = random.Random(seed)
+    addresses = []
+    for _ in range(count):
+        if rnd.random() < foreign:
+            addresses.append(f"{rnd.choice(currencies)[1]}_{rnd.getrandbits(130):033x}")
+        else:
+            currency_id, code = rnd.choice(currencies)
+            addresses.append(wallet_address(code, rnd.choice(user_ids), currency_id))
+    return addresses
+
+
+def run(users, ops, batch, foreign, seed=42, workdir=None):
+    use_workdir(workdir)
+
+    generator = SyntheticDataGenerator(seed=seed)
+    generator.generate(users, 0, 0)
+
+    from database import db
+    from models import Wallet, Currency
+    from addresses import address_book
+
+    session = db.get_session()
+    try:
+        currencies = session.query(Currency.id, Currency.code).all()
+        addresses = make_addresses(ops, generator.user_ids, currencies, foreign, seed)
+        report = {'users': users, 'ops': ops, 'foreign': foreign, 'results': []}
+
+        def by_address(address):
+            session.query(Wallet).filter_by(address=address).first()
+
+        report['results'].append(measure("by_address", by_address, [(a,) for a in addresses]))
+        report['results'].append(measure("resolve", lambda a: address_book.resolve(session, a),
+                                         [(a,) for a in addresses]))
+
+        started = time.perf_counter()
+        matched = 0
+        for start in range(0, len(addresses), batch):
+            matched += len(address_book.resolve_many(session, addresses[start:start + batch]))
+        seconds = time.perf_counter() - started
+        result = {'path': 'resolve_many', 'ops': len(addresses),
+                  'ops_per_sec': round(len(addresses) / seconds, 1) if seconds else None,
+                  'matched': matched}
+        print(f"{'resolve_many':<22} {result['ops_per_sec']:>10} адресов/с   наших {matched}")
+        report['results'].append(result)
+    finally:
+        session.close()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--ops", type=int, default=5000, help="Адресов в потоке")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--foreign", type=float, default=0.3, help="Доля чужих адресов")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None, help="Сохранить результат в JSON")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args.users, args.ops, args.batch, args.foreign, args.seed, args.workdir)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
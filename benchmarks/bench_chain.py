@@ -0,0 +1,164 @@
+"""
+Бенчмарк конвейера пополнений и выводов (chain_pipeline.py)
+
+База с --users пользователями; симулятор сети (python -m chain_simulator)
+запускается отдельным процессом и выдает около --rate платежей в секунду
+(доля --foreign - на чужие адреса, --duplicates - повторные доставки).
+ChainPipeline принимает поток --seconds секунд; параллельно ставится
+--withdrawals выводов, очередь отправляется пакетами раз в секунду.
+
+Результат: событий в секунду, емкость записи пополнений, время пачек,
+задержка зачисления (от времени блока) и вывода (от запроса), и сверка:
+повторные доставки не дали лишних зачислений - число и сумма зачисленных
+платежей равны числу и сумме операций пополнения.
+
+Запуск: python -m benchmarks.bench_chain --users 20000 --rate 500 --seconds 30
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import subprocess
+from sqlalchemy import func
+from benchmarks.synthetic_data import SyntheticDataGenerator, use_workdir
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_simulator(port, rate, block_interval, foreign, duplicates, seed):
+    """Процесс симулятора в папке бенчмарка; ждем, пока он начнет слушать порт"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "chain_simulator", "--port", str(port), "--rate", str(rate),
+         "--block-interval", str(block_interval), "--foreign", str(foreign), "--duplicates", str(duplicates),
+         "--seed", str(seed)],
+        env=env)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("Симулятор сети завершился при запуске")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Симулятор сети не начал слушать порт")
+
+
+def check_consistency():
+    """Зачисленное по платежам сходится с операциями пополнения"""
+    from database import db
+    from models import ChainDeposit, DepositStatus, Transaction, TransactionType
+
+    session = db.get_session()
+    try:
+        credited = (session.query(func.count(ChainDeposit.id), func.coalesce(func.sum(ChainDeposit.amount), 0.0))
+                    .filter(ChainDeposit.status == DepositStatus.CREDITED).one())
+        deposits = (session.query(func.count(Transaction.id), func.coalesce(func.sum(Transaction.amount), 0.0))
+                    .filter(Transaction.type == TransactionType.DEPOSIT).one())
+        return {'credited_deposits': credited[0], 'deposit_transactions': deposits[0],
+                'consistent': credited[0] == deposits[0] and abs(credited[1] - deposits[1]) < 1e-6}
+    finally:
+        session.close()
+
+
+def run(users, rate, seconds, block_interval, confirmations, withdrawals, foreign, duplicates, port,
+        seed=42, workdir=None):
+    use_workdir(workdir)
+
+    generator = SyntheticDataGenerator(seed=seed)
+    generator.generate(users, 0, 0)
+
+    from database import db
+    from models import Currency
+    from chain_pipeline import ChainPipeline
+
+    # Выводы - на минимальную сумму валюты (стартового баланса на нее хватает)
+    session = db.get_session()
+    try:
+        minimums = {currency_id: max(minimum or 0.0, 0.01) for currency_id, minimum in
+                    session.query(Currency.id, Currency.min_withdrawal)}
+    finally:
+        session.close()
+
+    simulator = start_simulator(port, rate, block_interval, foreign, duplicates, seed)
+    pipeline = ChainPipeline(node=f"127.0.0.1:{port}", confirmations=confirmations, stats_interval=0)
+    rnd = random.Random(seed)
+    rejected = 0
+    try:
+        pipeline.start()
+        started = time.monotonic()
+        per_second = withdrawals / seconds if seconds else 0
+        queued = 0
+        while time.monotonic() - started < seconds:
+            # Выводы равномерно по прогону, отправка очереди - раз в секунду
+            target = int((time.monotonic() - started + 1) * per_second)
+            while queued < min(target, withdrawals):
+                queued += 1
+                currency_id = rnd.choice(generator.currency_ids)
+                try:
+                    pipeline.request_withdrawal(rnd.choice(generator.user_ids), currency_id,
+                                                f"EXT_{rnd.getrandbits(64):016x}", minimums[currency_id])
+                except ValueError:
+                    rejected += 1
+            pipeline.broadcast_pending()
+            time.sleep(1)
+
+        # Даем дойти подтверждениям последних блоков
+        time.sleep(block_interval * (confirmations + 1))
+        pipeline.broadcast_pending()
+        time.sleep(block_interval * 2)
+    finally:
+        pipeline.stop()
+        simulator.terminate()
+        simulator.wait()
+
+    report = {'users': users, 'rate': rate, 'seconds': seconds, 'block_interval': block_interval,
+              'confirmations': confirmations, 'withdrawals_rejected': rejected,
+              **pipeline.stats(), 'check': check_consistency()}
+
+    print(f"События: {report['events']} ({report['events_per_sec']}/с), емкость записи "
+          f"{report['ingest_capacity_per_sec']}/с, пачка p50 {report['ingest_batch_p50_ms']} мс / "
+          f"p99 {report['ingest_batch_p99_ms']} мс")
+    print(f"Пополнения: {report['deposits']} записано, {report['credited']} зачислено, "
+          f"{report['duplicates']} повторов, {report['foreign']} чужих, {report['below_minimum']} ниже минимума")
+    print(f"Задержка зачисления: p50 {report['deposit_lag']['p50_s']} с, p99 {report['deposit_lag']['p99_s']} с, "
+          f"max {report['deposit_lag']['max_s']} с")
+    print(f"Выводы: {report['withdrawals_queued']} в очереди, {report['withdrawals_confirmed']} подтверждено, "
+          f"задержка p50 {report['withdrawal_lag']['p50_s']} с, p99 {report['withdrawal_lag']['p99_s']} с")
+    print(f"Сверка: {report['check']}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=500.0, help="Платежей сети в секунду")
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--block-interval", type=float, default=1.0)
+    parser.add_argument("--confirmations", type=int, default=3)
+    parser.add_argument("--withdrawals", type=int, default=1000)
+    parser.add_argument("--foreign", type=float, default=0.2, help="Доля платежей на чужие адреса")
+    parser.add_argument("--duplicates", type=float, default=0.02, help="Доля повторных доставок")
+    parser.add_argument("--port", type=int, default=18444)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None, help="Сохранить результат в JSON")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args.users, args.rate, args.seconds, args.block_interval, args.confirmations, args.withdrawals,
+                 args.foreign, args.duplicates, args.port, args.seed, args.workdir)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
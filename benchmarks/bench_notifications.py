@@ -0,0 +1,90 @@
+"""
+Бенчмарк списка уведомлений в зависимости от размера таблицы и очистки
+
+Таблица notifications наращивается до каждого размера из --sizes, на каждом
+размере меряются список уведомлений (Database.get_user_notifications - как
+NotificationsDialog) и чтение счетчика непрочитанных. Затем
+notification_retention удаляет просроченное (с архивом) и замер повторяется
+на "горячей" таблице. Даты уведомлений - за --days дней.
+
+Запуск: python -m benchmarks.bench_notifications --users 1000 --sizes 10000 100000 1000000
+"""
+import os
+import json
+import random
+import argparse
+from benchmarks.synthetic_data import SyntheticDataGenerator, use_workdir
+from benchmarks.bench_settlement import measure
+
+
+def table_size():
+    from database import db
+    from models import Notification
+
+    session = db.get_session()
+    try:
+        return session.query(Notification).count()
+    finally:
+        session.close()
+
+
+def measure_reads(label, user_args):
+    from database import db
+
+    rows = table_size()
+    print(f"--- {label}: {rows} уведомлений")
+    return {
+        'label': label,
+        'rows': rows,
+        'results': [measure("notification_list", db.get_user_notifications, user_args),
+                    measure("unread_count", db.get_unread_count, user_args)]
+    }
+
+
+def run(users, sizes, ops, days=365, seed=42, workdir=None):
+    workdir = use_workdir(workdir)
+
+    generator = SyntheticDataGenerator(seed=seed, days=days)
+    generator.generate(users, 0, 0)
+
+    from notification_retention import NotificationRetention
+
+    rnd = random.Random(seed)
+    user_args = [(rnd.choice(generator.user_ids),) for _ in range(ops)]
+    report = {'users': users, 'days': days, 'steps': []}
+
+    current = 0
+    for size in sorted(sizes):
+        generator.create_notifications(size - current)
+        current = size
+        report['steps'].append(measure_reads(f"{size}", user_args))
+
+    retention = NotificationRetention(archive_dir=os.path.join(workdir, "notification_archive"))
+    report['retention'] = retention.run()
+    print(f"Очистка: {report['retention']}")
+    report['steps'].append(measure_reads("после очистки", user_args))
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--sizes", type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument("--ops", type=int, default=300, help="Запросов на каждый замер")
+    parser.add_argument("--days", type=int, default=365, help="Период дат уведомлений")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None, help="Сохранить результат в JSON")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args.users, args.sizes, args.ops, args.days, args.seed, args.workdir)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
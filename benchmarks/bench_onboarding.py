@@ -0,0 +1,104 @@
+"""
+Бенчмарк массовой регистрации пользователей
+
+База с --existing пользователями; входной поток - --rows строк, из которых
+--duplicates доля повторяет телефон или Telegram ID (внутри потока или уже
+в базе). Сравниваются:
+- per_user - register_user_transaction, транзакция на пользователя
+  (--baseline строк с другими телефонами);
+- bulk - bulk_onboarding.BulkRegistrar, порции по --chunk-size строк.
+
+Запуск: python -m benchmarks.bench_onboarding --rows 200000 --chunk-size 500
+"""
+import os
+import json
+import time
+import random
+import argparse
+from benchmarks.synthetic_data import SyntheticDataGenerator, use_workdir
+
+
+def make_rows(count, existing, duplicates, seed=42, phone_prefix="+7901", telegram_base=200000000):
+    """Строки регистрации; дубли - повтор раннего телефона, Telegram ID или уже зарегистрированного"""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(count):
+        phone, telegram_id = f"{phone_prefix}{i:07d}", str(telegram_base + i)
+        if rnd.random() < duplicates:
+            kind = rnd.choice(('phone', 'telegram', 'existing'))
+            if kind == 'phone' and rows:
+                phone = rnd.choice(rows)['phone']
+            elif kind == 'telegram' and rows:
+                telegram_id = rnd.choice(rows)['telegram_id']
+            elif existing:
+                phone = f"+7900{rnd.randrange(existing):07d}"
+        rows.append({'phone': phone, 'full_name': f"Клиент партнера {i}", 'telegram_id': telegram_id})
+    return rows
+
+
+def per_user(rows):
+    from transaction_utils import execute_in_transaction, register_user_transaction
+
+    registered = 0
+    for row in rows:
+        try:
+            execute_in_transaction(register_user_transaction, row['phone'], row['full_name'], row['telegram_id'])
+            registered += 1
+        except ValueError:
+            pass
+    return registered
+
+
+def run(existing, rows_count, baseline, duplicates, chunk_size, seed=42, workdir=None):
+    use_workdir(workdir)
+
+    generator = SyntheticDataGenerator(seed=seed)
+    generator.generate(existing, 0, 0)
+
+    from bulk_onboarding import BulkRegistrar
+
+    rows = make_rows(rows_count, existing, duplicates, seed)
+    report = {'existing': existing, 'rows': rows_count, 'duplicates': duplicates, 'results': []}
+
+    # Базовая линия - на своих телефонах, чтобы не занять телефоны bulk-прогона
+    started = time.perf_counter()
+    registered = per_user(make_rows(baseline, existing, duplicates, seed + 1, "+7902", 300000000))
+    seconds = time.perf_counter() - started
+    report['results'].append({'path': 'per_user', 'registered': registered, 'seconds': round(seconds, 3),
+                              'per_second': round(registered / seconds, 1) if seconds else None})
+
+    result = BulkRegistrar(chunk_size=chunk_size).register(rows)
+    report['results'].append({'path': 'bulk', 'registered': result['registered'],
+                              'rejected': len(result['rejected']), 'seconds': result['seconds'],
+                              'per_second': result['per_second']})
+
+    for entry in report['results']:
+        print(f"{entry['path']:<10} {entry['registered']:>8} за {entry['seconds']:>8.3f} с   "
+              f"{entry['per_second']} регистраций/с")
+    print(f"Отказов bulk: {len(result['rejected'])}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--existing", type=int, default=1000, help="Пользователей в базе до загрузки")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--baseline", type=int, default=2000, help="Строк для прогона по одному")
+    parser.add_argument("--duplicates", type=float, default=0.02, help="Доля строк-дублей")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None, help="Сохранить результат в JSON")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args.existing, args.rows, args.baseline, args.duplicates, args.chunk_size, args.seed,
+                 args.workdir)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Микро-бенчмарк накладных расходов на один отчет (выписка на 10 строк)
+
+"before" - реестр шрифтов/стилей сбрасывается перед каждым отчетом
+(как раньше: поиск и разбор TTF, getSampleStyleSheet на каждый вызов),
+"after" - реестр построен один раз.
+
+Запуск: python -m benchmarks.bench_pdf_overhead --runs 50
+"""
+import os
+import time
+import argparse
+import statistics
+from pdf_generation import PDFGenerator, pdf_styles
+from benchmarks.bench_pdf_statement import synthetic_rows
+
+
+def measure(runs, cold):
+    user_info = {'id': 0, 'name': "Бенчмарк", 'phone': "+70000000000"}
+    rows = list(synthetic_rows(10))
+    timings = []
+
+    for _ in range(runs):
+        if cold:
+            pdf_styles.reset()
+        started = time.perf_counter()
+        output_file = PDFGenerator.generate_transaction_history(rows, user_info, "bench")
+        timings.append(time.perf_counter() - started)
+        os.remove(output_file)
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    pdf_styles.warm_up()
+    for label, cold in (("before", True), ("after", False)):
+        timings = measure(args.runs, cold)
+        print(f"{label:>6}: медиана {statistics.median(timings) * 1000:.2f} мс, "
+              f"среднее {statistics.mean(timings) * 1000:.2f} мс ({args.runs} отчетов)")
+
+
+if __name__ == "__main__":
+    main()
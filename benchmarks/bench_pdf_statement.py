@@ -0,0 +1,80 @@
+"""
+Бенчмарк потоковой PDF-выписки: страниц в секунду и пиковая память
+
+Запуск: python -m benchmarks.bench_pdf_statement --rows 100000
+"""
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from pdf_generation import PDFGenerator
+
+STATUSES = [('completed', '✅ Выполнено'), ('pending', '⏳ Ожидание'), ('failed', '❌ Ошибка')]
+
+
+def synthetic_rows(count):
+    """Синтетические строки выписки (генерируются лениво)"""
+    start = datetime.now()
+    for i in range(count):
+        code, status = STATUSES[i % 17 % 3]
+        yield {
+            'date': (start - timedelta(minutes=i)).strftime("%d.%m.%Y %H:%M"),
+            'type': "Отправка" if i % 2 else "Получение",
+            'currency': "BTC",
+            'amount': i * 0.00001,
+            'counterparty': f"Контрагент {i % 1000}",
+            'status': status,
+            'status_code': code
+        }
+
+
+def run(rows, legacy=False):
+    output_file = os.path.join(tempfile.gettempdir(), f"bench_statement_{rows}.pdf")
+    user_info = {'id': 0, 'name': "Бенчмарк", 'phone': "+70000000000"}
+
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    if legacy:
+        output_file = PDFGenerator.generate_transaction_history(list(synthetic_rows(rows)), user_info, "bench")
+        pages = None
+    else:
+        output_file, _, _, pages = PDFGenerator.generate_transaction_history_stream(
+            synthetic_rows(rows), user_info, "bench", output_file=output_file)
+
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'mode': 'legacy' if legacy else 'stream',
+        'rows': rows,
+        'pages': pages,
+        'seconds': elapsed,
+        'pages_per_sec': pages / elapsed if pages else None,
+        'rows_per_sec': rows / elapsed,
+        'peak_mb': peak / (1024 * 1024),
+        'file_mb': os.path.getsize(output_file) / (1024 * 1024)
+    }
+    os.remove(output_file)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument("--legacy", action="store_true", help="Сравнить с generate_transaction_history")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        for legacy in ([False, True] if args.legacy else [False]):
+            r = run(rows, legacy)
+            pages = f"{r['pages']} стр, {r['pages_per_sec']:.1f} стр/с" if r['pages'] else "-"
+            print(f"{r['mode']:>6} {rows:>8} строк: {r['seconds']:.2f} с, {pages}, "
+                  f"{r['rows_per_sec']:.0f} строк/с, пик памяти {r['peak_mb']:.1f} МБ, файл {r['file_mb']:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
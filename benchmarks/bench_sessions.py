@@ -0,0 +1,129 @@
+"""
+Бенчмарк сессий: поиск по токену, запись активности, истечение
+
+На базе с --sessions сессиями (половина активна за сутки) меряются:
+- token_lookup - Database.get_session_by_token с индексом ix_sessions_token
+  и без него (индекс временно удаляется);
+- activity_per_ping - прежняя запись: сессия базы и коммит на каждое действие;
+- activity_buffered - session_store.touch, сброс буфера каждые --batch действий
+  (время сброса входит в замер);
+- expire_orm - прежнее истечение: загрузка всех просроченных объектов и смена
+  статуса по одному (с откатом, чтобы не менять данные);
+- expire_update - session_store.expire, один UPDATE.
+
+Запуск: python -m benchmarks.bench_sessions --users 1000 --sessions 100000
+"""
+import os
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from benchmarks.synthetic_data import SyntheticDataGenerator, use_workdir
+from benchmarks.bench_settlement import measure
+
+
+def activity_per_ping(session_id):
+    """Запись активности как до session_store: своя сессия и коммит"""
+    from database import db
+    from models import Session
+
+    session = db.get_session()
+    try:
+        user_session = session.query(Session).get(session_id)
+        if user_session:
+            user_session.last_activity = datetime.now()
+            session.commit()
+    finally:
+        session.close()
+
+
+def expire_orm(hours=24):
+    """Истечение как до set-based UPDATE: объекты по одному, затем откат"""
+    from database import db
+    from models import Session
+
+    session = db.get_session()
+    try:
+        expired = session.query(Session).filter(Session.last_activity < datetime.now() - timedelta(hours=hours)).all()
+        for user_session in expired:
+            user_session.status = 'EXPIRED'
+        session.flush()
+        return len(expired)
+    finally:
+        session.rollback()
+        session.close()
+
+
+def timed(name, func):
+    started = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - started
+    print(f"{name:<22} {seconds * 1000:>10.1f} мс   ({value})")
+    return {'path': name, 'ms': round(seconds * 1000, 1), 'rows': value}
+
+
+def run(users, sessions, ops, batch, seed=42, workdir=None):
+    use_workdir(workdir)
+
+    generator = SyntheticDataGenerator(seed=seed)
+    generator.generate(users, 0, 0)
+    tokens = generator.create_sessions(sessions)
+
+    from database import db
+    from session_store import SessionStore
+
+    store = SessionStore(db)
+    rnd = random.Random(seed)
+    token_args = [(rnd.choice(tokens),) for _ in range(ops)]
+    active_ids = [db.get_session_by_token(token).id for (token,) in token_args[:batch]]
+    ping_args = [(rnd.choice(active_ids),) for _ in range(ops)]
+
+    report = {'users': users, 'sessions': sessions, 'batch': batch, 'results': []}
+    results = report['results']
+
+    results.append(measure("token_lookup", db.get_session_by_token, token_args))
+    with db.engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_sessions_token"))
+    results.append(measure("token_lookup_no_index", db.get_session_by_token, token_args[:max(ops // 10, 2)]))
+    db.migrate_sessions()
+
+    results.append(measure("activity_per_ping", activity_per_ping, ping_args))
+
+    def activity_buffered(index, session_id):
+        store.touch(session_id)
+        if index % batch == batch - 1:
+            store.flush()
+
+    results.append(measure("activity_buffered", activity_buffered,
+                           [(index, session_id) for index, (session_id,) in enumerate(ping_args)]))
+    store.flush()
+    print(f"Сбросов буфера: {store.stats['flushes']}, записано {store.stats['written']}")
+
+    results.append(timed("expire_orm", expire_orm))
+    results.append(timed("expire_update", store.expire))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--ops", type=int, default=2000, help="Запросов на каждый замер")
+    parser.add_argument("--batch", type=int, default=500, help="Действий на один сброс буфера")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None, help="Сохранить результат в JSON")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args.users, args.sessions, args.ops, args.batch, args.seed, args.workdir)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
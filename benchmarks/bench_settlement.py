@@ -0,0 +1,238 @@
+"""
+Бенчмарк горячих путей: создание и проведение переводов и обменов,
+загрузка истории и обновление панелей
+
+База - синтетическая (benchmarks.synthetic_data) во временной папке.
+Бот заглушен: TelegramBot.confirm_transaction / accept_exchange работают
+с настоящей базой, но ответы в Telegram никуда не уходят. Запросы панелей
+повторяют запросы MainWindow / AdminPanel / ModeratorPanel без Qt.
+
+Для каждого пути печатаются ops/sec и задержки p50/p99.
+
+Запуск: python -m benchmarks.bench_settlement --users 1000 --transactions 100000 --ops 500
+"""
+import os
+import json
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from benchmarks.synthetic_data import SyntheticDataGenerator, use_workdir
+
+
+class StubTelegramApi:
+    """Заглушка telebot.TeleBot: все вызовы API - пустые"""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def measure(name, func, args_list):
+    """Прогон func по каждому набору аргументов: ops/sec, p50, p99"""
+    latencies = []
+    started = time.perf_counter()
+    for args in args_list:
+        op_started = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - op_started)
+    total = time.perf_counter() - started
+
+    p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) >= 2 else latencies[0]
+    result = {
+        'path': name,
+        'ops': len(latencies),
+        'ops_per_sec': round(len(latencies) / total, 1) if total else None,
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p99_ms': round(p99 * 1000, 3)
+    }
+    print(f"{name:<22} {result['ops_per_sec']:>10} ops/s   p50 {result['p50_ms']:>9.3f} мс   "
+          f"p99 {result['p99_ms']:>9.3f} мс")
+    return result
+
+
+def create_transfer(user_id, recipient_id, currency_id, amount):
+    """Создание перевода как в MainWindow.make_transfer (без Qt и отправки в Telegram)"""
+    from models import User, Transaction, TransactionType
+    from transaction_utils import transaction_session, wallet_balance
+
+    with transaction_session() as session:
+        if wallet_balance(session, user_id, currency_id) < amount * 1.01:
+            raise ValueError("Недостаточно средств")
+
+        recipient = (session.query(User)
+                     .filter((User.phone == str(recipient_id)) | (User.id == recipient_id))
+                     .first())
+
+        transaction = Transaction(type=TransactionType.TRANSFER, user_id_from=user_id, user_id_to=recipient.id,
+                                  amount=amount, currency_id=currency_id, status='pending')
+        session.add(transaction)
+        session.flush()
+        return transaction.id
+
+
+def create_exchange(user_id, recipient_id, currency_from_id, currency_to_id, amount_from, amount_to):
+    """Создание обмена как в MainWindow.create_exchange"""
+    from models import Exchange, ExchangeStatus
+    from transaction_utils import transaction_session
+
+    with transaction_session() as session:
+        exchange = Exchange(user_id_from=user_id, user_id_to=recipient_id,
+                            currency_from_id=currency_from_id, currency_to_id=currency_to_id,
+                            amount_from=amount_from, amount_to=amount_to, status=ExchangeStatus.PENDING)
+        session.add(exchange)
+        session.flush()
+        return exchange.id
+
+
+def load_history(user_id):
+    """Запрос вкладки истории MainWindow.load_history (50 строк со связями)"""
+    from database import db
+    from models import Transaction
+
+    session = db.get_session()
+    try:
+        transactions = (session.query(Transaction)
+                        .filter((Transaction.user_id_from == user_id) | (Transaction.user_id_to == user_id))
+                        .order_by(Transaction.created_date.desc())
+                        .limit(50).all())
+        for transaction in transactions:
+            _ = (transaction.user_from.full_name if transaction.user_from else None,
+                 transaction.user_to.full_name if transaction.user_to else None,
+                 transaction.currency_rel.code if transaction.currency_rel else None)
+    finally:
+        session.close()
+
+
+def load_wallets(user_id):
+    """Запрос вкладки кошельков MainWindow.load_wallets"""
+    from database import db
+    from transaction_utils import user_wallets
+
+    session = db.get_session()
+    try:
+        for currency, wallet in user_wallets(session, user_id):
+            _ = (currency.code, wallet.balance if wallet else 0.0)
+    finally:
+        session.close()
+
+
+def admin_transactions_refresh():
+    """Запрос AdminPanel.load_transactions (последние 100 с отправителем и получателем)"""
+    from database import db
+    from models import Transaction, User
+
+    session = db.get_session()
+    try:
+        for transaction in (session.query(Transaction)
+                            .order_by(Transaction.created_date.desc())
+                            .limit(100).all()):
+            session.query(User).get(transaction.user_id_from)
+            session.query(User).get(transaction.user_id_to)
+    finally:
+        session.close()
+
+
+def moderator_30_days(user_id):
+    """Запрос ModeratorPanel.load_user_operations_30_days (операции и итоги)"""
+    from database import db
+    from models import Transaction, Exchange
+    from user_stats import user_stats
+
+    session = db.get_session()
+    try:
+        since = datetime.now() - timedelta(days=30)
+        session.query(Transaction).filter(
+            ((Transaction.user_id_from == user_id) | (Transaction.user_id_to == user_id)) &
+            (Transaction.created_date >= since)
+        ).order_by(Transaction.created_date.desc()).all()
+        session.query(Exchange).filter(
+            ((Exchange.user_id_from == user_id) | (Exchange.user_id_to == user_id)) &
+            (Exchange.created_date >= since)
+        ).order_by(Exchange.created_date.desc()).all()
+        user_stats.period_totals(user_id, since.date(), session=session)
+    finally:
+        session.close()
+
+
+def run(users, transactions, exchanges, ops, seed=42, workdir=None):
+    use_workdir(workdir)
+
+    generator = SyntheticDataGenerator(seed=seed)
+    timings = generator.generate(users, transactions, exchanges)
+    print(f"Данные: {users} пользователей, {transactions} транзакций, {exchanges} обменов "
+          f"({sum(timings.values()):.1f} с)")
+
+    from sqlalchemy import update
+    from database import db
+    from models import Wallet
+    from bot import telegram_bot
+
+    telegram_bot.bot = StubTelegramApi()
+
+    # Балансы с запасом: бенчмарк меряет проведение, а не отказы по недостатку средств
+    session = db.get_session()
+    try:
+        session.execute(update(Wallet).values(balance=1e9))
+        session.commit()
+    finally:
+        session.close()
+
+    rnd = random.Random(seed)
+    user_ids = generator.user_ids
+    currency_ids = generator.currency_ids
+
+    def pair():
+        user_from, user_to = rnd.sample(user_ids, 2)
+        return user_from, user_to
+
+    results = []
+
+    transfer_args = [(*pair(), rnd.choice(currency_ids), round(rnd.uniform(0.01, 5), 8)) for _ in range(ops)]
+    transaction_ids = []
+    results.append(measure("create_transfer", lambda *a: transaction_ids.append(create_transfer(*a)),
+                           transfer_args))
+    results.append(measure("confirm_transaction", telegram_bot.confirm_transaction,
+                           [(0, 0, transaction_id, "cb") for transaction_id in transaction_ids]))
+
+    exchange_args = [(*pair(), *rnd.sample(currency_ids, 2), round(rnd.uniform(0.01, 5), 8),
+                      round(rnd.uniform(0.01, 5), 8)) for _ in range(ops)]
+    exchange_ids = []
+    results.append(measure("create_exchange", lambda *a: exchange_ids.append(create_exchange(*a)),
+                           exchange_args))
+    results.append(measure("accept_exchange", telegram_bot.accept_exchange,
+                           [(0, 0, exchange_id, "cb") for exchange_id in exchange_ids]))
+
+    user_args = [(rnd.choice(user_ids),) for _ in range(ops)]
+    results.append(measure("load_history", load_history, user_args))
+    results.append(measure("load_wallets", load_wallets, user_args))
+    results.append(measure("moderator_30_days", moderator_30_days, user_args))
+    results.append(measure("admin_transactions", admin_transactions_refresh, [()] * max(1, ops // 10)))
+
+    return {'data': {'users': users, 'transactions': transactions, 'exchanges': exchanges,
+                     'generation_seconds': timings},
+            'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--exchanges", type=int, default=10000)
+    parser.add_argument("--ops", type=int, default=500, help="Операций на каждый путь")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None, help="Сохранить результат в JSON")
+    args = parser.parse_args()
+
+    # run() переходит в папку базы - путь результата фиксируем заранее
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args.users, args.transactions, args.exchanges, args.ops, args.seed, args.workdir)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Бенчмарк запуска: стоимость импорта модулей и фазы main.main до окна входа
+
+Каждый замер - в отдельном интерпретаторе во временной папке (своя пустая
+база), сеть заглушена: сокеты не подключаются, клиент Яндекс.Диска считает
+токен валидным, бот не опрашивает Telegram. Qt - на платформе offscreen.
+
+Импорт: `python -X importtime -c "import <модуль>"`, берется накопленное
+время модуля. Фазы: main.main() до показа окна входа (окно закрывается
+сразу после показа), данные - из startup_profile.
+
+Результат пишется в JSON. С --baseline прогон падает (код 1), если фаза или
+импорт медленнее базового на --threshold (доля) и не меньше --min-delta-ms.
+
+Запуск:
+    python -m benchmarks.bench_startup --runs 5 --output startup.json
+    python -m benchmarks.bench_startup --baseline startup.json --threshold 0.2
+"""
+import os
+import re
+import sys
+import json
+import glob
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Заглушки сети для дочернего интерпретатора (выполняются до импорта модулей приложения)
+STUB_BOOTSTRAP = '''
+import socket
+
+def _no_network(*args, **kwargs):
+    raise OSError("network disabled in startup benchmark")
+
+socket.socket.connect = _no_network
+socket.create_connection = _no_network
+
+try:
+    import yadisk
+    yadisk.YaDisk.check_token = lambda self, *args, **kwargs: True
+except ImportError:
+    pass
+
+try:
+    import telebot
+    telebot.TeleBot.polling = lambda self, *args, **kwargs: None
+    telebot.TeleBot.infinity_polling = lambda self, *args, **kwargs: None
+except ImportError:
+    pass
+'''
+
+# Запуск main.main() до показа окна входа и вывод фаз в stdout
+PHASES_SCRIPT = STUB_BOOTSTRAP + '''
+import json
+import os
+import sys
+from PyQt5.QtWidgets import QApplication
+import main
+
+def _exec_until_shown(self):
+    self.show()
+    QApplication.processEvents()
+    return 0
+
+main.LoginWindow.exec_ = _exec_until_shown
+
+try:
+    main.main()
+except SystemExit:
+    pass
+
+sys.stdout.write("STARTUP_REPORT " + json.dumps(main.startup_profiler.report()) + "\\n")
+sys.stdout.flush()
+os._exit(0)
+'''
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(.*)$")
+
+
+def discover_modules():
+    """Все модули верхнего уровня репозитория"""
+    return sorted(os.path.splitext(os.path.basename(path))[0]
+                  for path in glob.glob(os.path.join(REPO_ROOT, "*.py")))
+
+
+def child_env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = REPO_ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    env['QT_QPA_PLATFORM'] = 'offscreen'
+    env['WALLET_STARTUP_REPORT'] = '0'
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+
+def measure_import(module, workdir):
+    """Накопленное время импорта модуля и время всего процесса (мс)"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STUB_BOOTSTRAP + f"\nimport {module}\n"],
+        cwd=workdir, env=child_env(), capture_output=True, text=True, timeout=300
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+        return {'error': error}
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match and match.group(3).strip() == module:
+            cumulative_us = int(match.group(2))
+
+    return {'cumulative_ms': cumulative_us / 1000 if cumulative_us is not None else None,
+            'process_ms': wall_ms}
+
+
+def measure_phases(workdir):
+    """Фазы main.main() до показа окна входа (мс)"""
+    result = subprocess.run(
+        [sys.executable, "-c", PHASES_SCRIPT],
+        cwd=workdir, env=child_env(), capture_output=True, text=True, timeout=300
+    )
+
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP_REPORT "):
+            return json.loads(line[len("STARTUP_REPORT "):])
+
+    error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "no report"
+    raise RuntimeError(f"main.main() не дошел до окна входа: {error}")
+
+
+def median_or_none(values):
+    values = [value for value in values if value is not None]
+    return round(statistics.median(values), 2) if values else None
+
+
+def run_benchmark(modules, runs):
+    imports = {}
+    for module in modules:
+        samples = []
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory() as workdir:
+                samples.append(measure_import(module, workdir))
+
+        errors = [sample['error'] for sample in samples if 'error' in sample]
+        if errors:
+            imports[module] = {'error': errors[0]}
+        else:
+            imports[module] = {
+                'cumulative_ms': median_or_none([s['cumulative_ms'] for s in samples]),
+                'process_ms': median_or_none([s['process_ms'] for s in samples])
+            }
+        print(f"import {module:<24} {imports[module]}")
+
+    phase_samples = {}
+    background_samples = {}
+    mark_samples = {}
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            report = measure_phases(workdir)
+
+        for entry in report['phases']:
+            # Фоновые фазы обрываются выходом из процесса - в сравнение идут только фазы главного потока
+            target = phase_samples if entry['thread'] == 'MainThread' else background_samples
+            target.setdefault(entry['phase'], []).append(entry['duration_ms'])
+        for name, offset in report['marks'].items():
+            mark_samples.setdefault(name, []).append(offset)
+
+    phases = {name: median_or_none(values) for name, values in phase_samples.items()}
+    background = {name: median_or_none(values) for name, values in background_samples.items()}
+    marks = {name: median_or_none(values) for name, values in mark_samples.items()}
+
+    for name, value in sorted(phases.items()):
+        print(f"phase  {name:<24} {value} мс")
+    for name, value in marks.items():
+        print(f"mark   {name:<24} {value} мс")
+
+    return {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'runs': runs,
+        'imports': imports,
+        'phases': phases,
+        'background_phases': background,
+        'marks': marks
+    }
+
+
+def find_regressions(result, baseline, threshold, min_delta_ms):
+    """Список регрессий относительно базового прогона"""
+    pairs = []
+    for module, values in result['imports'].items():
+        base = baseline.get('imports', {}).get(module, {})
+        pairs.append((f"import {module}", values.get('cumulative_ms'), base.get('cumulative_ms')))
+    for name, value in result['phases'].items():
+        pairs.append((f"phase {name}", value, baseline.get('phases', {}).get(name)))
+    for name, value in result['marks'].items():
+        pairs.append((f"mark {name}", value, baseline.get('marks', {}).get(name)))
+
+    regressions = []
+    for label, current, base in pairs:
+        if current is None or base is None:
+            continue
+        delta = current - base
+        if delta >= min_delta_ms and delta > base * threshold:
+            regressions.append(f"{label}: {base:.1f} -> {current:.1f} мс (+{delta / base * 100 if base else 0:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modules", nargs='+', default=None, help="Модули (по умолчанию - все верхнего уровня)")
+    parser.add_argument("--output", default="startup_benchmark.json")
+    parser.add_argument("--baseline", default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимое замедление (доля)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Игнорировать замедления меньше")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.modules or discover_modules(), args.runs)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Результат: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+        regressions = find_regressions(result, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("❌ Регрессии запуска:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Бенчмарк применения тем оформления
+
+Генерация: сборка QSS без кэша (build_style_sheet.__wrapped__) против
+кэшированной. Применение (offscreen Qt, окно с типичным набором виджетов):
+первое применение при старте, переключение темы, повторное применение
+тех же настроек без сравнения (setStyleSheet заново) и со сравнением.
+
+Запуск: python -m benchmarks.bench_stylesheet --runs 20 --rows 50
+"""
+import os
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QTabWidget,
+                             QTableWidget, QTableWidgetItem, QPushButton, QGroupBox, QLineEdit)
+from models import Theme
+from theme_styles import build_style_sheet, DEFAULT_PRIMARY_COLOR, DEFAULT_BACKGROUND_COLOR
+
+
+def build_window(rows):
+    """Окно, похожее на главное: вкладки с таблицами, группы, кнопки, поля ввода"""
+    window = QMainWindow()
+    tabs = QTabWidget()
+
+    for tab_index in range(4):
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+
+        table = QTableWidget(rows, 6)
+        for row in range(rows):
+            for col in range(6):
+                table.setItem(row, col, QTableWidgetItem(f"{row}:{col}"))
+        layout.addWidget(table)
+
+        group = QGroupBox(f"Группа {tab_index}")
+        group_layout = QVBoxLayout(group)
+        for _ in range(5):
+            group_layout.addWidget(QLineEdit())
+            group_layout.addWidget(QPushButton("Кнопка"))
+        layout.addWidget(group)
+
+        tabs.addTab(widget, f"Вкладка {tab_index}")
+
+    window.setCentralWidget(tabs)
+    window.show()
+    return window
+
+
+def timed(func, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(label, timings):
+    print(f"{label:<38} медиана {statistics.median(timings) * 1000:8.3f} мс, "
+          f"макс {max(timings) * 1000:8.3f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=50, help="Строк в каждой таблице окна")
+    args = parser.parse_args()
+
+    themes = list(Theme)
+    key = (DEFAULT_PRIMARY_COLOR, DEFAULT_BACKGROUND_COLOR, 12)
+
+    # Генерация строки стилей
+    report("генерация без кэша", timed(
+        lambda: [build_style_sheet.__wrapped__(theme, *key) for theme in themes], args.runs))
+    build_style_sheet.cache_clear()
+    report("генерация из кэша", timed(
+        lambda: [build_style_sheet(theme, *key) for theme in themes], args.runs))
+
+    app = QApplication.instance() or QApplication([])
+    window = build_window(args.rows)
+    sheets = [build_style_sheet(theme, *key) for theme in themes]
+
+    # Старт: первое применение темы к уже построенному окну
+    started = time.perf_counter()
+    window.setStyleSheet(sheets[0])
+    app.processEvents()
+    report("старт (первое применение)", [time.perf_counter() - started])
+
+    def switch_theme():
+        for sheet in sheets[1:] + sheets[:1]:
+            window.setStyleSheet(sheet)
+            app.processEvents()
+
+    switch_timings = timed(switch_theme, args.runs)
+    report("переключение темы", [t / len(sheets) for t in switch_timings])
+
+    current = sheets[0]
+
+    def reapply_without_diff():
+        window.setStyleSheet(current)
+        app.processEvents()
+
+    def reapply_with_diff():
+        if current != window.styleSheet():
+            window.setStyleSheet(current)
+        app.processEvents()
+
+    report("повтор тех же настроек (без сравнения)", timed(reapply_without_diff, args.runs))
+    report("повтор тех же настроек (со сравнением)", timed(reapply_with_diff, args.runs))
+
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
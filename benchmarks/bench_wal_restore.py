@@ -0,0 +1,116 @@
+"""
+Сквозная проверка архивации WAL и восстановления на момент времени (wal_archiver.py)
+
+База с --users пользователями; архивация запускается через
+backup_manager.start_wal_archiving с локальным хранилищем (папка
+wal_archive в рабочей папке). Затем --stages раз пишется по
+--transactions транзакций; после отправки журнала каждого этапа
+запоминаются момент времени и число транзакций.
+
+После остановки архиватора база восстанавливается через restore_to_time
+на момент каждого этапа, число транзакций в восстановленной базе
+сравнивается с запомненным.
+
+Результат: отправлено сегментов и байт, время и скорость восстановления
+по этапам, совпадение числа строк.
+
+Запуск: python -m benchmarks.bench_wal_restore --users 1000 --stages 5 --transactions 20000
+"""
+import os
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+from benchmarks.synthetic_data import SyntheticDataGenerator, use_workdir
+
+
+def count_transactions(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def wait_shipped(archiver, timeout=60):
+    """Ждем, пока архиватор отправит весь журнал"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not archiver.status()['pending_bytes']:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run(users, stages, transactions, seed=42, workdir=None):
+    workdir = use_workdir(workdir)
+
+    generator = SyntheticDataGenerator(seed=seed)
+    generator.generate(users, 0, 0)
+
+    from backup_manager import backup_manager
+    from wal_archiver import LocalArchiveStorage, restore_to_time
+
+    storage = LocalArchiveStorage(os.path.join(workdir, "wal_archive"))
+    backup_manager.settings['wal_ship_interval_seconds'] = 0.2
+    archiver = backup_manager.start_wal_archiving(storage)
+    if archiver is None:
+        raise RuntimeError("Архивация WAL не запустилась")
+
+    points = []
+    try:
+        for stage in range(stages):
+            generator.create_transactions(transactions)
+            if not wait_shipped(archiver):
+                raise RuntimeError(f"Этап {stage + 1}: журнал не отправлен за отведенное время")
+            points.append((datetime.now(), count_transactions("crypto_wallet.db")))
+            # Следующий этап - в другой миллисекунде, чем отметка времени этого
+            time.sleep(0.01)
+    finally:
+        backup_manager.stop_wal_archiving()
+
+    shipped = archiver.status()
+    results = []
+    for stage, (target_time, expected) in enumerate(points, 1):
+        output_path = os.path.join(workdir, f"restored_{stage}.db")
+        restore = restore_to_time(storage, target_time, output_path)
+        restored = count_transactions(output_path)
+        results.append({'stage': stage, 'expected_rows': expected, 'restored_rows': restored,
+                        'match': restored == expected, 'segments': restore['segments'],
+                        'bytes': restore['bytes'], 'seconds': round(restore['seconds'], 3),
+                        'throughput_mb_s': round(restore['throughput_mb_s'], 1)})
+        print(f"Этап {stage}: {restored} из {expected} строк, {restore['segments']} сегментов "
+              f"({restore['bytes'] / 1024 / 1024:.1f} МБ) за {restore['seconds']:.2f} с")
+
+    report = {'users': users, 'stages': stages, 'transactions_per_stage': transactions,
+              'segments_shipped': shipped['segments_shipped'], 'bytes_shipped': shipped['bytes_shipped'],
+              'snapshots': shipped['snapshots'], 'restores': results,
+              'consistent': all(result['match'] for result in results)}
+
+    print(f"Отправлено: {report['segments_shipped']} сегментов, "
+          f"{report['bytes_shipped'] / 1024 / 1024:.1f} МБ, снимков {report['snapshots']}")
+    print(f"Сверка: {'совпадает' if report['consistent'] else 'НЕ совпадает'}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--stages", type=int, default=5)
+    parser.add_argument("--transactions", type=int, default=20000, help="Транзакций на этап")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None, help="Сохранить результат в JSON")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args.users, args.stages, args.transactions, args.seed, args.workdir)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Бенчмарк хранения кошельков: индекс, ленивое создание и удаление пустых
+
+База с --users пользователями (кошелек в каждой валюте), доля --zero-share
+кошельков обнуляется - как у давно зарегистрированных пользователей, которые
+держат средства в одной-двух валютах. Три шага:
+- eager - без индекса ix_wallets_user_currency (как до него);
+- indexed - с индексом;
+- pruned - после Database.prune_empty_wallets и VACUUM.
+
+На каждом шаге: строк в wallets, размер файла базы (после VACUUM), и
+задержки вкладки кошельков (transaction_utils.user_wallets) и поиска
+кошелька для проведения (find_wallet).
+
+Запуск: python -m benchmarks.bench_wallets --users 20000 --zero-share 0.8
+"""
+import os
+import json
+import random
+import argparse
+from sqlalchemy import text
+from benchmarks.synthetic_data import SyntheticDataGenerator, use_workdir
+from benchmarks.bench_settlement import measure, load_wallets
+
+
+def find_wallet(user_id, currency_id):
+    from database import db
+    from transaction_utils import find_wallet as find
+
+    session = db.get_session()
+    try:
+        find(session, user_id, currency_id)
+    finally:
+        session.close()
+
+
+def storage():
+    """Строк в wallets и размер файла базы после VACUUM"""
+    from database import db
+
+    with db.engine.connect() as connection:
+        rows = connection.execute(text("SELECT count(*) FROM wallets")).scalar()
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM"))
+    return {'wallet_rows': rows, 'db_bytes': os.path.getsize("crypto_wallet.db")}
+
+
+def measure_step(label, user_args, wallet_args):
+    step = {'label': label, **storage()}
+    print(f"--- {label}: {step['wallet_rows']} кошельков, база {step['db_bytes'] / 1024 / 1024:.1f} МБ")
+    step['results'] = [measure("load_wallets", load_wallets, user_args),
+                       measure("find_wallet", find_wallet, wallet_args)]
+    return step
+
+
+def run(users, zero_share, ops, seed=42, workdir=None):
+    use_workdir(workdir)
+
+    generator = SyntheticDataGenerator(seed=seed)
+    generator.generate(users, 0, 0)
+
+    from database import db
+
+    # Обнуляем долю кошельков (детерминированно по id)
+    with db.engine.begin() as connection:
+        connection.execute(text("UPDATE wallets SET balance = 0 WHERE (id * 2654435761) % 1000 < :threshold"),
+                           {'threshold': int(zero_share * 1000)})
+
+    rnd = random.Random(seed)
+    user_args = [(rnd.choice(generator.user_ids),) for _ in range(ops)]
+    wallet_args = [(rnd.choice(generator.user_ids), rnd.choice(generator.currency_ids)) for _ in range(ops)]
+    report = {'users': users, 'zero_share': zero_share, 'steps': []}
+
+    with db.engine.begin() as connection:
+        connection.execute(text("DROP INDEX IF EXISTS ix_wallets_user_currency"))
+    report['steps'].append(measure_step("eager", user_args, wallet_args))
+
+    db.migrate_wallets()
+    report['steps'].append(measure_step("indexed", user_args, wallet_args))
+
+    report['pruned'] = db.prune_empty_wallets()
+    report['steps'].append(measure_step("pruned", user_args, wallet_args))
+
+    first, last = report['steps'][0], report['steps'][-1]
+    print(f"Экономия: {first['wallet_rows'] - last['wallet_rows']} строк, "
+          f"{(first['db_bytes'] - last['db_bytes']) / 1024 / 1024:.1f} МБ")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--zero-share", type=float, default=0.8, help="Доля обнуляемых кошельков")
+    parser.add_argument("--ops", type=int, default=1000, help="Запросов на каждый замер")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None, help="Сохранить результат в JSON")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args.users, args.zero_share, args.ops, args.seed, args.workdir)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
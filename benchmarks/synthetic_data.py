@@ -0,0 +1,295 @@
+"""
+Генератор синтетических данных для бенчмарков
+
+Пользователи регистрируются через register_user_transaction (кошельки для
+всех валют, настройки интерфейса), история транзакций и обменов пишется
+пакетными вставками. Активность пользователей и популярность валют
+распределены по Ципфу: немногие пользователи и валюты дают основную
+часть операций, суммы - логнормальные.
+
+Модули приложения работают с базой crypto_wallet.db в текущей папке,
+поэтому генератор и бенчмарки переходят во временную папку до их импорта
+(см. use_workdir).
+
+Запуск: python -m benchmarks.synthetic_data --users 1000 --transactions 100000 --exchanges 10000
+"""
+import os
+import time
+import random
+import argparse
+import itertools
+import tempfile
+from datetime import datetime, timedelta
+
+TRANSACTION_STATUSES = (('completed', 0.85), ('pending', 0.08), ('failed', 0.04), ('cancelled', 0.03))
+EXCHANGE_STATUSES = (('COMPLETED', 0.7), ('PENDING', 0.15), ('REJECTED', 0.1), ('CANCELLED', 0.05))
+NOTIFICATION_TYPES = (('transaction', 0.6), ('exchange', 0.25), ('security', 0.1), ('system', 0.05))
+
+
+def use_workdir(path=None):
+    """Перейти в папку с базой бенчмарка (до импорта модулей приложения)"""
+    path = path or tempfile.mkdtemp(prefix="crypto_wallet_bench_")
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)
+    return path
+
+
+def zipf_weights(count, exponent):
+    """Веса рангов 1..count по закону Ципфа (накопленные - для random.choices)"""
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+class SyntheticDataGenerator:
+    """Наполнение базы приложения реалистичными данными"""
+
+    def __init__(self, seed=42, skew=1.1, days=180, chunk_size=5000):
+        self.random = random.Random(seed)
+        self.skew = skew
+        self.days = days
+        self.chunk_size = chunk_size
+        self.user_ids = []
+        self.currency_ids = []
+
+    def _pick_status(self, statuses):
+        value = self.random.random()
+        for status, share in statuses:
+            value -= share
+            if value <= 0:
+                return status
+        return statuses[0][0]
+
+    def _pick_pair(self, user_weights):
+        user_from, user_to = self.random.choices(self.user_ids, cum_weights=user_weights, k=2)
+        while user_to == user_from:
+            user_to = self.random.choice(self.user_ids)
+        return user_from, user_to
+
+    def _random_date(self, now):
+        return now - timedelta(seconds=self.random.uniform(0, self.days * 86400))
+
+    def _amount(self):
+        return round(self.random.lognormvariate(-1.0, 1.5), 8)
+
+    def create_users(self, count, start_index=0):
+        """Регистрация пользователей порциями (по одной транзакции БД на порцию)"""
+        from crypto_manager import crypto_manager
+        from transaction_utils import transaction_session, register_user_transaction
+
+        crypto_manager.initialize_currencies()
+
+        for chunk_start in range(start_index, start_index + count, 500):
+            with transaction_session() as session:
+                for i in range(chunk_start, min(chunk_start + 500, start_index + count)):
+                    self.user_ids.append(register_user_transaction(
+                        session,
+                        phone=f"+7900{i:07d}",
+                        full_name=f"Пользователь {i}",
+                        telegram_id=str(100000000 + i)
+                    ))
+        return self.user_ids
+
+    def _load_ids(self, session):
+        from models import User, Currency
+
+        if not self.user_ids:
+            self.user_ids = [user_id for user_id, in session.query(User.id).order_by(User.id)]
+        self.currency_ids = [currency_id for currency_id, in session.query(Currency.id).order_by(Currency.id)]
+
+    def create_transactions(self, count):
+        """История переводов с комиссиями (для выполненных)"""
+        from sqlalchemy import func
+        from database import db
+        from models import Transaction, Commission, TransactionType
+
+        session = db.get_session()
+        try:
+            self._load_ids(session)
+            # id назначаем сами: комиссиям нужен id транзакции, а return_defaults отключает пакетную вставку
+            next_id = itertools.count((session.query(func.max(Transaction.id)).scalar() or 0) + 1)
+            user_weights = zipf_weights(len(self.user_ids), self.skew)
+            currency_weights = zipf_weights(len(self.currency_ids), self.skew)
+            now = datetime.now()
+
+            for chunk_start in range(0, count, self.chunk_size):
+                rows = []
+                for _ in range(min(self.chunk_size, count - chunk_start)):
+                    user_from, user_to = self._pick_pair(user_weights)
+                    rows.append({
+                        'id': next(next_id),
+                        'type': TransactionType.TRANSFER,
+                        'user_id_from': user_from,
+                        'user_id_to': user_to,
+                        'amount': self._amount(),
+                        'currency_id': self.random.choices(self.currency_ids, cum_weights=currency_weights)[0],
+                        'created_date': self._random_date(now),
+                        'status': self._pick_status(TRANSACTION_STATUSES)
+                    })
+
+                session.bulk_insert_mappings(Transaction, rows)
+                session.bulk_insert_mappings(Commission, [
+                    {'transaction_id': row['id'], 'amount': row['amount'] * 0.01, 'type': 'transfer'}
+                    for row in rows if row['status'] == 'completed'
+                ])
+                session.commit()
+        finally:
+            session.close()
+
+    def create_exchanges(self, count):
+        """История P2P обменов"""
+        from database import db
+        from models import Exchange, ExchangeStatus
+
+        session = db.get_session()
+        try:
+            self._load_ids(session)
+            user_weights = zipf_weights(len(self.user_ids), self.skew)
+            now = datetime.now()
+
+            for chunk_start in range(0, count, self.chunk_size):
+                rows = []
+                for _ in range(min(self.chunk_size, count - chunk_start)):
+                    user_from, user_to = self._pick_pair(user_weights)
+                    currency_from, currency_to = self.random.sample(self.currency_ids, 2)
+                    status = ExchangeStatus(self._pick_status(EXCHANGE_STATUSES))
+                    created_date = self._random_date(now)
+                    rows.append({
+                        'user_id_from': user_from,
+                        'user_id_to': user_to,
+                        'currency_from_id': currency_from,
+                        'currency_to_id': currency_to,
+                        'amount_from': self._amount(),
+                        'amount_to': self._amount(),
+                        'status': status,
+                        'created_date': created_date,
+                        'completed_date': created_date + timedelta(minutes=5)
+                        if status == ExchangeStatus.COMPLETED else None
+                    })
+
+                session.bulk_insert_mappings(Exchange, rows)
+                session.commit()
+        finally:
+            session.close()
+
+    def create_notifications(self, count, read_share=0.8):
+        """Уведомления пользователей (типы, приоритеты, даты за days дней)"""
+        from database import db
+        from models import Notification
+
+        session = db.get_session()
+        try:
+            self._load_ids(session)
+            user_weights = zipf_weights(len(self.user_ids), self.skew)
+            now = datetime.now()
+
+            for chunk_start in range(0, count, self.chunk_size):
+                rows = []
+                for _ in range(min(self.chunk_size, count - chunk_start)):
+                    notification_type = self._pick_status(NOTIFICATION_TYPES)
+                    rows.append({
+                        'type': notification_type,
+                        'user_id': self.random.choices(self.user_ids, cum_weights=user_weights)[0],
+                        'title': f"Уведомление: {notification_type}",
+                        'message': f"Сумма {self._amount():.6f}",
+                        'created_date': self._random_date(now),
+                        'is_read': self.random.random() < read_share,
+                        'priority': self.random.choice((1, 2, 2, 3))
+                    })
+
+                session.bulk_insert_mappings(Notification, rows)
+                session.commit()
+        finally:
+            session.close()
+
+    def create_sessions(self, count, active_share=0.5):
+        """
+        Сессии входа: active_share - с активностью за последние сутки,
+        остальные - за days дней (их истекает expire)
+
+        Returns:
+            list: Токены созданных сессий
+        """
+        from database import db
+        from models import Session, SessionStatus
+
+        tokens = []
+        session = db.get_session()
+        try:
+            self._load_ids(session)
+            user_weights = zipf_weights(len(self.user_ids), self.skew)
+            now = datetime.now()
+
+            for chunk_start in range(0, count, self.chunk_size):
+                rows = []
+                for _ in range(min(self.chunk_size, count - chunk_start)):
+                    if self.random.random() < active_share:
+                        last_activity = now - timedelta(seconds=self.random.uniform(0, 86400))
+                    else:
+                        last_activity = self._random_date(now)
+                    token = f"{self.random.getrandbits(192):048x}"
+                    tokens.append(token)
+                    rows.append({
+                        'user_id': self.random.choices(self.user_ids, cum_weights=user_weights)[0],
+                        'created_date': last_activity,
+                        'last_activity': last_activity,
+                        'status': SessionStatus.ACTIVE,
+                        'ip_address': "127.0.0.1",
+                        'user_agent': "PyQt5 Desktop App",
+                        'token': token
+                    })
+
+                session.bulk_insert_mappings(Session, rows)
+                session.commit()
+        finally:
+            session.close()
+        return tokens
+
+    def generate(self, users, transactions, exchanges, notifications=0):
+        """
+        Полный набор данных
+
+        Returns:
+            dict: Время каждого этапа, секунды
+        """
+        from database import db
+        from user_stats import user_stats
+
+        timings = {}
+        db.create_tables()
+
+        for name, func, amount in (("users", self.create_users, users),
+                                   ("transactions", self.create_transactions, transactions),
+                                   ("exchanges", self.create_exchanges, exchanges),
+                                   ("notifications", self.create_notifications, notifications)):
+            started = time.perf_counter()
+            func(amount)
+            timings[name] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        user_stats.rebuild()
+        timings['user_stats'] = round(time.perf_counter() - started, 3)
+
+        return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--exchanges", type=int, default=10000)
+    parser.add_argument("--notifications", type=int, default=0)
+    parser.add_argument("--skew", type=float, default=1.1, help="Показатель Ципфа активности")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="Папка базы (по умолчанию - временная)")
+    args = parser.parse_args()
+
+    workdir = use_workdir(args.workdir)
+    generator = SyntheticDataGenerator(seed=args.seed, skew=args.skew)
+    timings = generator.generate(args.users, args.transactions, args.exchanges, args.notifications)
+
+    print(f"База: {os.path.join(workdir, 'crypto_wallet.db')}")
+    for name, seconds in timings.items():
+        print(f"{name:<14} {seconds:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
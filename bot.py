@@ -2,8 +2,13 @@ import telebot
 from telebot import types
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import text
-from models import User, Transaction, Wallet, Commission, Exchange, ExchangeStatus, TransactionType
+from models import User, Transaction, Commission, Exchange, ExchangeStatus, TransactionType
 from database import db
+from user_stats import user_stats
+from transaction_utils import find_wallet, get_or_create_wallet
+from event_bus import (event_bus, TRANSFER_COMPLETED, TRANSFER_FAILED, TRANSFER_CANCELLED,
+                       EXCHANGE_COMPLETED, EXCHANGE_REJECTED)
+from instrumentation import instrumentation
 from datetime import datetime
 import logging
 import os
@@ -22,6 +27,7 @@ class TelegramBot:
         """Настройка обработчиков команд"""
 
         @self.bot.message_handler(commands=['start'])
+        @instrumentation.timed("bot.start_command")
         def start_command(message):
             chat_id = message.chat.id
             user_id = message.from_user.id
@@ -63,6 +69,7 @@ class TelegramBot:
             )
 
         @self.bot.message_handler(commands=['login'])
+        @instrumentation.timed("bot.login_command")
         def login_command(message):
             """Отправка кода подтверждения для входа"""
             chat_id = message.chat.id
@@ -127,6 +134,33 @@ class TelegramBot:
         def callback_handler(call):
             self.handle_callback(call)
 
+    @staticmethod
+    def publish_transfer(event, transaction):
+        """Событие о переводе для открытых окон (после фиксации транзакции БД)"""
+        event_bus.publish(event, {
+            'transaction_id': transaction.id,
+            'user_id_from': transaction.user_id_from,
+            'user_id_to': transaction.user_id_to,
+            'currency_id': transaction.currency_id,
+            'amount': transaction.amount,
+            'status': transaction.status
+        })
+
+    @staticmethod
+    def publish_exchange(event, exchange):
+        """Событие об обмене для открытых окон (после фиксации транзакции БД)"""
+        event_bus.publish(event, {
+            'exchange_id': exchange.id,
+            'user_id_from': exchange.user_id_from,
+            'user_id_to': exchange.user_id_to,
+            'currency_from_id': exchange.currency_from_id,
+            'currency_to_id': exchange.currency_to_id,
+            'amount_from': exchange.amount_from,
+            'amount_to': exchange.amount_to,
+            'status': exchange.status.value
+        })
+
+    @instrumentation.timed("bot.handle_callback")
     def handle_callback(self, call):
         """Обработка нажатий на кнопки"""
         chat_id = call.message.chat.id
@@ -162,6 +196,7 @@ class TelegramBot:
             except:
                 pass
 
+    @instrumentation.timed("bot.confirm_transaction")
     def confirm_transaction(self, chat_id, message_id, transaction_id, callback_id):
         """Подтверждение транзакции с использованием транзакции БД"""
         session = db.get_session()
@@ -190,36 +225,23 @@ class TelegramBot:
                 self.bot.answer_callback_query(callback_id, "❌ Транзакция уже обработана")
                 return
 
-            # Блокируем кошельки для обновления
-            from_wallet = (session.query(Wallet)
-                           .with_for_update()
-                           .filter_by(
-                user_id=transaction.user_id_from,
-                currency_id=transaction.currency_id
-            ).first())
-
-            to_wallet = (session.query(Wallet)
-                         .with_for_update()
-                         .filter_by(
-                user_id=transaction.user_id_to,
-                currency_id=transaction.currency_id
-            ).first())
-
-            if not from_wallet or not to_wallet:
-                session.rollback()
-                self.bot.answer_callback_query(callback_id, "❌ Ошибка кошельков")
-                return
+            # Блокируем кошелек отправителя (нет кошелька - нулевой баланс)
+            from_wallet = find_wallet(session, transaction.user_id_from, transaction.currency_id, for_update=True)
 
             # Проверяем балансы внутри транзакции
             commission = transaction.amount * 0.01
             total_amount = transaction.amount + commission
 
-            if from_wallet.balance < total_amount:
+            if not from_wallet or from_wallet.balance < total_amount:
                 transaction.status = 'failed'
                 session.commit()
+                self.publish_transfer(TRANSFER_FAILED, transaction)
                 self.bot.answer_callback_query(callback_id, "❌ Недостаточно средств")
                 return
 
+            # Кошелек получателя создается при первом зачислении
+            to_wallet = get_or_create_wallet(session, transaction.user_id_to, transaction.currency_id)
+
             # Выполняем перевод
             from_wallet.balance -= total_amount
             to_wallet.balance += transaction.amount
@@ -233,7 +255,15 @@ class TelegramBot:
             )
             session.add(commission_record)
 
-            # Создаем уведомления
+            # Дневные итоги обновляем в той же транзакции
+            user_stats.record_transfer(session, transaction, commission)
+
+            # Фиксируем транзакцию
+            session.commit()
+            self.publish_transfer(TRANSFER_COMPLETED, transaction)
+
+            # Уведомления - после фиксации: upsert дневных итогов держит блокировку записи
+            # SQLite, и отдельная сессия create_notification ждала бы ее до таймаута
             db.create_notification(
                 user_id=transaction.user_id_from,
                 type='transaction',
@@ -252,9 +282,6 @@ class TelegramBot:
                 priority=2
             )
 
-            # Фиксируем транзакцию
-            session.commit()
-
             # Обновляем сообщение
             try:
                 self.bot.edit_message_text(
@@ -294,6 +321,7 @@ class TelegramBot:
         finally:
             session.close()
 
+    @instrumentation.timed("bot.cancel_transaction")
     def cancel_transaction(self, chat_id, message_id, transaction_id, callback_id):
         """Отмена транзакции"""
         session = db.get_session()
@@ -308,6 +336,7 @@ class TelegramBot:
             if transaction and transaction.status == 'pending':
                 transaction.status = 'cancelled'
                 session.commit()
+                self.publish_transfer(TRANSFER_CANCELLED, transaction)
 
                 try:
                     self.bot.edit_message_text(
@@ -334,6 +363,7 @@ class TelegramBot:
         finally:
             session.close()
 
+    @instrumentation.timed("bot.accept_exchange")
     def accept_exchange(self, chat_id, message_id, exchange_id, callback_id):
         """Принятие обмена с использованием транзакции"""
         session = db.get_session()
@@ -363,84 +393,36 @@ class TelegramBot:
                 self.bot.answer_callback_query(callback_id, "❌ Обмен уже обработан")
                 return
 
-            # Блокируем ВСЕ кошельки для обновления
+            # Блокируем кошельки списания (нет кошелька - нулевой баланс)
             # Кошелек отправителя (отдает валюту from)
-            from_wallet_send = (session.query(Wallet)
-                                .with_for_update()
-                                .filter_by(
-                user_id=exchange.user_id_from,
-                currency_id=exchange.currency_from_id
-            ).first())
-
-            # Кошелек отправителя (получает валюту to)
-            from_wallet_receive = (session.query(Wallet)
-                                   .with_for_update()
-                                   .filter_by(
-                user_id=exchange.user_id_from,
-                currency_id=exchange.currency_to_id
-            ).first())
+            from_wallet_send = find_wallet(session, exchange.user_id_from, exchange.currency_from_id,
+                                           for_update=True)
 
             # Кошелек получателя (отдает валюту to)
-            to_wallet_send = (session.query(Wallet)
-                              .with_for_update()
-                              .filter_by(
-                user_id=exchange.user_id_to,
-                currency_id=exchange.currency_to_id
-            ).first())
-
-            # Кошелек получателя (получает валюту from)
-            to_wallet_receive = (session.query(Wallet)
-                                 .with_for_update()
-                                 .filter_by(
-                user_id=exchange.user_id_to,
-                currency_id=exchange.currency_from_id
-            ).first())
-
-            # Проверяем существование кошельков, создаем если нет
-            if not from_wallet_send:
-                session.rollback()
-                self.bot.answer_callback_query(callback_id,
-                                               f"❌ У отправителя нет кошелька {exchange.currency_from.code}")
-                return
-
-            if not to_wallet_send:
-                session.rollback()
-                self.bot.answer_callback_query(callback_id, f"❌ У вас нет кошелька {exchange.currency_to.code}")
-                return
-
-            # Создаем кошельки для получения если их нет
-            if not from_wallet_receive:
-                from_wallet_receive = Wallet(
-                    user_id=exchange.user_id_from,
-                    currency_id=exchange.currency_to_id,
-                    address=f"{exchange.currency_to.code}_address_{exchange.user_id_from}_{exchange.currency_to_id}",
-                    balance=0
-                )
-                session.add(from_wallet_receive)
-
-            if not to_wallet_receive:
-                to_wallet_receive = Wallet(
-                    user_id=exchange.user_id_to,
-                    currency_id=exchange.currency_from_id,
-                    address=f"{exchange.currency_from.code}_address_{exchange.user_id_to}_{exchange.currency_from_id}",
-                    balance=0
-                )
-                session.add(to_wallet_receive)
+            to_wallet_send = find_wallet(session, exchange.user_id_to, exchange.currency_to_id, for_update=True)
 
             # Проверяем балансы
-            if from_wallet_send.balance < exchange.amount_from:
+            if not from_wallet_send or from_wallet_send.balance < exchange.amount_from:
                 exchange.status = ExchangeStatus.REJECTED
                 session.commit()
+                self.publish_exchange(EXCHANGE_REJECTED, exchange)
                 self.bot.answer_callback_query(callback_id,
                                                f"❌ У отправителя недостаточно {exchange.currency_from.code}")
                 return
 
-            if to_wallet_send.balance < exchange.amount_to:
+            if not to_wallet_send or to_wallet_send.balance < exchange.amount_to:
                 exchange.status = ExchangeStatus.REJECTED
                 session.commit()
+                self.publish_exchange(EXCHANGE_REJECTED, exchange)
                 self.bot.answer_callback_query(callback_id, f"❌ У вас недостаточно {exchange.currency_to.code}")
                 return
 
+            # Кошельки зачисления создаются при первом зачислении
+            # Кошелек отправителя (получает валюту to)
+            from_wallet_receive = get_or_create_wallet(session, exchange.user_id_from, exchange.currency_to_id)
+            # Кошелек получателя (получает валюту from)
+            to_wallet_receive = get_or_create_wallet(session, exchange.user_id_to, exchange.currency_from_id)
+
             # ВЫПОЛНЯЕМ ОБМЕН В ТРАНЗАКЦИИ
             # 1. Отправитель отдает валюту from
             from_wallet_send.balance -= exchange.amount_from
@@ -458,7 +440,13 @@ class TelegramBot:
             exchange.status = ExchangeStatus.COMPLETED
             exchange.completed_date = datetime.now()
 
-            # Создаем уведомления
+            user_stats.record_exchange(session, exchange)
+
+            # Фиксируем транзакцию
+            session.commit()
+            self.publish_exchange(EXCHANGE_COMPLETED, exchange)
+
+            # Уведомления - после фиксации (как у перевода)
             from database import db as database_db
 
             # Уведомляем отправителя
@@ -485,9 +473,6 @@ class TelegramBot:
                 priority=2
             )
 
-            # Фиксируем транзакцию
-            session.commit()
-
             # Обновляем сообщение
             try:
                 self.bot.edit_message_text(
@@ -529,6 +514,7 @@ class TelegramBot:
         finally:
             session.close()
 
+    @instrumentation.timed("bot.reject_exchange")
     def reject_exchange(self, chat_id, message_id, exchange_id, callback_id):
         """Отклонение обмена"""
         session = db.get_session()
@@ -543,6 +529,7 @@ class TelegramBot:
             if exchange and exchange.status == ExchangeStatus.PENDING:
                 exchange.status = ExchangeStatus.REJECTED
                 session.commit()
+                self.publish_exchange(EXCHANGE_REJECTED, exchange)
 
                 try:
                     self.bot.edit_message_text(
@@ -580,6 +567,7 @@ class TelegramBot:
         finally:
             session.close()
 
+    @instrumentation.timed("bot.send_confirmation_request")
     def send_confirmation_request(self, user_telegram_id, transaction_id):
         """Отправка запроса на подтверждение перевода"""
         try:
@@ -670,6 +658,7 @@ class TelegramBot:
             logging.error(f"Error sending PDF to {user_telegram_id}: {e}")
             return False
 
+    @instrumentation.timed("bot.send_exchange_request")
     def send_exchange_request(self, user_telegram_id, exchange_id):
         """Отправка запроса на подтверждение обмена"""
         try:
@@ -792,4 +781,12 @@ class TelegramBot:
 
 
 # Создаем экземпляр бота
-telegram_bot = TelegramBot("token")
\ No newline at end of file
+telegram_bot = TelegramBot("token")
+
+
+if __name__ == "__main__":
+    # Отдельный процесс бота: события проведения операций - в окна через сокет
+    from event_bus import UnixSocketTransport
+
+    UnixSocketTransport(event_bus).connect()
+    telegram_bot.run()
@@ -0,0 +1,413 @@
+import os
+import csv
+import json
+import enum
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import func, or_, tuple_
+from sqlalchemy.orm import aliased
+from models import Transaction, Exchange, Commission, Currency
+from database import db
+import logging
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+
+
+class ExportSource:
+    """
+    Описание выгружаемой таблицы: колонки, ключ, колонка даты и фильтр по пользователю
+
+    columns - список (имя, тип), тип одно из int/float/str/datetime
+    (нужен для схемы Parquet, чтобы пустые партиции не ломали типы).
+    """
+
+    def __init__(self, name, columns, build_query, id_column, date_column, user_filter):
+        self.name = name
+        self.columns = columns
+        self.build_query = build_query
+        self.id_column = id_column
+        self.date_column = date_column
+        self.user_filter = user_filter
+
+    @property
+    def column_names(self):
+        return [name for name, _ in self.columns]
+
+
+def _transactions_query(session):
+    return (session.query(
+        Transaction.id,
+        Transaction.type,
+        Transaction.user_id_from,
+        Transaction.user_id_to,
+        Transaction.amount,
+        Currency.code,
+        Transaction.status,
+        Transaction.created_date
+    )
+            .outerjoin(Currency, Currency.id == Transaction.currency_id)
+            .order_by(Transaction.id))
+
+
+def _exchanges_query(session):
+    currency_from = aliased(Currency)
+    currency_to = aliased(Currency)
+
+    return (session.query(
+        Exchange.id,
+        Exchange.user_id_from,
+        Exchange.user_id_to,
+        currency_from.code,
+        currency_to.code,
+        Exchange.amount_from,
+        Exchange.amount_to,
+        Exchange.status,
+        Exchange.created_date,
+        Exchange.completed_date
+    )
+            .outerjoin(currency_from, currency_from.id == Exchange.currency_from_id)
+            .outerjoin(currency_to, currency_to.id == Exchange.currency_to_id)
+            .order_by(Exchange.id))
+
+
+def _commissions_query(session):
+    # Своей даты и пользователя у комиссии нет - берем из транзакции
+    return (session.query(
+        Commission.id,
+        Commission.transaction_id,
+        Commission.amount,
+        Commission.type,
+        Transaction.user_id_from,
+        Transaction.created_date
+    )
+            .join(Transaction, Transaction.id == Commission.transaction_id)
+            .order_by(Commission.id))
+
+
+EXPORT_SOURCES = {
+    'transactions': ExportSource(
+        'transactions',
+        [('id', 'int'), ('type', 'str'), ('user_id_from', 'int'), ('user_id_to', 'int'),
+         ('amount', 'float'), ('currency', 'str'), ('status', 'str'), ('created_date', 'datetime')],
+        _transactions_query,
+        Transaction.id,
+        Transaction.created_date,
+        lambda user_id: or_(Transaction.user_id_from == user_id, Transaction.user_id_to == user_id)
+    ),
+    'exchanges': ExportSource(
+        'exchanges',
+        [('id', 'int'), ('user_id_from', 'int'), ('user_id_to', 'int'),
+         ('currency_from', 'str'), ('currency_to', 'str'), ('amount_from', 'float'),
+         ('amount_to', 'float'), ('status', 'str'), ('created_date', 'datetime'),
+         ('completed_date', 'datetime')],
+        _exchanges_query,
+        Exchange.id,
+        Exchange.created_date,
+        lambda user_id: or_(Exchange.user_id_from == user_id, Exchange.user_id_to == user_id)
+    ),
+    'commissions': ExportSource(
+        'commissions',
+        [('id', 'int'), ('transaction_id', 'int'), ('amount', 'float'), ('type', 'str'),
+         ('user_id', 'int'), ('created_date', 'datetime')],
+        _commissions_query,
+        Commission.id,
+        Transaction.created_date,
+        lambda user_id: or_(Transaction.user_id_from == user_id, Transaction.user_id_to == user_id)
+    )
+}
+
+
+class CsvExportWriter:
+    extension = 'csv'
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for name, _ in columns])
+
+    def write_batch(self, rows):
+        self.writer.writerows(
+            [[value.isoformat() if isinstance(value, datetime) else value for value in row]
+             for row in rows]
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlExportWriter:
+    extension = 'jsonl'
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.names = [name for name, _ in columns]
+
+    def write_batch(self, rows):
+        self.file.write(''.join(
+            json.dumps(dict(zip(self.names, row)), ensure_ascii=False, default=str) + '\n'
+            for row in rows
+        ))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetExportWriter:
+    """Запись Parquet: один батч - одна row group"""
+
+    extension = 'parquet'
+
+    def __init__(self, path, columns):
+        if pyarrow is None:
+            raise RuntimeError("Для экспорта в Parquet установите pyarrow")
+
+        types = {
+            'int': pyarrow.int64(),
+            'float': pyarrow.float64(),
+            'str': pyarrow.string(),
+            'datetime': pyarrow.timestamp('us')
+        }
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='snappy')
+
+    def write_batch(self, rows):
+        arrays = {name: [row[index] for row in rows] for index, name in enumerate(self.schema.names)}
+        self.writer.write_table(pyarrow.Table.from_pydict(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+EXPORT_WRITERS = {
+    'csv': CsvExportWriter,
+    'jsonl': JsonlExportWriter,
+    'parquet': ParquetExportWriter
+}
+
+
+def _month_ranges(date_min, date_max):
+    """Границы месяцев [начало, конец), покрывающие период"""
+    start = datetime(date_min.year, date_min.month, 1)
+    while start <= date_max:
+        if start.month == 12:
+            end = datetime(start.year + 1, 1, 1)
+        else:
+            end = datetime(start.year, start.month + 1, 1)
+        yield start, end
+        start = end
+
+
+class BulkExporter:
+    """
+    Массовая выгрузка транзакций, обменов и комиссий
+
+    Строки читаются порциями по batch_size по возрастанию id (WHERE id > последний
+    LIMIT batch_size), каждая порция - отдельная короткая транзакция: выгрузка
+    не держит блокировку чтения SQLite и не мешает записи. Память ограничена
+    batch_size на каждый поток, а не размером таблицы.
+
+    При partition_by='month' каждая таблица делится на месячные партиции,
+    которые пишутся параллельно - каждая в свой файл и своей сессией. Внутри
+    месяца порции идут по индексу created_date (ключ created_date, id), так что
+    каждая партиция читает только свой диапазон, а не всю таблицу.
+    """
+
+    def __init__(self, database=db, batch_size=50000, max_workers=4):
+        self.database = database
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def _filters(self, source, date_from=None, date_to=None, user_id=None):
+        filters = []
+        if date_from:
+            filters.append(source.date_column >= date_from)
+        if date_to:
+            filters.append(source.date_column < date_to)
+        if user_id is not None:
+            filters.append(source.user_filter(user_id))
+        return filters
+
+    def _partitions(self, source, filters, partition_by):
+        """Список партиций (суффикс файла, доп. фильтры, порции по дате)"""
+        if partition_by != 'month':
+            return [("", [], False)]
+
+        session = self.database.get_session()
+        try:
+            date_min, date_max = (source.build_query(session)
+                                  .order_by(None)
+                                  .with_entities(func.min(source.date_column),
+                                                 func.max(source.date_column))
+                                  .filter(*filters)
+                                  .one())
+            has_undated = (source.build_query(session)
+                           .order_by(None)
+                           .with_entities(func.count())
+                           .filter(*filters, source.date_column.is_(None))
+                           .scalar())
+        finally:
+            session.close()
+
+        partitions = []
+        if date_min is not None:
+            for start, end in _month_ranges(date_min, date_max):
+                partitions.append((start.strftime("_%Y_%m"),
+                                   [source.date_column >= start, source.date_column < end], True))
+        if has_undated:
+            partitions.append(("_undated", [source.date_column.is_(None)], False))
+
+        return partitions
+
+    @staticmethod
+    def _normalize(row):
+        return tuple(value.value if isinstance(value, enum.Enum) else value for value in row)
+
+    def _export_partition(self, source, writer_class, path, filters, by_date=False):
+        started = time.perf_counter()
+        rows_written = 0
+
+        session = self.database.get_session()
+        writer = writer_class(path, source.columns)
+        try:
+            # Партиция месяца идет по индексу даты, остальные - по первичному ключу
+            key = (source.date_column, source.id_column) if by_date else (source.id_column,)
+            query = (source.build_query(session)
+                     .filter(*filters)
+                     .add_columns(*key)
+                     .order_by(None)
+                     .order_by(*key))
+
+            last = None
+            while True:
+                batch_query = query if last is None else query.filter(tuple_(*key) > last)
+                rows = batch_query.limit(self.batch_size).all()
+                # Короткая транзакция на порцию: между порциями база свободна для записи
+                session.commit()
+                if not rows:
+                    break
+
+                last = tuple(rows[-1][-len(key):])
+                writer.write_batch([self._normalize(row[:-len(key)]) for row in rows])
+                rows_written += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+        finally:
+            writer.close()
+            session.close()
+
+        return {
+            'table': source.name,
+            'file': os.path.basename(path),
+            'rows': rows_written,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+    def export(self, output_dir, tables=None, fmt='csv', date_from=None, date_to=None,
+               user_id=None, partition_by=None):
+        """
+        Выгрузка таблиц в папку
+
+        Args:
+            output_dir (str): Папка для файлов выгрузки
+            tables (list): Таблицы из EXPORT_SOURCES (по умолчанию - все)
+            fmt (str): csv, jsonl или parquet
+            date_from (datetime): Начало периода (включительно)
+            date_to (datetime): Конец периода (не включительно)
+            user_id (int): Только операции пользователя (отправитель или получатель)
+            partition_by (str): None - файл на таблицу, 'month' - файл на месяц
+
+        Returns:
+            dict: Манифест выгрузки (файлы, количество строк, время)
+        """
+        if fmt not in EXPORT_WRITERS:
+            raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+        tables = tables or list(EXPORT_SOURCES)
+        unknown = [name for name in tables if name not in EXPORT_SOURCES]
+        if unknown:
+            raise ValueError(f"Неизвестные таблицы: {', '.join(unknown)}")
+
+        writer_class = EXPORT_WRITERS[fmt]
+        if fmt == 'parquet' and pyarrow is None:
+            raise RuntimeError("Для экспорта в Parquet установите pyarrow")
+
+        os.makedirs(output_dir, exist_ok=True)
+        started = time.perf_counter()
+
+        tasks = []
+        for name in tables:
+            source = EXPORT_SOURCES[name]
+            filters = self._filters(source, date_from, date_to, user_id)
+            for suffix, partition_filters, by_date in self._partitions(source, filters, partition_by):
+                path = os.path.join(output_dir, f"{name}{suffix}.{writer_class.extension}")
+                tasks.append((source, writer_class, path, filters + partition_filters, by_date))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="export") as executor:
+            files = list(executor.map(lambda task: self._export_partition(*task), tasks))
+
+        manifest = {
+            'format': fmt,
+            'created': datetime.now().isoformat(),
+            'filters': {
+                'date_from': date_from.isoformat() if date_from else None,
+                'date_to': date_to.isoformat() if date_to else None,
+                'user_id': user_id
+            },
+            'files': files,
+            'rows': {name: sum(f['rows'] for f in files if f['table'] == name) for name in tables},
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+        with open(os.path.join(output_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        logger.info(f"📤 Выгрузка завершена: {sum(manifest['rows'].values())} строк, "
+                    f"{len(files)} файлов за {manifest['seconds']} с")
+        return manifest
+
+
+# Общий экспортер для панели администратора
+bulk_exporter = BulkExporter()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовая выгрузка транзакций, обменов и комиссий")
+    parser.add_argument("output", help="Папка для файлов выгрузки")
+    parser.add_argument("--format", dest="fmt", choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument("--tables", nargs='+', choices=list(EXPORT_SOURCES), default=None)
+    parser.add_argument("--from", dest="date_from", default=None, help="Начало периода (ISO)")
+    parser.add_argument("--to", dest="date_to", default=None, help="Конец периода (ISO, не включительно)")
+    parser.add_argument("--user", dest="user_id", type=int, default=None)
+    parser.add_argument("--partition", choices=['month'], default=None)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    exporter = BulkExporter(batch_size=args.batch_size, max_workers=args.workers)
+    manifest = exporter.export(
+        args.output,
+        tables=args.tables,
+        fmt=args.fmt,
+        date_from=datetime.fromisoformat(args.date_from) if args.date_from else None,
+        date_to=datetime.fromisoformat(args.date_to) if args.date_to else None,
+        user_id=args.user_id,
+        partition_by=args.partition
+    )
+
+    for entry in manifest['files']:
+        print(f"{entry['file']}: {entry['rows']} строк за {entry['seconds']} с")
+    print(f"Всего: {sum(manifest['rows'].values())} строк за {manifest['seconds']} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Массовая регистрация пользователей (перенос клиентской базы партнера)
+
+Результат тот же, что у register_user_transaction для каждой строки:
+пользователь, кошелек в каждой валюте со стартовым балансом и настройки
+интерфейса. Но строки идут порциями по chunk_size, каждая порция - одна
+транзакция: дубли по телефону и Telegram ID отсеиваются в памяти (внутри
+загрузки) и двумя запросами IN к базе, затем пользователи, кошельки и
+настройки вставляются пакетными INSERT (executemany).
+
+Если порцию не удалось вставить из-за уникальности (тот же телефон
+одновременно зарегистрировали в приложении), она повторяется по одной
+строке через register_user_transaction - отказ получает только конфликтная
+строка.
+
+Запуск: python -m bulk_onboarding users.csv --rejects rejects.csv
+(колонки CSV: phone, full_name, telegram_id)
+"""
+import csv
+import time
+import argparse
+from sqlalchemy.exc import IntegrityError
+from models import User, Wallet, Currency, UserInterface
+from database import db
+from transaction_utils import execute_in_transaction, register_user_transaction, INITIAL_WALLET_BALANCE
+from addresses import wallet_address
+import logging
+
+logger = logging.getLogger(__name__)
+
+CSV_COLUMNS = ('phone', 'full_name', 'telegram_id')
+REJECT_COLUMNS = ('line', 'phone', 'telegram_id', 'reason')
+
+# Ограничения колонок users
+MAX_PHONE_LENGTH = User.__table__.c.phone.type.length
+MAX_NAME_LENGTH = User.__table__.c.full_name.type.length
+MAX_TELEGRAM_ID_LENGTH = User.__table__.c.telegram_id.type.length
+
+
+def read_csv(path, delimiter=','):
+    """Строки CSV-файла как словари (заголовок - имена колонок)"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f, delimiter=delimiter)
+
+
+def _normalize(row):
+    """(phone, full_name, telegram_id) из словаря или кортежа; пустые значения - None"""
+    if isinstance(row, dict):
+        values = [row.get(column) for column in CSV_COLUMNS]
+    else:
+        values = (list(row) + [None] * len(CSV_COLUMNS))[:len(CSV_COLUMNS)]
+    return tuple(str(value).strip() or None if value is not None else None for value in values)
+
+
+def _validate(phone, full_name, telegram_id):
+    """Причина отказа или None"""
+    if not phone:
+        return "Не указан телефон"
+    if not full_name:
+        return "Не указано имя"
+    if len(phone) > MAX_PHONE_LENGTH:
+        return f"Телефон длиннее {MAX_PHONE_LENGTH} символов"
+    if len(full_name) > MAX_NAME_LENGTH:
+        return f"Имя длиннее {MAX_NAME_LENGTH} символов"
+    if telegram_id and len(telegram_id) > MAX_TELEGRAM_ID_LENGTH:
+        return f"Telegram ID длиннее {MAX_TELEGRAM_ID_LENGTH} символов"
+    return None
+
+
+class BulkRegistrar:
+    """Регистрация пользователей порциями (общий экземпляр - bulk_registrar)"""
+
+    def __init__(self, database=db, chunk_size=500, initial_balance=INITIAL_WALLET_BALANCE):
+        """
+        Args:
+            chunk_size (int): Строк в одной транзакции (и в одном запросе IN -
+                SQLite ограничивает число параметров запроса)
+            initial_balance (float): Стартовый баланс кошельков
+        """
+        self.db = database
+        self.chunk_size = chunk_size
+        self.initial_balance = initial_balance
+
+    def register(self, rows, on_progress=None):
+        """
+        Регистрация пользователей
+
+        Args:
+            rows (iterable): Словари с phone, full_name, telegram_id или
+                кортежи в том же порядке (например, read_csv(path))
+            on_progress (callable): on_progress(обработано строк, зарегистрировано)
+
+        Returns:
+            dict: registered, rejected (список отказов: line, phone,
+                telegram_id, reason), chunks, seconds, per_second
+        """
+        started = time.perf_counter()
+        result = {'registered': 0, 'rejected': [], 'chunks': 0}
+        currencies = self._currencies()
+
+        # Телефоны и Telegram ID, уже встреченные в этой загрузке: значение - номер строки
+        seen_phones = {}
+        seen_telegram_ids = {}
+        chunk = []
+        line = 0
+
+        for line, row in enumerate(rows, start=1):
+            phone, full_name, telegram_id = _normalize(row)
+            reason = _validate(phone, full_name, telegram_id)
+            if not reason and phone in seen_phones:
+                reason = f"Телефон повторяется (строка {seen_phones[phone]})"
+            if not reason and telegram_id and telegram_id in seen_telegram_ids:
+                reason = f"Telegram ID повторяется (строка {seen_telegram_ids[telegram_id]})"
+            if reason:
+                self._reject(result, line, phone, telegram_id, reason)
+                continue
+
+            seen_phones[phone] = line
+            if telegram_id:
+                seen_telegram_ids[telegram_id] = line
+            chunk.append((line, phone, full_name, telegram_id))
+
+            if len(chunk) >= self.chunk_size:
+                self._register_chunk(chunk, currencies, result)
+                chunk = []
+                if on_progress:
+                    on_progress(line, result['registered'])
+
+        if chunk:
+            self._register_chunk(chunk, currencies, result)
+            if on_progress:
+                on_progress(line, result['registered'])
+
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        result['per_second'] = round(result['registered'] / result['seconds'], 1) if result['seconds'] else None
+        logger.info(f"👥 Массовая регистрация: {result['registered']} пользователей, "
+                    f"{len(result['rejected'])} отказов за {result['seconds']} с "
+                    f"({result['per_second']}/с)")
+        return result
+
+    def register_csv(self, path, delimiter=',', on_progress=None):
+        return self.register(read_csv(path, delimiter), on_progress)
+
+    @staticmethod
+    def _reject(result, line, phone, telegram_id, reason):
+        result['rejected'].append({'line': line, 'phone': phone, 'telegram_id': telegram_id, 'reason': reason})
+
+    def _currencies(self):
+        session = self.db.get_session()
+        try:
+            return session.query(Currency.id, Currency.code).all()
+        finally:
+            session.close()
+
+    def _register_chunk(self, chunk, currencies, result):
+        """Одна транзакция на порцию; при конфликте уникальности - по одной строке"""
+        result['chunks'] += 1
+        rejected_before = len(result['rejected'])
+        session = self.db.get_session()
+        try:
+            accepted = self._drop_existing(session, chunk, result)
+            if accepted:
+                self._insert(session, accepted, currencies)
+            session.commit()
+            result['registered'] += len(accepted)
+            return
+        except IntegrityError as e:
+            session.rollback()
+            del result['rejected'][rejected_before:]  # Порция пойдет заново целиком
+            logger.warning(f"Конфликт при вставке порции, регистрируем по одному: {e.orig}")
+        except Exception as e:
+            session.rollback()
+            del result['rejected'][rejected_before:]
+            logger.error(f"Ошибка массовой регистрации: {e}")
+            for line, phone, _, telegram_id in chunk:
+                self._reject(result, line, phone, telegram_id, f"Ошибка базы данных: {e}")
+            return
+        finally:
+            session.close()
+
+        for line, phone, full_name, telegram_id in chunk:
+            try:
+                execute_in_transaction(register_user_transaction, phone, full_name, telegram_id)
+                result['registered'] += 1
+            except Exception as e:
+                self._reject(result, line, phone, telegram_id, str(e))
+
+    def _drop_existing(self, session, chunk, result):
+        """Строки порции без телефонов и Telegram ID, уже занятых в базе"""
+        phones = [phone for _, phone, _, _ in chunk]
+        telegram_ids = [telegram_id for _, _, _, telegram_id in chunk if telegram_id]
+
+        existing_phones = {phone for (phone,) in session.query(User.phone).filter(User.phone.in_(phones))}
+        existing_telegram_ids = set()
+        if telegram_ids:
+            existing_telegram_ids = {telegram_id for (telegram_id,) in
+                                     session.query(User.telegram_id).filter(User.telegram_id.in_(telegram_ids))}
+
+        accepted = []
+        for line, phone, full_name, telegram_id in chunk:
+            if phone in existing_phones:
+                self._reject(result, line, phone, telegram_id, "Пользователь с таким телефоном уже существует")
+            elif telegram_id in existing_telegram_ids:
+                self._reject(result, line, phone, telegram_id, "Telegram ID уже привязан к другому аккаунту")
+            else:
+                accepted.append((line, phone, full_name, telegram_id))
+        return accepted
+
+    def _insert(self, session, accepted, currencies):
+        """Пакетные INSERT пользователей, кошельков и настроек"""
+        connection = session.connection()
+        connection.execute(User.__table__.insert(), [
+            {'phone': phone, 'full_name': full_name, 'telegram_id': telegram_id}
+            for _, phone, full_name, telegram_id in accepted
+        ])
+
+        # id новых пользователей - по телефонам (executemany не возвращает ключи)
+        user_ids = [user_id for (user_id,) in
+                    session.query(User.id).filter(User.phone.in_([phone for _, phone, _, _ in accepted]))]
+
+        # Кошельки - только если есть стартовое зачисление (иначе создадутся при первом)
+        if self.initial_balance > 0:
+            connection.execute(Wallet.__table__.insert(), [
+                {'user_id': user_id, 'currency_id': currency_id,
+                 'address': wallet_address(code, user_id, currency_id), 'balance': self.initial_balance}
+                for user_id in user_ids
+                for currency_id, code in currencies
+            ])
+        connection.execute(UserInterface.__table__.insert(), [{'user_id': user_id} for user_id in user_ids])
+
+
+# Общая массовая регистрация
+bulk_registrar = BulkRegistrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовая регистрация пользователей из CSV")
+    parser.add_argument("path", help="CSV с колонками phone, full_name, telegram_id")
+    parser.add_argument("--delimiter", default=',')
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--rejects", default=None, help="Сохранить отказы в CSV")
+    args = parser.parse_args()
+
+    db.create_tables()
+    registrar = BulkRegistrar(chunk_size=args.chunk_size)
+    result = registrar.register_csv(
+        args.path, args.delimiter,
+        on_progress=lambda lines, registered: print(f"\r{lines} строк, зарегистрировано {registered}", end=""))
+    print()
+
+    if args.rejects:
+        with open(args.rejects, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=REJECT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(result['rejected'])
+
+    print(f"Зарегистрировано: {result['registered']}, отказов: {len(result['rejected'])} "
+          f"за {result['seconds']} с ({result['per_second']}/с)")
+
+
+if __name__ == "__main__":
+    main()
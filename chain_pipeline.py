@@ -0,0 +1,772 @@
+"""
+Пополнения и выводы через внешнюю сеть
+
+Поток событий сети (chain_simulator.py или узел с тем же протоколом) читает
+ChainClient, ChainPipeline разбирает его в одном рабочем потоке:
+- deposit - копятся и пишутся пачкой (batch_size событий или batch_delay
+  секунд): адреса пачки разбираются одним address_book.resolve_many, платежи
+  вставляются INSERT OR IGNORE по уникальному (txid, vout) - повторная
+  доставка ничего не меняет. Платежи на чужие адреса не сохраняются, меньше
+  Currency.min_deposit - сохраняются со статусом IGNORED;
+- block - платежи, набравшие confirmations подтверждений, зачисляются пачкой
+  в одной транзакции: условный UPDATE статуса PENDING -> CREDITED (зачисление
+  ровно один раз), балансы - одним executemany по кошелькам (недостающие
+  создаются), операции, дневные итоги и уведомления;
+- withdrawal - пакет вывода попал в блок: выводы и их операции завершены.
+
+Блок закрывается, только когда все его платежи записаны: при ошибке
+записи пачка повторяется, а высота последнего закрытого блока хранится в
+chain_state - после перезапуска подписка продолжается с него (повторно
+доставленные платежи отсеет уникальный ключ).
+
+Выводы: request_withdrawal списывает баланс и ставит вывод в очередь,
+broadcast_pending (задача планировщика) отправляет очередь пакетами по
+валюте - одна транзакция сети на пакет; неподтвержденные пакеты через
+rebroadcast_after секунд отправляются повторно с тем же batch_id.
+
+Метрики (stats(), раз в stats_interval - в лог): событий в секунду, время
+пачек, задержка зачисления (от времени блока) и вывода (от запроса).
+
+Запуск: python -m chain_pipeline (узел - WALLET_CHAIN_NODE, по умолчанию 127.0.0.1:18444)
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import socket
+import argparse
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import and_, bindparam, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import (ChainDeposit, ChainState, DepositStatus, Withdrawal, WithdrawalStatus, Transaction,
+                    TransactionType, Wallet, Currency, Notification)
+from database import db
+from addresses import address_book, parse_address, wallet_address
+from transaction_utils import transaction_session, find_wallet
+from instrumentation import instrumentation, OperationStats
+from event_bus import event_bus, DEPOSIT_CREDITED, WITHDRAWAL_COMPLETED, NOTIFICATION_CREATED
+from user_stats import user_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NODE = os.environ.get("WALLET_CHAIN_NODE", "127.0.0.1:18444")
+
+
+def _observe(stats, value):
+    """Значение в OperationStats (задержки - в секундах)"""
+    stats.count += 1
+    stats.total += value
+    stats.max = max(stats.max, value)
+    stats.samples.append(value)
+
+
+def _lag_dict(stats):
+    return {
+        'count': stats.count,
+        'avg_s': round(stats.total / stats.count, 3) if stats.count else None,
+        'p50_s': round(stats.quantile(0.5), 3),
+        'p99_s': round(stats.quantile(0.99), 3),
+        'max_s': round(stats.max, 3)
+    }
+
+
+class ChainClient:
+    """Подписка на события узла сети; при обрыве - переподключение с последней высоты"""
+
+    def __init__(self, node, on_message, from_height=lambda: 0, reconnect_delay=2.0):
+        host, _, port = node.rpartition(':')
+        self.address = (host, int(port))
+        self.on_message = on_message
+        self.from_height = from_height
+        self.reconnect_delay = reconnect_delay
+        self._socket = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="chain-client", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            if self._socket:
+                self._socket.close()
+
+    def send(self, message):
+        """Отправка сообщения узлу; False - нет соединения"""
+        with self._lock:
+            if not self._socket:
+                return False
+            try:
+                self._socket.sendall((json.dumps(message) + "\n").encode('utf-8'))
+                return True
+            except OSError as e:
+                logger.error(f"Ошибка отправки узлу сети: {e}")
+                return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                connection = socket.create_connection(self.address, timeout=5)
+                connection.settimeout(None)
+                with self._lock:
+                    self._socket = connection
+                self.send({'type': 'subscribe', 'from_height': self.from_height()})
+                logger.info(f"Подключено к узлу сети {self.address[0]}:{self.address[1]}")
+
+                for raw in connection.makefile('rb'):
+                    self.on_message(json.loads(raw))
+            except (OSError, ValueError) as e:
+                if not self._stop.is_set():
+                    logger.warning(f"Соединение с узлом сети: {e}")
+            finally:
+                with self._lock:
+                    if self._socket:
+                        self._socket.close()
+                    self._socket = None
+            self._stop.wait(self.reconnect_delay)
+
+
+class ChainPipeline:
+    """Прием пополнений и отправка выводов (общий экземпляр - chain_pipeline)"""
+
+    def __init__(self, database=db, node=DEFAULT_NODE, confirmations=3, batch_size=500, batch_delay=0.2,
+                 credit_batch=500, withdrawal_batch=100, rebroadcast_after=300, retry_delay=1.0, stats_interval=60):
+        """
+        Args:
+            confirmations (int): Блоков до зачисления пополнения (включая блок платежа)
+            batch_size (int): Событий пополнения в одной записи
+            batch_delay (float): Наибольшее ожидание неполной пачки, секунды
+            credit_batch (int): Пополнений в одной транзакции зачисления
+            withdrawal_batch (int): Выводов в одном пакете сети
+            rebroadcast_after (float): Через сколько секунд без подтверждения пакет
+                выводов отправляется повторно (с тем же batch_id)
+            retry_delay (float): Пауза перед повтором неудавшейся записи пачки, секунды
+            stats_interval (float): Период записи метрик в лог, секунды (0 - не писать)
+        """
+        self.db = database
+        self.confirmations = confirmations
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.credit_batch = credit_batch
+        self.withdrawal_batch = withdrawal_batch
+        self.rebroadcast_after = rebroadcast_after
+        self.retry_delay = retry_delay
+        self.stats_interval = stats_interval
+        self.node = node
+        # Последний блок, платежи которого записаны полностью
+        self.tip = 0
+
+        self.client = ChainClient(node, self._enqueue, from_height=lambda: self.tip)
+        self._events = queue.Queue()
+        self._currencies = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+
+        self.counters = dict.fromkeys(('events', 'deposits', 'foreign', 'duplicates', 'below_minimum', 'credited',
+                                       'withdrawals_queued', 'withdrawals_broadcast', 'withdrawals_rebroadcast',
+                                       'withdrawals_confirmed', 'errors'), 0)
+        self.ingest_stats = OperationStats()
+        self.deposit_lag = OperationStats()
+        self.withdrawal_lag = OperationStats()
+
+    # ---- поток событий ----
+
+    def start(self):
+        """Чтение событий узла в фоне - с блока после последнего полностью записанного"""
+        session = self.db.get_session()
+        try:
+            state = session.query(ChainState).get(self.node)
+            self.tip = state.height if state else 0
+        finally:
+            session.close()
+
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="chain-pipeline", daemon=True)
+        self._thread.start()
+        self.client.start()
+
+    def stop(self, timeout=5):
+        self.client.stop()
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _enqueue(self, message):
+        self._events.put(message)
+
+    def _run(self):
+        deposits = []
+        deadline = None
+        # Блок, платежи которого еще не записаны: новые события не читаем, пока он не закрыт
+        block = None
+        next_stats = time.monotonic() + self.stats_interval
+
+        while not self._stop.is_set():
+            flush_due = deposits and (len(deposits) >= self.batch_size or time.monotonic() >= deadline)
+            if block is None and not flush_due:
+                timeout = max(0.0, deadline - time.monotonic()) if deposits else 1.0
+                try:
+                    message = self._events.get(timeout=timeout)
+                except queue.Empty:
+                    message = None
+
+                if message:
+                    self.counters['events'] += 1
+                    kind = message.get('type')
+                    if kind == 'deposit':
+                        if not deposits:
+                            deadline = time.monotonic() + self.batch_delay
+                        deposits.append(message)
+                    elif kind == 'block':
+                        block = message
+                    elif kind == 'withdrawal':
+                        # При ошибке пакет останется BROADCAST и уйдет повторно (broadcast_pending)
+                        self.complete_withdrawals(message['batch_id'], message['txid'])
+
+            flush_due = deposits and (len(deposits) >= self.batch_size or time.monotonic() >= deadline)
+            try:
+                if block is not None or flush_due:
+                    # Пачка не записана - держим ее и блок и повторяем: иначе платежи потеряются
+                    if deposits and self.ingest(deposits) is None:
+                        self._stop.wait(self.retry_delay)
+                        continue
+                    deposits = []
+
+                if block is not None:
+                    # Платежи блока пришли до него и записаны - блок закрыт
+                    if not self._save_tip(block['height']):
+                        self._stop.wait(self.retry_delay)
+                        continue
+                    block = None
+                    self.credit_confirmed()
+            except Exception as e:
+                self.counters['errors'] += 1
+                logger.error(f"Ошибка обработки события сети: {e}")
+                self._stop.wait(self.retry_delay)
+
+            if self.stats_interval and time.monotonic() >= next_stats:
+                next_stats = time.monotonic() + self.stats_interval
+                self.log_stats()
+
+    def _save_tip(self, height):
+        """Запоминает последний полностью записанный блок (переживает перезапуск)"""
+        session = self.db.get_session()
+        try:
+            stmt = sqlite_insert(ChainState).values(node=self.node, height=height, updated_date=datetime.now())
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=['node'], set_={'height': stmt.excluded.height,
+                                               'updated_date': stmt.excluded.updated_date}))
+            session.commit()
+            self.tip = height
+            return True
+        except Exception as e:
+            session.rollback()
+            self.counters['errors'] += 1
+            logger.error(f"Ошибка сохранения высоты блока: {e}")
+            return False
+        finally:
+            session.close()
+
+    def _currency(self, session, currency_id):
+        """(код, min_deposit, min_withdrawal) валюты"""
+        currency = self._currencies.get(currency_id)
+        if currency is None:
+            self._currencies = {row[0]: tuple(row[1:]) for row in session.query(
+                Currency.id, Currency.code, Currency.min_deposit, Currency.min_withdrawal)}
+            currency = self._currencies.get(currency_id)
+        return currency
+
+    # ---- пополнения ----
+
+    def ingest(self, events):
+        """
+        Запись пачки событий пополнения (повторно доставленные не меняются)
+
+        Returns:
+            int: Новых пополнений наших пользователей или None - ошибка записи
+                (пачку нужно повторить)
+        """
+        if not events:
+            return 0
+
+        started = time.perf_counter()
+        with instrumentation.operation("chain.ingest"):
+            session = self.db.get_session()
+            try:
+                resolved = address_book.resolve_many(session, [event['address'] for event in events])
+
+                rows = {}
+                foreign = 0
+                for event in events:
+                    match = resolved.get(event['address'])
+                    if not match or match[0].currency_code != event.get('currency'):
+                        foreign += 1
+                        continue
+
+                    info = match[0]
+                    amount = float(event['amount'])
+                    _, min_deposit, _ = self._currency(session, info.currency_id)
+                    status = DepositStatus.PENDING
+                    if amount <= 0 or amount < (min_deposit or 0.0):
+                        status = DepositStatus.IGNORED
+                    rows[(event['txid'], int(event.get('vout', 0)))] = {
+                        'txid': event['txid'],
+                        'vout': int(event.get('vout', 0)),
+                        'address': event['address'],
+                        'user_id': info.user_id,
+                        'currency_id': info.currency_id,
+                        'amount': amount,
+                        'block_height': event['height'],
+                        'block_time': datetime.fromtimestamp(event['time']) if event.get('time') else None,
+                        'status': status
+                    }
+
+                inserted = 0
+                if rows:
+                    result = session.connection().execute(
+                        ChainDeposit.__table__.insert().prefix_with("OR IGNORE"), list(rows.values()))
+                    inserted = result.rowcount if result.rowcount >= 0 else len(rows)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                self.counters['errors'] += 1
+                logger.error(f"Ошибка записи пополнений: {e}")
+                return None
+            finally:
+                session.close()
+
+        _observe(self.ingest_stats, time.perf_counter() - started)
+        self.counters['foreign'] += foreign
+        self.counters['deposits'] += inserted
+        # Повторы внутри пачки и уже записанные ранее
+        self.counters['duplicates'] += len(events) - foreign - inserted
+        self.counters['below_minimum'] += sum(1 for row in rows.values() if row['status'] == DepositStatus.IGNORED)
+        return inserted
+
+    def credit_confirmed(self):
+        """
+        Зачисление пополнений, набравших confirmations подтверждений
+
+        Returns:
+            int: Зачислено пополнений
+        """
+        max_height = self.tip - self.confirmations + 1
+        total = 0
+        while True:
+            credited = self._credit_batch(max_height)
+            total += credited
+            if credited < self.credit_batch:
+                return total
+
+    def _credit_batch(self, max_height):
+        with instrumentation.operation("chain.credit"):
+            session = self.db.get_session()
+            try:
+                deposits = (session.query(ChainDeposit.id, ChainDeposit.user_id, ChainDeposit.currency_id,
+                                          ChainDeposit.amount, ChainDeposit.block_time)
+                            .filter(ChainDeposit.status == DepositStatus.PENDING,
+                                    ChainDeposit.block_height <= max_height)
+                            .order_by(ChainDeposit.id)
+                            .limit(self.credit_batch)
+                            .all())
+                if not deposits:
+                    return 0
+
+                now = datetime.now()
+                ids = [deposit.id for deposit in deposits]
+                # Только PENDING: пополнение зачисляется один раз, даже если его уже взял другой процесс
+                claimed = (session.query(ChainDeposit)
+                           .filter(ChainDeposit.id.in_(ids), ChainDeposit.status == DepositStatus.PENDING)
+                           .update({ChainDeposit.status: DepositStatus.CREDITED, ChainDeposit.credited_date: now},
+                                   synchronize_session=False))
+                if claimed != len(ids):
+                    raise RuntimeError("пополнения уже зачисляются другим обработчиком")
+
+                totals = defaultdict(float)
+                for deposit in deposits:
+                    totals[(deposit.user_id, deposit.currency_id)] += deposit.amount
+                self._add_balances(session, totals)
+
+                transactions = [Transaction(type=TransactionType.DEPOSIT, user_id_to=deposit.user_id,
+                                            amount=deposit.amount, currency_id=deposit.currency_id,
+                                            status='completed', created_date=now)
+                                for deposit in deposits]
+                session.add_all(transactions)
+                session.flush()
+
+                session.connection().execute(
+                    ChainDeposit.__table__.update()
+                    .where(ChainDeposit.id == bindparam('deposit_id'))
+                    .values(transaction_id=bindparam('transaction_id')),
+                    [{'deposit_id': deposit.id, 'transaction_id': transaction.id}
+                     for deposit, transaction in zip(deposits, transactions)])
+
+                notifications = []
+                for transaction in transactions:
+                    user_stats.record_transfer(session, transaction)
+                    code = self._currency(session, transaction.currency_id)[0]
+                    notifications.append(Notification(
+                        user_id=transaction.user_id_to,
+                        type='transaction',
+                        title='Пополнение зачислено',
+                        message=f'На ваш кошелек зачислено {transaction.amount:.6f} {code}',
+                        transaction_id=transaction.id,
+                        priority=2,
+                        created_date=now
+                    ))
+                session.add_all(notifications)
+                session.flush()
+
+                # До commit: после него объекты сессии устаревают
+                payloads = [self._transaction_payload(transaction) for transaction in transactions]
+                notification_payloads = [self._notification_payload(notification) for notification in notifications]
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                self.counters['errors'] += 1
+                logger.error(f"Ошибка зачисления пополнений: {e}")
+                return 0
+            finally:
+                session.close()
+
+        for deposit in deposits:
+            if deposit.block_time:
+                _observe(self.deposit_lag, (now - deposit.block_time).total_seconds())
+        self.counters['credited'] += len(deposits)
+
+        for payload in payloads:
+            event_bus.publish(DEPOSIT_CREDITED, payload)
+        for payload in notification_payloads:
+            event_bus.publish(NOTIFICATION_CREATED, payload)
+        return len(deposits)
+
+    def _add_balances(self, session, totals):
+        """Зачисление сумм {(пользователь, валюта): сумма}: UPDATE существующих кошельков, INSERT новых"""
+        keys = list(totals)
+        existing = set()
+        for start in range(0, len(keys), address_book.LOOKUP_CHUNK):
+            chunk = keys[start:start + address_book.LOOKUP_CHUNK]
+            existing.update(session.query(Wallet.user_id, Wallet.currency_id)
+                            .filter(tuple_(Wallet.user_id, Wallet.currency_id).in_(chunk)))
+
+        connection = session.connection()
+        updates = [{'wallet_user_id': user_id, 'wallet_currency_id': currency_id,
+                    'amount': totals[(user_id, currency_id)]}
+                   for user_id, currency_id in keys if (user_id, currency_id) in existing]
+        if updates:
+            result = connection.execute(
+                Wallet.__table__.update()
+                .where(and_(Wallet.user_id == bindparam('wallet_user_id'),
+                            Wallet.currency_id == bindparam('wallet_currency_id')))
+                .values(balance=Wallet.balance + bindparam('amount')),
+                updates)
+            # Кошелек удален между чтением и UPDATE (prune_empty_wallets) - пачка повторится со следующим блоком
+            if result.rowcount >= 0 and result.rowcount != len(updates):
+                raise RuntimeError("кошелек удален во время зачисления")
+
+        inserts = [{'user_id': user_id, 'currency_id': currency_id,
+                    'address': wallet_address(self._currency(session, currency_id)[0], user_id, currency_id),
+                    'balance': totals[(user_id, currency_id)]}
+                   for user_id, currency_id in keys if (user_id, currency_id) not in existing]
+        if inserts:
+            connection.execute(Wallet.__table__.insert(), inserts)
+
+    # ---- выводы ----
+
+    def request_withdrawal(self, user_id, currency_id, address, amount):
+        """
+        Вывод на внешний адрес: баланс списывается сразу, отправка - пакетом
+
+        Returns:
+            int: id вывода
+
+        Raises:
+            ValueError: Вывод невозможен (причина - в тексте)
+        """
+        address = (address or '').strip()
+        if not address or len(address) > Withdrawal.__table__.c.address.type.length:
+            raise ValueError("Некорректный адрес")
+        if parse_address(address):
+            raise ValueError("Адрес принадлежит кошельку приложения - используйте перевод")
+
+        with transaction_session() as session:
+            currency = session.query(Currency).get(currency_id)
+            if not currency:
+                raise ValueError("Валюта не найдена")
+            if amount <= 0 or amount < (currency.min_withdrawal or 0.0):
+                raise ValueError(f"Минимальная сумма вывода: {currency.min_withdrawal} {currency.code}")
+
+            wallet = find_wallet(session, user_id, currency_id, for_update=True)
+            if not wallet or wallet.balance < amount:
+                raise ValueError("Недостаточно средств")
+            wallet.balance -= amount
+
+            now = datetime.now()
+            transaction = Transaction(type=TransactionType.WITHDRAWAL, user_id_from=user_id, amount=amount,
+                                      currency_id=currency_id, status='pending', created_date=now)
+            session.add(transaction)
+            session.flush()
+
+            withdrawal = Withdrawal(user_id=user_id, currency_id=currency_id, address=address, amount=amount,
+                                    transaction_id=transaction.id, created_date=now)
+            session.add(withdrawal)
+            session.flush()
+            withdrawal_id = withdrawal.id
+
+        self.counters['withdrawals_queued'] += 1
+        return withdrawal_id
+
+    def broadcast_pending(self):
+        """
+        Отправка очереди выводов пакетами по withdrawal_batch (по валютам)
+
+        Пакет помечается отправленным до отправки: сбой между ними оставит
+        вывод в BROADCAST, но не отправит его дважды. Пакеты, не подтвержденные
+        за rebroadcast_after секунд (узел мог их потерять), отправляются
+        повторно с тем же batch_id - сеть подтвердит пакет один раз, а
+        complete_withdrawals завершает только выводы в BROADCAST.
+
+        Returns:
+            int: Отправлено выводов
+        """
+        sent = 0
+        with instrumentation.operation("chain.broadcast"):
+            session = self.db.get_session()
+            try:
+                self._rebroadcast_stale(session)
+
+                currency_ids = [currency_id for (currency_id,) in
+                                session.query(Withdrawal.currency_id)
+                                .filter(Withdrawal.status == WithdrawalStatus.QUEUED).distinct()]
+                for currency_id in currency_ids:
+                    while True:
+                        batch = (session.query(Withdrawal.id, Withdrawal.address, Withdrawal.amount)
+                                 .filter(Withdrawal.status == WithdrawalStatus.QUEUED,
+                                         Withdrawal.currency_id == currency_id)
+                                 .order_by(Withdrawal.id)
+                                 .limit(self.withdrawal_batch)
+                                 .all())
+                        if not batch:
+                            break
+
+                        batch_id = uuid.uuid4().hex
+                        (session.query(Withdrawal)
+                         .filter(Withdrawal.id.in_([row.id for row in batch]),
+                                 Withdrawal.status == WithdrawalStatus.QUEUED)
+                         .update({Withdrawal.status: WithdrawalStatus.BROADCAST, Withdrawal.batch_id: batch_id,
+                                  Withdrawal.broadcast_date: datetime.now()}, synchronize_session=False))
+                        session.commit()
+
+                        if not self.client.send({
+                            'type': 'broadcast',
+                            'batch_id': batch_id,
+                            'currency': self._currency(session, currency_id)[0],
+                            'outputs': [{'address': row.address, 'amount': row.amount} for row in batch]
+                        }):
+                            # Узел недоступен - пакет вернется в очередь до следующего запуска
+                            (session.query(Withdrawal).filter(Withdrawal.batch_id == batch_id)
+                             .update({Withdrawal.status: WithdrawalStatus.QUEUED, Withdrawal.batch_id: None,
+                                      Withdrawal.broadcast_date: None}, synchronize_session=False))
+                            session.commit()
+                            return sent
+
+                        sent += len(batch)
+                        self.counters['withdrawals_broadcast'] += len(batch)
+                        if len(batch) < self.withdrawal_batch:
+                            break
+            except Exception as e:
+                session.rollback()
+                self.counters['errors'] += 1
+                logger.error(f"Ошибка отправки выводов: {e}")
+            finally:
+                session.close()
+        return sent
+
+    def _rebroadcast_stale(self, session):
+        """Повторная отправка пакетов, не подтвержденных дольше rebroadcast_after"""
+        cutoff = datetime.now() - timedelta(seconds=self.rebroadcast_after)
+        rows = (session.query(Withdrawal.batch_id, Withdrawal.currency_id, Withdrawal.address, Withdrawal.amount)
+                .filter(Withdrawal.status == WithdrawalStatus.BROADCAST, Withdrawal.broadcast_date < cutoff)
+                .order_by(Withdrawal.batch_id, Withdrawal.id)
+                .all())
+
+        batches = defaultdict(list)
+        for row in rows:
+            batches[(row.batch_id, row.currency_id)].append(row)
+
+        resent = 0
+        for (batch_id, currency_id), batch in batches.items():
+            if not self.client.send({
+                'type': 'broadcast',
+                'batch_id': batch_id,
+                'currency': self._currency(session, currency_id)[0],
+                'outputs': [{'address': row.address, 'amount': row.amount} for row in batch]
+            }):
+                break
+            (session.query(Withdrawal)
+             .filter(Withdrawal.batch_id == batch_id, Withdrawal.status == WithdrawalStatus.BROADCAST)
+             .update({Withdrawal.broadcast_date: datetime.now()}, synchronize_session=False))
+            session.commit()
+            resent += len(batch)
+            logger.warning(f"Пакет выводов {batch_id} не подтвержден за {self.rebroadcast_after} с, "
+                           f"отправлен повторно")
+
+        self.counters['withdrawals_rebroadcast'] += resent
+        return resent
+
+    def complete_withdrawals(self, batch_id, txid):
+        """
+        Пакет вывода подтвержден сетью
+
+        Returns:
+            int: Завершено выводов
+        """
+        with instrumentation.operation("chain.withdrawals"):
+            session = self.db.get_session()
+            try:
+                withdrawals = (session.query(Withdrawal.id, Withdrawal.created_date, Withdrawal.transaction_id)
+                               .filter(Withdrawal.batch_id == batch_id,
+                                       Withdrawal.status == WithdrawalStatus.BROADCAST)
+                               .all())
+                if not withdrawals:
+                    return 0
+
+                now = datetime.now()
+                (session.query(Withdrawal)
+                 .filter(Withdrawal.id.in_([row.id for row in withdrawals]))
+                 .update({Withdrawal.status: WithdrawalStatus.CONFIRMED, Withdrawal.txid: txid,
+                          Withdrawal.confirmed_date: now}, synchronize_session=False))
+
+                transactions = (session.query(Transaction)
+                                .filter(Transaction.id.in_([row.transaction_id for row in withdrawals]))
+                                .all())
+                notifications = []
+                for transaction in transactions:
+                    transaction.status = 'completed'
+                    user_stats.record_transfer(session, transaction)
+                    code = self._currency(session, transaction.currency_id)[0]
+                    notifications.append(Notification(
+                        user_id=transaction.user_id_from,
+                        type='transaction',
+                        title='Вывод выполнен',
+                        message=f'Вывод {transaction.amount:.6f} {code} подтвержден сетью',
+                        transaction_id=transaction.id,
+                        priority=2,
+                        created_date=now
+                    ))
+                session.add_all(notifications)
+                session.flush()
+
+                payloads = [self._transaction_payload(transaction) for transaction in transactions]
+                notification_payloads = [self._notification_payload(notification) for notification in notifications]
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                self.counters['errors'] += 1
+                logger.error(f"Ошибка завершения выводов: {e}")
+                return 0
+            finally:
+                session.close()
+
+        for row in withdrawals:
+            if row.created_date:
+                _observe(self.withdrawal_lag, (now - row.created_date).total_seconds())
+        self.counters['withdrawals_confirmed'] += len(withdrawals)
+
+        for payload in payloads:
+            event_bus.publish(WITHDRAWAL_COMPLETED, payload)
+        for payload in notification_payloads:
+            event_bus.publish(NOTIFICATION_CREATED, payload)
+        return len(withdrawals)
+
+    # ---- события и метрики ----
+
+    @staticmethod
+    def _transaction_payload(transaction):
+        return {
+            'transaction_id': transaction.id,
+            'user_id_from': transaction.user_id_from,
+            'user_id_to': transaction.user_id_to,
+            'currency_id': transaction.currency_id,
+            'amount': transaction.amount,
+            'status': transaction.status
+        }
+
+    @staticmethod
+    def _notification_payload(notification):
+        """Как в Database.create_notification (здесь уведомления создаются пачкой)"""
+        return {
+            'id': notification.id,
+            'user_id': notification.user_id,
+            'type': notification.type,
+            'title': notification.title,
+            'message': notification.message,
+            'transaction_id': notification.transaction_id,
+            'exchange_id': None,
+            'priority': notification.priority,
+            'created_date': notification.created_date.isoformat()
+        }
+
+    def stats(self):
+        """Счетчики, пропускная способность приема и задержки зачисления и вывода"""
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        ingest = self.ingest_stats
+        return {
+            **self.counters,
+            'tip': self.tip,
+            'backlog': self._events.qsize(),
+            'events_per_sec': round(self.counters['events'] / elapsed, 1) if elapsed else None,
+            'ingest_batches': ingest.count,
+            # Сколько событий пополнения запись успевает разобрать (без ожидания блоков)
+            'ingest_capacity_per_sec': round((self.counters['deposits'] + self.counters['duplicates'] +
+                                              self.counters['foreign']) / ingest.total, 1) if ingest.total else None,
+            'ingest_batch_p50_ms': round(ingest.quantile(0.5) * 1000, 3),
+            'ingest_batch_p99_ms': round(ingest.quantile(0.99) * 1000, 3),
+            'deposit_lag': _lag_dict(self.deposit_lag),
+            'withdrawal_lag': _lag_dict(self.withdrawal_lag)
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(f"⛓ Сеть: блок {stats['tip']}, {stats['events_per_sec']} событий/с, "
+                    f"очередь {stats['backlog']}, зачислено {stats['credited']}, "
+                    f"задержка зачисления p50 {stats['deposit_lag']['p50_s']} с / "
+                    f"p99 {stats['deposit_lag']['p99_s']} с, выводов подтверждено "
+                    f"{stats['withdrawals_confirmed']}")
+
+
+# Общий конвейер пополнений и выводов
+chain_pipeline = ChainPipeline()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прием пополнений и отправка выводов")
+    parser.add_argument("--node", default=DEFAULT_NODE, help="Узел сети host:port")
+    parser.add_argument("--confirmations", type=int, default=3)
+    parser.add_argument("--broadcast-interval", type=float, default=10.0, help="Период отправки выводов, секунды")
+    parser.add_argument("--stats-interval", type=float, default=10.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db.create_tables()
+    pipeline = ChainPipeline(node=args.node, confirmations=args.confirmations, stats_interval=args.stats_interval)
+    pipeline.start()
+    try:
+        while True:
+            time.sleep(args.broadcast_interval)
+            pipeline.broadcast_pending()
+    except KeyboardInterrupt:
+        pipeline.stop()
+    print(json.dumps(pipeline.stats(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Локальный симулятор сети для конвейера пополнений и выводов (chain_pipeline.py)
+
+Отдельный процесс: раз в --block-interval секунд "добывает" блок с
+входящими платежами (около --rate в секунду) на адреса пользователей из
+базы и на чужие адреса (доля --foreign), часть платежей доставляет повторно
+(доля --duplicates) - как узел после переподключения. Отправленные пакеты
+выводов попадают в следующий блок.
+
+Протокол - TCP, JSON по сообщению на строку:
+  клиент -> {"type": "subscribe", "from_height": N}
+            события блоков выше N (из последних --history блоков), затем новые
+  сеть   -> {"type": "deposit", "txid", "vout", "address", "currency", "amount", "height", "time"}
+  сеть   -> {"type": "withdrawal", "batch_id", "txid", "height", "time"}
+  сеть   -> {"type": "block", "height", "time"} - после событий блока
+  клиент -> {"type": "broadcast", "batch_id", "currency", "outputs": [{"address", "amount"}]}
+
+Запуск: python -m chain_simulator --rate 200 --block-interval 1
+"""
+import json
+import time
+import random
+import socket
+import hashlib
+import argparse
+import threading
+from collections import deque
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 18444
+
+
+def _line(message):
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+class ChainSimulator:
+    """Генерация блоков и раздача их событий подписчикам"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, rate=100.0, block_interval=1.0,
+                 foreign=0.2, duplicates=0.02, history=1000, seed=42):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.block_interval = block_interval
+        self.foreign = foreign
+        self.duplicates = duplicates
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.height = 0
+
+        # (высота, строки событий блока) - для подписки с прошлой высоты
+        self._history = deque(maxlen=history)
+        self._recent_deposits = deque(maxlen=10000)
+        self._broadcasts = []
+        self._clients = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+        self._user_ids = []
+        self._currencies = []
+
+    def load_addresses(self):
+        """Пользователи и валюты из базы приложения - из них строятся адреса платежей"""
+        from database import db
+        from models import User, Currency
+
+        session = db.get_session()
+        try:
+            self._user_ids = [user_id for (user_id,) in session.query(User.id)]
+            self._currencies = session.query(Currency.id, Currency.code).all()
+        finally:
+            session.close()
+        logger.info(f"Симулятор: {len(self._user_ids)} пользователей, {len(self._currencies)} валют")
+
+    # ---- блоки ----
+
+    def _deposit(self, block_time, index):
+        from addresses import wallet_address
+
+        currency_id, code = self.random.choice(self._currencies)
+        if not self._user_ids or self.random.random() < self.foreign:
+            address = f"{code}_{self.random.getrandbits(130):033x}"
+        else:
+            address = wallet_address(code, self.random.choice(self._user_ids), currency_id)
+
+        txid = hashlib.sha256(f"{self.seed}:{self.height}:{index}".encode()).hexdigest()
+        return {'type': 'deposit', 'txid': txid, 'vout': self.random.randrange(3), 'address': address,
+                'currency': code, 'amount': round(self.random.lognormvariate(-2.0, 1.5), 8),
+                'height': self.height, 'time': block_time}
+
+    def mine_block(self):
+        """Новый блок: платежи, подтверждения отправленных пакетов и сам блок"""
+        self.height += 1
+        block_time = time.time()
+        messages = []
+
+        if self._currencies:
+            expected = self.rate * self.block_interval
+            count = int(expected) + (1 if self.random.random() < expected % 1 else 0)
+            for index in range(count):
+                if self._recent_deposits and self.random.random() < self.duplicates:
+                    messages.append(self.random.choice(self._recent_deposits))
+                    continue
+                deposit = self._deposit(block_time, index)
+                self._recent_deposits.append(deposit)
+                messages.append(deposit)
+
+        with self._lock:
+            broadcasts, self._broadcasts = self._broadcasts, []
+        for batch in broadcasts:
+            txid = hashlib.sha256(f"withdrawal:{batch['batch_id']}".encode()).hexdigest()
+            messages.append({'type': 'withdrawal', 'batch_id': batch['batch_id'], 'txid': txid,
+                             'height': self.height, 'time': block_time})
+
+        messages.append({'type': 'block', 'height': self.height, 'time': block_time})
+        data = b"".join(_line(message) for message in messages)
+
+        with self._lock:
+            self._history.append((self.height, data))
+            clients = list(self._clients)
+        for client in clients:
+            self._send(client, data)
+
+    def _send(self, client, data):
+        try:
+            client.sendall(data)
+        except OSError:
+            with self._lock:
+                if client in self._clients:
+                    self._clients.remove(client)
+            client.close()
+
+    # ---- подписчики ----
+
+    def _handle_client(self, client):
+        try:
+            for raw in client.makefile('rb'):
+                message = json.loads(raw)
+                if message.get('type') == 'subscribe':
+                    from_height = message.get('from_height') or 0
+                    # Под блокировкой: новый блок не проскочит между историей и подпиской
+                    with self._lock:
+                        for height, data in self._history:
+                            if height > from_height:
+                                client.sendall(data)
+                        self._clients.append(client)
+                elif message.get('type') == 'broadcast':
+                    with self._lock:
+                        self._broadcasts.append(message)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Подписчик отключился: {e}")
+        finally:
+            with self._lock:
+                if client in self._clients:
+                    self._clients.remove(client)
+            client.close()
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle_client, args=(client,), daemon=True).start()
+
+    def run(self):
+        """Прием подписчиков и добыча блоков до stop()"""
+        self._server = socket.create_server((self.host, self.port))
+        threading.Thread(target=self._accept, daemon=True).start()
+        logger.info(f"Симулятор сети слушает {self.host}:{self.port}")
+
+        next_block = time.monotonic() + self.block_interval
+        try:
+            while not self._stop.wait(max(0.0, next_block - time.monotonic())):
+                self.mine_block()
+                next_block += self.block_interval
+        finally:
+            self._server.close()
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--rate", type=float, default=100.0, help="Платежей в секунду")
+    parser.add_argument("--block-interval", type=float, default=1.0, help="Секунд между блоками")
+    parser.add_argument("--foreign", type=float, default=0.2, help="Доля платежей на чужие адреса")
+    parser.add_argument("--duplicates", type=float, default=0.02, help="Доля повторных доставок")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = ChainSimulator(args.host, args.port, args.rate, args.block_interval, args.foreign,
+                               args.duplicates, seed=args.seed)
+    simulator.load_addresses()
+    try:
+        simulator.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
-from sqlalchemy import create_engine, func, text
+from sqlalchemy import create_engine, func, text, event, bindparam
 from sqlalchemy.orm import sessionmaker
-from models import Base, Session, Notification, UserInterface, User, UserRole
+from models import Base, Session, SessionStatus, Notification, NotificationCounter, UserInterface, User, UserRole
 from datetime import datetime, timedelta
+from backup_retention import RetentionPolicy, RetentionEngine
+from backup_catalog import copy_database
+from instrumentation import instrumentation
+from event_bus import event_bus, NOTIFICATION_CREATED
 import os
-import shutil
+import secrets
+import time
 
 
 class Database:
@@ -11,11 +16,20 @@ class Database:
         self.engine = create_engine(db_url)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         self.func = func
+        self.wal_mode = False
+        self.wal_autocheckpoint = True
+        # Время и число SQL-запросов по операциям приложения
+        instrumentation.install(self.engine)
 
     def create_tables(self):
         Base.metadata.create_all(bind=self.engine)
         print("Таблицы базы данных проверены/созданы")
         self.migrate_user_roles()
+        self.migrate_notifications()
+        self.migrate_sessions()
+        self.migrate_wallets()
+        self.migrate_transactions()
+        self.migrate_export_indexes()
 
     def migrate_user_roles(self):
         """Миграция для добавления ролей пользователей"""
@@ -50,9 +64,216 @@ class Database:
         finally:
             session.close()
 
+    # Счетчик непрочитанных: +1 при вставке непрочитанного, -1 при прочтении или удалении
+    NOTIFICATION_COUNTER_TRIGGERS = {
+        "notifications_unread_insert": """AFTER INSERT ON notifications
+            WHEN new.user_id IS NOT NULL AND coalesce(new.is_read, 0) = 0 BEGIN
+            INSERT INTO notification_counters(user_id, unread) VALUES (new.user_id, 1)
+            ON CONFLICT(user_id) DO UPDATE SET unread = unread + 1;
+        END""",
+        "notifications_unread_read": """AFTER UPDATE OF is_read ON notifications
+            WHEN old.is_read = 0 AND new.is_read = 1 BEGIN
+            UPDATE notification_counters SET unread = max(unread - 1, 0) WHERE user_id = new.user_id;
+        END""",
+        "notifications_unread_unread": """AFTER UPDATE OF is_read ON notifications
+            WHEN new.user_id IS NOT NULL AND old.is_read = 1 AND new.is_read = 0 BEGIN
+            INSERT INTO notification_counters(user_id, unread) VALUES (new.user_id, 1)
+            ON CONFLICT(user_id) DO UPDATE SET unread = unread + 1;
+        END""",
+        "notifications_unread_delete": """AFTER DELETE ON notifications
+            WHEN old.is_read = 0 BEGIN
+            UPDATE notification_counters SET unread = max(unread - 1, 0) WHERE user_id = old.user_id;
+        END"""
+    }
+
+    def migrate_notifications(self):
+        """Индексы уведомлений и триггеры счетчика непрочитанных (первый запуск пересчитывает счетчики)"""
+        session = self.get_session()
+        try:
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_notifications_user_date "
+                                 "ON notifications (user_id, created_date)"))
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_notifications_user_unread "
+                                 "ON notifications (user_id, is_read)"))
+            # Для очистки по сроку хранения (notification_retention)
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_notifications_created "
+                                 "ON notifications (created_date)"))
+
+            existing = {row[0] for row in session.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'notifications_unread_%'"))}
+            missing = [name for name in self.NOTIFICATION_COUNTER_TRIGGERS if name not in existing]
+            for name in missing:
+                session.execute(text(f"CREATE TRIGGER {name} {self.NOTIFICATION_COUNTER_TRIGGERS[name]}"))
+
+            if missing:
+                # Триггеров не было - счетчики пересчитываем в той же транзакции
+                session.execute(text("DELETE FROM notification_counters"))
+                session.execute(text("""
+                    INSERT INTO notification_counters (user_id, unread)
+                    SELECT user_id, count(*) FROM notifications
+                    WHERE is_read = 0 AND user_id IS NOT NULL
+                    GROUP BY user_id
+                """))
+                print("Счетчики непрочитанных уведомлений пересчитаны")
+
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Ошибка миграции уведомлений: {e}")
+        finally:
+            session.close()
+
+    def migrate_sessions(self):
+        """Индексы сессий для баз, созданных до их появления в модели"""
+        session = self.get_session()
+        try:
+            session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_sessions_token ON sessions (token)"))
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_sessions_status_activity "
+                                 "ON sessions (status, last_activity)"))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Ошибка миграции сессий: {e}")
+        finally:
+            session.close()
+
+    def migrate_wallets(self):
+        """Индекс кошельков по пользователю и валюте для баз, созданных до него"""
+        session = self.get_session()
+        try:
+            session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_wallets_user_currency "
+                                 "ON wallets (user_id, currency_id)"))
+            session.commit()
+        except Exception as e:
+            # В старой базе могут быть дубли кошельков - тогда индекс без уникальности
+            session.rollback()
+            print(f"Уникальный индекс кошельков не создан ({e}), создаем обычный")
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_wallets_user_currency "
+                                 "ON wallets (user_id, currency_id)"))
+            session.commit()
+        finally:
+            session.close()
+
+    def migrate_transactions(self):
+        """Индексы транзакций по пользователю и дате для баз, созданных до них"""
+        session = self.get_session()
+        try:
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_transactions_from_date "
+                                 "ON transactions (user_id_from, created_date)"))
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_transactions_to_date "
+                                 "ON transactions (user_id_to, created_date)"))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Ошибка миграции транзакций: {e}")
+        finally:
+            session.close()
+
+    def migrate_export_indexes(self):
+        """Индексы по дате для месячных партиций массовой выгрузки (bulk_export)"""
+        session = self.get_session()
+        try:
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_transactions_created_date "
+                                 "ON transactions (created_date)"))
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_exchanges_created_date "
+                                 "ON exchanges (created_date)"))
+            session.execute(text("CREATE INDEX IF NOT EXISTS ix_commissions_transaction "
+                                 "ON commissions (transaction_id)"))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Ошибка миграции индексов выгрузки: {e}")
+        finally:
+            session.close()
+
+    def prune_empty_wallets(self, chunk_size=5000, pause=0.05):
+        """
+        Удаление кошельков с нулевым балансом (нет кошелька - тот же нулевой баланс)
+
+        Удаляет порциями, каждая - короткая транзакция, чтобы не держать запись
+        в базу. Кошелек, который зачисление успело прочитать до удаления,
+        не потеряет денег: UPDATE удаленной строки провалит ту транзакцию.
+
+        Returns:
+            int: Число удаленных кошельков
+        """
+        deleted = 0
+        while True:
+            session = self.get_session()
+            try:
+                removed = session.execute(text(
+                    "DELETE FROM wallets WHERE id IN "
+                    "(SELECT id FROM wallets WHERE balance = 0 LIMIT :limit)"), {'limit': chunk_size}).rowcount
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                print(f"Ошибка удаления пустых кошельков: {e}")
+                break
+            finally:
+                session.close()
+
+            deleted += removed
+            if removed < chunk_size:
+                break
+            time.sleep(pause)
+
+        if deleted:
+            print(f"Удалено пустых кошельков: {deleted}")
+        return deleted
+
     def get_session(self):
         return self.SessionLocal()
 
+    def enable_wal_mode(self, autocheckpoint=True):
+        """
+        Перевод SQLite базы в режим WAL
+
+        Повторный вызов меняет только autocheckpoint: после остановки
+        архиватора SQLite снова сам делает checkpoint'ы, иначе WAL растет без предела.
+
+        Args:
+            autocheckpoint (bool): False - checkpoint'ы делает только архиватор WAL
+        """
+        if self.wal_mode:
+            if self.wal_autocheckpoint != autocheckpoint:
+                self.wal_autocheckpoint = autocheckpoint
+                self.engine.dispose()
+            return
+
+        self.wal_autocheckpoint = autocheckpoint
+
+        @event.listens_for(self.engine, "connect")
+        def set_wal_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # 1000 страниц - значение SQLite по умолчанию
+            cursor.execute(f"PRAGMA wal_autocheckpoint={1000 if self.wal_autocheckpoint else 0}")
+            cursor.close()
+
+        # Уже открытые соединения пула переоткрываются с новыми настройками
+        self.engine.dispose()
+        self.wal_mode = True
+
+    def checkpoint_wal(self):
+        """
+        Перенос всех кадров журнала WAL в файл базы с обнулением журнала
+
+        Returns:
+            bool: True если журнал перенесен целиком
+        """
+        if not self.wal_mode:
+            return True
+        try:
+            with self.engine.connect() as connection:
+                busy, log_frames, checkpointed = connection.execute(
+                    text("PRAGMA wal_checkpoint(TRUNCATE)")).one()
+            if busy:
+                print(f"Checkpoint WAL не завершен: перенесено {checkpointed} из {log_frames} кадров")
+                return False
+            return True
+        except Exception as e:
+            print(f"Ошибка checkpoint WAL: {e}")
+            return False
+
     def create_user_session(self, user_id, ip_address="", user_agent=""):
         """Создание новой сессии пользователя"""
         session = self.get_session()
@@ -61,10 +282,13 @@ class Database:
                 user_id=user_id,
                 ip_address=ip_address,
                 user_agent=user_agent,
-                status='ACTIVE'
+                status='ACTIVE',
+                token=secrets.token_urlsafe(32)
             )
             session.add(user_session)
             session.commit()
+            # Загружаем поля до закрытия сессии - объект используется после нее
+            session.refresh(user_session)
             return user_session
         except Exception as e:
             session.rollback()
@@ -73,37 +297,95 @@ class Database:
         finally:
             session.close()
 
+    def get_session_by_token(self, token):
+        """Активная сессия по токену (поиск по индексу ix_sessions_token)"""
+        session = self.get_session()
+        try:
+            return (session.query(Session)
+                    .filter(Session.token == token, Session.status == SessionStatus.ACTIVE)
+                    .first())
+        except Exception as e:
+            print(f"Error getting session by token: {e}")
+            return None
+        finally:
+            session.close()
+
     def update_session_activity(self, session_id):
-        """Обновление времени последней активности сессии"""
+        """Обновление времени последней активности сессии (запись - пачкой через session_store)"""
+        from session_store import session_store
+        session_store.touch(session_id)
+
+    def update_sessions_activity(self, activity):
+        """
+        Запись last_activity для многих сессий одним executemany
+
+        Args:
+            activity (dict): {id сессии: время активности}
+
+        Returns:
+            int: Число обновленных сессий, None - ошибка записи
+        """
+        if not activity:
+            return 0
+
+        table = Session.__table__
+        statement = (table.update()
+                     .where(table.c.id == bindparam('session_id'))
+                     .where(table.c.status == SessionStatus.ACTIVE)
+                     .values(last_activity=bindparam('activity')))
         session = self.get_session()
         try:
-            user_session = session.query(Session).get(session_id)
-            if user_session:
-                user_session.last_activity = datetime.now()
-                session.commit()
+            result = session.connection().execute(
+                statement, [{'session_id': session_id, 'activity': when} for session_id, when in activity.items()])
+            session.commit()
+            return result.rowcount
         except Exception as e:
             session.rollback()
-            print(f"Error updating session activity: {e}")
+            print(f"Error updating sessions activity: {e}")
+            return None
         finally:
             session.close()
 
-    def cleanup_expired_sessions(self, hours=24):
-        """Очистка просроченных сессий"""
+    def end_user_session(self, session_id, status=SessionStatus.LOGGED_OUT):
+        """Завершение сессии (выход пользователя)"""
         session = self.get_session()
         try:
-            expiry_time = datetime.now() - timedelta(hours=hours)
-            expired_sessions = session.query(Session).filter(
-                Session.last_activity < expiry_time
-            ).all()
+            updated = (session.query(Session)
+                       .filter(Session.id == session_id, Session.status == SessionStatus.ACTIVE)
+                       .update({Session.status: status}, synchronize_session=False))
+            session.commit()
+            return updated > 0
+        except Exception as e:
+            session.rollback()
+            print(f"Error ending user session: {e}")
+            return False
+        finally:
+            session.close()
 
-            for user_session in expired_sessions:
-                user_session.status = 'EXPIRED'
+    def cleanup_expired_sessions(self, hours=24):
+        """
+        Очистка просроченных сессий одним UPDATE
+
+        Активность из буфера session_store сюда не попадает - по расписанию
+        вызывается session_store.expire, который сначала сбрасывает буфер.
 
+        Returns:
+            int: Число сессий, помеченных просроченными
+        """
+        session = self.get_session()
+        try:
+            expiry_time = datetime.now() - timedelta(hours=hours)
+            expired = (session.query(Session)
+                       .filter(Session.status == SessionStatus.ACTIVE, Session.last_activity < expiry_time)
+                       .update({Session.status: SessionStatus.EXPIRED}, synchronize_session=False))
             session.commit()
-            print(f"Обновлено {len(expired_sessions)} просроченных сессий")
+            if expired:
+                print(f"Обновлено {expired} просроченных сессий")
+            return expired
         except Exception as e:
             session.rollback()
             print(f"Error cleaning up sessions: {e}")
+            return 0
         finally:
             session.close()
 
@@ -122,6 +404,19 @@ class Database:
             )
             session.add(notification)
             session.commit()
+
+            # Открытые окна получателя добавят уведомление без перезагрузки списка
+            event_bus.publish(NOTIFICATION_CREATED, {
+                'id': notification.id,
+                'user_id': user_id,
+                'type': type,
+                'title': title,
+                'message': message,
+                'transaction_id': transaction_id,
+                'exchange_id': exchange_id,
+                'priority': priority,
+                'created_date': notification.created_date.isoformat() if notification.created_date else None
+            })
             return notification
         except Exception as e:
             session.rollback()
@@ -148,12 +443,10 @@ class Database:
         """Пометить уведомление как прочитанное"""
         session = self.get_session()
         try:
-            notification = session.query(Notification).get(notification_id)
-            if notification:
-                notification.is_read = True
-                session.commit()
-                return True
-            return False
+            updated = session.query(Notification).filter_by(id=notification_id).update(
+                {Notification.is_read: True}, synchronize_session=False)
+            session.commit()
+            return updated > 0
         except Exception as e:
             session.rollback()
             print(f"Error marking notification as read: {e}")
@@ -161,6 +454,87 @@ class Database:
         finally:
             session.close()
 
+    def mark_notifications_read(self, user_id, notification_ids):
+        """
+        Пометить прочитанными уведомления пользователя по списку id (одним UPDATE)
+
+        Returns:
+            int: Сколько уведомлений стало прочитанными
+        """
+        if not notification_ids:
+            return 0
+        session = self.get_session()
+        try:
+            updated = (session.query(Notification)
+                       .filter(Notification.user_id == user_id,
+                               Notification.id.in_(list(notification_ids)),
+                               Notification.is_read == False)
+                       .update({Notification.is_read: True}, synchronize_session=False))
+            session.commit()
+            return updated
+        except Exception as e:
+            session.rollback()
+            print(f"Error marking notifications as read: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def mark_all_notifications_read(self, user_id):
+        """
+        Пометить прочитанными все уведомления пользователя (одним UPDATE)
+
+        Returns:
+            int: Сколько уведомлений стало прочитанными
+        """
+        session = self.get_session()
+        try:
+            updated = (session.query(Notification)
+                       .filter(Notification.user_id == user_id, Notification.is_read == False)
+                       .update({Notification.is_read: True}, synchronize_session=False))
+            session.commit()
+            return updated
+        except Exception as e:
+            session.rollback()
+            print(f"Error marking all notifications as read: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def delete_notifications_older_than(self, cutoff, user_id=None):
+        """
+        Удалить уведомления, созданные раньше cutoff (одним DELETE)
+
+        Returns:
+            int: Число удаленных уведомлений
+        """
+        session = self.get_session()
+        try:
+            query = session.query(Notification).filter(Notification.created_date < cutoff)
+            if user_id is not None:
+                query = query.filter(Notification.user_id == user_id)
+            deleted = query.delete(synchronize_session=False)
+            session.commit()
+            return deleted
+        except Exception as e:
+            session.rollback()
+            print(f"Error deleting old notifications: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def get_unread_count(self, user_id):
+        """Число непрочитанных уведомлений (чтение одной строки счетчика)"""
+        session = self.get_session()
+        try:
+            unread = (session.query(NotificationCounter.unread)
+                      .filter(NotificationCounter.user_id == user_id).scalar())
+            return unread or 0
+        except Exception as e:
+            print(f"Error getting unread count: {e}")
+            return 0
+        finally:
+            session.close()
+
     def get_user_interface(self, user_id):
         """Получение настроек интерфейса пользователя"""
         session = self.get_session()
@@ -213,7 +587,7 @@ class Database:
         finally:
             session.close()
 
-    def backup_database(self):
+    def backup_database(self, retention_policy=None):
         """Создание резервной копии базы данных"""
         try:
             backup_dir = "backups"
@@ -224,14 +598,22 @@ class Database:
             backup_file = f"{backup_dir}/crypto_wallet_backup_{timestamp}.db"
 
             if os.path.exists("crypto_wallet.db"):
-                shutil.copy2("crypto_wallet.db", backup_file)
+                # Через backup API: в режиме WAL часть коммитов еще только в журнале
+                copy_database("crypto_wallet.db", backup_file)
 
-            # Очистка старых бэкапов (храним только последние 7)
-            if os.path.exists(backup_dir):
-                backups = sorted([f for f in os.listdir(backup_dir) if f.endswith('.db')])
-                if len(backups) > 7:
-                    for old_backup in backups[:-7]:
-                        os.remove(os.path.join(backup_dir, old_backup))
+            # Очистка старых бэкапов по той же политике хранения, что и на Яндекс.Диске
+            local_backups = []
+            for name in os.listdir(backup_dir):
+                path = os.path.join(backup_dir, name)
+                if name.endswith('.db') and os.path.isfile(path):
+                    local_backups.append({
+                        'name': name,
+                        'size': os.path.getsize(path),
+                        'modified': datetime.fromtimestamp(os.path.getmtime(path))
+                    })
+
+            engine = RetentionEngine(retention_policy or RetentionPolicy())
+            engine.apply(local_backups, lambda name: self._remove_local_backup(backup_dir, name))
 
             print(f"Backup created: {backup_file}")
             return True
@@ -240,6 +622,11 @@ class Database:
             print(f"Backup failed: {e}")
             return False
 
+    @staticmethod
+    def _remove_local_backup(backup_dir, name):
+        os.remove(os.path.join(backup_dir, name))
+        return True
+
 
 # Создаем экземпляр базы данных
 db = Database()
\ No newline at end of file
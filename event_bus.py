@@ -0,0 +1,176 @@
+"""
+Шина событий приложения
+
+Проведение операций публикует события (transfer_completed, exchange_completed,
+notification_created и др.), открытые окна подписываются и обновляют только
+затронутые строки вместо периодической перезагрузки всего.
+
+Подписчики вызываются в потоке публикации - окна Qt получают события через
+QtEventBridge (widgets.py), который переносит их в GUI-поток сигналом.
+
+Если бот работает отдельным процессом, события передаются в процесс окна
+через локальный Unix-сокет (UnixSocketTransport): окно слушает сокет, бот
+пересылает в него свои события. Payload должен сериализоваться в JSON.
+"""
+import os
+import json
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# События проведения операций
+TRANSFER_COMPLETED = "transfer_completed"
+TRANSFER_FAILED = "transfer_failed"
+TRANSFER_CANCELLED = "transfer_cancelled"
+EXCHANGE_COMPLETED = "exchange_completed"
+EXCHANGE_REJECTED = "exchange_rejected"
+NOTIFICATION_CREATED = "notification_created"
+# Операции с внешней сетью (chain_pipeline.py)
+DEPOSIT_CREDITED = "deposit_credited"
+WITHDRAWAL_COMPLETED = "withdrawal_completed"
+
+DEFAULT_SOCKET_PATH = os.environ.get("WALLET_EVENT_SOCKET", "wallet_events.sock")
+
+
+class EventBus:
+    """Подписка и публикация событий внутри процесса"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._forwarders = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, event, callback):
+        """Подписка callback(event, payload) на событие ('*' - на все)"""
+        with self._lock:
+            self._subscribers.setdefault(event, []).append(callback)
+
+    def unsubscribe(self, event, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(event, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def add_forwarder(self, forwarder):
+        """Пересылка событий этого процесса наружу (forwarder(event, payload))"""
+        with self._lock:
+            self._forwarders.append(forwarder)
+
+    def publish(self, event, payload=None, forward=True):
+        """
+        Публикация события
+
+        Ошибка подписчика не прерывает доставку остальным и не возвращается
+        публикующему коду (проведение операции уже зафиксировано).
+
+        Args:
+            forward (bool): Пересылать ли событие в другие процессы
+                (False - для событий, пришедших извне)
+        """
+        payload = payload or {}
+        with self._lock:
+            callbacks = list(self._subscribers.get(event, ())) + list(self._subscribers.get('*', ()))
+            forwarders = list(self._forwarders) if forward else []
+
+        for callback in callbacks:
+            try:
+                callback(event, payload)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика события {event}: {e}")
+
+        for forwarder in forwarders:
+            try:
+                forwarder(event, payload)
+            except Exception as e:
+                logger.error(f"Ошибка пересылки события {event}: {e}")
+
+
+class UnixSocketTransport:
+    """
+    Передача событий между процессами через локальный Unix-сокет
+
+    serve() - в процессе с окнами: принимает события и публикует их в шину.
+    connect() - в процессе бота: пересылает события шины в сокет. Если окно
+    не запущено, события теряются - окна при открытии и так читают базу.
+    """
+
+    def __init__(self, bus, path=DEFAULT_SOCKET_PATH):
+        self.bus = bus
+        self.path = path
+        self._server = None
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return hasattr(socket, 'AF_UNIX')
+
+    def serve(self):
+        """Слушать сокет в фоновом потоке"""
+        if not self.available() or self._server:
+            return False
+
+        if os.path.exists(self.path):
+            os.remove(self.path)  # Сокет от прошлого запуска
+
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(8)
+        threading.Thread(target=self._accept_loop, name="events-socket", daemon=True).start()
+        logger.info(f"События других процессов: {self.path}")
+        return True
+
+    def _accept_loop(self):
+        while self._server:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._read_loop, args=(connection,), daemon=True).start()
+
+    def _read_loop(self, connection):
+        with connection, connection.makefile('r', encoding='utf-8') as stream:
+            for line in stream:
+                try:
+                    message = json.loads(line)
+                    self.bus.publish(message['event'], message.get('payload'), forward=False)
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Некорректное событие из сокета: {e}")
+
+    def connect(self):
+        """Пересылать события шины этого процесса в сокет"""
+        if not self.available():
+            return False
+        self.bus.add_forwarder(self.send)
+        return True
+
+    def send(self, event, payload):
+        data = (json.dumps({'event': event, 'payload': payload}, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._client_lock:
+            try:
+                if self._client is None:
+                    self._client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    self._client.connect(self.path)
+                self._client.sendall(data)
+            except OSError as e:
+                logger.debug(f"Событие {event} не передано: {e}")
+                if self._client:
+                    self._client.close()
+                self._client = None
+
+    def close(self):
+        server, self._server = self._server, None
+        if server:
+            server.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        with self._client_lock:
+            if self._client:
+                self._client.close()
+                self._client = None
+
+
+# Общая шина событий
+event_bus = EventBus()
@@ -0,0 +1,354 @@
+"""
+Инструментирование: время операций и SQL-запросов
+
+Операция - именованный участок работы приложения ("main.load_history",
+"bot.confirm_transaction"). Внутри операции SQL-запросы движка (события
+before/after_cursor_execute) относятся к ней: считаются количество и время
+запросов по операции и по каждому тексту запроса. Запросы вне операций
+попадают в "other".
+
+Экспорт: текст Prometheus (/metrics на локальном порту) и/или JSON-лог с
+ротацией (одна строка на операцию). Топ медленных операций - в админ-панели.
+"""
+import re
+import json
+import time
+import inspect
+import logging
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+logger = logging.getLogger(__name__)
+
+OTHER_OPERATION = "other"
+STATEMENT_MAX_LENGTH = 300
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+class OperationStats:
+    """Накопленная статистика одной операции"""
+
+    __slots__ = ('count', 'total', 'max', 'errors', 'sql_count', 'sql_time', 'samples')
+
+    def __init__(self, samples=1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        # Последние длительности - для перцентилей
+        self.samples = deque(maxlen=samples)
+
+    def quantile(self, q):
+        values = sorted(self.samples)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def as_dict(self, name):
+        count = self.count or 1
+        return {
+            'operation': name,
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total / count * 1000, 3),
+            'p50_ms': round(self.quantile(0.5) * 1000, 3),
+            'p99_ms': round(self.quantile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'total_ms': round(self.total * 1000, 3),
+            'sql_per_call': round(self.sql_count / count, 2),
+            'sql_ms_per_call': round(self.sql_time / count * 1000, 3)
+        }
+
+
+class _Frame:
+    """Текущая операция потока: SQL внутри нее копится здесь без блокировок"""
+
+    __slots__ = ('name', 'sql_count', 'sql_time')
+
+    def __init__(self, name):
+        self.name = name
+        self.sql_count = 0
+        self.sql_time = 0.0
+
+
+class Instrumentation:
+    """Сбор метрик операций и SQL (общий экземпляр - instrumentation)"""
+
+    def __init__(self, samples=1000):
+        self.samples = samples
+        self.enabled = True
+        self.operations = {}
+        self.statements = {}
+        self._current = ContextVar("instrumentation_operation", default=None)
+        self._lock = threading.Lock()
+        self._engines = set()
+        self._json_logger = None
+        self._json_min_duration = 0.0
+        self._http_server = None
+
+    # ---- операции ----
+
+    def current_operation(self):
+        frame = self._current.get()
+        return frame.name if frame else None
+
+    @contextmanager
+    def operation(self, name):
+        """Замер операции; вложенная операция забирает SQL себе"""
+        if not self.enabled:
+            yield
+            return
+
+        frame = _Frame(name)
+        token = self._current.set(frame)
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self._current.reset(token)
+            self._record_operation(frame, duration, error)
+
+    def timed(self, name=None):
+        """
+        Декоратор: вызов функции - операция (по умолчанию имя - module.Class.method)
+
+        Qt передает в слоты лишние аргументы сигнала (checked у clicked) -
+        их обертка отбрасывает, как сделал бы Qt для исходного метода.
+        """
+
+        def decorator(func):
+            operation_name = name or f"{func.__module__}.{func.__qualname__}"
+            max_args = self._max_positional(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if max_args is not None:
+                    args = args[:max_args]
+                with self.operation(operation_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def _max_positional(func):
+        try:
+            parameters = inspect.signature(func).parameters.values()
+        except (TypeError, ValueError):
+            return None
+        if any(p.kind == p.VAR_POSITIONAL for p in parameters):
+            return None
+        return sum(1 for p in parameters if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+
+    def _record_operation(self, frame, duration, error):
+        with self._lock:
+            stats = self.operations.get(frame.name)
+            if stats is None:
+                stats = self.operations[frame.name] = OperationStats(self.samples)
+            stats.count += 1
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+            stats.errors += error
+            stats.sql_count += frame.sql_count
+            stats.sql_time += frame.sql_time
+            stats.samples.append(duration)
+
+        if self._json_logger and duration >= self._json_min_duration:
+            self._json_logger.info(json.dumps({
+                'ts': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'operation': frame.name,
+                'duration_ms': round(duration * 1000, 3),
+                'sql_count': frame.sql_count,
+                'sql_ms': round(frame.sql_time * 1000, 3),
+                'error': error,
+                'thread': threading.current_thread().name
+            }, ensure_ascii=False))
+
+    # ---- SQL ----
+
+    def install(self, engine):
+        """Подписка на события выполнения запросов движка SQLAlchemy"""
+        from sqlalchemy import event
+
+        if engine in self._engines:
+            return
+        self._engines.add(engine)
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('instrumentation_started', []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info.get('instrumentation_started')
+            if not started:
+                return
+            self._record_statement(statement, time.perf_counter() - started.pop())
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(exception_context):
+            # Упавший запрос не доходит до after_cursor_execute - снимаем его отметку
+            connection = exception_context.connection
+            started = connection.info.get('instrumentation_started') if connection is not None else None
+            if started:
+                started.pop()
+
+    def _record_statement(self, statement, duration):
+        if not self.enabled:
+            return
+
+        frame = self._current.get()
+        if frame:
+            frame.sql_count += 1
+            frame.sql_time += duration
+
+        text = _SPACES_RE.sub(" ", statement).strip()[:STATEMENT_MAX_LENGTH]
+        key = (frame.name if frame else OTHER_OPERATION, text)
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+
+    # ---- просмотр ----
+
+    def top_operations(self, limit=10, by='total_ms'):
+        """Топ операций по полю as_dict (total_ms, avg_ms, p99_ms, max_ms, ...)"""
+        with self._lock:
+            rows = [stats.as_dict(name) for name, stats in self.operations.items()]
+        rows.sort(key=lambda row: row[by], reverse=True)
+        return rows[:limit]
+
+    def top_statements(self, limit=10):
+        """Самые затратные (по суммарному времени) запросы с операцией-источником"""
+        with self._lock:
+            items = [(operation, statement, list(stats))
+                     for (operation, statement), stats in self.statements.items()]
+        items.sort(key=lambda item: item[2][1], reverse=True)
+        return [{
+            'operation': operation,
+            'statement': statement,
+            'count': count,
+            'total_ms': round(total * 1000, 3),
+            'avg_ms': round(total / count * 1000, 3),
+            'max_ms': round(maximum * 1000, 3)
+        } for operation, statement, (count, total, maximum) in items[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self.operations.clear()
+            self.statements.clear()
+
+    # ---- экспорт ----
+
+    @staticmethod
+    def _label(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def prometheus_text(self):
+        """Метрики в текстовом формате Prometheus"""
+        with self._lock:
+            operations = [(name, stats.count, stats.total, stats.errors, stats.sql_count, stats.sql_time,
+                           stats.quantile(0.5), stats.quantile(0.99))
+                          for name, stats in sorted(self.operations.items())]
+            statements = {}
+            for (operation, _), (count, total, _) in self.statements.items():
+                current = statements.setdefault(operation, [0, 0.0])
+                current[0] += count
+                current[1] += total
+
+        lines = [
+            "# HELP wallet_operation_seconds Длительность операций приложения",
+            "# TYPE wallet_operation_seconds summary"
+        ]
+        for name, count, total, _, _, _, p50, p99 in operations:
+            label = self._label(name)
+            lines.append(f'wallet_operation_seconds{{operation="{label}",quantile="0.5"}} {p50:.6f}')
+            lines.append(f'wallet_operation_seconds{{operation="{label}",quantile="0.99"}} {p99:.6f}')
+            lines.append(f'wallet_operation_seconds_sum{{operation="{label}"}} {total:.6f}')
+            lines.append(f'wallet_operation_seconds_count{{operation="{label}"}} {count}')
+
+        lines += ["# HELP wallet_operation_errors_total Операции, завершившиеся исключением",
+                  "# TYPE wallet_operation_errors_total counter"]
+        for name, _, _, errors, _, _, _, _ in operations:
+            lines.append(f'wallet_operation_errors_total{{operation="{self._label(name)}"}} {errors}')
+
+        lines += ["# HELP wallet_sql_queries_total SQL-запросы по операциям",
+                  "# TYPE wallet_sql_queries_total counter"]
+        for operation, (count, _) in sorted(statements.items()):
+            lines.append(f'wallet_sql_queries_total{{operation="{self._label(operation)}"}} {count}')
+
+        lines += ["# HELP wallet_sql_seconds_total Время SQL-запросов по операциям",
+                  "# TYPE wallet_sql_seconds_total counter"]
+        for operation, (_, total) in sorted(statements.items()):
+            lines.append(f'wallet_sql_seconds_total{{operation="{self._label(operation)}"}} {total:.6f}')
+
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port=9108, host="127.0.0.1"):
+        """Локальный endpoint /metrics для Prometheus (фоновый поток)"""
+        if self._http_server:
+            return self._http_server
+
+        instrumentation = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = instrumentation.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            logger.error(f"Не удалось открыть порт метрик {host}:{port}: {e}")
+            return None
+
+        threading.Thread(target=self._http_server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Метрики: http://{host}:{port}/metrics")
+        return self._http_server
+
+    def enable_json_log(self, path, max_bytes=5 * 1024 * 1024, backup_count=5, min_duration_ms=0):
+        """JSON-лог операций с ротацией (операции короче min_duration_ms не пишутся)"""
+        json_logger = logging.getLogger("wallet.metrics")
+        json_logger.setLevel(logging.INFO)
+        json_logger.propagate = False
+        for handler in list(json_logger.handlers):
+            json_logger.removeHandler(handler)
+            handler.close()
+
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        json_logger.addHandler(handler)
+
+        self._json_min_duration = min_duration_ms / 1000
+        self._json_logger = json_logger
+
+
+# Общий сборщик метрик
+instrumentation = Instrumentation()
@@ -5,6 +5,7 @@ from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont
 from sqlalchemy.orm import Session
 from database import db
+from session_store import session_store
 from models import User
 from transaction_utils import execute_in_transaction, register_user_transaction
 from datetime import datetime
@@ -19,6 +20,7 @@ class LoginWindow(QDialog):
     def __init__(self):
         super().__init__()
         self.authenticated_user = None
+        self.user_session_id = None
         self.tg_code = None
         self.timer = None
         self.time_left = 0
@@ -770,7 +772,8 @@ class LoginWindow(QDialog):
             self.authenticated_user = user.id
             user.last_login = datetime.now()
 
-            db.create_user_session(user.id, "127.0.0.1", "PyQt5 Desktop App")
+            user_session = session_store.create(user.id, "127.0.0.1", "PyQt5 Desktop App")
+            self.user_session_id = user_session.id if user_session else None
 
             # Сохраняем профиль
             with open('saved_profile.txt', 'w', encoding='utf-8') as f:
@@ -876,6 +879,9 @@ class LoginWindow(QDialog):
     def get_authenticated_user(self):
         return self.authenticated_user
 
+    def get_user_session_id(self):
+        return self.user_session_id
+
     def closeEvent(self, event):
         self.stop_timer()
         event.accept()
\ No newline at end of file
@@ -1,67 +1,216 @@
+from startup_profile import startup_profiler  # Первым: отсчет времени запуска
 import sys
 import threading
 import traceback
 import os
-from PyQt5.QtWidgets import QApplication, QMessageBox
-from database import db
-from crypto_manager import crypto_manager
-from bot import telegram_bot
-from main_window import MainWindow
-from login_window import LoginWindow
-from backup_manager import backup_manager  # Импортируем менеджер бэкапов
+from concurrent.futures import ThreadPoolExecutor
+
+with startup_profiler.phase("import_core"):
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    from PyQt5.QtCore import QTimer
+    from database import db
+    from login_window import LoginWindow
+
+# Фоновые задачи запуска (бот, бэкапы, курсы) - окно входа их не ждет
+startup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup")
+startup_tasks = {}
+
+
+def run_startup_task(name, func):
+    """Запуск фоновой задачи запуска с замером времени"""
+
+    def task():
+        try:
+            with startup_profiler.phase(name):
+                return func()
+        except Exception as e:
+            print(f"⚠️ Ошибка фоновой задачи запуска {name}: {e}")
+            print(traceback.format_exc())
+
+    startup_tasks[name] = startup_executor.submit(task)
+    return startup_tasks[name]
+
+
+def wait_for_startup_task(name, timeout=None):
+    """Дождаться фоновой задачи запуска (если она была запущена)"""
+    future = startup_tasks.get(name)
+    if future:
+        future.result(timeout=timeout)
 
 
 def run_telegram_bot():
     """Запуск Telegram бота в отдельном потоке"""
     try:
+        from bot import telegram_bot
         telegram_bot.run()
     except Exception as e:
         print(f"Telegram bot error: {e}")
         print(traceback.format_exc())
 
 
-def main():
+def cleanup_reports():
+    """Удаление старых PDF-выписок из временной папки"""
+    from report_jobs import report_queue
+    report_queue.cleanup()
+
+
+def warm_up_pdf_styles():
+    """Прогрев шрифтов и стилей PDF в фоне, чтобы первый отчет не платил за них"""
     try:
-        # Создаем таблицы (если их нет)
-        db.create_tables()
+        from pdf_generation import pdf_styles
+        pdf_styles.warm_up()
+    except Exception as e:
+        print(f"PDF warm-up error: {e}")
+
+
+def init_rates():
+    """Криптовалюты и курсы, затем периодическое обновление курсов"""
+    from crypto_manager import crypto_manager
+    from scheduler import scheduler
+
+    crypto_manager.initialize_currencies()
+    scheduler.add_job("rates_tick", crypto_manager.update_exchange_rates, interval=10)
+    scheduler.start()
+
+
+def start_maintenance():
+    """Очистка сессий и периодические задачи обслуживания"""
+    from scheduler import scheduler
+    from user_stats import user_stats
+    from user_directory import user_directory
+    from text_search import text_search
+    from notification_retention import notification_retention
+    from session_store import session_store
+
+    session_store.expire()
+    # Поисковые индексы (первое создание заполняет их из таблиц)
+    user_directory.ensure_index()
+    text_search.ensure_indexes()
+
+    # Периодические задачи: очистка сессий, отчеты, агрегаты
+    scheduler.add_job("session_cleanup", session_store.expire, interval=600, jitter=60)
+    # Активность сессий пишется в базу пачками
+    scheduler.add_job("session_activity_flush", session_store.flush, interval=session_store.flush_interval)
+    scheduler.add_job("reports_cleanup", cleanup_reports, interval=3600, run_immediately=True)
+    # Догоняющий пересчет дневных агрегатов (первый запуск заполняет таблицу целиком)
+    scheduler.add_job("user_stats_catchup", user_stats.catch_up, interval=3600, jitter=60,
+                      run_immediately=True)
+    # Просроченные уведомления - в архив и из базы (порциями)
+    scheduler.add_job("notifications_retention", notification_retention.run, interval=6 * 3600, jitter=300)
+    # Кошельки с нулевым балансом не нужны - создадутся заново при зачислении
+    scheduler.add_job("wallets_prune", db.prune_empty_wallets, at="04:30", jitter=600)
+    scheduler.start()
+
 
-        # Очистка старых сессий при запуске
-        db.cleanup_expired_sessions()
+def start_metrics():
+    """JSON-лог медленных операций; endpoint Prometheus - при WALLET_METRICS_PORT"""
+    from instrumentation import instrumentation
 
-        # Создаем резервную копию базы данных локально
+    os.makedirs("logs", exist_ok=True)
+    instrumentation.enable_json_log(os.path.join("logs", "metrics.jsonl"),
+                                    min_duration_ms=float(os.environ.get("WALLET_METRICS_LOG_MS", "50")))
+
+    port = os.environ.get("WALLET_METRICS_PORT")
+    if port:
+        instrumentation.start_http_server(int(port))
+
+
+def start_event_socket():
+    """События бота, запущенного отдельным процессом (python bot.py) - при WALLET_EVENT_SOCKET"""
+    from event_bus import event_bus, UnixSocketTransport
+
+    if os.environ.get("WALLET_EVENT_SOCKET"):
+        UnixSocketTransport(event_bus).serve()
+
+
+def start_chain_pipeline():
+    """Пополнения и выводы через узел сети (chain_simulator.py или узел) - при WALLET_CHAIN_NODE"""
+    from scheduler import scheduler
+    from chain_pipeline import chain_pipeline
+
+    if os.environ.get("WALLET_CHAIN_NODE"):
+        chain_pipeline.start()
+        # Выводы копятся и уходят в сеть пакетами
+        scheduler.add_job("chain_withdrawals_broadcast", chain_pipeline.broadcast_pending, interval=30, jitter=5)
+
+
+def start_backups():
+    """Локальная копия базы и авто-бэкапы на Яндекс.Диск (сеть - только в фоне)"""
+    from backup_manager import backup_manager
+
+    # Бэкап при старте сам делает локальную копию - не копируем файл дважды
+    settings = backup_manager.settings
+    if not (settings['auto_backup'] and settings['backup_on_start']):
         db.backup_database()
 
-        # ЗАПУСКАЕМ АВТО-БЭКАПЫ КАЖДЫЙ ЧАС
-        try:
-            backup_manager.start_auto_backup()
-            print("✅ Авто-бэкапы запущены (каждый час)")
-        except Exception as e:
-            print(f"⚠️ Не удалось запустить авто-бэкапы: {e}")
+    # ЗАПУСКАЕМ АВТО-БЭКАПЫ КАЖДЫЙ ЧАС
+    backup_manager.start_auto_backup()
+    print("✅ Авто-бэкапы запущены (каждый час)")
+
+
+def start_bot():
+    """Запуск Telegram бота в отдельном потоке (импорт telebot - тоже там)"""
+    bot_thread = threading.Thread(target=run_telegram_bot, daemon=True)
+    bot_thread.start()
 
-        # Инициализируем криптовалюты и курсы
-        crypto_manager.initialize_currencies()
 
-        # Запускаем Telegram бота в отдельном потоке
-        bot_thread = threading.Thread(target=run_telegram_bot, daemon=True)
-        bot_thread.start()
+def on_login_shown():
+    shown_ms = startup_profiler.mark("login_window_shown")
+    print(f"⏱ Окно входа показано через {shown_ms:.0f} мс после запуска")
+    if startup_profiler.verbose:
+        print(startup_profiler.format_report())
 
-        app = QApplication(sys.argv)
+
+def main():
+    try:
+        # Синхронно - только то, что нужно окну входа: таблицы базы
+        with startup_profiler.phase("create_tables"):
+            db.create_tables()
+
+        # Остальное - в фоне, пока пользователь вводит данные
+        run_startup_task("rates_init", init_rates)
+        run_startup_task("maintenance", start_maintenance)
+        run_startup_task("metrics", start_metrics)
+        run_startup_task("event_socket", start_event_socket)
+        run_startup_task("chain_pipeline", start_chain_pipeline)
+        run_startup_task("backups", start_backups)
+        run_startup_task("telegram_bot", start_bot)
+        run_startup_task("pdf_warm_up", warm_up_pdf_styles)
+
+        with startup_profiler.phase("qt_application"):
+            app = QApplication(sys.argv)
 
         # Показываем окно входа
-        login_window = LoginWindow()
+        with startup_profiler.phase("login_window"):
+            login_window = LoginWindow()
+
+        QTimer.singleShot(0, on_login_shown)
+
         if login_window.exec_() == LoginWindow.Accepted:
             user_id = login_window.get_authenticated_user()
 
             if user_id:
+                # Главному окну нужны валюты и курсы
+                wait_for_startup_task("rates_init")
+
+                with startup_profiler.phase("import_main_window"):
+                    from main_window import MainWindow
+
                 # Показываем главное окно
-                main_window = MainWindow(user_id)
-                main_window.show()
+                with startup_profiler.phase("main_window"):
+                    main_window = MainWindow(user_id, login_window.get_user_session_id())
+                    main_window.show()
 
                 # Запускаем приложение
                 exit_code = app.exec_()
 
+                # Несброшенная активность сессии
+                from session_store import session_store
+                session_store.flush()
+
                 # Бэкап при выходе
                 try:
+                    from backup_manager import backup_manager
                     backup_manager.backup_on_exit()
                 except Exception as e:
                     print(f"⚠️ Ошибка бэкапа при выходе: {e}")
@@ -81,4 +230,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
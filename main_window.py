@@ -3,43 +3,73 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QTabWidget, QLineEdit, QComboBox, QMessageBox,
                              QGroupBox, QFormLayout, QHeaderView, QMenuBar,
                              QMenu, QAction, QStatusBar, QDialog, QApplication)
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QEvent
 from PyQt5.QtGui import QFont, QColor
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 from models import User, Wallet, Transaction, Currency, ExchangeRate, Commission, Exchange, ExchangeStatus, \
-    TransactionType, Theme, UserRole
+    TransactionType, UserRole
 from database import db
+from session_store import session_store
 from bot import telegram_bot
 from crypto_manager import crypto_manager
 from telegram_link_dialog import TelegramLinkDialog
 from notifications_dialog import NotificationsDialog
 from settings_dialog import SettingsDialog
-from transaction_utils import transaction_session
+from transaction_utils import transaction_session, find_wallet, user_wallets
+from addresses import wallet_address
 from admin_panel import AdminPanelDialog
 from moderator_panel import ModeratorPanelDialog
 from permissions import *
 from backup_dialog import BackupDialog
+from theme_styles import style_sheet_for, prebuild_style_sheets, adjust_color, DEFAULT_FONT_SIZE
+from text_search import text_search
+from widgets import SearchBar, QtEventBridge
+from event_bus import (TRANSFER_COMPLETED, TRANSFER_FAILED, TRANSFER_CANCELLED, EXCHANGE_COMPLETED,
+                       EXCHANGE_REJECTED, NOTIFICATION_CREATED, DEPOSIT_CREDITED, WITHDRAWAL_COMPLETED)
+from instrumentation import instrumentation
 from datetime import datetime
 import json
-import os
 import threading
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, user_id):
+    def __init__(self, user_id, user_session_id=None):
         super().__init__()
         self.user_id = user_id
+        self.user_session_id = user_session_id
         self.session_db = db.get_session()
         self.user = self.session_db.query(User).get(user_id)
+        self.applied_style_sheet = None
+        self.style_sheets_prebuilt = False
+        # Строки таблицы кошельков по currency_id и балансы для пересчета по курсам
+        self.wallet_rows = {}
+        self.wallet_balances = {}
         self.init_ui()
         self.apply_styles()
         self.load_data()
 
-        # Таймер для обновления курсов
+        # Таймер перерисовки курсов (балансы и уведомления обновляются по событиям)
         self.rates_timer = QTimer()
         self.rates_timer.timeout.connect(self.update_rates_display)
         self.rates_timer.start(10000)
 
+        # Проведенные операции и новые уведомления - только затронутые строки
+        self.events = QtEventBridge(self)
+        self.events.event_received.connect(self.on_event)
+        self.events.listen(TRANSFER_COMPLETED, TRANSFER_FAILED, TRANSFER_CANCELLED,
+                           EXCHANGE_COMPLETED, EXCHANGE_REJECTED, NOTIFICATION_CREATED,
+                           DEPOSIT_CREDITED, WITHDRAWAL_COMPLETED)
+
+        # Действия пользователя в любом окне приложения - активность сессии
+        if self.user_session_id:
+            QApplication.instance().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.MouseButtonPress, QEvent.KeyPress):
+            # Только отметка в памяти - в базу пишет session_store.flush
+            session_store.touch(self.user_session_id)
+        return False
+
     def init_ui(self):
         self.setWindowTitle(f"Крипто Кошелек - {self.user.full_name}")
         self.setGeometry(100, 100, 1200, 800)
@@ -93,9 +123,9 @@ class MainWindow(QMainWindow):
         # Меню Вид
         view_menu = menubar.addMenu('Вид')
 
-        notifications_action = QAction('🔔 Уведомления', self)
-        notifications_action.triggered.connect(self.show_notifications_dialog)
-        view_menu.addAction(notifications_action)
+        self.notifications_action = QAction('🔔 Уведомления', self)
+        self.notifications_action.triggered.connect(self.show_notifications_dialog)
+        view_menu.addAction(self.notifications_action)
 
         settings_action = QAction('⚙️ Настройки интерфейса', self)
         settings_action.triggered.connect(self.show_settings_dialog)
@@ -181,10 +211,16 @@ class MainWindow(QMainWindow):
         try:
             dialog = NotificationsDialog(self.user_id, self)
             dialog.exec_()
+            self.update_notifications_badge()
         except Exception as e:
             print(f"Ошибка открытия уведомлений: {e}")
             QMessageBox.critical(self, "Ошибка", f"Не удалось открыть уведомления: {str(e)}")
 
+    def update_notifications_badge(self):
+        """Число непрочитанных в меню (чтение счетчика - одна строка)"""
+        unread = db.get_unread_count(self.user_id)
+        self.notifications_action.setText(f"🔔 Уведомления ({unread})" if unread else "🔔 Уведомления")
+
     def show_settings_dialog(self):
         """Показать диалог настроек"""
         try:
@@ -204,430 +240,37 @@ class MainWindow(QMainWindow):
             if not ui_settings:
                 return
 
+            # setStyleSheet заново полирует все виджеты окна - вызываем только при изменении
             style_sheet = self.generate_style_sheet(ui_settings)
-            self.setStyleSheet(style_sheet)
+            if style_sheet != self.applied_style_sheet:
+                self.setStyleSheet(style_sheet)
+                self.applied_style_sheet = style_sheet
 
+            font_size = ui_settings.font_size or DEFAULT_FONT_SIZE
             font = QApplication.font()
-            font.setPointSize(ui_settings.font_size)
-            QApplication.setFont(font)
+            if font.pointSize() != font_size:
+                font.setPointSize(font_size)
+                QApplication.setFont(font)
+
+            # Остальные темы собираем в фоне, чтобы переключение темы брало готовую строку
+            if not self.style_sheets_prebuilt:
+                self.style_sheets_prebuilt = True
+                threading.Thread(
+                    target=prebuild_style_sheets,
+                    args=(ui_settings.primary_color, ui_settings.background_color, font_size),
+                    daemon=True
+                ).start()
 
         except Exception as e:
             print(f"Ошибка применения стилей: {e}")
 
     def generate_style_sheet(self, ui_settings):
-        """Генерация CSS стилей на основе темы и настроек"""
-        theme = ui_settings.theme if ui_settings else Theme.LIGHT
-        primary_color = ui_settings.primary_color if ui_settings else '#2E8B57'
-        background_color = ui_settings.background_color if ui_settings else '#FFFFFF'
-        font_size = ui_settings.font_size if ui_settings and ui_settings.font_size else 12
-
-        themes = {
-            Theme.LIGHT: {
-                'primary': primary_color,
-                'secondary': '#4682B4',
-                'background': background_color,
-                'surface': '#FFFFFF',
-                'text': '#333333',
-                'text_secondary': '#666666',
-                'border': '#DDDDDD',
-                'success': '#28a745',
-                'warning': '#ffc107',
-                'error': '#dc3545'
-            },
-            Theme.DARK: {
-                'primary': primary_color,
-                'secondary': '#6c757d',
-                'background': '#1a1a1a',
-                'surface': '#2d2d2d',
-                'text': '#ffffff',
-                'text_secondary': '#b0b0b0',
-                'border': '#404040',
-                'success': '#20c997',
-                'warning': '#fd7e14',
-                'error': '#e83e8c'
-            },
-            Theme.BLUE: {
-                'primary': '#2196F3',
-                'secondary': '#03A9F4',
-                'background': '#E3F2FD',
-                'surface': '#FFFFFF',
-                'text': '#1565C0',
-                'text_secondary': '#1976D2',
-                'border': '#BBDEFB',
-                'success': '#4CAF50',
-                'warning': '#FF9800',
-                'error': '#F44336'
-            },
-            Theme.GREEN: {
-                'primary': '#4CAF50',
-                'secondary': '#8BC34A',
-                'background': '#F1F8E9',
-                'surface': '#FFFFFF',
-                'text': '#2E7D32',
-                'text_secondary': '#388E3C',
-                'border': '#C5E1A5',
-                'success': '#66BB6A',
-                'warning': '#FFA726',
-                'error': '#EF5350'
-            },
-            Theme.PURPLE: {
-                'primary': '#9C27B0',
-                'secondary': '#BA68C8',
-                'background': '#F3E5F5',
-                'surface': '#FFFFFF',
-                'text': '#7B1FA2',
-                'text_secondary': '#8E24AA',
-                'border': '#E1BEE7',
-                'success': '#7CB342',
-                'warning': '#FFB300',
-                'error': '#E53935'
-            },
-            Theme.ORANGE: {
-                'primary': '#FF9800',
-                'secondary': '#FFB74D',
-                'background': '#FFF3E0',
-                'surface': '#FFFFFF',
-                'text': '#EF6C00',
-                'text_secondary': '#F57C00',
-                'border': '#FFCC80',
-                'success': '#43A047',
-                'warning': '#FF8F00',
-                'error': '#E53935'
-            },
-            Theme.MODERN: {
-                'primary': '#6366F1',
-                'secondary': '#8B5CF6',
-                'background': '#0F172A',
-                'surface': '#1E293B',
-                'text': '#F1F5F9',
-                'text_secondary': '#94A3B8',
-                'border': '#334155',
-                'success': '#10B981',
-                'warning': '#F59E0B',
-                'error': '#EF4444'
-            }
-        }
-
-        colors = themes.get(theme, themes[Theme.LIGHT])
-
-        if ui_settings and ui_settings.primary_color:
-            colors['primary'] = ui_settings.primary_color
-        if ui_settings and ui_settings.background_color:
-            colors['background'] = ui_settings.background_color
-
-        style = f"""
-            /* Основные стили */
-            QMainWindow, QWidget, QDialog {{
-                background-color: {colors['background']};
-                color: {colors['text']};
-                font-size: {font_size}px;
-                font-family: "Arial", sans-serif;
-            }}
-
-            /* ЗАГОЛОВКИ */
-            QLabel[fontSize="large"] {{
-                font-size: {font_size + 4}px;
-                font-weight: bold;
-            }}
-
-            QLabel[fontSize="medium"] {{
-                font-size: {font_size + 2}px;
-            }}
-
-            QLabel[fontSize="small"] {{
-                font-size: {font_size}px;
-                color: {colors['text_secondary']};
-            }}
-
-            /* КНОПКИ */
-            QPushButton {{
-                background-color: {colors['primary']};
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 6px;
-                font-weight: bold;
-                font-size: {font_size}px;
-                min-height: 10px;
-            }}
-
-            QPushButton:hover {{
-                background-color: {self.adjust_color(colors['primary'], 15)};
-            }}
-
-            QPushButton:pressed {{
-                background-color: {self.adjust_color(colors['primary'], -10)};
-            }}
-
-            /* Кнопка перевода (зеленая) */
-            QPushButton[objectName="transfer_btn"] {{
-                background-color: {colors['success']};
-                font-size: {font_size}px;
-                padding: 10px 20px;
-            }}
-
-            QPushButton[objectName="transfer_btn"]:hover {{
-                background-color: {self.adjust_color(colors['success'], 15)};
-            }}
-
-            /* Кнопка обмена (оранжевая) */
-            QPushButton[objectName="exchange_btn"] {{
-                background-color: {colors['warning']};
-                font-size: {font_size}px;
-                padding: 10px 20px;
-            }}
-
-            QPushButton[objectName="exchange_btn"]:hover {{
-                background-color: {self.adjust_color(colors['warning'], 15)};
-            }}
-
-            /* Кнопка экспорта в PDF (фиолетовая) */
-            QPushButton[objectName="export_btn"] {{
-                background-color: #9C27B0;
-                color: white;
-                font-weight: bold;
-                padding: 8px 16px;
-                border-radius: 6px;
-                min-width: 120px;
-                font-size: {font_size}px;
-            }}
-            QPushButton[objectName="export_btn"]:hover {{
-                background-color: #BA68C8;
-            }}
-            QPushButton[objectName="export_btn"]:disabled {{
-                background-color: #cccccc;
-                color: #666666;
-            }}
-
-            /* Вторичные кнопки */
-            QPushButton[objectName="secondary_btn"] {{
-                background-color: {colors['secondary']};
-                padding: 6px 12px;
-            }}
-
-            /* ТАБЫ */
-            QTabWidget::pane {{
-                border: 1px solid {colors['border']};
-                background-color: {colors['surface']};
-                border-radius: 6px;
-                margin-top: 5px;
-            }}
-
-            QTabBar::tab {{
-                background-color: {colors['surface']};
-                color: {colors['text_secondary']};
-                padding: 8px 16px;
-                border: 1px solid {colors['border']};
-                border-bottom: none;
-                border-top-left-radius: 6px;
-                border-top-right-radius: 6px;
-                margin-right: 2px;
-                font-weight: bold;
-                font-size: {font_size}px;
-                min-width: 100px;
-            }}
-
-            QTabBar::tab:selected {{
-                background-color: {colors['primary']};
-                color: white;
-                border-color: {colors['primary']};
-            }}
-
-            QTabBar::tab:hover:!selected {{
-                background-color: {self.adjust_color(colors['primary'], 40)};
-                color: white;
-            }}
-
-            /* ГРУППЫ */
-            QGroupBox {{
-                font-weight: bold;
-                border: 2px solid {colors['primary']};
-                border-radius: 8px;
-                margin-top: 10px;
-                padding-top: 12px;
-                background-color: {colors['surface']};
-                color: {colors['text']};
-                font-size: {font_size}px;
-            }}
-
-            QGroupBox::title {{
-                subcontrol-origin: margin;
-                left: 12px;
-                padding: 0 8px 0 8px;
-                color: {colors['primary']};
-                background-color: {colors['surface']};
-                font-size: {font_size}px;
-            }}
-
-            /* ПОЛЯ ВВОДА */
-            QLineEdit, QComboBox, QSpinBox {{
-                padding: 6px 10px;
-                border: 1px solid {colors['border']};
-                border-radius: 4px;
-                background-color: {colors['surface']};
-                color: {colors['text']};
-                font-size: {font_size}px;
-                selection-background-color: {colors['primary']};
-                min-height: 20px;
-            }}
-
-            QLineEdit:focus, QComboBox:focus, QSpinBox:focus {{
-                border-color: {colors['primary']};
-                background-color: {self.adjust_color(colors['surface'], 5)};
-            }}
-
-            QComboBox::drop-down {{
-                border: none;
-                background-color: {colors['primary']};
-                width: 20px;
-                border-top-right-radius: 4px;
-                border-bottom-right-radius: 4px;
-            }}
-
-            QComboBox::down-arrow {{
-                image: none;
-                border-left: 4px solid transparent;
-                border-right: 4px solid transparent;
-                border-top: 4px solid white;
-                width: 0px;
-                height: 0px;
-            }}
-
-            /* ТАБЛИЦЫ */
-            QTableWidget {{
-                gridline-color: {colors['border']};
-                background-color: {colors['surface']};
-                color: {colors['text']};
-                border: 1px solid {colors['border']};
-                border-radius: 4px;
-                font-size: {font_size}px;
-                alternate-background-color: {self.adjust_color(colors['surface'], 5)};
-            }}
-
-            QTableWidget::item {{
-                padding: 6px;
-                border-bottom: 1px solid {colors['border']};
-            }}
-
-            QTableWidget::item:selected {{
-                background-color: {colors['primary']};
-                color: white;
-            }}
-
-            QHeaderView::section {{
-                background-color: {colors['primary']};
-                color: white;
-                padding: 8px;
-                border: none;
-                font-weight: bold;
-                font-size: {font_size}px;
-            }}
-
-            /* МЕНЮ */
-            QMenuBar {{
-                background-color: {colors['primary']};
-                color: white;
-                border: none;
-                font-weight: bold;
-                font-size: {font_size}px;
-                padding: 4px;
-            }}
-
-            QMenuBar::item {{
-                background-color: transparent;
-                color: white;
-                padding: 6px 12px;
-                border-radius: 4px;
-                margin: 0 2px;
-            }}
-
-            QMenuBar::item:selected {{
-                background-color: {self.adjust_color(colors['primary'], 20)};
-            }}
-
-            QMenu {{
-                background-color: {colors['surface']};
-                color: {colors['text']};
-                border: 1px solid {colors['border']};
-                border-radius: 6px;
-                padding: 6px;
-            }}
-
-            QMenu::item {{
-                padding: 6px 20px;
-                border-radius: 4px;
-                font-size: {font_size}px;
-            }}
-
-            QMenu::item:selected {{
-                background-color: {colors['primary']};
-                color: white;
-            }}
-
-            /* СТАТУС БАР */
-            QStatusBar {{
-                background-color: {colors['surface']};
-                color: {colors['text_secondary']};
-                border-top: 1px solid {colors['border']};
-                font-size: {font_size - 1}px;
-                padding: 4px;
-            }}
-
-            /* CHECKBOX */
-            QCheckBox {{
-                font-size: {font_size}px;
-                color: {colors['text']};
-                spacing: 6px;
-            }}
-
-            QCheckBox::indicator {{
-                width: 16px;
-                height: 16px;
-                border: 1px solid {colors['border']};
-                border-radius: 3px;
-                background-color: {colors['surface']};
-            }}
-
-            QCheckBox::indicator:checked {{
-                background-color: {colors['primary']};
-                border: 1px solid {colors['primary']};
-            }}
-
-            /* SCROLLBAR */
-            QScrollBar:vertical {{
-                background-color: {colors['surface']};
-                width: 12px;
-                margin: 0px;
-                border-radius: 6px;
-            }}
-
-            QScrollBar::handle:vertical {{
-                background-color: {colors['primary']};
-                border-radius: 6px;
-                min-height: 20px;
-            }}
-
-            QScrollBar::handle:vertical:hover {{
-                background-color: {self.adjust_color(colors['primary'], 15)};
-            }}
-        """
-
-        return style
+        """Генерация CSS стилей на основе темы и настроек (из кэша theme_styles)"""
+        return style_sheet_for(ui_settings)
 
     def adjust_color(self, color, amount):
         """Осветлить или затемнить цвет"""
-        if color.startswith('#'):
-            color = color[1:]
-
-        r = int(color[0:2], 16)
-        g = int(color[2:4], 16)
-        b = int(color[4:6], 16)
-
-        r = max(0, min(255, r + amount))
-        g = max(0, min(255, g + amount))
-        b = max(0, min(255, b + amount))
-
-        return f"#{r:02x}{g:02x}{b:02x}"
+        return adjust_color(color, amount)
 
     def create_balance_tab(self):
         widget = QWidget()
@@ -796,6 +439,11 @@ class MainWindow(QMainWindow):
         export_panel.addStretch()
         layout.addLayout(export_panel)
 
+        # Поиск по номеру транзакции, контрагенту и валюте
+        self.history_search_bar = SearchBar("🔍 Номер, контрагент или валюта...")
+        self.history_search_bar.search_requested.connect(self.load_history)
+        layout.addWidget(self.history_search_bar)
+
         self.history_table = QTableWidget()
         self.history_table.setColumnCount(7)
         self.history_table.setHorizontalHeaderLabels([
@@ -806,6 +454,7 @@ class MainWindow(QMainWindow):
 
         return widget
 
+    @instrumentation.timed("main.load_data")
     def load_data(self):
         """Загрузка всех данных"""
         try:
@@ -813,6 +462,7 @@ class MainWindow(QMainWindow):
             self.load_history()
             self.load_exchange_rates()
             self.load_exchanges()
+            self.update_notifications_badge()
 
             # Обновляем состояние кнопки экспорта
             if hasattr(self, 'export_btn'):
@@ -822,41 +472,81 @@ class MainWindow(QMainWindow):
             print(f"Error loading data: {e}")
             QMessageBox.warning(self, "Ошибка", f"Ошибка загрузки данных: {str(e)}")
 
+    @instrumentation.timed("main.load_wallets")
     def load_wallets(self):
-        """Загрузка кошельков пользователя"""
-        wallets = self.session_db.query(Wallet).filter_by(user_id=self.user_id).all()
+        """Загрузка кошельков пользователя (все валюты, без кошелька - нулевой баланс)"""
+        wallets = user_wallets(self.session_db, self.user_id, refresh=True)
         self.wallets_table.setRowCount(len(wallets))
+        self.wallet_rows = {}
+        self.wallet_balances = {}
+
+        for row, (currency, wallet) in enumerate(wallets):
+            self.wallet_rows[currency.id] = row
+            self.set_wallet_row(row, currency, wallet)
+
+        self.update_wallet_values()
 
+        self.load_transfer_currencies(wallets)
+        self.load_exchange_currencies(wallets)
+
+    def set_wallet_row(self, row, currency, wallet):
+        balance = wallet.balance if wallet else 0.0
+        # Адрес кошелька известен и до его создания первым зачислением
+        address = wallet.address if wallet else wallet_address(currency.code, self.user_id, currency.id)
+        self.wallet_balances[currency.id] = (currency.code, balance)
+        self.wallets_table.setItem(row, 0, QTableWidgetItem(f"{currency.name} ({currency.code})"))
+        self.wallets_table.setItem(row, 1, QTableWidgetItem(f"{balance:.8f}"))
+        self.wallets_table.setItem(row, 3, QTableWidgetItem(address))
+
+    def update_wallet_values(self):
+        """Колонки, зависящие от курсов, и общий баланс - по уже загруженным балансам"""
         total_balance_usdt = 0
 
-        for row, wallet in enumerate(wallets):
-            self.wallets_table.setItem(row, 0, QTableWidgetItem(f"{wallet.currency.name} ({wallet.currency.code})"))
-            self.wallets_table.setItem(row, 1, QTableWidgetItem(f"{wallet.balance:.8f}"))
+        for currency_id, (code, balance) in self.wallet_balances.items():
+            row = self.wallet_rows[currency_id]
 
-            usdt_value = crypto_manager.convert_to_usdt(wallet.currency.code, wallet.balance)
+            usdt_value = crypto_manager.convert_to_usdt(code, balance)
             total_balance_usdt += usdt_value
             self.wallets_table.setItem(row, 2, QTableWidgetItem(f"{usdt_value:.2f} USDT"))
 
-            self.wallets_table.setItem(row, 3, QTableWidgetItem(wallet.address))
-
-            rate = crypto_manager.get_exchange_rate(wallet.currency.code)
-            self.wallets_table.setItem(row, 4, QTableWidgetItem(f"1 {wallet.currency.code} = {rate:.2f} USDT"))
+            rate = crypto_manager.get_exchange_rate(code)
+            self.wallets_table.setItem(row, 4, QTableWidgetItem(f"1 {code} = {rate:.2f} USDT"))
 
         self.total_balance_label.setText(f"{total_balance_usdt:.2f} USDT")
 
-        self.load_transfer_currencies(wallets)
-        self.load_exchange_currencies(wallets)
+    def refresh_wallets(self, currency_ids):
+        """Перечитать кошельки пользователя только по указанным валютам"""
+        wallets = user_wallets(self.session_db, self.user_id, currency_ids, refresh=True)
+
+        if any(currency.id not in self.wallet_rows for currency, _ in wallets):
+            # Новая валюта - меняется состав таблицы и списков валют
+            self.load_wallets()
+            return
+
+        for currency, wallet in wallets:
+            self.set_wallet_row(self.wallet_rows[currency.id], currency, wallet)
+
+            text = f"{currency.code} ({wallet.balance if wallet else 0.0:.6f})"
+            index = self.currency_combo.findData(currency.id)
+            if index >= 0:
+                self.currency_combo.setItemText(index, text)
+            for combo in (self.exchange_from_currency, self.exchange_to_currency):
+                index = combo.findData(currency.code)
+                if index >= 0:
+                    combo.setItemText(index, text)
+
+        self.update_wallet_values()
 
     def load_transfer_currencies(self, wallets):
-        current_wallet_id = self.currency_combo.currentData() if self.currency_combo.currentIndex() >= 0 else None
+        current_currency_id = self.currency_combo.currentData() if self.currency_combo.currentIndex() >= 0 else None
 
         self.currency_combo.clear()
 
-        for wallet in wallets:
-            self.currency_combo.addItem(f"{wallet.currency.code} ({wallet.balance:.6f})", wallet.id)
+        for currency, wallet in wallets:
+            self.currency_combo.addItem(f"{currency.code} ({wallet.balance if wallet else 0.0:.6f})", currency.id)
 
-        if current_wallet_id:
-            index = self.currency_combo.findData(current_wallet_id)
+        if current_currency_id:
+            index = self.currency_combo.findData(current_currency_id)
             if index >= 0:
                 self.currency_combo.setCurrentIndex(index)
 
@@ -870,9 +560,10 @@ class MainWindow(QMainWindow):
         self.exchange_from_currency.clear()
         self.exchange_to_currency.clear()
 
-        for wallet in wallets:
-            self.exchange_from_currency.addItem(f"{wallet.currency.code} ({wallet.balance:.6f})", wallet.currency.code)
-            self.exchange_to_currency.addItem(f"{wallet.currency.code} ({wallet.balance:.6f})", wallet.currency.code)
+        for currency, wallet in wallets:
+            text = f"{currency.code} ({wallet.balance if wallet else 0.0:.6f})"
+            self.exchange_from_currency.addItem(text, currency.code)
+            self.exchange_to_currency.addItem(text, currency.code)
 
         if current_from:
             index = self.exchange_from_currency.findData(current_from)
@@ -915,6 +606,7 @@ class MainWindow(QMainWindow):
 
         self.calculate_exchange()
 
+    @instrumentation.timed("main.load_exchanges")
     def load_exchanges(self):
         exchanges = (self.session_db.query(Exchange)
                      .filter((Exchange.user_id_from == self.user_id) |
@@ -925,42 +617,47 @@ class MainWindow(QMainWindow):
         self.exchanges_table.setRowCount(len(exchanges))
 
         for row, exchange in enumerate(exchanges):
-            self.exchanges_table.setItem(row, 0, QTableWidgetItem(
-                exchange.created_date.strftime("%d.%m.%Y %H:%M")))
+            self.set_exchange_row(row, exchange)
 
-            if exchange.user_id_from == self.user_id:
-                type_text = "📤 Исходящий"
-            else:
-                type_text = "📥 Входящий"
-            self.exchanges_table.setItem(row, 1, QTableWidgetItem(type_text))
+    def set_exchange_row(self, row, exchange):
+        date_item = QTableWidgetItem(exchange.created_date.strftime("%d.%m.%Y %H:%M"))
+        date_item.setData(Qt.UserRole, exchange.id)
+        self.exchanges_table.setItem(row, 0, date_item)
 
-            if exchange.user_id_from == self.user_id:
-                partner = exchange.user_to.full_name
-            else:
-                partner = exchange.user_from.full_name
-            self.exchanges_table.setItem(row, 2, QTableWidgetItem(partner))
+        if exchange.user_id_from == self.user_id:
+            type_text = "📤 Исходящий"
+        else:
+            type_text = "📥 Входящий"
+        self.exchanges_table.setItem(row, 1, QTableWidgetItem(type_text))
 
-            if exchange.user_id_from == self.user_id:
-                give_text = f"{exchange.amount_from} {exchange.currency_from.code}"
-            else:
-                give_text = f"{exchange.amount_to} {exchange.currency_to.code}"
-            self.exchanges_table.setItem(row, 3, QTableWidgetItem(give_text))
+        if exchange.user_id_from == self.user_id:
+            partner = exchange.user_to.full_name
+        else:
+            partner = exchange.user_from.full_name
+        self.exchanges_table.setItem(row, 2, QTableWidgetItem(partner))
 
-            if exchange.user_id_from == self.user_id:
-                receive_text = f"{exchange.amount_to} {exchange.currency_to.code}"
-            else:
-                receive_text = f"{exchange.amount_from} {exchange.currency_from.code}"
-            self.exchanges_table.setItem(row, 4, QTableWidgetItem(receive_text))
-
-            status_item = QTableWidgetItem(exchange.status.value)
-            if exchange.status == ExchangeStatus.COMPLETED:
-                status_item.setForeground(QColor("#2E8B57"))
-            elif exchange.status == ExchangeStatus.PENDING:
-                status_item.setForeground(QColor("#FF8C00"))
-            else:
-                status_item.setForeground(QColor("#DC143C"))
-            self.exchanges_table.setItem(row, 5, status_item)
+        if exchange.user_id_from == self.user_id:
+            give_text = f"{exchange.amount_from} {exchange.currency_from.code}"
+        else:
+            give_text = f"{exchange.amount_to} {exchange.currency_to.code}"
+        self.exchanges_table.setItem(row, 3, QTableWidgetItem(give_text))
 
+        if exchange.user_id_from == self.user_id:
+            receive_text = f"{exchange.amount_to} {exchange.currency_to.code}"
+        else:
+            receive_text = f"{exchange.amount_from} {exchange.currency_from.code}"
+        self.exchanges_table.setItem(row, 4, QTableWidgetItem(receive_text))
+
+        status_item = QTableWidgetItem(exchange.status.value)
+        if exchange.status == ExchangeStatus.COMPLETED:
+            status_item.setForeground(QColor("#2E8B57"))
+        elif exchange.status == ExchangeStatus.PENDING:
+            status_item.setForeground(QColor("#FF8C00"))
+        else:
+            status_item.setForeground(QColor("#DC143C"))
+        self.exchanges_table.setItem(row, 5, status_item)
+
+    @instrumentation.timed("main.load_exchange_rates")
     def load_exchange_rates(self):
         rates = crypto_manager.get_all_rates()
         self.rates_table.setRowCount(len(rates))
@@ -1002,50 +699,67 @@ class MainWindow(QMainWindow):
         }
         return names.get(code, code)
 
+    @instrumentation.timed("main.load_history")
     def load_history(self):
         try:
-            transactions = (self.session_db.query(Transaction)
-                            .filter((Transaction.user_id_from == self.user_id) |
-                                    (Transaction.user_id_to == self.user_id))
-                            .order_by(Transaction.created_date.desc())
-                            .limit(50).all())
+            search = self.history_search_bar.text()
+            if search:
+                transactions, has_more = text_search.search_transactions(
+                    self.user_id, search, self.history_search_bar.page, session=self.session_db)
+            else:
+                transactions = (self.session_db.query(Transaction)
+                                .filter((Transaction.user_id_from == self.user_id) |
+                                        (Transaction.user_id_to == self.user_id))
+                                .order_by(Transaction.created_date.desc())
+                                .limit(50).all())
+                has_more = False
+            self.history_search_bar.set_has_more(has_more)
 
             self.history_table.setRowCount(len(transactions))
 
             for row, transaction in enumerate(transactions):
-                self.history_table.setItem(row, 0, QTableWidgetItem(
-                    transaction.created_date.strftime("%d.%m.%Y %H:%M")))
+                self.set_history_row(row, transaction)
+        except Exception as e:
+            print(f"Error loading history: {e}")
+            self.history_table.setRowCount(0)
 
-                type_text = "📤 Отправка" if transaction.user_id_from == self.user_id else "📥 Получение"
-                self.history_table.setItem(row, 1, QTableWidgetItem(type_text))
+    def set_history_row(self, row, transaction):
+        date_item = QTableWidgetItem(transaction.created_date.strftime("%d.%m.%Y %H:%M"))
+        date_item.setData(Qt.UserRole, transaction.id)
+        self.history_table.setItem(row, 0, date_item)
 
-                self.history_table.setItem(row, 2, QTableWidgetItem(
-                    transaction.user_from.full_name if transaction.user_from else "System"))
+        if transaction.type == TransactionType.DEPOSIT:
+            type_text = "📥 Пополнение"
+        elif transaction.type == TransactionType.WITHDRAWAL:
+            type_text = "📤 Вывод"
+        else:
+            type_text = "📤 Отправка" if transaction.user_id_from == self.user_id else "📥 Получение"
+        self.history_table.setItem(row, 1, QTableWidgetItem(type_text))
 
-                self.history_table.setItem(row, 3, QTableWidgetItem(
-                    transaction.user_to.full_name if transaction.user_to else "System"))
+        self.history_table.setItem(row, 2, QTableWidgetItem(
+            transaction.user_from.full_name if transaction.user_from else "System"))
 
-                currency_code = transaction.currency_rel.code if transaction.currency_rel else "N/A"
-                self.history_table.setItem(row, 4, QTableWidgetItem(currency_code))
+        self.history_table.setItem(row, 3, QTableWidgetItem(
+            transaction.user_to.full_name if transaction.user_to else "System"))
 
-                amount_item = QTableWidgetItem(f"{transaction.amount:.8f}")
-                if transaction.user_id_from == self.user_id:
-                    amount_item.setForeground(QColor("#DC143C"))
-                else:
-                    amount_item.setForeground(QColor("#2E8B57"))
-                self.history_table.setItem(row, 5, amount_item)
-
-                status_item = QTableWidgetItem(transaction.status)
-                if transaction.status == 'completed':
-                    status_item.setForeground(QColor("#2E8B57"))
-                elif transaction.status == 'pending':
-                    status_item.setForeground(QColor("#FF8C00"))
-                else:
-                    status_item.setForeground(QColor("#DC143C"))
-                self.history_table.setItem(row, 6, status_item)
-        except Exception as e:
-            print(f"Error loading history: {e}")
-            self.history_table.setRowCount(0)
+        currency_code = transaction.currency_rel.code if transaction.currency_rel else "N/A"
+        self.history_table.setItem(row, 4, QTableWidgetItem(currency_code))
+
+        amount_item = QTableWidgetItem(f"{transaction.amount:.8f}")
+        if transaction.user_id_from == self.user_id:
+            amount_item.setForeground(QColor("#DC143C"))
+        else:
+            amount_item.setForeground(QColor("#2E8B57"))
+        self.history_table.setItem(row, 5, amount_item)
+
+        status_item = QTableWidgetItem(transaction.status)
+        if transaction.status == 'completed':
+            status_item.setForeground(QColor("#2E8B57"))
+        elif transaction.status == 'pending':
+            status_item.setForeground(QColor("#FF8C00"))
+        else:
+            status_item.setForeground(QColor("#DC143C"))
+        self.history_table.setItem(row, 6, status_item)
 
     def calculate_fee(self):
         try:
@@ -1099,11 +813,63 @@ class MainWindow(QMainWindow):
             self.exchange_rate_label.setText("Курс: -")
 
     def update_rates_display(self):
-        crypto_manager.update_exchange_rates()
+        # Сами курсы обновляет задача rates_tick планировщика, здесь только отрисовка
         self.load_exchange_rates()
-        self.load_wallets()
+        self.update_wallet_values()
         self.calculate_exchange()
 
+    @staticmethod
+    def find_row(table, record_id):
+        """Строка таблицы по id записи в Qt.UserRole первой колонки"""
+        for row in range(table.rowCount()):
+            item = table.item(row, 0)
+            if item and item.data(Qt.UserRole) == record_id:
+                return row
+        return None
+
+    def refresh_table_row(self, table, record, set_row, limit, insert=True):
+        """Обновить строку записи или вставить ее первой (таблица - последние limit записей)"""
+        row = self.find_row(table, record.id)
+        if row is None:
+            if not insert:
+                return
+            table.insertRow(0)
+            row = 0
+            if table.rowCount() > limit:
+                table.setRowCount(limit)
+        set_row(row, record)
+
+    def on_event(self, event, payload):
+        """Событие шины: проведенная операция или новое уведомление пользователя"""
+        try:
+            if event == NOTIFICATION_CREATED:
+                if payload.get('user_id') == self.user_id:
+                    self.update_notifications_badge()
+                return
+
+            if self.user_id not in (payload.get('user_id_from'), payload.get('user_id_to')):
+                return
+
+            if event in (TRANSFER_COMPLETED, TRANSFER_FAILED, TRANSFER_CANCELLED,
+                         DEPOSIT_CREDITED, WITHDRAWAL_COMPLETED):
+                # Вывод списан при запросе - по подтверждению меняется только статус операции
+                if event in (TRANSFER_COMPLETED, DEPOSIT_CREDITED):
+                    self.refresh_wallets([payload['currency_id']])
+                transaction = self.session_db.query(Transaction).populate_existing().get(payload['transaction_id'])
+                if transaction:
+                    # В режиме поиска не добавляем строки, не подходящие под запрос
+                    self.refresh_table_row(self.history_table, transaction, self.set_history_row, 50,
+                                           insert=not self.history_search_bar.text())
+            else:
+                if event == EXCHANGE_COMPLETED:
+                    self.refresh_wallets([payload['currency_from_id'], payload['currency_to_id']])
+                exchange = self.session_db.query(Exchange).populate_existing().get(payload['exchange_id'])
+                if exchange:
+                    self.refresh_table_row(self.exchanges_table, exchange, self.set_exchange_row, 20)
+        except Exception as e:
+            print(f"Error handling event {event}: {e}")
+
+    @instrumentation.timed("main.make_transfer")
     def make_transfer(self):
         """Выполнение перевода - ТОЛЬКО СОЗДАНИЕ, БЕЗ СПИСАНИЯ"""
         try:
@@ -1111,7 +877,7 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Ошибка", "Выберите валюту для перевода!")
                 return
 
-            wallet_id = self.currency_combo.currentData()
+            currency_id = self.currency_combo.currentData()
             recipient_id = self.recipient_input.text()
 
             try:
@@ -1120,7 +886,7 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Ошибка", "Введите корректную сумму!")
                 return
 
-            if not all([wallet_id, recipient_id, amount > 0]):
+            if not all([currency_id, recipient_id, amount > 0]):
                 QMessageBox.warning(self, "Ошибка", "Заполните все поля корректно!")
                 return
 
@@ -1128,11 +894,12 @@ class MainWindow(QMainWindow):
 
             # Используем транзакцию для создания перевода
             with transaction_session() as session:
-                wallet = session.query(Wallet).get(wallet_id)
+                wallet = find_wallet(session, self.user_id, currency_id)
+                balance = wallet.balance if wallet else 0.0
                 total_amount = amount * 1.01
 
-                if wallet.balance < total_amount:
-                    raise ValueError(f"Недостаточно средств! Доступно: {wallet.balance:.8f}")
+                if balance < total_amount:
+                    raise ValueError(f"Недостаточно средств! Доступно: {balance:.8f}")
 
                 # Поиск получателя
                 recipient = (session.query(User)
@@ -1145,13 +912,7 @@ class MainWindow(QMainWindow):
                 if recipient.id == self.user_id:
                     raise ValueError("Нельзя переводить самому себе!")
 
-                # Поиск кошелька получателя
-                recipient_wallet = (session.query(Wallet)
-                                    .filter_by(user_id=recipient.id, currency_id=wallet.currency_id)
-                                    .first())
-
-                if not recipient_wallet:
-                    raise ValueError("У получателя нет кошелька для этой валюты!")
+                # Кошелек получателя не нужен: он создается при зачислении
 
                 # Создаем транзакцию PENDING
                 transaction = Transaction(
@@ -1159,7 +920,7 @@ class MainWindow(QMainWindow):
                     user_id_from=self.user_id,
                     user_id_to=recipient.id,
                     amount=amount,
-                    currency_id=wallet.currency_id,
+                    currency_id=currency_id,
                     status='pending'
                 )
                 session.add(transaction)
@@ -1202,6 +963,7 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при переводе: {str(e)}")
 
+    @instrumentation.timed("main.create_exchange")
     def create_exchange(self):
         """Создание P2P обмена с использованием транзакции"""
         try:
@@ -1338,7 +1100,7 @@ class MainWindow(QMainWindow):
         dialog.exec_()
 
     def export_transaction_history(self):
-        """Упрощенный экспорт истории транзакций"""
+        """Экспорт истории транзакций (генерация и отправка идут в фоне)"""
         try:
             # Проверка Telegram
             if not self.user.telegram_id:
@@ -1351,66 +1113,13 @@ class MainWindow(QMainWindow):
             period_days = self.export_period_combo.currentData()
             period_text = self.export_period_combo.currentText()
 
-            from datetime import datetime, timedelta
-            from sqlalchemy import and_
-
-            # Получаем транзакции
-            session = self.session_db
-            date_from = datetime.now() - timedelta(days=period_days)
-
-            transactions = (session.query(Transaction)
-                            .options(
-                joinedload(Transaction.user_from),
-                joinedload(Transaction.user_to),
-                joinedload(Transaction.currency_rel)
-            )
-                            .filter(
-                and_(
-                    (Transaction.user_id_from == self.user_id) |
-                    (Transaction.user_id_to == self.user_id),
-                    Transaction.created_date >= date_from
-                )
-            )
-                            .order_by(Transaction.created_date.desc())
-                            .all())
-
-            if not transactions:
-                QMessageBox.information(self, "Информация",
-                                        f"Нет транзакций за {period_text.lower()}.")
-                return
+            from report_jobs import report_queue
 
-            # Показываем что начинаем обработку
-            QMessageBox.information(self, "📤 Экспорт",
-                                    f"Начинаю экспорт истории...\n"
-                                    f"Период: {period_text}\n"
-                                    f"Транзакций: {len(transactions)}")
-
-            # Подготавливаем данные
-            transactions_data = []
-            for t in transactions:
-                if t.user_id_from == self.user_id:
-                    trans_type = "Отправка"
-                    counterparty = t.user_to.full_name if t.user_to else "Система"
-                else:
-                    trans_type = "Получение"
-                    counterparty = t.user_from.full_name if t.user_from else "Система"
-
-                status_map = {
-                    'completed': '✅ Выполнено',
-                    'pending': '⏳ Ожидание',
-                    'cancelled': '❌ Отменено',
-                    'failed': '❌ Ошибка'
-                }
-                status = status_map.get(t.status, t.status)
-
-                transactions_data.append({
-                    'date': t.created_date.strftime("%d.%m.%Y %H:%M"),
-                    'type': trans_type,
-                    'currency': t.currency_rel.code if t.currency_rel else "N/A",
-                    'amount': t.amount,
-                    'counterparty': counterparty,
-                    'status': status
-                })
+            if not hasattr(self, 'report_jobs'):
+                self.report_jobs = {}
+                report_queue.progress.connect(self.on_report_progress)
+                report_queue.finished.connect(self.on_report_finished)
+                report_queue.failed.connect(self.on_report_failed)
 
             user_info = {
                 'id': self.user.id,
@@ -1419,69 +1128,57 @@ class MainWindow(QMainWindow):
                 'role': self.user.get_role_display()
             }
 
-            period_info = f"{period_text} (с {date_from.strftime('%d.%m.%Y')})"
+            job_id = report_queue.submit(user_info, period_days, period_text,
+                                         telegram_id=self.user.telegram_id)
+            self.report_jobs[job_id] = period_text
 
-            # Пробуем создать PDF
-            try:
-                from pdf_generation import PDFGenerator
-                pdf_file = PDFGenerator.generate_transaction_history(
-                    transactions_data, user_info, period_info
-                )
-
-                if not pdf_file or not os.path.exists(pdf_file):
-                    QMessageBox.critical(self, "Ошибка", "Не удалось создать PDF файл")
-                    return
-
-                # Отправляем через Telegram
-                from bot import telegram_bot
-
-                caption = (f"📊 История транзакций\n\n"
-                           f"👤 {self.user.full_name}\n"
-                           f"📱 {self.user.phone}\n"
-                           f"{period_text}\n"
-                           f"📈 {len(transactions)} транзакций\n"
-                           f"🕐 {datetime.now().strftime('%d.%m.%Y %H:%M')}")
-
-                # Отправляем с обработкой исключений
-                try:
-                    success = telegram_bot.send_pdf_document(
-                        self.user.telegram_id,
-                        pdf_file,
-                        caption
-                    )
-
-                    if success:
-                        # Успех - показываем сообщение
-                        QMessageBox.information(self, "✅ Успешно",
-                                                f"Файл отправлен в Telegram!\n\n"
-                                                f"Период: {period_text}\n"
-                                                f"Транзакций: {len(transactions)}\n\n"
-                                                f"Проверьте чат с ботом.")
-                    else:
-                        QMessageBox.warning(self, "❌ Ошибка",
-                                            "Не удалось отправить файл.\n"
-                                            "Возможные причины:\n"
-                                            "• Нет интернета\n"
-                                            "• Бот не запущен\n"
-                                            "• Проблемы с Telegram API")
-
-                except Exception as send_error:
-                    QMessageBox.critical(self, "Ошибка отправки",
-                                         f"Ошибка при отправке:\n{str(send_error)}")
-
-            except ImportError:
-                QMessageBox.critical(self, "Ошибка",
-                                     "Библиотека reportlab не установлена!\n\n"
-                                     "Установите командой:\n"
-                                     "pip install reportlab")
-            except Exception as pdf_error:
-                QMessageBox.critical(self, "Ошибка создания PDF",
-                                     f"Ошибка: {str(pdf_error)}")
+            self.export_btn.setEnabled(False)
+            self.statusBar().showMessage(f"📤 Экспорт истории ({period_text}) выполняется в фоне...")
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка экспорта",
                                  f"Ошибка: {str(e)}")
 
+    def on_report_progress(self, job_id, pages, rows):
+        """Прогресс фоновой генерации выписки"""
+        if job_id in self.report_jobs:
+            self.statusBar().showMessage(f"📤 Экспорт: {pages} стр., {rows} транзакций обработано...")
+
+    def on_report_finished(self, job_id, pdf_file, rows, from_cache):
+        """Выписка готова и отправлена в Telegram"""
+        period_text = self.report_jobs.pop(job_id, None)
+        if period_text is None:
+            return
+
+        self.export_btn.setEnabled(True)
+        self.statusBar().clearMessage()
+
+        if not rows:
+            QMessageBox.information(self, "Информация",
+                                    f"Нет транзакций за {period_text.lower()}.")
+            return
+
+        QMessageBox.information(self, "✅ Успешно",
+                                f"Файл отправлен в Telegram!\n\n"
+                                f"Период: {period_text}\n"
+                                f"Транзакций: {rows}\n"
+                                f"{'(готовый отчет из кэша)' if from_cache else ''}\n\n"
+                                f"Проверьте чат с ботом.")
+
+    def on_report_failed(self, job_id, error):
+        """Ошибка фоновой генерации или отправки выписки"""
+        if self.report_jobs.pop(job_id, None) is None:
+            return
+
+        self.export_btn.setEnabled(True)
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, "❌ Ошибка",
+                            f"Не удалось выгрузить историю:\n{error}\n\n"
+                            "Возможные причины:\n"
+                            "• Нет интернета\n"
+                            "• Бот не запущен\n"
+                            "• Проблемы с Telegram API")
+
     def show_simple_message(self, title, message):
         """Простое сообщение без лишних кнопок"""
         msg_box = QMessageBox(self)
@@ -1492,5 +1189,9 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         self.rates_timer.stop()
+        self.events.close()
+        if self.user_session_id:
+            QApplication.instance().removeEventFilter(self)
+            session_store.end(self.user_session_id)
         self.session_db.close()
         event.accept()
\ No newline at end of file
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Enum
+from sqlalchemy import (Column, Integer, String, Float, DateTime, Date, Boolean, ForeignKey, Text, Enum,
+                        UniqueConstraint, Index)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -35,12 +36,32 @@ class UserRole(enum.Enum):
     ADMIN = "ADMIN"  # Администратор
 
 
+# Отображаемые названия ролей
+ROLE_DISPLAY_NAMES = {
+    UserRole.USER: "Пользователь",
+    UserRole.MODERATOR: "Модератор",
+    UserRole.ADMIN: "Администратор"
+}
+
+
 class SessionStatus(enum.Enum):
     ACTIVE = "ACTIVE"
     EXPIRED = "EXPIRED"
     LOGGED_OUT = "LOGGED_OUT"
 
 
+class DepositStatus(enum.Enum):
+    PENDING = "PENDING"  # Ждет подтверждений сети
+    CREDITED = "CREDITED"  # Зачислен на кошелек
+    IGNORED = "IGNORED"  # Меньше минимального пополнения валюты
+
+
+class WithdrawalStatus(enum.Enum):
+    QUEUED = "QUEUED"  # Ждет отправки пакетом
+    BROADCAST = "BROADCAST"  # Отправлен в сеть
+    CONFIRMED = "CONFIRMED"  # Подтвержден сетью
+
+
 class Theme(enum.Enum):
     LIGHT = "light"
     DARK = "dark"
@@ -90,12 +111,7 @@ class User(Base):
 
     def get_role_display(self):
         """Получить отображаемое название роли"""
-        role_names = {
-            UserRole.USER: "Пользователь",
-            UserRole.MODERATOR: "Модератор",
-            UserRole.ADMIN: "Администратор"
-        }
-        return role_names.get(self.role, "Пользователь")
+        return ROLE_DISPLAY_NAMES.get(self.role, "Пользователь")
 
 class Session(Base):
     __tablename__ = 'sessions'
@@ -107,7 +123,10 @@ class Session(Base):
     status = Column(Enum(SessionStatus), default=SessionStatus.ACTIVE)
     ip_address = Column(String(45))
     user_agent = Column(String(255))
-    token = Column(String(255))
+    token = Column(String(255), unique=True, index=True)
+
+    # Для истечения сессий одним UPDATE по активным
+    __table_args__ = (Index('ix_sessions_status_activity', 'status', 'last_activity'),)
 
     # Relationships
     user = relationship("User", back_populates="sessions")
@@ -136,6 +155,9 @@ class Wallet(Base):
     address = Column(String(255), unique=True, nullable=False)
     balance = Column(Float, default=0.0)
 
+    # Один кошелек на пользователя и валюту (кошельки создаются при первом зачислении)
+    __table_args__ = (Index('ix_wallets_user_currency', 'user_id', 'currency_id', unique=True),)
+
     # Relationships
     user = relationship("User", back_populates="wallets")
     currency = relationship("Currency", back_populates="wallets")
@@ -153,6 +175,12 @@ class Transaction(Base):
     created_date = Column(DateTime, default=func.now())
     status = Column(String(20), default='pending')
 
+    # Выписка читает отправленные и полученные пользователя по дате
+    __table_args__ = (Index('ix_transactions_from_date', 'user_id_from', 'created_date'),
+                      Index('ix_transactions_to_date', 'user_id_to', 'created_date'),
+                      # Месячные партиции массовой выгрузки
+                      Index('ix_transactions_created_date', 'created_date'))
+
     # Relationships
     user_from = relationship("User", foreign_keys=[user_id_from], back_populates="sent_transactions")
     user_to = relationship("User", foreign_keys=[user_id_to], back_populates="received_transactions")
@@ -167,6 +195,66 @@ class Transaction(Base):
         return self.status == 'pending'
 
 
+class ChainDeposit(Base):
+    """Входящий платеж сети на адрес нашего кошелька (выход транзакции txid:vout)"""
+    __tablename__ = 'chain_deposits'
+
+    id = Column(Integer, primary_key=True)
+    txid = Column(String(100), nullable=False)
+    vout = Column(Integer, nullable=False, default=0)
+    address = Column(String(255), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    currency_id = Column(Integer, ForeignKey('currencies.id'), nullable=False)
+    amount = Column(Float, nullable=False)
+    block_height = Column(Integer, nullable=False)
+    block_time = Column(DateTime)
+    status = Column(Enum(DepositStatus), default=DepositStatus.PENDING)
+    transaction_id = Column(Integer, ForeignKey('transactions.id'), nullable=True)
+    created_date = Column(DateTime, default=func.now())
+    credited_date = Column(DateTime)
+
+    # Повторно доставленный выход не зачисляется дважды; зачисление - по статусу и высоте блока
+    __table_args__ = (UniqueConstraint('txid', 'vout', name='uq_chain_deposits_output'),
+                      Index('ix_chain_deposits_status_height', 'status', 'block_height'))
+
+    # Relationships
+    currency = relationship("Currency")
+    transaction = relationship("Transaction")
+
+
+class ChainState(Base):
+    """Последний блок узла, платежи которого записаны полностью (с него продолжается подписка)"""
+    __tablename__ = 'chain_state'
+
+    node = Column(String(100), primary_key=True)
+    height = Column(Integer, nullable=False, default=0)
+    updated_date = Column(DateTime, default=func.now())
+
+
+class Withdrawal(Base):
+    """Вывод средств на внешний адрес (отправляется в сеть пакетами)"""
+    __tablename__ = 'withdrawals'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    currency_id = Column(Integer, ForeignKey('currencies.id'), nullable=False)
+    address = Column(String(255), nullable=False)
+    amount = Column(Float, nullable=False)
+    status = Column(Enum(WithdrawalStatus), default=WithdrawalStatus.QUEUED)
+    batch_id = Column(String(32), index=True)
+    txid = Column(String(100))
+    transaction_id = Column(Integer, ForeignKey('transactions.id'), nullable=True)
+    created_date = Column(DateTime, default=func.now())
+    broadcast_date = Column(DateTime)
+    confirmed_date = Column(DateTime)
+
+    __table_args__ = (Index('ix_withdrawals_status_currency', 'status', 'currency_id'),)
+
+    # Relationships
+    currency = relationship("Currency")
+    transaction = relationship("Transaction")
+
+
 class Exchange(Base):
     __tablename__ = 'exchanges'
 
@@ -181,6 +269,9 @@ class Exchange(Base):
     created_date = Column(DateTime, default=func.now())
     completed_date = Column(DateTime)
 
+    # Месячные партиции массовой выгрузки
+    __table_args__ = (Index('ix_exchanges_created_date', 'created_date'),)
+
     # Relationships
     user_from = relationship("User", foreign_keys=[user_id_from], back_populates="sent_exchanges")
     user_to = relationship("User", foreign_keys=[user_id_to], back_populates="received_exchanges")
@@ -197,6 +288,9 @@ class Commission(Base):
     amount = Column(Float, nullable=False)
     type = Column(String(50))
 
+    # Партиции выгрузки идут по дате транзакции, комиссия находится по ее id
+    __table_args__ = (Index('ix_commissions_transaction', 'transaction_id'),)
+
     # Relationships
     transaction = relationship("Transaction", back_populates="commission")
 
@@ -233,6 +327,36 @@ class Notification(Base):
     exchange = relationship("Exchange", back_populates="notifications")
 
 
+class NotificationCounter(Base):
+    """Число непрочитанных уведомлений пользователя (ведут триггеры на notifications)"""
+    __tablename__ = 'notification_counters'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    unread = Column(Integer, default=0, nullable=False)
+
+
+class UserDailyStats(Base):
+    """Дневные итоги пользователя по валюте (обновляются при проведении операций)"""
+    __tablename__ = 'user_daily_stats'
+    __table_args__ = (UniqueConstraint('user_id', 'day', 'currency_id', name='uq_user_daily_stats'),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    day = Column(Date, nullable=False)
+    currency_id = Column(Integer, ForeignKey('currencies.id'), nullable=False)
+    sent_count = Column(Integer, default=0, nullable=False)
+    sent_amount = Column(Float, default=0.0, nullable=False)
+    received_count = Column(Integer, default=0, nullable=False)
+    received_amount = Column(Float, default=0.0, nullable=False)
+    commission_paid = Column(Float, default=0.0, nullable=False)
+    exchanges_count = Column(Integer, default=0, nullable=False)
+    exchanged_out = Column(Float, default=0.0, nullable=False)
+    exchanged_in = Column(Float, default=0.0, nullable=False)
+
+    # Relationships
+    currency = relationship("Currency")
+
+
 class UserInterface(Base):
     __tablename__ = 'user_interface'
 
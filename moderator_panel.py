@@ -7,6 +7,10 @@ from PyQt5.QtGui import QFont, QColor
 from database import db
 from models import User, UserStatus, Transaction, Exchange, Currency
 from transaction_utils import transaction_session
+from user_stats import user_stats
+from text_search import text_search
+from widgets import SearchBar
+from instrumentation import instrumentation
 from datetime import datetime, timedelta
 
 
@@ -135,6 +139,11 @@ class ModeratorPanelDialog(QDialog):
 
         layout.addWidget(search_group)
 
+        # Поиск в транзакциях найденного пользователя (по релевантности, страницами)
+        self.operations_search_bar = SearchBar("🔍 Номер транзакции, контрагент или валюта...")
+        self.operations_search_bar.search_requested.connect(self.on_operations_search)
+        layout.addWidget(self.operations_search_bar)
+
         # Информация о пользователе
         self.user_operations_info_label = QLabel("Введите ID пользователя для просмотра операций за последние 30 дней")
         self.user_operations_info_label.setStyleSheet("font-weight: bold; padding: 10px;")
@@ -196,6 +205,12 @@ class ModeratorPanelDialog(QDialog):
 
     # ===================== МЕТОДЫ МОНИТОРИНГА =====================
 
+    def on_operations_search(self):
+        """Поиск в операциях - только когда пользователь уже указан"""
+        if self.user_operations_id_input.text().strip():
+            self.load_user_operations_30_days()
+
+    @instrumentation.timed("moderator.load_recent_activity")
     def load_recent_activity(self):
         """Загрузка последней активности"""
         try:
@@ -371,6 +386,7 @@ class ModeratorPanelDialog(QDialog):
 
     # ===================== МЕТОДЫ ОПЕРАЦИЙ ПОЛЬЗОВАТЕЛЯ (30 дней) =====================
 
+    @instrumentation.timed("moderator.load_user_operations_30_days")
     def load_user_operations_30_days(self):
         """Загрузка операций пользователя за последние 30 дней"""
         user_id_str = self.user_operations_id_input.text().strip()
@@ -405,18 +421,22 @@ class ModeratorPanelDialog(QDialog):
                 f"📅 Период: Последние 30 дней"
             )
 
-            # Загружаем транзакции пользователя за последние 30 дней
-            transactions = session.query(Transaction).filter(
-                ((Transaction.user_id_from == user_id) |
-                 (Transaction.user_id_to == user_id)) &
-                (Transaction.created_date >= thirty_days_ago)
-            ).order_by(Transaction.created_date.desc()).all()
+            # Загружаем транзакции пользователя за последние 30 дней (или результаты поиска по ним)
+            search = self.operations_search_bar.text()
+            if search:
+                transactions, has_more = text_search.search_transactions(
+                    user_id, search, self.operations_search_bar.page, since=thirty_days_ago, session=session)
+            else:
+                transactions = session.query(Transaction).filter(
+                    ((Transaction.user_id_from == user_id) |
+                     (Transaction.user_id_to == user_id)) &
+                    (Transaction.created_date >= thirty_days_ago)
+                ).order_by(Transaction.created_date.desc()).all()
+                has_more = False
+            self.operations_search_bar.set_has_more(has_more)
 
             self.user_operations_transactions_table.setRowCount(len(transactions))
 
-            total_sent = 0
-            total_received = 0
-
             for row, transaction in enumerate(transactions):
                 # Дата
                 date_str = transaction.created_date.strftime("%d.%m.%Y %H:%M") if transaction.created_date else "-"
@@ -429,10 +449,8 @@ class ModeratorPanelDialog(QDialog):
                 # Направление
                 if transaction.user_id_from == user_id:
                     direction = "📤 Отправка"
-                    total_sent += transaction.amount
                 else:
                     direction = "📥 Получение"
-                    total_received += transaction.amount
 
                 self.user_operations_transactions_table.setItem(row, 2, QTableWidgetItem(direction))
 
@@ -508,14 +526,19 @@ class ModeratorPanelDialog(QDialog):
                     status_item.setForeground(QColor("#f44336"))
                 self.user_operations_exchanges_table.setItem(row, 5, status_item)
 
+            # Суммы - из дневных агрегатов (только проведенные операции)
+            totals = user_stats.period_totals(user_id, thirty_days_ago.date(), session=session)
+
             # Обновляем статистику
-            self.user_total_transactions_label.setText(f"Транзакций: {len(transactions)}")
+            self.user_total_transactions_label.setText(
+                f"Найдено транзакций: {len(transactions)}" if search else f"Транзакций: {len(transactions)}")
             self.user_total_exchanges_label.setText(f"Обменов: {len(exchanges)}")
-            self.user_total_sent_label.setText(f"Отправлено: {total_sent:.2f}")
-            self.user_total_received_label.setText(f"Получено: {total_received:.2f}")
+            self.user_total_sent_label.setText(f"Отправлено: {user_stats.format_amounts(totals, 'sent_amount')}")
+            self.user_total_received_label.setText(
+                f"Получено: {user_stats.format_amounts(totals, 'received_amount')}")
 
             # Если нет операций за 30 дней
-            if len(transactions) == 0 and len(exchanges) == 0:
+            if not search and len(transactions) == 0 and len(exchanges) == 0:
                 QMessageBox.information(self, "Информация",
                                         f"У пользователя {user.full_name} нет операций за последние 30 дней.")
 
@@ -0,0 +1,216 @@
+"""
+Хранение уведомлений: срок жизни по типу/приоритету, удаление порциями, архив
+
+Просроченные уведомления удаляются порциями по chunk_size, каждая порция -
+отдельная короткая транзакция с паузой после нее, так что запись в базу
+(проведение операций, новые уведомления) не ждет всей очистки. Перед
+удалением порция дописывается в сжатый архив месяца создания
+(notifications-ГГГГ-ММ.jsonl.gz), который можно прочитать обратно через
+read_archive. Если процесс упадет между записью архива и удалением, строки
+попадут в архив повторно - при чтении дубли по id отбрасываются.
+
+Счетчики непрочитанных и поисковый индекс обновляются триггерами на удаление.
+"""
+import os
+import glob
+import gzip
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case
+from database import db
+from models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Срок хранения в днях: (тип, приоритет), None - любой.
+# Порядок выбора правила: тип и приоритет, только тип, только приоритет, default_days.
+DEFAULT_TTL_DAYS = {
+    ('system', None): 30,
+    ('transaction', None): 180,
+    ('exchange', None): 180,
+    ('security', None): 365,
+    (None, 3): 365,  # высокий приоритет
+}
+
+ARCHIVE_COLUMNS = (Notification.id, Notification.type, Notification.user_id, Notification.transaction_id,
+                   Notification.exchange_id, Notification.title, Notification.message,
+                   Notification.created_date, Notification.is_read, Notification.priority)
+
+
+class NotificationRetentionPolicy:
+    """
+    Сроки хранения уведомлений
+
+    Args:
+        default_days (int): Срок для уведомлений без подходящего правила
+        ttl_days (dict): {(тип или None, приоритет или None): дней}
+    """
+
+    def __init__(self, default_days=180, ttl_days=None):
+        self.default_days = default_days
+        self.ttl_days = dict(DEFAULT_TTL_DAYS if ttl_days is None else ttl_days)
+
+    def _ordered_rules(self):
+        """Правила от самых конкретных к общим"""
+        return sorted(self.ttl_days.items(),
+                      key=lambda rule: (rule[0][0] is None, rule[0][1] is None))
+
+    def ttl_for(self, type, priority):
+        for (rule_type, rule_priority), days in self._ordered_rules():
+            if rule_type in (None, type) and rule_priority in (None, priority):
+                return days
+        return self.default_days
+
+    def expired_condition(self, now=None):
+        """
+        SQL-условие "уведомление просрочено"
+
+        Первое слагаемое - граница по самому короткому сроку: по нему работает
+        индекс created_date, CASE проверяется только для строк старше нее.
+        """
+        now = now or datetime.now()
+        whens = []
+        for (rule_type, rule_priority), days in self._ordered_rules():
+            conditions = []
+            if rule_type is not None:
+                conditions.append(Notification.type == rule_type)
+            if rule_priority is not None:
+                conditions.append(Notification.priority == rule_priority)
+            whens.append((and_(*conditions), now - timedelta(days=days)))
+
+        cutoff = case(*whens, else_=now - timedelta(days=self.default_days)) if whens \
+            else now - timedelta(days=self.default_days)
+        shortest = min([self.default_days, *self.ttl_days.values()])
+        return and_(Notification.created_date < now - timedelta(days=shortest),
+                    Notification.created_date < cutoff)
+
+
+class NotificationRetention:
+    """Очистка и архивирование уведомлений (общий экземпляр - notification_retention)"""
+
+    def __init__(self, database=db, policy=None, archive_dir="notification_archive", archive=True,
+                 chunk_size=2000, pause=0.05, max_chunks=None):
+        self.db = database
+        self.policy = policy or NotificationRetentionPolicy()
+        self.archive_dir = archive_dir
+        self.archive = archive
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.max_chunks = max_chunks
+
+    def run(self, now=None):
+        """
+        Удаление просроченных уведомлений порциями
+
+        Returns:
+            dict: deleted, archived, chunks, seconds
+        """
+        started = time.perf_counter()
+        condition = self.policy.expired_condition(now)
+        stats = {'deleted': 0, 'archived': 0, 'chunks': 0}
+
+        while self.max_chunks is None or stats['chunks'] < self.max_chunks:
+            session = self.db.get_session()
+            try:
+                rows = session.query(*ARCHIVE_COLUMNS).filter(condition).limit(self.chunk_size).all()
+                if not rows:
+                    break
+
+                if self.archive:
+                    stats['archived'] += self._write_archive(rows)
+
+                ids = [row.id for row in rows]
+                stats['deleted'] += (session.query(Notification)
+                                     .filter(Notification.id.in_(ids))
+                                     .delete(synchronize_session=False))
+                session.commit()
+                stats['chunks'] += 1
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Ошибка очистки уведомлений: {e}")
+                break
+            finally:
+                session.close()
+
+            if len(rows) < self.chunk_size:
+                break
+            # Пауза между порциями - окно для других писателей
+            time.sleep(self.pause)
+
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        if stats['deleted']:
+            logger.info(f"🧹 Уведомления: удалено {stats['deleted']}, в архиве {stats['archived']} "
+                        f"({stats['chunks']} порций, {stats['seconds']} с)")
+        return stats
+
+    # ---- архив ----
+
+    def archive_path(self, month):
+        return os.path.join(self.archive_dir, f"notifications-{month}.jsonl.gz")
+
+    def _write_archive(self, rows):
+        """Дописать строки в архивы их месяцев (gzip допускает дописывание новым блоком)"""
+        by_month = {}
+        for row in rows:
+            month = row.created_date.strftime("%Y-%m") if row.created_date else "undated"
+            by_month.setdefault(month, []).append(row)
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        for month, month_rows in by_month.items():
+            with gzip.open(self.archive_path(month), 'at', encoding='utf-8') as f:
+                for row in month_rows:
+                    record = dict(row._mapping)
+                    record['created_date'] = row.created_date.isoformat() if row.created_date else None
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return len(rows)
+
+    def archive_months(self):
+        """Месяцы, за которые есть архивы (ГГГГ-ММ), по возрастанию"""
+        pattern = os.path.join(self.archive_dir, "notifications-*.jsonl.gz")
+        return sorted(os.path.basename(path)[len("notifications-"):-len(".jsonl.gz")]
+                      for path in glob.glob(pattern))
+
+    def read_archive(self, user_id=None, date_from=None, date_to=None, limit=None):
+        """
+        Уведомления из архива, новые сначала
+
+        Args:
+            user_id (int): Только уведомления пользователя
+            date_from, date_to (datetime): Период создания
+            limit (int): Не больше стольких записей
+
+        Returns:
+            list: Словари с полями уведомления (created_date - datetime)
+        """
+        months = self.archive_months()
+        if date_from:
+            months = [m for m in months if m == "undated" or m >= date_from.strftime("%Y-%m")]
+        if date_to:
+            months = [m for m in months if m == "undated" or m <= date_to.strftime("%Y-%m")]
+
+        records = {}
+        for month in reversed(months):
+            try:
+                with gzip.open(self.archive_path(month), 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        record = json.loads(line)
+                        if user_id is not None and record['user_id'] != user_id:
+                            continue
+                        created = record['created_date']
+                        record['created_date'] = datetime.fromisoformat(created) if created else None
+                        if date_from and (not record['created_date'] or record['created_date'] < date_from):
+                            continue
+                        if date_to and (not record['created_date'] or record['created_date'] > date_to):
+                            continue
+                        records[record['id']] = record
+            except (OSError, EOFError, ValueError) as e:
+                logger.error(f"Ошибка чтения архива уведомлений {month}: {e}")
+
+        result = sorted(records.values(), key=lambda r: r['created_date'] or datetime.min, reverse=True)
+        return result[:limit] if limit else result
+
+
+# Общая очистка уведомлений
+notification_retention = NotificationRetention()
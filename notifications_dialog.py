@@ -1,9 +1,16 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QListWidget, QListWidgetItem,
-                             QMessageBox, QSplitter, QWidget)
+                             QMessageBox, QSplitter, QWidget, QAbstractItemView)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont, QColor
+from types import SimpleNamespace
+from datetime import datetime
 from database import db
+from notification_retention import notification_retention
+from instrumentation import instrumentation
+from text_search import text_search
+from widgets import SearchBar, QtEventBridge
+from event_bus import NOTIFICATION_CREATED
 
 
 class NotificationsDialog(QDialog):
@@ -13,6 +20,15 @@ class NotificationsDialog(QDialog):
         self.init_ui()
         self.load_notifications()
 
+        # Новые уведомления добавляются в открытый список без перезагрузки
+        self.events = QtEventBridge(self)
+        self.events.event_received.connect(self.on_notification_created)
+        self.events.listen(NOTIFICATION_CREATED)
+
+    def done(self, result):
+        self.events.close()
+        super().done(result)
+
     def init_ui(self):
         self.setWindowTitle("🔔 Уведомления")
         self.setGeometry(300, 200, 700, 500)
@@ -21,16 +37,22 @@ class NotificationsDialog(QDialog):
         layout = QVBoxLayout()
 
         # Заголовок
-        title = QLabel("Уведомления")
-        title.setFont(QFont("Arial", 16, QFont.Bold))
-        title.setAlignment(Qt.AlignCenter)
-        layout.addWidget(title)
+        self.title_label = QLabel("Уведомления")
+        self.title_label.setFont(QFont("Arial", 16, QFont.Bold))
+        self.title_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.title_label)
+
+        # Поиск по заголовку и тексту (результаты - по релевантности)
+        self.search_bar = SearchBar("🔍 Поиск в уведомлениях...")
+        self.search_bar.search_requested.connect(self.load_notifications)
+        layout.addWidget(self.search_bar)
 
         # Список уведомлений и детали
         splitter = QSplitter(Qt.Horizontal)
 
         # Список уведомлений
         self.notifications_list = QListWidget()
+        self.notifications_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.notifications_list.currentItemChanged.connect(self.show_notification_details)
         splitter.addWidget(self.notifications_list)
 
@@ -61,13 +83,19 @@ class NotificationsDialog(QDialog):
         # Кнопки
         buttons_layout = QHBoxLayout()
 
-        mark_read_btn = QPushButton("Пометить прочитанным")
-        mark_read_btn.clicked.connect(self.mark_as_read)
-        buttons_layout.addWidget(mark_read_btn)
+        self.mark_read_btn = QPushButton("Пометить прочитанным")
+        self.mark_read_btn.clicked.connect(self.mark_as_read)
+        buttons_layout.addWidget(self.mark_read_btn)
+
+        self.mark_all_read_btn = QPushButton("Прочитать все")
+        self.mark_all_read_btn.clicked.connect(self.mark_all_as_read)
+        buttons_layout.addWidget(self.mark_all_read_btn)
 
-        mark_all_read_btn = QPushButton("Прочитать все")
-        mark_all_read_btn.clicked.connect(self.mark_all_as_read)
-        buttons_layout.addWidget(mark_all_read_btn)
+        # Старые уведомления, вынесенные из базы политикой хранения
+        self.archive_btn = QPushButton("📦 Архив")
+        self.archive_btn.setCheckable(True)
+        self.archive_btn.toggled.connect(self.load_notifications)
+        buttons_layout.addWidget(self.archive_btn)
 
         close_btn = QPushButton("Закрыть")
         close_btn.clicked.connect(self.accept)
@@ -77,45 +105,111 @@ class NotificationsDialog(QDialog):
 
         self.setLayout(layout)
 
+    @instrumentation.timed("notifications.load")
     def load_notifications(self):
         """Загрузка уведомлений"""
         self.notifications_list.clear()
-        notifications = db.get_user_notifications(self.user_id)
+        search = self.search_bar.text()
+        archive = self.archive_btn.isChecked()
+        self.mark_read_btn.setEnabled(not archive)
+        self.mark_all_read_btn.setEnabled(not archive)
+
+        if archive:
+            notifications, has_more = self.load_archived(search), False
+        elif search:
+            notifications, has_more = text_search.search_notifications(self.user_id, search, self.search_bar.page)
+        else:
+            notifications, has_more = db.get_user_notifications(self.user_id), False
+        self.search_bar.set_has_more(has_more)
+        self.update_unread_count()
 
         if not notifications:
-            item = QListWidgetItem("📭 Нет уведомлений")
+            item = QListWidgetItem("🔍 Ничего не найдено" if search else "📭 Нет уведомлений")
             item.setFlags(Qt.NoItemFlags)  # Делаем недоступным для выбора
             self.notifications_list.addItem(item)
             return
 
         for notification in notifications:
             item = QListWidgetItem()
-
-            # Иконка в зависимости от типа
-            icon = "💸" if notification.type == 'transaction' else \
-                "🔄" if notification.type == 'exchange' else \
-                    "🔐" if notification.type == 'security' else "⚙️"
-
-            # Дата и заголовок
-            date_str = notification.created_date.strftime("%d.%m %H:%M")
-            text = f"{icon} {date_str} - {notification.title}"
-
-            # Выделяем непрочитанные
-            if not notification.is_read:
-                text = f"🔔 {text}"
-                item.setBackground(QColor("#FFF0F0"))
-                item.setFont(QFont("Arial", 10, QFont.Bold))
-            else:
-                item.setFont(QFont("Arial", 9))
-
-            item.setText(text)
             item.setData(Qt.UserRole, notification)
+            self.render_item(item)
             self.notifications_list.addItem(item)
 
         # Выбираем первый элемент
         if self.notifications_list.count() > 0:
             self.notifications_list.setCurrentRow(0)
 
+    def on_notification_created(self, event, payload):
+        """Новое уведомление пользователя - первой строкой списка"""
+        if payload.get('user_id') != self.user_id:
+            return
+
+        self.update_unread_count()
+        # Поиск и архив показывают выборку - новое уведомление в нее не добавляем
+        if self.search_bar.text() or self.archive_btn.isChecked():
+            return
+
+        first = self.notifications_list.item(0)
+        if first and not first.data(Qt.UserRole):
+            self.notifications_list.takeItem(0)  # "Нет уведомлений"
+
+        created = payload.get('created_date')
+        notification = SimpleNamespace(**dict(payload, is_read=False,
+                                              created_date=datetime.fromisoformat(created) if created
+                                              else datetime.now()))
+        item = QListWidgetItem()
+        item.setData(Qt.UserRole, notification)
+        self.render_item(item)
+        self.notifications_list.insertItem(0, item)
+
+    def load_archived(self, search, limit=200):
+        """Уведомления из архива (поиск - простым вхождением, архив читается целиком)"""
+        search = search.lower()
+        records = notification_retention.read_archive(self.user_id)
+        if search:
+            records = [r for r in records if search in r['title'].lower() or search in r['message'].lower()]
+        return [SimpleNamespace(**record) for record in records[:limit]]
+
+    def render_item(self, item):
+        """Текст и оформление строки по уведомлению из данных элемента"""
+        notification = item.data(Qt.UserRole)
+
+        # Иконка в зависимости от типа
+        icon = "💸" if notification.type == 'transaction' else \
+            "🔄" if notification.type == 'exchange' else \
+                "🔐" if notification.type == 'security' else "⚙️"
+
+        # Дата и заголовок
+        date_str = notification.created_date.strftime("%d.%m %H:%M")
+        text = f"{icon} {date_str} - {notification.title}"
+
+        # Выделяем непрочитанные
+        if not notification.is_read:
+            text = f"🔔 {text}"
+            item.setBackground(QColor("#FFF0F0"))
+            item.setFont(QFont("Arial", 10, QFont.Bold))
+        else:
+            item.setBackground(QColor(Qt.transparent))
+            item.setFont(QFont("Arial", 9))
+
+        item.setText(text)
+
+    def update_unread_count(self):
+        """Число непрочитанных в заголовке (счетчик, без подсчета строк)"""
+        unread = db.get_unread_count(self.user_id)
+        self.title_label.setText(f"Уведомления ({unread} непрочитанных)" if unread else "Уведомления")
+
+    def mark_items_read(self, items):
+        """Перерисовать только строки, ставшие прочитанными"""
+        for item in items:
+            item.data(Qt.UserRole).is_read = True
+            self.render_item(item)
+        self.update_unread_count()
+
+    def unread_items(self):
+        items = (self.notifications_list.item(row) for row in range(self.notifications_list.count()))
+        return [item for item in items if item.data(Qt.UserRole) and not item.data(Qt.UserRole).is_read]
+
     def show_notification_details(self, current, previous):
         """Показать детали выбранного уведомления"""
         if current and current.data(Qt.UserRole):
@@ -125,27 +219,24 @@ class NotificationsDialog(QDialog):
             self.notification_message.setText(notification.message)
 
     def mark_as_read(self):
-        """Пометить выбранное уведомление как прочитанное"""
-        current_item = self.notifications_list.currentItem()
-        if current_item and current_item.data(Qt.UserRole):
-            notification = current_item.data(Qt.UserRole)
-            if db.mark_notification_read(notification.id):
-                self.load_notifications()
-                QMessageBox.information(self, "Успех", "Уведомление помечено как прочитанное!")
-        else:
+        """Пометить выбранные уведомления как прочитанные (одним запросом)"""
+        items = [item for item in self.notifications_list.selectedItems() if item.data(Qt.UserRole)]
+        if not items:
             QMessageBox.warning(self, "Внимание", "Выберите уведомление!")
+            return
+
+        unread = [item for item in items if not item.data(Qt.UserRole).is_read]
+        db.mark_notifications_read(self.user_id, [item.data(Qt.UserRole).id for item in unread])
+        self.mark_items_read(unread)
+        QMessageBox.information(self, "Успех", "Уведомление помечено как прочитанное!" if len(items) == 1
+                                else f"Помечено как прочитанные: {len(unread)} уведомлений!")
 
     def mark_all_as_read(self):
-        """Пометить все уведомления как прочитанные"""
-        notifications = db.get_user_notifications(self.user_id, unread_only=True)
-        if not notifications:
+        """Пометить все уведомления как прочитанные (одним запросом)"""
+        marked_count = db.mark_all_notifications_read(self.user_id)
+        if not marked_count:
             QMessageBox.information(self, "Информация", "Нет непрочитанных уведомлений!")
             return
 
-        marked_count = 0
-        for notification in notifications:
-            if db.mark_notification_read(notification.id):
-                marked_count += 1
-
-        self.load_notifications()
-        QMessageBox.information(self, "Успех", f"Помечено как прочитанные: {marked_count} уведомлений!")
\ No newline at end of file
+        self.mark_items_read(self.unread_items())
+        QMessageBox.information(self, "Успех", f"Помечено как прочитанные: {marked_count} уведомлений!")
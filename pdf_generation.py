@@ -5,9 +5,15 @@ from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
 from datetime import datetime
 import os
 import tempfile
+import threading
+
+
+STATEMENT_HEADERS = ["Дата", "Тип", "Валюта", "Сумма", "Контрагент", "Статус"]
+STATEMENT_COL_WIDTHS = [1.5 * inch, 1 * inch, 0.8 * inch, 1 * inch, 1.5 * inch, 1 * inch]
 
 
 class PDFGenerator:
@@ -15,7 +21,12 @@ class PDFGenerator:
 
     @staticmethod
     def register_russian_font():
-        """Регистрация шрифта с поддержкой кириллицы"""
+        """Регистрация шрифта с поддержкой кириллицы (один раз на процесс)"""
+        return pdf_styles.get().font_registered
+
+    @staticmethod
+    def _register_russian_font_uncached():
+        """Поиск и разбор TTF-файлов шрифта с поддержкой кириллицы"""
         try:
             # Ищем шрифт Arial в стандартных местах
             font_paths = [
@@ -67,28 +78,10 @@ class PDFGenerator:
         filename = f"История_транзакций_{user_info.get('id', 'user')}_{timestamp}.pdf"
         output_file = os.path.join(temp_dir, filename)
 
-        # Регистрируем русский шрифт
-        font_registered = PDFGenerator.register_russian_font()
-
-        # Определяем используемые шрифты
-        if font_registered:
-            # Проверяем какие шрифты доступны
-            try:
-                pdfmetrics.getFont('Arial-Bold')
-                normal_font = 'Arial'
-                bold_font = 'Arial-Bold'
-            except:
-                try:
-                    pdfmetrics.getFont('DejaVu-Bold')
-                    normal_font = 'DejaVu'
-                    bold_font = 'DejaVu-Bold'
-                except:
-                    # Возвращаемся к стандартным шрифтам
-                    normal_font = 'Helvetica'
-                    bold_font = 'Helvetica-Bold'
-        else:
-            normal_font = 'Helvetica'
-            bold_font = 'Helvetica-Bold'
+        # Шрифты и стили берем из общего реестра (строятся один раз)
+        registry = pdf_styles.get()
+        normal_font = registry.normal_font
+        bold_font = registry.bold_font
 
         # Создаем документ
         doc = SimpleDocTemplate(
@@ -100,32 +93,9 @@ class PDFGenerator:
         )
 
         elements = []
-        styles = getSampleStyleSheet()
-
-        # Создаем стили с русскими шрифтами
-        title_style = ParagraphStyle(
-            'RussianTitle',
-            parent=styles['Heading1'],
-            fontName=bold_font,
-            fontSize=16,
-            spaceAfter=20,
-            alignment=1
-        )
-
-        subtitle_style = ParagraphStyle(
-            'RussianSubtitle',
-            parent=styles['Heading2'],
-            fontName=bold_font,
-            fontSize=12,
-            spaceAfter=10
-        )
-
-        normal_style = ParagraphStyle(
-            'RussianNormal',
-            parent=styles['Normal'],
-            fontName=normal_font,
-            fontSize=10
-        )
+        title_style = registry.styles['title']
+        subtitle_style = registry.styles['subtitle']
+        normal_style = registry.styles['normal']
 
         # Заголовок (русский текст напрямую)
         title_text = "История транзакций - Crypto Wallet"
@@ -210,7 +180,7 @@ class PDFGenerator:
         elements.append(Spacer(1, 20))
 
         total_count = len(transactions)
-        completed = len([t for t in transactions if '✅' in t.get('status', '') or 'Выполнено' in t.get('status', '')])
+        completed = sum(1 for t in transactions if PDFGenerator._is_completed(t))
 
         summary_text = f"Итого: {total_count} транзакций, из них {completed} выполнено"
         summary_para = Paragraph(summary_text, normal_style)
@@ -218,16 +188,253 @@ class PDFGenerator:
 
         # Примечание
         note_text = "Отчет сгенерирован автоматически системой Crypto Wallet"
-        note_style = ParagraphStyle(
-            'Note',
-            parent=styles['Normal'],
-            fontName=normal_font,
-            fontSize=8,
-            textColor=colors.grey
-        )
-        elements.append(Paragraph(note_text, note_style))
+        elements.append(Paragraph(note_text, registry.styles['note']))
 
         # Строим PDF
         doc.build(elements)
 
-        return output_file
\ No newline at end of file
+        return output_file
+
+    @staticmethod
+    def _is_completed(row):
+        """Выполнена ли операция (по коду статуса, текст - только для старых данных)"""
+        code = row.get('status_code')
+        if code is not None:
+            return code == 'completed'
+        status = row.get('status', '')
+        return '✅' in status or 'Выполнено' in status
+
+    @staticmethod
+    def _status_color(row):
+        """Цвет статуса по коду статуса (или по тексту для старых данных)"""
+        code = row.get('status_code')
+        status = row.get('status', '')
+        if PDFGenerator._is_completed(row):
+            return colors.green
+        if code == 'pending' or (code is None and ('⏳' in status or 'Ожидание' in status)):
+            return colors.orange
+        if code in ('cancelled', 'failed') or (code is None and ('❌' in status or 'Отменено' in status
+                                                                   or 'Ошибка' in status)):
+            return colors.red
+        return None
+
+    @staticmethod
+    def _statement_page_table(rows, normal_font, bold_font):
+        """Небольшая таблица на одну страницу выписки"""
+        data = [STATEMENT_HEADERS]
+        style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E8B57')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), bold_font),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ('FONTNAME', (0, 1), (-1, -1), normal_font),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
+            ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (2, -1), 'CENTER'),
+            ('ALIGN', (5, 1), (5, -1), 'CENTER'),
+        ])
+
+        for i, t in enumerate(rows, start=1):
+            data.append([
+                t.get('date', ''),
+                t.get('type', ''),
+                t.get('currency', ''),
+                f"{t.get('amount', 0):.8f}",
+                t.get('counterparty', '')[:20],
+                t.get('status', '')
+            ])
+            color = PDFGenerator._status_color(t)
+            if color is not None:
+                style.add('TEXTCOLOR', (5, i), (5, i), color)
+
+        table = Table(data, colWidths=STATEMENT_COL_WIDTHS)
+        table.setStyle(style)
+        return table
+
+    @staticmethod
+    def generate_transaction_history_stream(rows, user_info, period_info="", output_file=None,
+                                            progress_callback=None, summary_lines=None):
+        """
+        Потоковая генерация PDF выписки для больших историй
+
+        Строки читаются из итератора порциями ровно на одну страницу, каждая
+        страница - отдельная небольшая таблица, которая рисуется сразу на
+        canvas и освобождается. Память не зависит от количества строк.
+
+        Args:
+            rows (iterable): Итератор dict-строк (см. statement_export.iter_statement_rows)
+            user_info (dict): id, name, phone
+            period_info (str): Описание периода
+            output_file (str): Путь PDF (по умолчанию - во временной папке)
+            progress_callback (callable): Вызывается с (страниц, строк) после каждой страницы
+            summary_lines (list): Дополнительные строки итогов (суммы из дневных агрегатов)
+
+        Returns:
+            tuple: (путь к файлу, всего строк, выполнено, страниц)
+        """
+        if output_file is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"История_транзакций_{user_info.get('id', 'user')}_{timestamp}.pdf"
+            output_file = os.path.join(tempfile.gettempdir(), filename)
+
+        registry = pdf_styles.get()
+        normal_font = registry.normal_font
+        bold_font = registry.bold_font
+        title_style = registry.styles['title']
+        subtitle_style = registry.styles['subtitle']
+        normal_style = registry.styles['normal']
+        note_style = registry.styles['note']
+
+        page_width, page_height = landscape(A4)
+        margin = 0.5 * inch
+        avail_width = page_width - 2 * margin
+        pdf = canvas.Canvas(output_file, pagesize=landscape(A4), pageCompression=1)
+
+        def draw_paragraph(text, style, y):
+            para = Paragraph(text, style)
+            _, h = para.wrapOn(pdf, avail_width, page_height)
+            para.drawOn(pdf, margin, y - h)
+            return y - h - style.spaceAfter
+
+        # Шапка первой страницы
+        y = page_height - margin
+        y = draw_paragraph("История транзакций - Crypto Wallet", title_style, y)
+        y = draw_paragraph(f"Пользователь: {user_info.get('name', '')}", subtitle_style, y)
+        y = draw_paragraph(f"Телефон: {user_info.get('phone', '')}", normal_style, y)
+        y = draw_paragraph(f"Период: {period_info}", normal_style, y)
+        y = draw_paragraph(f"Дата выгрузки: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}", normal_style, y)
+        y -= 20
+
+        # Высота строк постоянна (контрагент обрезан), меряем один раз
+        sample = PDFGenerator._statement_page_table(
+            [{'date': '00.00.0000 00:00', 'amount': 0, 'status': '✅ Выполнено'}], normal_font, bold_font)
+        sample.wrapOn(pdf, avail_width, page_height)
+        header_height = sample._rowHeights[0]
+        row_height = sample._rowHeights[1]
+
+        def rows_fitting(y_top):
+            return max(1, int((y_top - margin - header_height) // row_height))
+
+        total = 0
+        completed = 0
+        pages = 0
+        chunk = []
+        capacity = rows_fitting(y)
+
+        def flush_page(y_top):
+            table = PDFGenerator._statement_page_table(chunk, normal_font, bold_font)
+            _, h = table.wrapOn(pdf, avail_width, y_top - margin)
+            table.drawOn(pdf, margin, y_top - h)
+            return y_top - h
+
+        for row in rows:
+            chunk.append(row)
+            total += 1
+            if PDFGenerator._is_completed(row):
+                completed += 1
+
+            if len(chunk) >= capacity:
+                flush_page(y)
+                pages += 1
+                chunk = []
+                pdf.showPage()
+                y = page_height - margin
+                capacity = rows_fitting(y)
+                if progress_callback:
+                    progress_callback(pages, total)
+
+        if chunk:
+            y = flush_page(y)
+
+        summary_lines = summary_lines or []
+
+        # Итоги (на новой странице, если не помещаются)
+        if y - margin < 60 + 20 * len(summary_lines):
+            pdf.showPage()
+            y = page_height - margin
+
+        y -= 20
+        y = draw_paragraph(f"Итого: {total} транзакций, из них {completed} выполнено", normal_style, y)
+        for line in summary_lines:
+            y = draw_paragraph(line, normal_style, y)
+        draw_paragraph("Отчет сгенерирован автоматически системой Crypto Wallet", note_style, y)
+
+        pdf.showPage()
+        pages += 1
+        pdf.save()
+
+        if progress_callback:
+            progress_callback(pages, total)
+
+        return output_file, total, completed, pages
+
+
+class PDFStyleRegistry:
+    """
+    Шрифты и стили PDF, общие для всего процесса
+
+    Регистрация TTF-шрифтов и сборка ParagraphStyle выполняются один раз
+    (лениво или заранее через warm_up) и защищены блокировкой.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = False
+        self.font_registered = False
+        self.normal_font = 'Helvetica'
+        self.bold_font = 'Helvetica-Bold'
+        self.styles = {}
+
+    def _build(self):
+        self.font_registered = PDFGenerator._register_russian_font_uncached()
+
+        # Определяем используемые шрифты
+        self.normal_font, self.bold_font = 'Helvetica', 'Helvetica-Bold'
+        if self.font_registered:
+            for normal_font, bold_font in (('Arial', 'Arial-Bold'), ('DejaVu', 'DejaVu-Bold')):
+                try:
+                    pdfmetrics.getFont(bold_font)
+                    self.normal_font, self.bold_font = normal_font, bold_font
+                    break
+                except Exception:
+                    continue
+
+        sample = getSampleStyleSheet()
+        self.styles = {
+            'title': ParagraphStyle('RussianTitle', parent=sample['Heading1'], fontName=self.bold_font,
+                                    fontSize=16, spaceAfter=20, alignment=1),
+            'subtitle': ParagraphStyle('RussianSubtitle', parent=sample['Heading2'], fontName=self.bold_font,
+                                       fontSize=12, spaceAfter=10),
+            'normal': ParagraphStyle('RussianNormal', parent=sample['Normal'], fontName=self.normal_font,
+                                     fontSize=10),
+            'note': ParagraphStyle('Note', parent=sample['Normal'], fontName=self.normal_font,
+                                   fontSize=8, textColor=colors.grey)
+        }
+
+    def get(self):
+        """Реестр с гарантированно построенными шрифтами и стилями"""
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self._build()
+                    self._ready = True
+        return self
+
+    def warm_up(self):
+        """Заранее построить реестр (например, в фоне при запуске)"""
+        return self.get()
+
+    def reset(self):
+        """Сбросить реестр (для бенчмарков и смены шрифтов)"""
+        with self._lock:
+            self._ready = False
+
+
+# Общий реестр шрифтов и стилей
+pdf_styles = PDFStyleRegistry()
@@ -0,0 +1,192 @@
+from PyQt5.QtCore import QObject, QCoreApplication, pyqtSignal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+from models import Transaction
+from database import db
+import itertools
+import threading
+import tempfile
+import time
+import glob
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReportJobQueue(QObject):
+    """
+    Фоновая генерация выписок PDF
+
+    Выписки строятся в пуле потоков, прогресс и результат приходят в GUI
+    через сигналы. Готовые отчеты кэшируются по (user_id, период,
+    id последней транзакции, число транзакций по статусам): повторная
+    выгрузка неизменного периода отдает уже готовый файл.
+    """
+
+    progress = pyqtSignal(int, int, int)  # job_id, страниц, строк
+    finished = pyqtSignal(int, str, int, bool)  # job_id, путь к PDF, строк, из кэша
+    failed = pyqtSignal(int, str)  # job_id, ошибка
+
+    def __init__(self, max_workers=2, cache_ttl=3600, max_file_age=24 * 3600):
+        super().__init__()
+
+        # Очередь может впервые импортироваться из фонового потока - привязываем к GUI-потоку
+        app = QCoreApplication.instance()
+        if app is not None:
+            self.moveToThread(app.thread())
+
+        self.reports_dir = os.path.join(tempfile.gettempdir(), "crypto_wallet_reports")
+        os.makedirs(self.reports_dir, exist_ok=True)
+
+        self.cache_ttl = cache_ttl
+        self.max_file_age = max_file_age
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reports")
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def _statement_key(self, session, user_id, period_days, date_from):
+        # Число транзакций по статусам входит в ключ: подтверждение или
+        # отмена перевода меняет выписку, не меняя id последней транзакции
+        by_status = (session.query(Transaction.status, func.count(Transaction.id), func.max(Transaction.id))
+                     .filter(or_(Transaction.user_id_from == user_id,
+                                 Transaction.user_id_to == user_id),
+                             Transaction.created_date >= date_from)
+                     .group_by(Transaction.status)
+                     .all())
+        last_id = max((row[2] for row in by_status), default=None)
+        count = sum(row[1] for row in by_status)
+        statuses = tuple(sorted((status or '', status_count) for status, status_count, _ in by_status))
+        return (user_id, period_days, last_id, statuses), count
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if not entry:
+                return None
+            path, rows, created = entry
+            if time.time() - created > self.cache_ttl or not os.path.exists(path):
+                del self._cache[key]
+                return None
+            return path, rows
+
+    def _render(self, job_id, user_info, period_days, period_text, telegram_id):
+        from pdf_generation import PDFGenerator
+        from statement_export import iter_statement_rows
+        from user_stats import user_stats
+
+        session = db.get_session()
+        try:
+            # Период с начала дня - чтобы итоги совпадали с дневными агрегатами
+            date_from = datetime.combine((datetime.now() - timedelta(days=period_days)).date(), datetime.min.time())
+            key, count = self._statement_key(session, user_info['id'], period_days, date_from)
+
+            if not count:
+                self.finished.emit(job_id, "", 0, False)
+                return
+
+            cached = self._cached(key)
+            from_cache = cached is not None
+
+            if from_cache:
+                pdf_file, count = cached
+            else:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                pdf_file = os.path.join(self.reports_dir,
+                                        f"История_транзакций_{user_info['id']}_{timestamp}_{job_id}.pdf")
+                period_info = f"{period_text} (с {date_from.strftime('%d.%m.%Y')})"
+
+                totals = user_stats.period_totals(user_info['id'], date_from.date(), session=session)
+                summary_lines = [
+                    f"Отправлено: {user_stats.format_amounts(totals, 'sent_amount', 8)}",
+                    f"Получено: {user_stats.format_amounts(totals, 'received_amount', 8)}",
+                    f"Комиссии: {user_stats.format_amounts(totals, 'commission_paid', 8)}"
+                ]
+
+                PDFGenerator.generate_transaction_history_stream(
+                    iter_statement_rows(session, user_info['id'], date_from),
+                    user_info, period_info, output_file=pdf_file,
+                    progress_callback=lambda pages, rows: self.progress.emit(job_id, pages, rows),
+                    summary_lines=summary_lines
+                )
+
+                with self._lock:
+                    self._cache[key] = (pdf_file, count, time.time())
+        finally:
+            session.close()
+
+        if telegram_id:
+            from bot import telegram_bot
+
+            caption = (f"📊 История транзакций\n\n"
+                       f"👤 {user_info['name']}\n"
+                       f"📱 {user_info['phone']}\n"
+                       f"{period_text}\n"
+                       f"📈 {count} транзакций\n"
+                       f"🕐 {datetime.now().strftime('%d.%m.%Y %H:%M')}")
+
+            if not telegram_bot.send_pdf_document(telegram_id, pdf_file, caption):
+                raise RuntimeError("Не удалось отправить файл в Telegram")
+
+        self.finished.emit(job_id, pdf_file, count, from_cache)
+
+    def _run(self, job_id, *args):
+        try:
+            self._render(job_id, *args)
+        except Exception as e:
+            logger.error(f"❌ Ошибка генерации отчета #{job_id}: {e}")
+            self.failed.emit(job_id, str(e))
+
+    def submit(self, user_info, period_days, period_text, telegram_id=None):
+        """
+        Постановка выписки в очередь
+
+        Args:
+            user_info (dict): id, name, phone, role
+            period_days (int): Период в днях
+            period_text (str): Описание периода для отчета
+            telegram_id (str): Если указан - готовый PDF отправляется в Telegram
+
+        Returns:
+            int: Номер задачи (приходит в сигналах)
+        """
+        job_id = next(self._counter)
+        self._executor.submit(self._run, job_id, user_info, period_days, period_text, telegram_id)
+        return job_id
+
+    def cleanup(self):
+        """Удаление старых PDF (и наших, и оставшихся во временной папке от прежних версий)"""
+        cutoff = time.time() - self.max_file_age
+        patterns = [
+            os.path.join(self.reports_dir, "*.pdf"),
+            os.path.join(tempfile.gettempdir(), "История_транзакций_*.pdf")
+        ]
+
+        with self._lock:
+            cached_paths = {path for path, _, _ in self._cache.values()}
+
+        removed = 0
+        for pattern in patterns:
+            for path in glob.glob(pattern):
+                try:
+                    if os.path.getmtime(path) < cutoff and path not in cached_paths:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+
+        with self._lock:
+            expired = [key for key, (path, _, created) in self._cache.items()
+                       if time.time() - created > self.cache_ttl or not os.path.exists(path)]
+            for key in expired:
+                del self._cache[key]
+
+        if removed:
+            logger.info(f"🧹 Удалено старых отчетов: {removed}")
+        return removed
+
+
+# Общая очередь отчетов
+report_queue = ReportJobQueue()
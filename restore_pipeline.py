@@ -0,0 +1,165 @@
+import os
+import time
+import shutil
+import sqlite3
+import zipfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from database import db
+from backup_catalog import file_checksum
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RestoreError(Exception):
+    """Ошибка восстановления из бэкапа"""
+
+
+class RestorePipeline:
+    """
+    Проверенное восстановление базы данных из бэкапа.
+
+    Этапы: скачивание -> потоковая распаковка (параллельно со сверкой
+    контрольной суммы и снимком текущей базы) -> PRAGMA integrity_check ->
+    сброс пула соединений -> атомарная подмена файла через os.replace.
+    По каждому этапу замеряется время, чтобы знать реальное время восстановления.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, storage, database=db, db_path="crypto_wallet.db", quick_check=False):
+        self.storage = storage
+        self.database = database
+        self.db_path = db_path
+        self.quick_check = quick_check
+        self.timings = {}
+
+    def _stage(self, name, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.timings[name] = time.perf_counter() - started
+
+    def _work_dir(self):
+        # Временные файлы кладем рядом с базой, чтобы os.replace был атомарным
+        target_dir = os.path.dirname(os.path.abspath(self.db_path))
+        return tempfile.mkdtemp(prefix=".crypto_restore_", dir=target_dir)
+
+    def _download(self, backup_name, work_dir):
+        zip_path = self.storage.download_backup(backup_name, work_dir)
+        if not zip_path:
+            raise RestoreError(f"Не удалось скачать бэкап: {backup_name}")
+        return zip_path
+
+    def _extract(self, zip_path, work_dir):
+        """Потоковая распаковка файла базы без extractall"""
+        target = os.path.join(work_dir, "crypto_wallet.db.restore")
+        with zipfile.ZipFile(zip_path, 'r') as zipf:
+            if "crypto_wallet.db" not in zipf.namelist():
+                raise RestoreError("Файл базы данных не найден в архиве")
+            with zipf.open("crypto_wallet.db") as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+        return target
+
+    def _verify_checksum(self, backup_name, zip_path):
+        entry = self.storage.catalog.get(backup_name)
+        expected = entry.get('checksum') if entry else None
+        if not expected:
+            return None
+
+        actual = file_checksum(zip_path, self.CHUNK_SIZE)
+        if actual != expected:
+            raise RestoreError(f"Контрольная сумма архива не совпадает: {backup_name}")
+        return actual
+
+    def _snapshot_current(self):
+        """Снимок текущей базы через sqlite backup API (консистентен при открытых соединениях)"""
+        if not os.path.exists(self.db_path):
+            return None
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        snapshot_path = f"{self.db_path}.pre_restore_{timestamp}"
+        src = sqlite3.connect(self.db_path)
+        dst = sqlite3.connect(snapshot_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        logger.info(f"📋 Создан бэкап текущей базы: {snapshot_path}")
+        return snapshot_path
+
+    def _integrity_check(self, restored_path):
+        pragma = "PRAGMA quick_check" if self.quick_check else "PRAGMA integrity_check"
+        conn = sqlite3.connect(f"file:{restored_path}?mode=ro", uri=True)
+        try:
+            result = [row[0] for row in conn.execute(pragma)]
+        finally:
+            conn.close()
+
+        if result != ['ok']:
+            raise RestoreError(f"Проверка целостности не пройдена: {'; '.join(result[:5])}")
+
+    def _swap(self, restored_path):
+        # Старые соединения пула указывают на заменяемый файл - сбрасываем их
+        self.database.engine.dispose()
+
+        for suffix in ("-wal", "-shm", "-journal"):
+            stale = f"{self.db_path}{suffix}"
+            if os.path.exists(stale):
+                os.remove(stale)
+
+        os.replace(restored_path, self.db_path)
+
+    def run(self, backup_name):
+        """
+        Восстановление из бэкапа
+
+        Args:
+            backup_name (str): Имя файла бэкапа
+
+        Returns:
+            dict: Отчет с временем этапов (секунды) и путем снимка старой базы
+        """
+        self.timings = {}
+        started = time.perf_counter()
+        work_dir = self._work_dir()
+
+        try:
+            zip_path = self._stage('download', self._download, backup_name, work_dir)
+
+            # Распаковка, сверка контрольной суммы и снимок текущей базы идут параллельно
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                extract_future = executor.submit(self._stage, 'extract', self._extract, zip_path, work_dir)
+                checksum_future = executor.submit(self._stage, 'checksum', self._verify_checksum,
+                                                  backup_name, zip_path)
+                snapshot_future = executor.submit(self._stage, 'snapshot', self._snapshot_current)
+
+                restored_path = extract_future.result()
+                checksum = checksum_future.result()
+                snapshot_path = snapshot_future.result()
+
+            self._stage('integrity_check', self._integrity_check, restored_path)
+            self._stage('swap', self._swap, restored_path)
+
+            # Миграции схемы для бэкапов старых версий
+            self._stage('migrate', self.database.create_tables)
+
+            self.timings['total'] = time.perf_counter() - started
+
+            report = {
+                'backup_name': backup_name,
+                'checksum': checksum,
+                'snapshot_path': snapshot_path,
+                'timings': dict(self.timings)
+            }
+
+            stages = ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.timings.items())
+            logger.info(f"✅ База данных восстановлена из {backup_name} ({stages})")
+            return report
+
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,228 @@
+import heapq
+import random
+import threading
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Задача планировщика с собственными метриками выполнения"""
+
+    def __init__(self, name, func, interval=None, at=None, jitter=0, args=(), kwargs=None):
+        if interval is None and at is None:
+            raise ValueError("Нужно указать interval (секунды) или at ('ЧЧ:ММ')")
+
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.at = at
+        self.jitter = jitter
+        self.args = args
+        self.kwargs = kwargs or {}
+
+        self.next_run = None
+        self.running = False
+        self.cancelled = False
+        # Замененная задача, чей запуск еще идет - новая не стартует параллельно ей
+        self.previous = None
+
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_duration = 0.0
+        self.last_duration = None
+        self.last_run = None
+        self.last_error = None
+
+    def schedule_next(self, now=None):
+        """Вычисление времени следующего запуска (с джиттером)"""
+        now = now or time.time()
+
+        if self.at is not None:
+            hour, minute = map(int, self.at.split(':'))
+            current = datetime.fromtimestamp(now)
+            target = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if target.timestamp() <= now:
+                target += timedelta(days=1)
+            next_run = target.timestamp()
+        else:
+            next_run = now + self.interval
+
+        if self.jitter:
+            next_run += random.uniform(0, self.jitter)
+
+        self.next_run = next_run
+        return next_run
+
+    def metrics(self):
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'running': self.running,
+            'last_duration': self.last_duration,
+            'avg_duration': self.total_duration / self.runs if self.runs else None,
+            'last_run': datetime.fromtimestamp(self.last_run) if self.last_run else None,
+            'next_run': datetime.fromtimestamp(self.next_run) if self.next_run else None,
+            'last_error': self.last_error
+        }
+
+
+class JobScheduler:
+    """
+    Планировщик задач на куче времен следующего запуска.
+
+    Поток спит ровно до ближайшей задачи (без опроса раз в минуту),
+    задачи выполняются в пуле потоков, одна и та же задача не запускается
+    повторно, пока не завершился предыдущий запуск.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._heap = []
+        self._jobs = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self.running = False
+
+    def add_job(self, name, func, interval=None, at=None, jitter=0, run_immediately=False,
+                args=(), kwargs=None):
+        """
+        Добавление задачи (задача с тем же именем заменяется)
+
+        Args:
+            name (str): Уникальное имя задачи
+            func (callable): Функция задачи
+            interval (float): Интервал в секундах
+            at (str): Ежедневный запуск в 'ЧЧ:ММ'
+            jitter (float): Случайная добавка к времени запуска, секунды
+            run_immediately (bool): Первый запуск сразу
+
+        Returns:
+            Job: Созданная задача
+        """
+        job = Job(name, func, interval=interval, at=at, jitter=jitter, args=args, kwargs=kwargs)
+
+        with self._condition:
+            old_job = self._jobs.get(name)
+            if old_job:
+                old_job.cancelled = True
+                if old_job.running:
+                    job.previous = old_job
+
+            if run_immediately:
+                job.next_run = time.time()
+            else:
+                job.schedule_next()
+
+            self._jobs[name] = job
+            heapq.heappush(self._heap, (job.next_run, next(self._counter), job))
+            self._condition.notify()
+
+        return job
+
+    def cancel(self, name):
+        """Отмена одной задачи (остальные задачи не затрагиваются)"""
+        with self._condition:
+            job = self._jobs.pop(name, None)
+            if job:
+                job.cancelled = True
+                self._condition.notify()
+            return job is not None
+
+    def get_job(self, name):
+        return self._jobs.get(name)
+
+    def next_run(self, prefix=""):
+        """Ближайшее время запуска среди задач (опционально - с именем на prefix)"""
+        times = [job.next_run for name, job in self._jobs.items() if name.startswith(prefix)]
+        return datetime.fromtimestamp(min(times)) if times else None
+
+    def metrics(self):
+        """Метрики всех задач: длительность, успехи, ошибки, пропуски"""
+        with self._condition:
+            return {name: job.metrics() for name, job in self._jobs.items()}
+
+    def _run_job(self, job):
+        started = time.perf_counter()
+        try:
+            job.func(*job.args, **job.kwargs)
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"❌ Ошибка задачи {job.name}: {e}")
+        finally:
+            duration = time.perf_counter() - started
+            job.runs += 1
+            job.last_duration = duration
+            job.total_duration += duration
+            job.last_run = time.time()
+            job.running = False
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while self.running:
+                    # Выбрасываем отмененные задачи с вершины кучи
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+
+                if not self.running:
+                    return
+
+                _, _, job = heapq.heappop(self._heap)
+
+                if job.running or (job.previous is not None and job.previous.running):
+                    # Предыдущий запуск еще идет - не накладываем запуски
+                    job.skipped += 1
+                else:
+                    job.previous = None
+                    job.running = True
+                    self._executor.submit(self._run_job, job)
+
+                job.schedule_next()
+                heapq.heappush(self._heap, (job.next_run, next(self._counter), job))
+
+    def start(self):
+        """Запуск потока планировщика"""
+        with self._condition:
+            if self.running:
+                return
+            self.running = True
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="scheduler")
+
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        """Остановка планировщика"""
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+
+
+# Общий планировщик приложения (бэкапы, очистка сессий, курсы валют)
+scheduler = JobScheduler()
@@ -0,0 +1,120 @@
+"""
+Полнотекстовые индексы SQLite FTS5
+
+Индекс - обычная таблица FTS5 (rowid = id исходной строки), которую
+поддерживают триггеры на исходной таблице. При первом создании индекс
+заполняется из существующих данных, при изменении триггеров (другое
+содержимое индекса) - пересобирается. Если сборка SQLite без FTS5, ensure()
+возвращает False и поиск уходит в запасной путь с LIKE.
+"""
+import re
+import threading
+from sqlalchemy import text
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_PHONE_RE = re.compile(r"^[\d\s+()\-]+$")
+
+
+def digits_sql(column):
+    """SQL-выражение: телефон без +, пробелов, скобок и дефисов"""
+    expression = column
+    for char in ('+', ' ', '-', '(', ')'):
+        expression = f"replace({expression}, '{char}', '')"
+    return expression
+
+
+def phone_tokens_sql(column):
+    """
+    SQL-выражение для индекса телефона: цифры номера, а для российских номеров
+    (11 цифр с 7 или 8) - еще и номер без кода страны отдельным словом, чтобы
+    префиксный поиск находил '9001234567' и '79001234567'
+    """
+    digits = digits_sql(column)
+    return (f"CASE WHEN length({digits}) = 11 AND substr({digits}, 1, 1) IN ('7', '8') "
+            f"THEN {digits} || ' ' || substr({digits}, 2) ELSE {digits} END")
+
+
+def phone_digits(search):
+    """Цифры запроса, если он похож на телефон или ID ('+7 900', '123'), иначе None"""
+    if not _PHONE_RE.match(search):
+        return None
+    digits = re.sub(r"\D", "", search)
+    return digits or None
+
+
+def match_query(search):
+    """
+    Запрос MATCH из пользовательского ввода: каждое слово - префикс, все слова обязательны
+
+    Кавычки и операторы FTS5 из ввода отбрасываются. None - искать нечего.
+    """
+    tokens = _TOKEN_RE.findall(search.lower())
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+class FtsIndex:
+    """Таблица FTS5 с триггерами синхронизации"""
+
+    def __init__(self, name, columns, populate_sql, triggers):
+        self.name = name
+        self.columns = columns
+        self.populate_sql = populate_sql
+        self.triggers = triggers
+        self._ready = None
+        self._lock = threading.Lock()
+
+    def _exists(self, connection):
+        return connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': self.name}
+        ).first() is not None
+
+    def _triggers_changed(self, connection):
+        """Триггеры в базе отличаются от нужных (индекс собран по старым правилам)"""
+        existing = dict(connection.execute(
+            text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")).fetchall())
+        return any(existing.get(trigger) != f"CREATE TRIGGER {trigger} {body}"
+                   for trigger, body in self.triggers.items())
+
+    def ensure(self, engine):
+        """
+        Создать индекс и триггеры (один раз за процесс)
+
+        Returns:
+            bool: Индекс доступен (False - нет FTS5 или ошибка создания)
+        """
+        with self._lock:
+            if self._ready is not None:
+                return self._ready
+
+            try:
+                with engine.begin() as connection:
+                    if not self._exists(connection):
+                        connection.execute(text(f"CREATE VIRTUAL TABLE {self.name} USING fts5({self.columns})"))
+                        connection.execute(text(self.populate_sql))
+                        print(f"Поисковый индекс {self.name} создан")
+                    elif self._triggers_changed(connection):
+                        for trigger in self.triggers:
+                            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+                        connection.execute(text(f"DELETE FROM {self.name}"))
+                        connection.execute(text(self.populate_sql))
+                        print(f"Поисковый индекс {self.name} пересобран")
+                    for trigger, body in self.triggers.items():
+                        connection.execute(text(f"CREATE TRIGGER IF NOT EXISTS {trigger} {body}"))
+                self._ready = True
+            except Exception as e:
+                print(f"Поисковый индекс {self.name} недоступен: {e}")
+                self._ready = False
+
+            return self._ready
+
+    def rebuild(self, engine):
+        """Полная пересборка индекса из исходной таблицы"""
+        if not self.ensure(engine):
+            return False
+        with engine.begin() as connection:
+            connection.execute(text(f"DELETE FROM {self.name}"))
+            connection.execute(text(self.populate_sql))
+        return True
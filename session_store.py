@@ -0,0 +1,137 @@
+"""
+Сессии пользователей: проверка по токену и отложенная запись активности
+
+Каждое действие пользователя раньше открывало сессию базы и коммитило
+last_activity одной строки. Теперь touch() только запоминает время в памяти,
+а flush() (задача планировщика раз в flush_interval секунд) пишет все
+накопленное одним executemany. Между сбросами last_activity в базе отстает
+не больше чем на flush_interval - для истечения через часы это неважно,
+а expire() перед UPDATE истечения сначала сбрасывает буфер.
+
+При падении процесса теряется только несброшенная активность (сессия может
+истечь на несколько секунд раньше).
+"""
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from database import db
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Сессии и буфер их активности (общий экземпляр - session_store)"""
+
+    def __init__(self, database=db, idle_hours=24, flush_interval=5, max_pending=10000):
+        """
+        Args:
+            idle_hours (int): Сессия без активности дольше - просрочена
+            flush_interval (float): Период сброса буфера (для задачи планировщика)
+            max_pending (int): Размер буфера, при котором touch сбрасывает его сам
+        """
+        self.db = database
+        self.idle_hours = idle_hours
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {'touches': 0, 'flushes': 0, 'written': 0}
+
+    def create(self, user_id, ip_address="", user_agent=""):
+        """Новая сессия с токеном; None - ошибка"""
+        return self.db.create_user_session(user_id, ip_address, user_agent)
+
+    def touch(self, session_id, when=None):
+        """Отметить активность сессии (без обращения к базе)"""
+        when = when or datetime.now()
+        with self._lock:
+            previous = self._pending.get(session_id)
+            if previous is None or when > previous:
+                self._pending[session_id] = when
+            self.stats['touches'] += 1
+            overflow = len(self._pending) >= self.max_pending
+
+        if overflow:
+            self.flush()
+
+    def last_activity(self, user_session):
+        """Время активности с учетом еще не записанного в базу"""
+        with self._lock:
+            pending = self._pending.get(user_session.id)
+        if pending and (not user_session.last_activity or pending > user_session.last_activity):
+            return pending
+        return user_session.last_activity
+
+    def validate(self, token):
+        """
+        Проверка токена: активная и не простаивающая сессия
+
+        Успешная проверка считается активностью сессии.
+
+        Returns:
+            Session: Сессия или None
+        """
+        if not token:
+            return None
+
+        user_session = self.db.get_session_by_token(token)
+        if not user_session:
+            return None
+
+        last_activity = self.last_activity(user_session)
+        if last_activity and last_activity < datetime.now() - timedelta(hours=self.idle_hours):
+            return None
+
+        self.touch(user_session.id)
+        return user_session
+
+    def end(self, session_id):
+        """Выход: несброшенная активность сессии больше не нужна"""
+        with self._lock:
+            self._pending.pop(session_id, None)
+        return self.db.end_user_session(session_id)
+
+    def flush(self):
+        """
+        Запись накопленной активности одним пакетом
+
+        Returns:
+            int: Число сессий в пакете
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            started = time.perf_counter()
+            written = self.db.update_sessions_activity(pending)
+            if written is None:
+                # Не записали - возвращаем в буфер, более новые отметки не затираем
+                with self._lock:
+                    for session_id, when in pending.items():
+                        current = self._pending.get(session_id)
+                        if current is None or when > current:
+                            self._pending[session_id] = when
+                return 0
+
+            self.stats['flushes'] += 1
+            self.stats['written'] += written
+            logger.debug(f"Активность сессий: {len(pending)} за "
+                         f"{(time.perf_counter() - started) * 1000:.1f} мс")
+            return len(pending)
+
+    def expire(self):
+        """Сброс буфера и истечение простаивающих сессий одним UPDATE"""
+        self.flush()
+        return self.db.cleanup_expired_sessions(self.idle_hours)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+
+# Общее хранилище сессий
+session_store = SessionStore()
@@ -0,0 +1,76 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """
+    Замер фаз запуска приложения
+
+    Фазы пишутся с моментом начала (от старта процесса) и длительностью,
+    в том числе фазы фоновых задач. Подробный отчет в стиле -X importtime
+    печатается при WALLET_STARTUP_REPORT=1.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self.marks = {}
+        self._lock = threading.Lock()
+        self.verbose = os.environ.get("WALLET_STARTUP_REPORT") == "1"
+
+    def _offset_ms(self, moment):
+        return (moment - self.started) * 1000
+
+    @contextmanager
+    def phase(self, name):
+        """Замер фазы запуска (ошибка внутри фазы пробрасывается дальше)"""
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            finished = time.perf_counter()
+            entry = {
+                'phase': name,
+                'start_ms': round(self._offset_ms(started), 2),
+                'duration_ms': round((finished - started) * 1000, 2),
+                'thread': threading.current_thread().name,
+                'error': error
+            }
+            with self._lock:
+                self.phases.append(entry)
+
+            if self.verbose and threading.current_thread() is not threading.main_thread():
+                print(f"⏱ startup (фон): {name} {entry['duration_ms']:.1f} мс")
+
+    def mark(self, name):
+        """Отметка момента (например, окно входа показано)"""
+        with self._lock:
+            self.marks[name] = round(self._offset_ms(time.perf_counter()), 2)
+        return self.marks[name]
+
+    def report(self):
+        """Фазы и отметки для сохранения (бенчмарки, логи)"""
+        with self._lock:
+            return {'phases': list(self.phases), 'marks': dict(self.marks)}
+
+    def format_report(self):
+        """Текстовый отчет: смещение | длительность | поток | фаза"""
+        data = self.report()
+        lines = ["startup: offset [ms] | duration [ms] | thread | phase"]
+        for entry in sorted(data['phases'], key=lambda e: e['start_ms']):
+            suffix = f" (ошибка: {entry['error']})" if entry['error'] else ""
+            lines.append(f"startup: {entry['start_ms']:11.1f} | {entry['duration_ms']:13.1f} | "
+                         f"{entry['thread']:<10} | {entry['phase']}{suffix}")
+        for name, offset in data['marks'].items():
+            lines.append(f"startup: {offset:11.1f} | {'':>13} | {'':<10} | * {name}")
+        return "\n".join(lines)
+
+
+# Общий профилировщик запуска (создается при первом импорте - как можно раньше в main)
+startup_profiler = StartupProfiler()
@@ -0,0 +1,113 @@
+import heapq
+from sqlalchemy import func, or_, and_, tuple_
+from sqlalchemy.orm import aliased
+from models import Transaction, User, Currency
+
+STATUS_MAP = {
+    'completed': '✅ Выполнено',
+    'pending': '⏳ Ожидание',
+    'cancelled': '❌ Отменено',
+    'failed': '❌ Ошибка'
+}
+
+
+def _statement_filter(user_id, date_from):
+    return (
+        or_(Transaction.user_id_from == user_id, Transaction.user_id_to == user_id),
+        Transaction.created_date >= date_from
+    )
+
+
+def count_statement_rows(session, user_id, date_from):
+    """Количество транзакций пользователя за период (без загрузки строк)"""
+    return (session.query(func.count(Transaction.id))
+            .filter(*_statement_filter(user_id, date_from))
+            .scalar())
+
+
+def _statement_batches(session, user_id, date_from, outgoing, batch_size):
+    """
+    Строки одной стороны выписки (отправленные или полученные) порциями по keyset
+
+    Каждая порция - отдельный короткий запрос с LIMIT по индексу
+    (user_id_*, created_date): курсор не остается открытым между порциями
+    и не держит блокировку чтения SQLite, пока строится PDF.
+    """
+    user_from = aliased(User)
+    user_to = aliased(User)
+
+    if outgoing:
+        side = Transaction.user_id_from == user_id
+    else:
+        # Перевод самому себе уже попал в отправленные
+        side = and_(Transaction.user_id_to == user_id,
+                    or_(Transaction.user_id_from.is_(None), Transaction.user_id_from != user_id))
+
+    query = (session.query(
+        Transaction.id,
+        Transaction.created_date,
+        Transaction.user_id_from,
+        Transaction.amount,
+        Transaction.status,
+        Currency.code,
+        user_from.full_name,
+        user_to.full_name
+    )
+             .outerjoin(Currency, Currency.id == Transaction.currency_id)
+             .outerjoin(user_from, user_from.id == Transaction.user_id_from)
+             .outerjoin(user_to, user_to.id == Transaction.user_id_to)
+             .filter(side, Transaction.created_date >= date_from)
+             .order_by(Transaction.created_date.desc(), Transaction.id.desc()))
+
+    last = None
+    while True:
+        batch_query = query
+        if last is not None:
+            batch_query = batch_query.filter(tuple_(Transaction.created_date, Transaction.id) < last)
+        batch = batch_query.limit(batch_size).all()
+        # Короткая транзакция на порцию
+        session.commit()
+
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last = (batch[-1][1], batch[-1][0])
+
+
+def iter_statement_rows(session, user_id, date_from, chunk_size=1000):
+    """
+    Чтение строк выписки порциями (новые сначала)
+
+    Выбираются только нужные колонки (без ORM-объектов и связей).
+    Отправленные и полученные читаются по своим индексам и сливаются
+    по (created_date, id), по chunk_size строк за запрос.
+
+    Yields:
+        dict: Строка выписки (date, type, currency, amount, counterparty, status, status_code)
+    """
+    rows = heapq.merge(
+        _statement_batches(session, user_id, date_from, True, chunk_size),
+        _statement_batches(session, user_id, date_from, False, chunk_size),
+        key=lambda row: (row[1], row[0]),
+        reverse=True
+    )
+
+    for (transaction_id, created_date, user_id_from, amount, status,
+         currency_code, from_name, to_name) in rows:
+        if user_id_from == user_id:
+            trans_type = "Отправка"
+            counterparty = to_name or "Система"
+        else:
+            trans_type = "Получение"
+            counterparty = from_name or "Система"
+
+        yield {
+            'id': transaction_id,
+            'date': created_date.strftime("%d.%m.%Y %H:%M"),
+            'type': trans_type,
+            'currency': currency_code or "N/A",
+            'amount': amount,
+            'counterparty': counterparty,
+            'status': STATUS_MAP.get(status, status),
+            'status_code': status
+        }
@@ -0,0 +1,183 @@
+"""
+Полнотекстовый поиск по уведомлениям и истории переводов
+
+Индексы FTS5 поддерживаются триггерами (см. search_index):
+- notifications_fts: заголовок и текст уведомления;
+- transactions_fts: номер транзакции, имена отправителя и получателя, код валюты.
+  Переименование пользователя обновляет его имя во всех его транзакциях.
+
+Колонка owner хранит токены владельцев ("u<id>"), поэтому фильтр по
+пользователю - часть запроса MATCH, а не просмотр всех совпадений.
+Результаты упорядочены по bm25 (при равенстве - новые выше) и отдаются
+страницами.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+from database import db
+from models import Notification, Transaction
+from search_index import FtsIndex, match_query
+
+notifications_index = FtsIndex(
+    "notifications_fts",
+    "owner, title, message, prefix='2 3'",
+    populate_sql="INSERT INTO notifications_fts(rowid, owner, title, message) "
+                 "SELECT id, 'u' || user_id, title, message FROM notifications",
+    triggers={
+        "notifications_fts_insert": """AFTER INSERT ON notifications BEGIN
+            INSERT INTO notifications_fts(rowid, owner, title, message)
+            VALUES (new.id, 'u' || new.user_id, new.title, new.message);
+        END""",
+        "notifications_fts_update": """AFTER UPDATE OF user_id, title, message ON notifications BEGIN
+            DELETE FROM notifications_fts WHERE rowid = old.id;
+            INSERT INTO notifications_fts(rowid, owner, title, message)
+            VALUES (new.id, 'u' || new.user_id, new.title, new.message);
+        END""",
+        "notifications_fts_delete": """AFTER DELETE ON notifications BEGIN
+            DELETE FROM notifications_fts WHERE rowid = old.id;
+        END"""
+    }
+)
+
+_TRANSACTION_DOCUMENT = """
+    SELECT t.id, 'u' || coalesce(t.user_id_from, '') || ' u' || coalesce(t.user_id_to, ''), t.id,
+           (SELECT full_name FROM users WHERE id = t.user_id_from),
+           (SELECT full_name FROM users WHERE id = t.user_id_to),
+           (SELECT code FROM currencies WHERE id = t.currency_id)
+    FROM transactions t"""
+
+transactions_index = FtsIndex(
+    "transactions_fts",
+    "owner, ref, sender, recipient, currency, prefix='2 3'",
+    populate_sql=f"INSERT INTO transactions_fts(rowid, owner, ref, sender, recipient, currency) {_TRANSACTION_DOCUMENT}",
+    triggers={
+        "transactions_fts_insert": f"""AFTER INSERT ON transactions BEGIN
+            INSERT INTO transactions_fts(rowid, owner, ref, sender, recipient, currency)
+            {_TRANSACTION_DOCUMENT} WHERE t.id = new.id;
+        END""",
+        "transactions_fts_update": f"""AFTER UPDATE OF user_id_from, user_id_to, currency_id ON transactions BEGIN
+            DELETE FROM transactions_fts WHERE rowid = old.id;
+            INSERT INTO transactions_fts(rowid, owner, ref, sender, recipient, currency)
+            {_TRANSACTION_DOCUMENT} WHERE t.id = new.id;
+        END""",
+        "transactions_fts_delete": """AFTER DELETE ON transactions BEGIN
+            DELETE FROM transactions_fts WHERE rowid = old.id;
+        END""",
+        "transactions_fts_user_rename": """AFTER UPDATE OF full_name ON users BEGIN
+            UPDATE transactions_fts SET sender = new.full_name
+            WHERE rowid IN (SELECT id FROM transactions WHERE user_id_from = new.id);
+            UPDATE transactions_fts SET recipient = new.full_name
+            WHERE rowid IN (SELECT id FROM transactions WHERE user_id_to = new.id);
+        END"""
+    }
+)
+
+
+def owner_query(user_id, search):
+    """MATCH: документы пользователя, в которых есть все слова запроса (префиксы)"""
+    terms = match_query(search)
+    if not terms:
+        return None
+    return f'owner : "u{int(user_id)}" AND ({terms})'
+
+
+class TextSearch:
+    """Поиск по уведомлениям и транзакциям пользователя"""
+
+    PAGE_SIZE = 50
+
+    def __init__(self, database=db):
+        self.db = database
+
+    def ensure_indexes(self):
+        """Создание индексов (первое создание заполняет их из таблиц)"""
+        return (notifications_index.ensure(self.db.engine) and
+                transactions_index.ensure(self.db.engine))
+
+    def _ranked_ids(self, session, sql, params, page, page_size):
+        """id одной страницы (+1 для признака следующей страницы) в порядке ранга"""
+        params = dict(params, limit=page_size + 1, offset=page * page_size)
+        ids = [row[0] for row in session.execute(text(sql), params)]
+        return ids[:page_size], len(ids) > page_size
+
+    @staticmethod
+    def _in_order(objects, ids):
+        by_id = {obj.id: obj for obj in objects}
+        return [by_id[object_id] for object_id in ids if object_id in by_id]
+
+    def search_notifications(self, user_id, search, page=0, page_size=PAGE_SIZE, session=None):
+        """
+        Уведомления пользователя по заголовку и тексту
+
+        Returns:
+            tuple: ([Notification, ...] по рангу, есть ли следующая страница)
+        """
+        query = owner_query(user_id, search)
+        if not query or not notifications_index.ensure(self.db.engine):
+            return [], False
+
+        own_session = session is None
+        session = session or self.db.get_session()
+        try:
+            ids, has_more = self._ranked_ids(
+                session,
+                "SELECT rowid FROM notifications_fts WHERE notifications_fts MATCH :query "
+                "ORDER BY bm25(notifications_fts, 0.0, 5.0, 1.0), rowid DESC LIMIT :limit OFFSET :offset",
+                {'query': query}, page, page_size
+            )
+            if not ids:
+                return [], False
+            notifications = session.query(Notification).filter(Notification.id.in_(ids)).all()
+            return self._in_order(notifications, ids), has_more
+        except Exception as e:
+            print(f"Error searching notifications: {e}")
+            return [], False
+        finally:
+            if own_session:
+                session.close()
+
+    def search_transactions(self, user_id, search, page=0, page_size=PAGE_SIZE, since=None, session=None):
+        """
+        Транзакции пользователя по номеру, именам контрагентов и валюте
+
+        Args:
+            since (datetime): Только транзакции не раньше этой даты
+
+        Returns:
+            tuple: ([Transaction, ...] по рангу, есть ли следующая страница)
+        """
+        query = owner_query(user_id, search)
+        if not query or not transactions_index.ensure(self.db.engine):
+            return [], False
+
+        since_filter = "AND t.created_date >= :since" if since else ""
+        own_session = session is None
+        session = session or self.db.get_session()
+        try:
+            ids, has_more = self._ranked_ids(
+                session,
+                f"SELECT transactions_fts.rowid FROM transactions_fts "
+                f"JOIN transactions t ON t.id = transactions_fts.rowid "
+                f"WHERE transactions_fts MATCH :query {since_filter} "
+                f"ORDER BY bm25(transactions_fts, 0.0, 10.0, 2.0, 2.0, 1.0), transactions_fts.rowid DESC "
+                f"LIMIT :limit OFFSET :offset",
+                # Даты в SQLite - строки ISO, сравнение строк совпадает с хронологическим
+                {'query': query, 'since': since.strftime("%Y-%m-%d %H:%M:%S") if since else None},
+                page, page_size
+            )
+            if not ids:
+                return [], False
+            transactions = (session.query(Transaction)
+                            .options(joinedload(Transaction.user_from), joinedload(Transaction.user_to),
+                                     joinedload(Transaction.currency_rel))
+                            .filter(Transaction.id.in_(ids)).all())
+            return self._in_order(transactions, ids), has_more
+        except Exception as e:
+            print(f"Error searching transactions: {e}")
+            return [], False
+        finally:
+            if own_session:
+                session.close()
+
+
+# Общий поиск
+text_search = TextSearch()
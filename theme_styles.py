@@ -0,0 +1,471 @@
+from functools import lru_cache
+from models import Theme
+
+DEFAULT_PRIMARY_COLOR = '#2E8B57'
+DEFAULT_BACKGROUND_COLOR = '#FFFFFF'
+DEFAULT_FONT_SIZE = 12
+
+# Производные цвета шаблона: (ключ в шаблоне, базовый цвет, сдвиг яркости)
+DERIVED_COLORS = (
+    ('primary_lighter_15', 'primary', 15),
+    ('primary_lighter_20', 'primary', 20),
+    ('primary_lighter_40', 'primary', 40),
+    ('primary_darker_10', 'primary', -10),
+    ('success_lighter_15', 'success', 15),
+    ('warning_lighter_15', 'warning', 15),
+    ('surface_lighter_5', 'surface', 5)
+)
+
+THEME_PALETTES = {
+    Theme.LIGHT: {
+        'primary': DEFAULT_PRIMARY_COLOR,
+        'secondary': '#4682B4',
+        'background': DEFAULT_BACKGROUND_COLOR,
+        'surface': '#FFFFFF',
+        'text': '#333333',
+        'text_secondary': '#666666',
+        'border': '#DDDDDD',
+        'success': '#28a745',
+        'warning': '#ffc107',
+        'error': '#dc3545'
+    },
+    Theme.DARK: {
+        'primary': DEFAULT_PRIMARY_COLOR,
+        'secondary': '#6c757d',
+        'background': '#1a1a1a',
+        'surface': '#2d2d2d',
+        'text': '#ffffff',
+        'text_secondary': '#b0b0b0',
+        'border': '#404040',
+        'success': '#20c997',
+        'warning': '#fd7e14',
+        'error': '#e83e8c'
+    },
+    Theme.BLUE: {
+        'primary': '#2196F3',
+        'secondary': '#03A9F4',
+        'background': '#E3F2FD',
+        'surface': '#FFFFFF',
+        'text': '#1565C0',
+        'text_secondary': '#1976D2',
+        'border': '#BBDEFB',
+        'success': '#4CAF50',
+        'warning': '#FF9800',
+        'error': '#F44336'
+    },
+    Theme.GREEN: {
+        'primary': '#4CAF50',
+        'secondary': '#8BC34A',
+        'background': '#F1F8E9',
+        'surface': '#FFFFFF',
+        'text': '#2E7D32',
+        'text_secondary': '#388E3C',
+        'border': '#C5E1A5',
+        'success': '#66BB6A',
+        'warning': '#FFA726',
+        'error': '#EF5350'
+    },
+    Theme.PURPLE: {
+        'primary': '#9C27B0',
+        'secondary': '#BA68C8',
+        'background': '#F3E5F5',
+        'surface': '#FFFFFF',
+        'text': '#7B1FA2',
+        'text_secondary': '#8E24AA',
+        'border': '#E1BEE7',
+        'success': '#7CB342',
+        'warning': '#FFB300',
+        'error': '#E53935'
+    },
+    Theme.ORANGE: {
+        'primary': '#FF9800',
+        'secondary': '#FFB74D',
+        'background': '#FFF3E0',
+        'surface': '#FFFFFF',
+        'text': '#EF6C00',
+        'text_secondary': '#F57C00',
+        'border': '#FFCC80',
+        'success': '#43A047',
+        'warning': '#FF8F00',
+        'error': '#E53935'
+    },
+    Theme.MODERN: {
+        'primary': '#6366F1',
+        'secondary': '#8B5CF6',
+        'background': '#0F172A',
+        'surface': '#1E293B',
+        'text': '#F1F5F9',
+        'text_secondary': '#94A3B8',
+        'border': '#334155',
+        'success': '#10B981',
+        'warning': '#F59E0B',
+        'error': '#EF4444'
+    }
+}
+
+# Шаблон QSS: значения подставляются по именам (см. build_style_sheet)
+QSS_TEMPLATE = """
+    /* Основные стили */
+    QMainWindow, QWidget, QDialog {{
+        background-color: {background};
+        color: {text};
+        font-size: {font_size}px;
+        font-family: "Arial", sans-serif;
+    }}
+
+    /* ЗАГОЛОВКИ */
+    QLabel[fontSize="large"] {{
+        font-size: {font_size_plus_4}px;
+        font-weight: bold;
+    }}
+
+    QLabel[fontSize="medium"] {{
+        font-size: {font_size_plus_2}px;
+    }}
+
+    QLabel[fontSize="small"] {{
+        font-size: {font_size}px;
+        color: {text_secondary};
+    }}
+
+    /* КНОПКИ */
+    QPushButton {{
+        background-color: {primary};
+        color: white;
+        border: none;
+        padding: 8px 16px;
+        border-radius: 6px;
+        font-weight: bold;
+        font-size: {font_size}px;
+        min-height: 10px;
+    }}
+
+    QPushButton:hover {{
+        background-color: {primary_lighter_15};
+    }}
+
+    QPushButton:pressed {{
+        background-color: {primary_darker_10};
+    }}
+
+    /* Кнопка перевода (зеленая) */
+    QPushButton[objectName="transfer_btn"] {{
+        background-color: {success};
+        font-size: {font_size}px;
+        padding: 10px 20px;
+    }}
+
+    QPushButton[objectName="transfer_btn"]:hover {{
+        background-color: {success_lighter_15};
+    }}
+
+    /* Кнопка обмена (оранжевая) */
+    QPushButton[objectName="exchange_btn"] {{
+        background-color: {warning};
+        font-size: {font_size}px;
+        padding: 10px 20px;
+    }}
+
+    QPushButton[objectName="exchange_btn"]:hover {{
+        background-color: {warning_lighter_15};
+    }}
+
+    /* Кнопка экспорта в PDF (фиолетовая) */
+    QPushButton[objectName="export_btn"] {{
+        background-color: #9C27B0;
+        color: white;
+        font-weight: bold;
+        padding: 8px 16px;
+        border-radius: 6px;
+        min-width: 120px;
+        font-size: {font_size}px;
+    }}
+    QPushButton[objectName="export_btn"]:hover {{
+        background-color: #BA68C8;
+    }}
+    QPushButton[objectName="export_btn"]:disabled {{
+        background-color: #cccccc;
+        color: #666666;
+    }}
+
+    /* Вторичные кнопки */
+    QPushButton[objectName="secondary_btn"] {{
+        background-color: {secondary};
+        padding: 6px 12px;
+    }}
+
+    /* ТАБЫ */
+    QTabWidget::pane {{
+        border: 1px solid {border};
+        background-color: {surface};
+        border-radius: 6px;
+        margin-top: 5px;
+    }}
+
+    QTabBar::tab {{
+        background-color: {surface};
+        color: {text_secondary};
+        padding: 8px 16px;
+        border: 1px solid {border};
+        border-bottom: none;
+        border-top-left-radius: 6px;
+        border-top-right-radius: 6px;
+        margin-right: 2px;
+        font-weight: bold;
+        font-size: {font_size}px;
+        min-width: 100px;
+    }}
+
+    QTabBar::tab:selected {{
+        background-color: {primary};
+        color: white;
+        border-color: {primary};
+    }}
+
+    QTabBar::tab:hover:!selected {{
+        background-color: {primary_lighter_40};
+        color: white;
+    }}
+
+    /* ГРУППЫ */
+    QGroupBox {{
+        font-weight: bold;
+        border: 2px solid {primary};
+        border-radius: 8px;
+        margin-top: 10px;
+        padding-top: 12px;
+        background-color: {surface};
+        color: {text};
+        font-size: {font_size}px;
+    }}
+
+    QGroupBox::title {{
+        subcontrol-origin: margin;
+        left: 12px;
+        padding: 0 8px 0 8px;
+        color: {primary};
+        background-color: {surface};
+        font-size: {font_size}px;
+    }}
+
+    /* ПОЛЯ ВВОДА */
+    QLineEdit, QComboBox, QSpinBox {{
+        padding: 6px 10px;
+        border: 1px solid {border};
+        border-radius: 4px;
+        background-color: {surface};
+        color: {text};
+        font-size: {font_size}px;
+        selection-background-color: {primary};
+        min-height: 20px;
+    }}
+
+    QLineEdit:focus, QComboBox:focus, QSpinBox:focus {{
+        border-color: {primary};
+        background-color: {surface_lighter_5};
+    }}
+
+    QComboBox::drop-down {{
+        border: none;
+        background-color: {primary};
+        width: 20px;
+        border-top-right-radius: 4px;
+        border-bottom-right-radius: 4px;
+    }}
+
+    QComboBox::down-arrow {{
+        image: none;
+        border-left: 4px solid transparent;
+        border-right: 4px solid transparent;
+        border-top: 4px solid white;
+        width: 0px;
+        height: 0px;
+    }}
+
+    /* ТАБЛИЦЫ */
+    QTableWidget {{
+        gridline-color: {border};
+        background-color: {surface};
+        color: {text};
+        border: 1px solid {border};
+        border-radius: 4px;
+        font-size: {font_size}px;
+        alternate-background-color: {surface_lighter_5};
+    }}
+
+    QTableWidget::item {{
+        padding: 6px;
+        border-bottom: 1px solid {border};
+    }}
+
+    QTableWidget::item:selected {{
+        background-color: {primary};
+        color: white;
+    }}
+
+    QHeaderView::section {{
+        background-color: {primary};
+        color: white;
+        padding: 8px;
+        border: none;
+        font-weight: bold;
+        font-size: {font_size}px;
+    }}
+
+    /* МЕНЮ */
+    QMenuBar {{
+        background-color: {primary};
+        color: white;
+        border: none;
+        font-weight: bold;
+        font-size: {font_size}px;
+        padding: 4px;
+    }}
+
+    QMenuBar::item {{
+        background-color: transparent;
+        color: white;
+        padding: 6px 12px;
+        border-radius: 4px;
+        margin: 0 2px;
+    }}
+
+    QMenuBar::item:selected {{
+        background-color: {primary_lighter_20};
+    }}
+
+    QMenu {{
+        background-color: {surface};
+        color: {text};
+        border: 1px solid {border};
+        border-radius: 6px;
+        padding: 6px;
+    }}
+
+    QMenu::item {{
+        padding: 6px 20px;
+        border-radius: 4px;
+        font-size: {font_size}px;
+    }}
+
+    QMenu::item:selected {{
+        background-color: {primary};
+        color: white;
+    }}
+
+    /* СТАТУС БАР */
+    QStatusBar {{
+        background-color: {surface};
+        color: {text_secondary};
+        border-top: 1px solid {border};
+        font-size: {font_size_minus_1}px;
+        padding: 4px;
+    }}
+
+    /* CHECKBOX */
+    QCheckBox {{
+        font-size: {font_size}px;
+        color: {text};
+        spacing: 6px;
+    }}
+
+    QCheckBox::indicator {{
+        width: 16px;
+        height: 16px;
+        border: 1px solid {border};
+        border-radius: 3px;
+        background-color: {surface};
+    }}
+
+    QCheckBox::indicator:checked {{
+        background-color: {primary};
+        border: 1px solid {primary};
+    }}
+
+    /* SCROLLBAR */
+    QScrollBar:vertical {{
+        background-color: {surface};
+        width: 12px;
+        margin: 0px;
+        border-radius: 6px;
+    }}
+
+    QScrollBar::handle:vertical {{
+        background-color: {primary};
+        border-radius: 6px;
+        min-height: 20px;
+    }}
+
+    QScrollBar::handle:vertical:hover {{
+        background-color: {primary_lighter_15};
+    }}
+"""
+
+
+def adjust_color(color, amount):
+    """Осветлить или затемнить цвет"""
+    if color.startswith('#'):
+        color = color[1:]
+
+    r = int(color[0:2], 16)
+    g = int(color[2:4], 16)
+    b = int(color[4:6], 16)
+
+    r = max(0, min(255, r + amount))
+    g = max(0, min(255, g + amount))
+    b = max(0, min(255, b + amount))
+
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def theme_colors(theme, primary_color=None, background_color=None):
+    """Палитра темы с пользовательскими цветами и производными оттенками"""
+    colors = dict(THEME_PALETTES.get(theme, THEME_PALETTES[Theme.LIGHT]))
+
+    if primary_color:
+        colors['primary'] = primary_color
+    if background_color:
+        colors['background'] = background_color
+
+    for key, base, amount in DERIVED_COLORS:
+        colors[key] = adjust_color(colors[base], amount)
+
+    return colors
+
+
+@lru_cache(maxsize=64)
+def build_style_sheet(theme, primary_color, background_color, font_size):
+    """
+    Готовая таблица стилей для (тема, цвета, размер шрифта)
+
+    Результат кэшируется: повторное применение тех же настроек
+    не пересобирает строку.
+    """
+    return QSS_TEMPLATE.format(
+        font_size=font_size,
+        font_size_plus_2=font_size + 2,
+        font_size_plus_4=font_size + 4,
+        font_size_minus_1=font_size - 1,
+        **theme_colors(theme, primary_color, background_color)
+    )
+
+
+def style_sheet_for(ui_settings):
+    """Таблица стилей по настройкам интерфейса пользователя (UserInterface или None)"""
+    if not ui_settings:
+        return build_style_sheet(Theme.LIGHT, DEFAULT_PRIMARY_COLOR, DEFAULT_BACKGROUND_COLOR, DEFAULT_FONT_SIZE)
+
+    return build_style_sheet(
+        ui_settings.theme or Theme.LIGHT,
+        ui_settings.primary_color or None,
+        ui_settings.background_color or None,
+        ui_settings.font_size or DEFAULT_FONT_SIZE
+    )
+
+
+def prebuild_style_sheets(primary_color=DEFAULT_PRIMARY_COLOR, background_color=DEFAULT_BACKGROUND_COLOR,
+                          font_size=DEFAULT_FONT_SIZE):
+    """Заранее собрать стили всех тем (переключение темы берет готовую строку)"""
+    for theme in THEME_PALETTES:
+        build_style_sheet(theme, primary_color, background_color, font_size)
+    return build_style_sheet.cache_info()
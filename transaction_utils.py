@@ -1,10 +1,73 @@
 from sqlalchemy.orm import Session
 from contextlib import contextmanager
 from database import db
+from addresses import wallet_address
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Стартовый баланс кошельков нового пользователя (0 - кошельки не создаются)
+INITIAL_WALLET_BALANCE = 10.0
+
+
+# Кошельки создаются при первом зачислении: нет строки в wallets - нулевой баланс
+
+def find_wallet(session, user_id, currency_id, for_update=False):
+    """Кошелек пользователя в валюте или None (нулевой баланс)"""
+    from models import Wallet
+
+    query = session.query(Wallet)
+    if for_update:
+        query = query.with_for_update()
+    return query.filter_by(user_id=user_id, currency_id=currency_id).first()
+
+
+def wallet_balance(session, user_id, currency_id):
+    wallet = find_wallet(session, user_id, currency_id)
+    return wallet.balance if wallet else 0.0
+
+
+def get_or_create_wallet(session, user_id, currency_id, for_update=True):
+    """Кошелек для зачисления: если его еще нет - создается с нулевым балансом"""
+    from models import Wallet, Currency
+
+    wallet = find_wallet(session, user_id, currency_id, for_update)
+    if wallet:
+        return wallet
+
+    currency = session.query(Currency).get(currency_id)
+    wallet = Wallet(
+        user_id=user_id,
+        currency_id=currency_id,
+        address=wallet_address(currency.code, user_id, currency_id),
+        balance=0.0
+    )
+    session.add(wallet)
+    session.flush()
+    return wallet
+
+
+def user_wallets(session, user_id, currency_ids=None, refresh=False):
+    """
+    Кошельки пользователя по всем валютам (одним запросом)
+
+    Args:
+        refresh (bool): Перечитать балансы уже загруженных в сессию кошельков
+
+    Returns:
+        list: (Currency, Wallet или None) в порядке валют
+    """
+    from sqlalchemy import and_
+    from models import Wallet, Currency
+
+    query = (session.query(Currency, Wallet)
+             .outerjoin(Wallet, and_(Wallet.currency_id == Currency.id, Wallet.user_id == user_id)))
+    if currency_ids is not None:
+        query = query.filter(Currency.id.in_(currency_ids))
+    if refresh:
+        query = query.populate_existing()
+    return query.order_by(Currency.id).all()
+
 
 @contextmanager
 def transaction_session():
@@ -36,10 +99,11 @@ def register_user_transaction(session, phone, full_name, telegram_id):
     if existing_user:
         raise ValueError("Пользователь с таким телефоном уже существует")
 
-    # Проверяем Telegram ID
-    existing_tg_user = session.query(User).filter_by(telegram_id=telegram_id).first()
-    if existing_tg_user:
-        raise ValueError("Telegram ID уже привязан к другому аккаунту")
+    # Проверяем Telegram ID (без него - не с чем сравнивать)
+    if telegram_id:
+        existing_tg_user = session.query(User).filter_by(telegram_id=telegram_id).first()
+        if existing_tg_user:
+            raise ValueError("Telegram ID уже привязан к другому аккаунту")
 
     # Создаем пользователя
     user = User(
@@ -50,16 +114,17 @@ def register_user_transaction(session, phone, full_name, telegram_id):
     session.add(user)
     session.flush()
 
-    # Создаем кошельки для всех валют
-    currencies = session.query(Currency).all()
-    for currency in currencies:
-        wallet = Wallet(
-            user_id=user.id,
-            currency_id=currency.id,
-            address=f"{currency.code}_address_{user.id}_{currency.id}",
-            balance=10.0
-        )
-        session.add(wallet)
+    # Стартовое зачисление во всех валютах - первое зачисление создает кошельки
+    if INITIAL_WALLET_BALANCE > 0:
+        currencies = session.query(Currency).all()
+        for currency in currencies:
+            wallet = Wallet(
+                user_id=user.id,
+                currency_id=currency.id,
+                address=wallet_address(currency.code, user.id, currency.id),
+                balance=INITIAL_WALLET_BALANCE
+            )
+            session.add(wallet)
 
     # Создаем настройки интерфейса
     ui_settings = UserInterface(user_id=user.id)
@@ -0,0 +1,143 @@
+"""
+Справочник пользователей для админ-панели: страницы из SQL и поиск по индексу
+
+Страницы - по ключу (id > последнего id прошлой страницы), поэтому любая
+страница стоит одинаково при любом числе пользователей. Поиск: FTS5 по
+телефону (только цифры, с кодом страны и без) и ФИО с префиксным совпадением
+слов, цифровой запрос дополнительно ищет ID с таким префиксом - диапазонами
+по первичному ключу. Цифры из середины или конца номера ('0003') FTS не
+находит - для них подстрока через LIKE.
+"""
+from sqlalchemy import func, or_, text
+from database import db
+from models import User
+from search_index import FtsIndex, digits_sql, phone_tokens_sql, phone_digits, match_query
+
+users_index = FtsIndex(
+    "users_fts",
+    "phone, full_name, prefix='2 3'",
+    populate_sql=f"INSERT INTO users_fts(rowid, phone, full_name) SELECT id, {phone_tokens_sql('phone')}, full_name "
+                 f"FROM users",
+    triggers={
+        "users_fts_insert": f"""AFTER INSERT ON users BEGIN
+            INSERT INTO users_fts(rowid, phone, full_name) VALUES (new.id, {phone_tokens_sql('new.phone')}, new.full_name);
+        END""",
+        "users_fts_update": f"""AFTER UPDATE OF phone, full_name ON users BEGIN
+            DELETE FROM users_fts WHERE rowid = old.id;
+            INSERT INTO users_fts(rowid, phone, full_name) VALUES (new.id, {phone_tokens_sql('new.phone')}, new.full_name);
+        END""",
+        "users_fts_delete": """AFTER DELETE ON users BEGIN
+            DELETE FROM users_fts WHERE rowid = old.id;
+        END"""
+    }
+)
+
+USER_COLUMNS = (User.id, User.phone, User.full_name, User.role, User.status)
+
+
+def id_prefix_ranges(prefix, max_id):
+    """Диапазоны id, десятичная запись которых начинается с prefix: 12 -> [12], [120..129], ..."""
+    if not prefix or prefix.startswith('0') or not max_id:
+        return []
+
+    ranges = []
+    low = high = int(prefix)
+    while low <= max_id:
+        ranges.append((low, high))
+        low, high = low * 10, high * 10 + 9
+    return ranges
+
+
+class UserDirectory:
+    """Страницы и поиск пользователей"""
+
+    PAGE_SIZE = 100
+
+    def __init__(self, database=db):
+        self.db = database
+
+    def ensure_index(self):
+        return users_index.ensure(self.db.engine)
+
+    def total_count(self):
+        session = self.db.get_session()
+        try:
+            return session.query(func.count(User.id)).scalar() or 0
+        finally:
+            session.close()
+
+    def page(self, search="", after_id=None, limit=PAGE_SIZE):
+        """
+        Страница пользователей по возрастанию id
+
+        Args:
+            search (str): Телефон, часть ФИО или префикс ID (пусто - все)
+            after_id (int): Последний id предыдущей страницы
+            limit (int): Размер страницы
+
+        Returns:
+            tuple: ([(id, phone, full_name, role, status), ...], есть ли следующая страница)
+        """
+        search = (search or "").strip()
+        after_id = after_id or 0
+
+        session = self.db.get_session()
+        try:
+            query = session.query(*USER_COLUMNS)
+            if search:
+                ids = self._search_ids(session, search, after_id, limit + 1)
+                if not ids:
+                    return [], False
+                query = query.filter(User.id.in_(ids))
+            else:
+                query = query.filter(User.id > after_id)
+
+            rows = query.order_by(User.id).limit(limit + 1).all()
+            return rows[:limit], len(rows) > limit
+        finally:
+            session.close()
+
+    def _search_ids(self, session, search, after_id, limit):
+        """Первые limit id после after_id, подходящих под запрос"""
+        digits = phone_digits(search)
+        ids = set()
+
+        if digits:
+            ranges = id_prefix_ranges(digits, session.query(func.max(User.id)).scalar())
+            if ranges:
+                ids.update(user_id for user_id, in (
+                    session.query(User.id)
+                    .filter(or_(*[User.id.between(low, high) for low, high in ranges]), User.id > after_id)
+                    .order_by(User.id).limit(limit)
+                ))
+
+        fts_query = match_query(digits or search)
+        if fts_query and self.ensure_index():
+            fts_ids = [row[0] for row in session.execute(
+                text("SELECT rowid FROM users_fts WHERE users_fts MATCH :query AND rowid > :after_id "
+                     "ORDER BY rowid LIMIT :limit"),
+                {'query': fts_query, 'after_id': after_id, 'limit': limit}
+            )]
+            ids.update(fts_ids)
+            if digits and not fts_ids:
+                # Цифры не с начала номера - подстрока по цифрам телефона (полный просмотр)
+                ids.update(user_id for user_id, in (
+                    session.query(User.id)
+                    .filter(text(f"{digits_sql('users.phone')} LIKE :pattern").bindparams(pattern=f"%{digits}%"),
+                            User.id > after_id)
+                    .order_by(User.id).limit(limit)
+                ))
+        elif fts_query:
+            # Без FTS5 - подстрока через LIKE (полный просмотр таблицы)
+            pattern = f"%{digits or search}%"
+            ids.update(user_id for user_id, in (
+                session.query(User.id)
+                .filter(or_(User.phone.like(pattern), User.full_name.like(pattern)), User.id > after_id)
+                .order_by(User.id).limit(limit)
+            ))
+
+        return sorted(ids)[:limit]
+
+
+# Общий справочник пользователей
+user_directory = UserDirectory()
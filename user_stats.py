@@ -0,0 +1,214 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import UserDailyStats, Transaction, Exchange, ExchangeStatus, Commission, Currency
+from database import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = ('sent_count', 'sent_amount', 'received_count', 'received_amount', 'commission_paid',
+               'exchanges_count', 'exchanged_out', 'exchanged_in')
+
+
+def _day(value):
+    return value.date() if value else date.today()
+
+
+class UserStatsService:
+    """
+    Дневные агрегаты по пользователям (таблица user_daily_stats)
+
+    Счетчики увеличиваются в той же транзакции БД, что и проведение перевода
+    или обмена, поэтому выписки и панели читают готовые итоги, а не всю историю.
+    Задача догоняющего пересчета переписывает последние дни из сырых данных -
+    на случай операций, проведенных в обход бота.
+
+    День операции - дата ее создания (как в выписках). Обмен учитывается
+    в exchanges_count по строке валюты, которую пользователь отдал.
+    """
+
+    def __init__(self, database=db):
+        self.database = database
+
+    def _increment(self, session, user_id, day, currency_id, **deltas):
+        values = {field: deltas.get(field, 0) for field in STAT_FIELDS}
+
+        stmt = sqlite_insert(UserDailyStats).values(user_id=user_id, day=day, currency_id=currency_id, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'day', 'currency_id'],
+            set_={field: getattr(UserDailyStats, field) + stmt.excluded[field]
+                  for field in STAT_FIELDS if field in deltas}
+        )
+        session.execute(stmt)
+
+    def record_transfer(self, session, transaction, commission=0.0):
+        """Учет проведенного перевода (вызывается внутри транзакции проведения)"""
+        day = _day(transaction.created_date)
+
+        if transaction.user_id_from:
+            self._increment(session, transaction.user_id_from, day, transaction.currency_id,
+                            sent_count=1, sent_amount=transaction.amount, commission_paid=commission)
+        if transaction.user_id_to:
+            self._increment(session, transaction.user_id_to, day, transaction.currency_id,
+                            received_count=1, received_amount=transaction.amount)
+
+    def record_exchange(self, session, exchange):
+        """Учет проведенного обмена (вызывается внутри транзакции проведения)"""
+        day = _day(exchange.created_date)
+
+        # Инициатор отдает currency_from и получает currency_to, второй участник - наоборот
+        self._increment(session, exchange.user_id_from, day, exchange.currency_from_id,
+                        exchanges_count=1, exchanged_out=exchange.amount_from)
+        self._increment(session, exchange.user_id_from, day, exchange.currency_to_id,
+                        exchanged_in=exchange.amount_to)
+        self._increment(session, exchange.user_id_to, day, exchange.currency_to_id,
+                        exchanges_count=1, exchanged_out=exchange.amount_to)
+        self._increment(session, exchange.user_id_to, day, exchange.currency_from_id,
+                        exchanged_in=exchange.amount_from)
+
+    @staticmethod
+    def _aggregate(session, since):
+        """Пересчет итогов из сырых данных: {(user_id, day, currency_id): {поле: значение}}"""
+        stats = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+
+        def grouped(user_column, day_column, currency_column, date_column, aggregates, *filters):
+            query = session.query(user_column, day_column, currency_column, *aggregates)
+            if since:
+                filters += (date_column >= datetime.combine(since, time.min),)
+            return (query.filter(user_column.isnot(None), date_column.isnot(None), *filters)
+                    .group_by(user_column, day_column, currency_column))
+
+        completed = Transaction.status == 'completed'
+        tx_day = func.date(Transaction.created_date)
+
+        for user_id, day, currency_id, count, amount in grouped(
+                Transaction.user_id_from, tx_day, Transaction.currency_id, Transaction.created_date,
+                (func.count(Transaction.id), func.sum(Transaction.amount)), completed):
+            stats[(user_id, day, currency_id)].update(sent_count=count, sent_amount=amount)
+
+        for user_id, day, currency_id, count, amount in grouped(
+                Transaction.user_id_to, tx_day, Transaction.currency_id, Transaction.created_date,
+                (func.count(Transaction.id), func.sum(Transaction.amount)), completed):
+            stats[(user_id, day, currency_id)].update(received_count=count, received_amount=amount)
+
+        for user_id, day, currency_id, amount in grouped(
+                Transaction.user_id_from, tx_day, Transaction.currency_id, Transaction.created_date,
+                (func.sum(Commission.amount),), completed,
+                Commission.transaction_id == Transaction.id):
+            stats[(user_id, day, currency_id)]['commission_paid'] = amount
+
+        ex_completed = Exchange.status == ExchangeStatus.COMPLETED
+        ex_day = func.date(Exchange.created_date)
+        sides = [
+            (Exchange.user_id_from, Exchange.currency_from_id, Exchange.amount_from, 'out'),
+            (Exchange.user_id_from, Exchange.currency_to_id, Exchange.amount_to, 'in'),
+            (Exchange.user_id_to, Exchange.currency_to_id, Exchange.amount_to, 'out'),
+            (Exchange.user_id_to, Exchange.currency_from_id, Exchange.amount_from, 'in')
+        ]
+        for user_column, currency_column, amount_column, direction in sides:
+            for user_id, day, currency_id, count, amount in grouped(
+                    user_column, ex_day, currency_column, Exchange.created_date,
+                    (func.count(Exchange.id), func.sum(amount_column)), ex_completed):
+                row = stats[(user_id, day, currency_id)]
+                if direction == 'out':
+                    row['exchanges_count'] += count
+                    row['exchanged_out'] += amount
+                else:
+                    row['exchanged_in'] += amount
+
+        return stats
+
+    def rebuild(self, since=None):
+        """
+        Пересчет агрегатов из истории
+
+        Args:
+            since (date): С какого дня пересчитывать (None - полностью)
+
+        Returns:
+            int: Количество записанных строк агрегатов
+        """
+        session = self.database.get_session()
+        try:
+            # Удаляем первым: блокировка записи не даст провести операцию между чтением и вставкой
+            delete_query = session.query(UserDailyStats)
+            if since:
+                delete_query = delete_query.filter(UserDailyStats.day >= since)
+            delete_query.delete(synchronize_session=False)
+
+            stats = self._aggregate(session, since)
+
+            session.bulk_insert_mappings(UserDailyStats, [
+                dict(values, user_id=user_id, day=date.fromisoformat(day), currency_id=currency_id)
+                for (user_id, day, currency_id), values in stats.items()
+            ])
+            session.commit()
+
+            logger.info(f"📊 Агрегаты пересчитаны: {len(stats)} строк"
+                        f"{' с ' + since.strftime('%d.%m.%Y') if since else ''}")
+            return len(stats)
+
+        except Exception as e:
+            session.rollback()
+            logger.error(f"❌ Ошибка пересчета агрегатов: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def catch_up(self, days=2):
+        """Догоняющий пересчет последних дней (при пустой таблице - полный)"""
+        session = self.database.get_session()
+        try:
+            is_empty = session.query(UserDailyStats.id).first() is None
+        finally:
+            session.close()
+
+        if is_empty:
+            return self.rebuild()
+        return self.rebuild(since=date.today() - timedelta(days=days - 1))
+
+    def period_totals(self, user_id, date_from=None, date_to=None, session=None):
+        """
+        Итоги пользователя за период по валютам
+
+        Args:
+            user_id (int): ID пользователя
+            date_from (date): Первый день периода (None - с начала истории)
+            date_to (date): Последний день периода включительно
+
+        Returns:
+            dict: {код валюты: {поле: сумма}}
+        """
+        own_session = session is None
+        session = session or self.database.get_session()
+        try:
+            query = (session.query(Currency.code,
+                                   *[func.sum(getattr(UserDailyStats, field)) for field in STAT_FIELDS])
+                     .join(Currency, Currency.id == UserDailyStats.currency_id)
+                     .filter(UserDailyStats.user_id == user_id))
+            if date_from:
+                query = query.filter(UserDailyStats.day >= date_from)
+            if date_to:
+                query = query.filter(UserDailyStats.day <= date_to)
+
+            return {code: dict(zip(STAT_FIELDS, values))
+                    for code, *values in query.group_by(Currency.code).order_by(Currency.code)}
+        finally:
+            if own_session:
+                session.close()
+
+    @staticmethod
+    def format_amounts(totals, field, precision=2):
+        """Строка вида '1.50 BTC, 20.00 USDT' по одному полю итогов"""
+        parts = [f"{values[field]:.{precision}f} {code}" for code, values in totals.items() if values[field]]
+        return ", ".join(parts) if parts else "0"
+
+    @staticmethod
+    def total_count(totals, *fields):
+        return sum(values[field] for values in totals.values() for field in fields)
+
+
+# Создаем экземпляр сервиса агрегатов
+user_stats = UserStatsService()
@@ -0,0 +1,438 @@
+import os
+import io
+import re
+import time
+import struct
+import shutil
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+
+BASE_RE = re.compile(r"^base_(\d{15})_(\d{8})\.db$")
+SEGMENT_RE = re.compile(r"^wal_(\d{8})_(\d{12})_(\d{15})\.seg$")
+
+
+def _ts_ms(dt=None):
+    return int((dt or datetime.now()).timestamp() * 1000)
+
+
+class LocalArchiveStorage:
+    """Хранилище WAL-архива в локальной папке"""
+
+    def __init__(self, root="backups/wal_archive"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, name, data):
+        tmp_path = os.path.join(self.root, f".{name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.root, name))
+
+    def put_file(self, name, path):
+        tmp_path = os.path.join(self.root, f".{name}.tmp")
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, os.path.join(self.root, name))
+
+    def get_file(self, name, path):
+        shutil.copyfile(os.path.join(self.root, name), path)
+
+    def get(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def list(self):
+        return [name for name in os.listdir(self.root) if not name.startswith('.')]
+
+
+class YandexDiskArchiveStorage:
+    """Хранилище WAL-архива на Яндекс.Диске (подпапка папки бэкапов)"""
+
+    def __init__(self, backup, folder="wal_archive"):
+        self.disk = backup.disk
+        self.folder = f"{backup.app_folder}/{folder}"
+        backup.ensure_app_folder()
+        if not self.disk.exists(self.folder):
+            self.disk.mkdir(self.folder)
+
+    def put(self, name, data):
+        self.disk.upload(io.BytesIO(data), f"{self.folder}/{name}", overwrite=True)
+
+    def put_file(self, name, path):
+        self.disk.upload(path, f"{self.folder}/{name}", overwrite=True)
+
+    def get_file(self, name, path):
+        self.disk.download(f"{self.folder}/{name}", path)
+
+    def get(self, name):
+        buffer = io.BytesIO()
+        self.disk.download(f"{self.folder}/{name}", buffer)
+        return buffer.getvalue()
+
+    def list(self):
+        return [item.name for item in self.disk.listdir(self.folder)]
+
+
+class WalArchiver:
+    """
+    Непрерывная отправка WAL для восстановления на момент времени (PITR)
+
+    База работает в режиме WAL без автоматических checkpoint'ов: контрольные
+    точки делает только архиватор, после того как отправил все кадры журнала.
+    В хранилище лежат базовые снимки (base_<время>_<номер журнала>.db) и
+    сегменты журнала (wal_<номер журнала>_<смещение>_<время>.seg).
+    """
+
+    def __init__(self, storage, db_path="crypto_wallet.db", interval=1.0,
+                 rotate_bytes=16 * 1024 * 1024, snapshot_interval=24 * 3600):
+        self.storage = storage
+        self.db_path = db_path
+        self.wal_path = f"{db_path}-wal"
+        self.interval = interval
+        self.rotate_bytes = rotate_bytes
+        self.snapshot_interval = snapshot_interval
+
+        self.running = False
+        self.thread = None
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.wal_index = 0
+        self.offset = 0
+        self.salt = None
+        self.last_snapshot_at = 0
+
+        self.stats = {
+            'segments_shipped': 0,
+            'bytes_shipped': 0,
+            'snapshots': 0,
+            'last_ship_at': None,
+            'last_error': None
+        }
+
+    # --- Работа с журналом ---
+
+    def _connect(self):
+        if self._conn is None:
+            # Соединение архиватора держим открытым: иначе при закрытии последнего
+            # соединения SQLite сам сделает checkpoint и удалит журнал
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA wal_autocheckpoint=0")
+        return self._conn
+
+    def _read_wal_tail(self):
+        """Новые целые кадры журнала с последней отправленной позиции"""
+        if not os.path.exists(self.wal_path):
+            return None, b''
+
+        with open(self.wal_path, 'rb') as f:
+            header = f.read(WAL_HEADER_SIZE)
+            if len(header) < WAL_HEADER_SIZE:
+                return None, b''
+
+            page_size = struct.unpack(">I", header[8:12])[0]
+            salt = header[16:24]
+            frame_size = WAL_FRAME_HEADER_SIZE + page_size
+
+            start = max(self.offset, WAL_HEADER_SIZE)
+            f.seek(start)
+            frames = f.read()
+
+        # Отправляем только до последнего кадра с коммитом: незакоммиченные
+        # кадры SQLite может перезаписать на месте
+        commit_end = 0
+        position = 0
+        while position + frame_size <= len(frames):
+            db_size_after_commit = struct.unpack(">I", frames[position + 4:position + 8])[0]
+            position += frame_size
+            if db_size_after_commit:
+                commit_end = position
+
+        if not commit_end:
+            return salt, b''
+
+        prefix = header if self.offset < WAL_HEADER_SIZE else b''
+        return salt, prefix + frames[:commit_end]
+
+    def _ship_pending(self):
+        salt, data = self._read_wal_tail()
+
+        if self.salt is not None and salt is not None and salt != self.salt:
+            # Журнал перезапущен не архиватором - непрерывность нарушена
+            raise RuntimeError("WAL был перезапущен вне архиватора")
+
+        if not data:
+            return 0
+
+        name = f"wal_{self.wal_index:08d}_{self.offset:012d}_{_ts_ms():015d}.seg"
+        self.storage.put(name, data)
+
+        self.salt = salt
+        self.offset += len(data)
+        self.stats['segments_shipped'] += 1
+        self.stats['bytes_shipped'] += len(data)
+        self.stats['last_ship_at'] = time.time()
+        return len(data)
+
+    def _checkpoint(self):
+        """checkpoint(TRUNCATE); возвращает число кадров в журнале или None если занято"""
+        busy, log_frames, _ = self._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        if busy:
+            return None
+        return log_frames
+
+    def _shipped_frames(self):
+        if self.offset <= WAL_HEADER_SIZE:
+            return 0
+        page_size = self._connect().execute("PRAGMA page_size").fetchone()[0]
+        return (self.offset - WAL_HEADER_SIZE) // (WAL_FRAME_HEADER_SIZE + page_size)
+
+    def _start_new_wal(self):
+        self.wal_index += 1
+        self.offset = 0
+        self.salt = None
+
+    def rotate(self):
+        """Отправка хвоста журнала и checkpoint с началом нового журнала"""
+        self._ship_pending()
+        shipped = self._shipped_frames()
+
+        log_frames = self._checkpoint()
+        if log_frames is None:
+            return False
+
+        self._start_new_wal()
+        if log_frames > shipped:
+            # Между отправкой и checkpoint'ом успела пройти запись - закрываем разрыв снимком
+            logger.warning("⚠️ Кадры WAL попали в checkpoint до отправки, создаю новый базовый снимок")
+            self.snapshot()
+        return True
+
+    def snapshot(self):
+        """Новый базовый снимок; следующий журнал воспроизводится поверх него"""
+        self._ship_pending()
+        if self._checkpoint() is None:
+            return False
+
+        self._start_new_wal()
+
+        tmp_path = f"{self.db_path}.snapshot.tmp"
+        dst = sqlite3.connect(tmp_path)
+        try:
+            self._connect().backup(dst)
+        finally:
+            dst.close()
+
+        try:
+            name = f"base_{_ts_ms():015d}_{self.wal_index:08d}.db"
+            self.storage.put_file(name, tmp_path)
+        finally:
+            os.remove(tmp_path)
+
+        self.last_snapshot_at = time.time()
+        self.stats['snapshots'] += 1
+        logger.info(f"📸 Базовый снимок для PITR отправлен: {name}")
+        return True
+
+    def tick(self):
+        """Один цикл отправки (вызывается из потока архиватора)"""
+        with self._lock:
+            if time.time() - self.last_snapshot_at >= self.snapshot_interval:
+                self.snapshot()
+                return
+
+            self._ship_pending()
+            if self.offset >= self.rotate_bytes:
+                self.rotate()
+
+    # --- Управление ---
+
+    def start(self):
+        """Запуск непрерывной отправки журнала"""
+        if self.running:
+            return
+
+        existing = [int(m.group(1)) for m in map(SEGMENT_RE.match, self.storage.list()) if m]
+        existing += [int(m.group(2)) for m in map(BASE_RE.match, self.storage.list()) if m]
+        self.wal_index = max(existing, default=0)
+
+        # Без базового снимка отправленные сегменты не к чему применить:
+        # ждем, пока checkpoint не будет занят читателями
+        deadline = time.monotonic() + max(10, self.interval * 10)
+        with self._lock:
+            while not self.snapshot():
+                if time.monotonic() >= deadline:
+                    raise RuntimeError("Не удалось создать базовый снимок: база занята")
+                time.sleep(0.1)
+
+        self.running = True
+
+        def archiver_loop():
+            while self.running:
+                try:
+                    self.tick()
+                    self.stats['last_error'] = None
+                except Exception as e:
+                    self.stats['last_error'] = str(e)
+                    logger.error(f"❌ Ошибка отправки WAL: {e}")
+                    # Непрерывность потеряна - начинаем новый журнал от свежего снимка
+                    try:
+                        with self._lock:
+                            self.snapshot()
+                    except Exception as snapshot_error:
+                        logger.error(f"❌ Ошибка создания снимка: {snapshot_error}")
+                time.sleep(self.interval)
+
+        self.thread = threading.Thread(target=archiver_loop, daemon=True)
+        self.thread.start()
+        logger.info(f"✅ Архивация WAL запущена (интервал {self.interval} с)")
+
+    def stop(self):
+        """Остановка архивации с отправкой оставшегося хвоста журнала"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=max(5, self.interval * 2))
+
+        with self._lock:
+            try:
+                self._ship_pending()
+            except Exception as e:
+                logger.error(f"❌ Ошибка отправки хвоста WAL: {e}")
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        logger.info("⏸️ Архивация WAL остановлена")
+
+    def status(self):
+        """Состояние архиватора и отставание репликации"""
+        pending_bytes = 0
+        lag = 0.0
+        if os.path.exists(self.wal_path):
+            pending_bytes = max(0, os.path.getsize(self.wal_path) - self.offset)
+            if pending_bytes:
+                last_ship = self.stats['last_ship_at'] or self.last_snapshot_at
+                lag = max(0.0, time.time() - last_ship)
+
+        status = dict(self.stats)
+        status.update({
+            'running': self.running,
+            'wal_index': self.wal_index,
+            'pending_bytes': pending_bytes,
+            'lag_seconds': lag
+        })
+        return status
+
+
+def restore_to_time(storage, target_time, output_path):
+    """
+    Восстановление базы на момент времени: последний снимок + воспроизведение WAL
+
+    Args:
+        storage: Хранилище архива (LocalArchiveStorage / YandexDiskArchiveStorage)
+        target_time (datetime): Момент, на который восстанавливаем
+        output_path (str): Куда записать восстановленную базу
+
+    Returns:
+        dict: Отчет (снимок, число сегментов, байты, время, пропускная способность)
+    """
+    started = time.perf_counter()
+    target_ms = _ts_ms(target_time)
+    names = storage.list()
+
+    bases = sorted(
+        (int(m.group(1)), int(m.group(2)), m.group(0))
+        for m in map(BASE_RE.match, names) if m
+    )
+    bases = [base for base in bases if base[0] <= target_ms]
+    if not bases:
+        raise ValueError("Нет базового снимка раньше указанного времени")
+
+    _, base_index, base_name = bases[-1]
+
+    segments = {}
+    for m in map(SEGMENT_RE.match, names):
+        if m and int(m.group(1)) >= base_index and int(m.group(3)) <= target_ms:
+            segments.setdefault(int(m.group(1)), []).append((int(m.group(2)), m.group(0)))
+
+    tmp_path = f"{output_path}.pitr.tmp"
+    wal_path = f"{tmp_path}-wal"
+    for path in (tmp_path, wal_path, f"{tmp_path}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    storage.get_file(base_name, tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+
+    replayed_bytes = 0
+    replayed_segments = 0
+
+    for wal_index in sorted(segments):
+        data = bytearray()
+        for offset, name in sorted(segments[wal_index]):
+            if offset != len(data):
+                # Разрыв в журнале - дальше воспроизводить нельзя
+                break
+            data += storage.get(name)
+            replayed_segments += 1
+
+        if not data:
+            continue
+
+        with open(wal_path, 'wb') as f:
+            f.write(data)
+
+        # SQLite сам восстановит закоммиченные кадры из журнала при открытии
+        conn = sqlite3.connect(tmp_path)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+        replayed_bytes += len(data)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    conn.close()
+
+    if integrity != 'ok':
+        raise RuntimeError(f"Проверка целостности не пройдена: {integrity}")
+
+    os.replace(tmp_path, output_path)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'base': base_name,
+        'segments': replayed_segments,
+        'bytes': replayed_bytes,
+        'seconds': elapsed,
+        'throughput_mb_s': replayed_bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Восстановление базы на момент времени из WAL-архива")
+    parser.add_argument("archive", help="Папка локального WAL-архива")
+    parser.add_argument("output", help="Путь для восстановленной базы")
+    parser.add_argument("--to", dest="target", default=None,
+                        help="Момент времени в ISO формате (по умолчанию - последнее состояние)")
+    args = parser.parse_args()
+
+    target = datetime.fromisoformat(args.target) if args.target else datetime.now()
+    report = restore_to_time(LocalArchiveStorage(args.archive), target, args.output)
+
+    print(f"Снимок: {report['base']}")
+    print(f"Сегментов воспроизведено: {report['segments']} ({report['bytes']} байт)")
+    print(f"Время: {report['seconds']:.3f} с, {report['throughput_mb_s']:.2f} МБ/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QLineEdit, QPushButton
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 
 
@@ -31,4 +31,109 @@ class BalanceWidget(QWidget):
         layout.addStretch()
         layout.addWidget(usd_label)
 
-        self.setLayout(layout)
\ No newline at end of file
+        self.setLayout(layout)
+
+
+class SearchBar(QWidget):
+    """
+    Строка поиска с задержкой и листанием страниц результатов
+
+    search_requested испускается после паузы в наборе (страница сбрасывается
+    на первую) и при листании; номер страницы - в page.
+    """
+
+    search_requested = pyqtSignal()
+
+    def __init__(self, placeholder="Поиск...", delay_ms=250, parent=None):
+        super().__init__(parent)
+        self.page = 0
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.input = QLineEdit()
+        self.input.setPlaceholderText(placeholder)
+        self.input.setClearButtonEnabled(True)
+        self.input.textChanged.connect(self.on_text_changed)
+        layout.addWidget(self.input)
+
+        self.prev_btn = QPushButton("◀")
+        self.prev_btn.setFixedWidth(40)
+        self.prev_btn.clicked.connect(self.show_previous_page)
+        layout.addWidget(self.prev_btn)
+
+        self.page_label = QLabel()
+        layout.addWidget(self.page_label)
+
+        self.next_btn = QPushButton("▶")
+        self.next_btn.setFixedWidth(40)
+        self.next_btn.clicked.connect(self.show_next_page)
+        layout.addWidget(self.next_btn)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay_ms)
+        self.timer.timeout.connect(self.on_timeout)
+
+        self.set_has_more(False)
+
+    def text(self):
+        return self.input.text().strip()
+
+    def on_text_changed(self):
+        self.timer.start()
+
+    def on_timeout(self):
+        self.page = 0
+        self.search_requested.emit()
+
+    def show_previous_page(self):
+        if self.page > 0:
+            self.page -= 1
+            self.search_requested.emit()
+
+    def show_next_page(self):
+        self.page += 1
+        self.search_requested.emit()
+
+    def set_has_more(self, has_more):
+        """Обновить кнопки листания после загрузки страницы"""
+        searching = bool(self.text())
+        for widget in (self.prev_btn, self.page_label, self.next_btn):
+            widget.setVisible(searching)
+        self.page_label.setText(f"Стр. {self.page + 1}")
+        self.prev_btn.setEnabled(self.page > 0)
+        self.next_btn.setEnabled(has_more)
+
+
+class QtEventBridge(QObject):
+    """
+    Доставка событий шины (event_bus) в GUI-поток
+
+    Шина вызывает подписчиков в потоке публикации (бот, сокет), сигнал Qt
+    переносит событие в поток окна - обработчики event_received могут
+    трогать виджеты. Перед закрытием окна нужно вызвать close().
+    """
+
+    event_received = pyqtSignal(str, dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.events = []
+
+    def listen(self, *events):
+        from event_bus import event_bus
+
+        for event in events:
+            event_bus.subscribe(event, self.on_event)
+            self.events.append(event)
+
+    def on_event(self, event, payload):
+        self.event_received.emit(event, dict(payload))
+
+    def close(self):
+        from event_bus import event_bus
+
+        for event in self.events:
+            event_bus.unsubscribe(event, self.on_event)
+        self.events = []
@@ -3,9 +3,12 @@ import shutil
 import tempfile
 import zipfile
 import json
+import threading
 from datetime import datetime, timedelta
 from yadisk import YaDisk
 from yadisk.exceptions import YaDiskError
+from backup_catalog import backup_catalog, file_checksum, collect_row_counts, copy_database
+from backup_retention import RetentionPolicy, RetentionEngine
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,17 +25,35 @@ class YandexDiskBackup:
         """
         self.token = token
         self.app_folder = app_folder
-        self.disk = YaDisk(token=token)
+        self.catalog = backup_catalog
+
+        # Клиент создается при первом обращении: импорт модуля не ходит в сеть
+        self._disk = None
+        self._disk_lock = threading.Lock()
+
+    @property
+    def disk(self):
+        """Клиент Яндекс.Диска (подключение и проверка токена - при первом обращении)"""
+        if self._disk is None:
+            with self._disk_lock:
+                if self._disk is None:
+                    self._disk = self._connect()
+        return self._disk
+
+    def _connect(self):
+        disk = YaDisk(token=self.token)
 
         # Проверяем соединение
         try:
-            if not self.disk.check_token():
+            if not disk.check_token():
                 raise ValueError("Недействительный токен Яндекс.Диск")
             logger.info("✅ Соединение с Яндекс.Диск установлено")
         except Exception as e:
             logger.error(f"❌ Ошибка подключения к Яндекс.Диск: {e}")
             raise
 
+        return disk
+
     def ensure_app_folder(self):
         """Создание папки приложения на Яндекс.Диске если её нет"""
         try:
@@ -59,20 +80,25 @@ class YandexDiskBackup:
             logger.error(f"❌ Файл базы данных не найден: {db_path}")
             return None
 
+        temp_dir = None
         try:
             # Создаем временную директорию для бэкапа
             temp_dir = tempfile.mkdtemp(prefix="crypto_backup_")
 
-            # Копируем файл базы данных
+            # Копируем базу вместе с кадрами журнала WAL
             backup_file = os.path.join(temp_dir, "crypto_wallet.db")
-            shutil.copy2(db_path, backup_file)
+            copy_database(db_path, backup_file)
+
+            # Считаем строки по копии, чтобы не трогать рабочую базу
+            row_counts = collect_row_counts(backup_file)
 
             # Создаем файл с метаданными
             meta = {
                 "backup_date": datetime.now().isoformat(),
-                "db_size": os.path.getsize(db_path),
+                "db_size": os.path.getsize(backup_file),
                 "app_version": "1.0.0",
-                "description": "Автоматический бэкап крипто-кошелька"
+                "description": "Автоматический бэкап крипто-кошелька",
+                "row_counts": row_counts
             }
 
             if metadata:
@@ -97,80 +123,125 @@ class YandexDiskBackup:
                 self.disk.upload(zip_path, remote_path)
                 logger.info(f"✅ Бэкап загружен на Яндекс.Диск: {zip_filename}")
 
-                # Очищаем старые бэкапы (оставляем последние 7)
-                self.cleanup_old_backups()
+                # Записываем бэкап в локальный каталог
+                self.catalog.add(
+                    name=zip_filename,
+                    size=os.path.getsize(zip_path),
+                    modified=datetime.now(),
+                    path=remote_path,
+                    checksum=file_checksum(zip_path),
+                    row_counts=row_counts,
+                    metadata=meta
+                )
 
                 return zip_filename
 
-            # Очищаем временную директорию
-            shutil.rmtree(temp_dir)
+            return None
 
         except Exception as e:
             logger.error(f"❌ Ошибка создания бэкапа: {e}")
             return None
 
-    def cleanup_old_backups(self, keep_last=7):
+        finally:
+            # Очищаем временную директорию
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def cleanup_old_backups(self, policy=None):
         """
-        Очистка старых бэкапов
+        Очистка старых бэкапов по политике хранения
 
         Args:
-            keep_last (int): Сколько последних бэкапов оставить
+            policy (RetentionPolicy): Политика хранения (по умолчанию - стандартная GFS)
+
+        Returns:
+            list: Имена удаленных бэкапов
         """
         try:
-            if not self.disk.exists(self.app_folder):
-                return
-
-            # Получаем список файлов
-            files = []
-            for item in self.disk.listdir(self.app_folder):
-                if item.name.endswith('.zip'):
-                    files.append({
-                        'name': item.name,
-                        'modified': item.modified
-                    })
-
-            # Сортируем по дате изменения (новые сначала)
-            files.sort(key=lambda x: x['modified'], reverse=True)
-
-            # Удаляем старые
-            if len(files) > keep_last:
-                for file in files[keep_last:]:
-                    remote_path = f"{self.app_folder}/{file['name']}"
-                    self.disk.remove(remote_path, permanently=True)
-                    logger.info(f"🗑️ Удален старый бэкап: {file['name']}")
+            # Решение принимается по локальному каталогу, удаление - пакетами параллельно
+            engine = RetentionEngine(policy or RetentionPolicy())
+            return engine.apply(self.list_backups(), self.delete_backup)
 
         except Exception as e:
             logger.error(f"❌ Ошибка очистки старых бэкапов: {e}")
+            return []
 
-    def list_backups(self):
+    def delete_backup(self, backup_name):
         """
-        Получение списка бэкапов на Яндекс.Диске
+        Удаление бэкапа с Яндекс.Диска и из каталога
+
+        Args:
+            backup_name (str): Имя файла бэкапа
+
+        Returns:
+            bool: Был ли бэкап удален
+        """
+        try:
+            remote_path = f"{self.app_folder}/{backup_name}"
+            removed = False
+
+            if self.disk.exists(remote_path):
+                self.disk.remove(remote_path, permanently=True)
+                removed = True
+                logger.info(f"🗑️ Удален бэкап: {backup_name}")
+
+            self.catalog.remove(backup_name)
+            return removed
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка удаления бэкапа {backup_name}: {e}")
+            return False
+
+    def list_remote_backups(self):
+        """
+        Получение списка бэкапов непосредственно с Яндекс.Диска
 
         Returns:
             list: Список бэкапов с информацией
         """
         backups = []
 
+        if not self.disk.exists(self.app_folder):
+            return backups
+
+        for item in self.disk.listdir(self.app_folder):
+            if item.name.endswith('.zip'):
+                backups.append({
+                    'name': item.name,
+                    'size': item.size,
+                    'modified': item.modified,
+                    'path': item.path
+                })
+
+        return backups
+
+    def reconcile_catalog(self):
+        """Сверка локального каталога с содержимым Яндекс.Диска"""
         try:
-            if not self.disk.exists(self.app_folder):
-                return backups
+            return self.catalog.reconcile(self.list_remote_backups())
+        except Exception as e:
+            logger.error(f"❌ Ошибка сверки каталога бэкапов: {e}")
+            return 0, 0
+
+    def list_backups(self, refresh=False):
+        """
+        Получение списка бэкапов из локального каталога
 
-            for item in self.disk.listdir(self.app_folder):
-                if item.name.endswith('.zip'):
-                    backups.append({
-                        'name': item.name,
-                        'size': item.size,
-                        'modified': item.modified,
-                        'path': item.path
-                    })
+        Args:
+            refresh (bool): Сверить каталог с Яндекс.Диском перед чтением
 
-            # Сортируем по дате (новые сначала)
-            backups.sort(key=lambda x: x['modified'], reverse=True)
+        Returns:
+            list: Список бэкапов с информацией
+        """
+        # Удаленный листинг нужен только для сверки или первого заполнения каталога
+        if refresh or not self.catalog.exists():
+            self.reconcile_catalog()
 
+        try:
+            return self.catalog.list_backups()
         except Exception as e:
             logger.error(f"❌ Ошибка получения списка бэкапов: {e}")
-
-        return backups
+            return []
 
     def download_backup(self, backup_name, download_path=None):
         """
@@ -218,46 +289,8 @@ class YandexDiskBackup:
             bool: Успешно ли восстановление
         """
         try:
-            # Скачиваем бэкап
-            zip_path = self.download_backup(backup_name)
-            if not zip_path:
-                return False
-
-            # Создаем временную директорию для распаковки
-            temp_dir = tempfile.mkdtemp(prefix="crypto_restore_")
-
-            # Распаковываем архив
-            with zipfile.ZipFile(zip_path, 'r') as zipf:
-                zipf.extractall(temp_dir)
-
-            # Находим файл базы данных
-            db_backup = os.path.join(temp_dir, "crypto_wallet.db")
-            if not os.path.exists(db_backup):
-                logger.error("❌ Файл базы данных не найден в архиве")
-                shutil.rmtree(temp_dir)
-                return False
-
-            # Создаем бэкап текущей базы данных
-            if os.path.exists(db_path):
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_current = f"{db_path}.pre_restore_{timestamp}"
-                shutil.copy2(db_path, backup_current)
-                logger.info(f"📋 Создан бэкап текущей базы: {backup_current}")
-
-            # Восстанавливаем базу данных
-            shutil.copy2(db_backup, db_path)
-
-            # Читаем метаданные
-            meta_file = os.path.join(temp_dir, "metadata.json")
-            if os.path.exists(meta_file):
-                with open(meta_file, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                logger.info(f"📊 Восстановлен бэкап от: {metadata.get('backup_date')}")
-
-            # Очищаем временные файлы
-            shutil.rmtree(temp_dir)
-
-            logger.info("✅ База данных успешно восстановлена!")
+            from restore_pipeline import RestorePipeline
+            RestorePipeline(self, db_path=db_path).run(backup_name)
             return True
 
         except Exception as e:
@@ -274,48 +307,70 @@ class YandexDiskBackup:
         Returns:
             dict: Информация о бэкапе или None
         """
+        # Сначала смотрим в локальный каталог - без обращения к сети
+        entry = self.catalog.get(backup_name)
+        if entry and entry.get('metadata') is not None:
+            return {
+                'name': backup_name,
+                'size': entry['size'],
+                'modified': entry['modified'],
+                'created': entry.get('metadata', {}).get('backup_date', entry['modified']),
+                'checksum': entry.get('checksum'),
+                'row_counts': entry.get('row_counts', {}),
+                'metadata': entry['metadata']
+            }
+
+        temp_dir = None
         try:
-            # Создаем временную директорию
+            # Бэкап без метаданных в каталоге (например, найден при сверке) - скачиваем один раз
             temp_dir = tempfile.mkdtemp(prefix="crypto_info_")
 
             # Скачиваем архив
             zip_path = self.download_backup(backup_name, temp_dir)
             if not zip_path:
-                shutil.rmtree(temp_dir)
                 return None
 
             # Извлекаем метаданные
             with zipfile.ZipFile(zip_path, 'r') as zipf:
-                # Получаем список файлов
-                file_list = zipf.namelist()
-
-                # Ищем файл метаданных
-                if "metadata.json" in file_list:
-                    with zipf.open("metadata.json") as f:
-                        metadata = json.load(f)
-
-                    # Добавляем информацию о файле
-                    file_info = self.disk.get_meta(f"{self.app_folder}/{backup_name}")
-
-                    result = {
-                        'name': backup_name,
-                        'size': file_info.size,
-                        'modified': file_info.modified,
-                        'created': file_info.created,
-                        'metadata': metadata
-                    }
-
-                    # Очищаем временные файлы
-                    shutil.rmtree(temp_dir)
-                    return result
-
-            shutil.rmtree(temp_dir)
-            return None
+                if "metadata.json" not in zipf.namelist():
+                    return None
+
+                with zipf.open("metadata.json") as f:
+                    metadata = json.load(f)
+
+            # Добавляем информацию о файле
+            file_info = self.disk.get_meta(f"{self.app_folder}/{backup_name}")
+            checksum = file_checksum(zip_path)
+
+            # Запоминаем в каталоге, чтобы следующий запрос был мгновенным
+            self.catalog.add(
+                name=backup_name,
+                size=file_info.size,
+                modified=file_info.modified,
+                path=file_info.path,
+                checksum=checksum,
+                row_counts=metadata.get('row_counts'),
+                metadata=metadata
+            )
+
+            return {
+                'name': backup_name,
+                'size': file_info.size,
+                'modified': file_info.modified,
+                'created': file_info.created,
+                'checksum': checksum,
+                'row_counts': metadata.get('row_counts', {}),
+                'metadata': metadata
+            }
 
         except Exception as e:
             logger.error(f"❌ Ошибка получения информации о бэкапе: {e}")
             return None
 
+        finally:
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
     def get_disk_info(self):
         """
         Получение информации о Яндекс.Диске